@@ -0,0 +1,232 @@
+"""
+PDF Render Benchmark
+
+Measures barcode PDF throughput in PDFs per second per core for the cargo
+and container layouts, comparing the generator (process-wide fonts and
+styles, vector Code39, single-page layouts drawn directly on the canvas)
+with the previous path (Platypus layout, fonts and styles rebuilt per PDF,
+Code39 rasterised to a 300-DPI PNG through python-barcode + PIL, QR images
+embedded per row as RGB). The PDF sizes of both paths are also compared
+for container lists with distinct black-and-white QR images.
+
+Each worker process renders for a fixed time; the per-core figure is the
+total divided by the number of processes. With --batch, a batch of
+declarations is also pushed through the PDF render pool (the path the
+barcode retriever uses) from a set of I/O threads, for each worker count.
+
+Usage:
+    python -m benchmarks.bench_pdf_render
+    python -m benchmarks.bench_pdf_render --processes 1 4 --seconds 5
+    python -m benchmarks.bench_pdf_render --containers 20 --no-legacy
+    python -m benchmarks.bench_pdf_render --batch 1000 --workers 0 2 4 -1
+"""
+
+import argparse
+import base64
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image as PILImage  # noqa: E402
+from reportlab.platypus import Image  # noqa: E402
+
+from web_utils import barcode_pdf_generator  # noqa: E402
+from web_utils.barcode_pdf_generator import BarcodePdfGenerator  # noqa: E402
+from web_utils.api_capture import placeholder_png  # noqa: E402
+from web_utils.pdf_render_pool import PdfRenderPool  # noqa: E402
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo  # noqa: E402
+
+try:
+    from barcode import Code39
+    from barcode.writer import ImageWriter
+    LEGACY_AVAILABLE = True
+except ImportError:
+    LEGACY_AVAILABLE = False
+
+
+class LegacyPdfGenerator(BarcodePdfGenerator):
+    """The previous per-PDF rendering path, for comparison."""
+
+    def __init__(self, logger=None):
+        super().__init__(logger)
+        self.fast_render = False
+
+    def _register_fonts(self):
+        barcode_pdf_generator._fonts = None
+        super()._register_fonts()
+
+    def _get_styles(self) -> dict:
+        return barcode_pdf_generator._build_paragraph_styles(self.font_name, self.font_bold, self.font_italic)
+
+    def _get_table_styles(self) -> dict:
+        return barcode_pdf_generator._build_table_styles(self.font_name, self.font_bold, self.font_italic)
+
+    def _generate_barcode_image(self, code: str) -> Optional[Image]:
+        buffer = io.BytesIO()
+        Code39(code, writer=ImageWriter(), add_checksum=False).write(buffer, options={
+            'module_width': 0.3, 'module_height': 12, 'font_size': 0, 'text_distance': 1,
+            'quiet_zone': 2, 'write_text': False, 'dpi': 300,
+        })
+        buffer.seek(0)
+        img = Image(buffer, width=self.config.barcode_width, height=self.config.barcode_height)
+        img.hAlign = 'RIGHT'
+        return img
+
+    def _decode_qr_image(self, base64_data: str) -> Optional[Image]:
+        if not base64_data:
+            return None
+        img = Image(io.BytesIO(base64.b64decode(base64_data)),
+                    width=self.config.qr_code_size, height=self.config.qr_code_size)
+        img.hAlign = 'CENTER'
+        return img
+
+
+def qr_like_png(seed: int, modules: int = 33, scale: int = 8) -> bytes:
+    """RGB PNG of a random QR-sized module grid (8 px per module, 4-module border)."""
+    rnd = random.Random(seed)
+    size = modules + 8
+    image = PILImage.new('1', (size, size), 1)
+    pixels = image.load()
+    for y in range(modules):
+        for x in range(modules):
+            if rnd.random() < 0.5:
+                pixels[x + 4, y + 4] = 0
+    buffer = io.BytesIO()
+    image.resize((size * scale, size * scale), PILImage.NEAREST).convert('RGB').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def build_info(containers: int) -> ContainerDeclarationInfo:
+    """Declaration info for the cargo layout (0 containers) or the container layout."""
+    info = ContainerDeclarationInfo(
+        ma_so_thue='2300782217',
+        so_to_khai='308010891440',
+        ngay_to_khai='01/12/2024',
+        ten_don_vi_xnk='CÔNG TY TNHH ABC',
+        ma_ddgs='18A3OZZ',
+        ten_ddgs='Cảng Hải Phòng',
+        ten_chi_cuc_hai_quan='Hải quan Bắc Ninh',
+        ten_loai_hinh='A11 - Nhập kinh doanh tiêu dùng',
+        trang_thai_to_khai='Thông quan',
+        luong_to_khai='Xanh',
+        so_luong_hang=1250,
+        dvt_so_luong_hang='PK',
+        tong_trong_luong_hang=24567.5,
+        dvt_tong_trong_luong_hang='KGM',
+        so_dinh_danh='DD2412010001',
+        ma_ptvc='2' if containers else '1',
+    )
+    image = base64.b64encode(placeholder_png(400)).decode('ascii')
+    for i in range(1, containers + 1):
+        info.containers.append(ContainerInfo(
+            stt=i, so_container=f'TEMU{i:07d}', so_seal=f'S{i:06d}', barcode_image=image
+        ))
+    return info
+
+
+def _render_for(args: tuple) -> int:
+    """Worker: render PDFs for `seconds`, return how many were produced."""
+    legacy, containers, seconds = args
+    generator_class = LegacyPdfGenerator if legacy else BarcodePdfGenerator
+    info = build_info(containers)
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        # A generator per PDF, as the retriever's callers did before
+        if generator_class(logger=None).generate_pdf(info) is None:
+            raise RuntimeError("PDF generation failed")
+        count += 1
+    return count
+
+
+def measure(legacy: bool, containers: int, processes: int, seconds: float) -> float:
+    """PDFs per second per core."""
+    jobs = [(legacy, containers, seconds)] * processes
+    if processes == 1:
+        total = _render_for(jobs[0])
+    else:
+        with Pool(processes) as pool:
+            total = sum(pool.map(_render_for, jobs))
+    return total / seconds / processes
+
+
+def run(containers_list: List[int], processes_list: List[int], seconds: float, legacy: bool) -> None:
+    print(f"{'layout':<22}{'procs':>6}{'legacy PDF/s/core':>20}{'PDF/s/core':>14}{'speed-up':>10}")
+    for containers in containers_list:
+        label = f"container x{containers}" if containers else "cargo"
+        for processes in processes_list:
+            new = measure(False, containers, processes, seconds)
+            if legacy:
+                old = measure(True, containers, processes, seconds)
+                print(f"{label:<22}{processes:>6}{old:>20.1f}{new:>14.1f}{new / old:>9.1f}x")
+            else:
+                print(f"{label:<22}{processes:>6}{'-':>20}{new:>14.1f}{'-':>10}")
+
+
+def report_sizes(containers_list: List[int]) -> None:
+    """PDF size of both paths with a distinct QR image per container."""
+    print(f"\n{'layout':<22}{'legacy bytes':>14}{'bytes':>12}{'saved':>12}")
+    for containers in containers_list:
+        if not containers:
+            continue
+        info = build_info(containers)
+        for i, container in enumerate(info.containers):
+            container.barcode_image = base64.b64encode(qr_like_png(i)).decode('ascii')
+        old = len(LegacyPdfGenerator(logger=None).generate_pdf(info))
+        new = len(BarcodePdfGenerator(logger=None).generate_pdf(info))
+        print(f"{f'container x{containers}':<22}{old:>14}{new:>12}{old - new:>12}")
+
+
+def run_batch(batch: int, containers: int, workers_list: List[int], threads: int) -> None:
+    """Render a batch through PdfRenderPool from `threads` I/O threads per worker count."""
+    print(f"\nbatch of {batch} ({containers} containers each) from {threads} threads")
+    print(f"{'workers':>8}{'seconds':>10}{'PDF/s':>10}")
+    infos = [build_info(containers) for _ in range(batch)]
+    for workers in workers_list:
+        pool = PdfRenderPool(workers=workers)
+        try:
+            pool.render(infos[0])  # Start the workers outside the timing
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                failed = sum(1 for pdf in executor.map(pool.render, infos) if not pdf)
+            elapsed = time.perf_counter() - started
+        finally:
+            pool.shutdown()
+        if failed:
+            print(f"WARNING: {failed} PDFs failed with {workers} workers")
+        print(f"{pool.workers:>8}{elapsed:>10.2f}{batch / elapsed:>10.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark barcode PDF rendering (PDFs per second per core)")
+    parser.add_argument('--containers', type=int, nargs='+', default=[0, 5, 40],
+                        help="Container rows per PDF (0 = cargo layout)")
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--seconds', type=float, default=3.0, help="Render time per measurement")
+    parser.add_argument('--no-legacy', action='store_true', help="Skip the previous rendering path")
+    parser.add_argument('--batch', type=int, default=0, help="Also render a batch through the render pool")
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, -1],
+                        help="Render pool worker counts for --batch (0 = in-process, -1 = one per core)")
+    parser.add_argument('--threads', type=int, default=10, help="I/O threads submitting the --batch")
+    args = parser.parse_args(argv)
+
+    legacy = not args.no_legacy
+    if legacy and not LEGACY_AVAILABLE:
+        print("python-barcode not installed, skipping the previous rendering path")
+        legacy = False
+    run(args.containers, sorted(set(args.processes)), args.seconds, legacy)
+    if legacy:
+        report_sizes(args.containers)
+    if args.batch:
+        run_batch(args.batch, args.containers[0], args.workers, args.threads)
+
+
+if __name__ == '__main__':
+    main()
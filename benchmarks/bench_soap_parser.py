@@ -0,0 +1,197 @@
+"""
+SOAP Parser Benchmark
+
+Compares the single-pass QueryBangKeDanhSachContainer parser with the
+previous ElementTree DOM + find() implementation on payloads with
+hundreds of containers.
+
+Usage:
+    python -m benchmarks.bench_soap_parser
+    python -m benchmarks.bench_soap_parser --containers 200 500 1000 --repeat 20
+    python -m benchmarks.bench_soap_parser --file captured_response.xml
+"""
+
+import argparse
+import base64
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_utils.qrcode_api_client import (  # noqa: E402
+    ContainerDeclarationInfo,
+    ContainerInfo,
+    parse_bang_ke_response,
+)
+
+
+TEMPURI_NS = "http://tempuri.org/"
+
+HEADER = {
+    'MaSoThue': '2300782217',
+    'SoToKhai': '308010891440',
+    'NgayToKhai': '2024-12-01T00:00:00',
+    'TenDonViXNK': 'CÔNG TY TNHH ABC',
+    'MaDDGS': '18A3OZZ',
+    'TenDDGS': 'Cảng Hải Phòng',
+    'TenChiCucHaiQuan': 'Chi cục HQ Bắc Ninh',
+    'LoaiHinh': 'A11',
+    'TrangThaiToKhai': 'Thông quan',
+    'LuongToKhai': 'Xanh',
+    'So_Luong_Hang': '1250',
+    'Tong_Trong_Luong_Hang': '24567.5',
+    'IsContainer': '1',
+    'MaPTVC': '2',
+    'ThoiGianLayDuLieu': '2024-12-01 10:00:00',
+}
+
+
+def build_payload(containers: int, image_bytes: int = 1500) -> str:
+    """
+    Build a response shaped like a captured QueryBangKeDanhSachContainer reply.
+
+    Args:
+        containers: Number of Table_BangKe rows
+        image_bytes: Size of each (random) QR image before base64 encoding
+
+    Returns:
+        SOAP XML response text
+    """
+    header = "".join(f"<{k}>{v}</{k}>" for k, v in HEADER.items())
+    rows = []
+    for i in range(1, containers + 1):
+        image = base64.b64encode(os.urandom(image_bytes)).decode('ascii')
+        rows.append(
+            f'<Table_BangKe diffgr:id="Table_BangKe{i}" msdata:rowOrder="{i - 1}">'
+            f'<Stt>{i}</Stt><SoContainer>TEMU{i:07d} </SoContainer>'
+            f'<SoSeal>S{i:06d}</SoSeal><SoSealHQ>#####</SoSealHQ>'
+            f'<BarcodeImage>{image}</BarcodeImage><GhiChu>Ghi chú {i}</GhiChu>'
+            f'</Table_BangKe>'
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+        '<soap:Body>'
+        f'<QueryBangKeDanhSachContainerResponse xmlns="{TEMPURI_NS}">'
+        f'<QueryBangKeDanhSachContainerResult>{header}'
+        '<BangKe>'
+        '<xs:schema id="NewDataSet" xmlns:xs="http://www.w3.org/2001/XMLSchema">'
+        '<xs:element name="Table_BangKe"><xs:complexType><xs:sequence>'
+        '<xs:element name="Stt" type="xs:int" minOccurs="0"/>'
+        '</xs:sequence></xs:complexType></xs:element></xs:schema>'
+        '<diffgr:diffgram xmlns:msdata="urn:schemas-microsoft-com:xml-msdata" '
+        'xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1">'
+        f'<DocumentElement xmlns="">{"".join(rows)}</DocumentElement>'
+        '</diffgr:diffgram></BangKe>'
+        '</QueryBangKeDanhSachContainerResult>'
+        '</QueryBangKeDanhSachContainerResponse></soap:Body></soap:Envelope>'
+    )
+
+
+_LEGACY_FIELDS = {
+    'MaSoThue': 'ma_so_thue', 'SoToKhai': 'so_to_khai', 'NgayToKhai': 'ngay_to_khai',
+    'TenDonViXNK': 'ten_don_vi_xnk', 'MaDDGS': 'ma_ddgs', 'TenDDGS': 'ten_ddgs',
+    'TenChiCucHaiQuanGS': 'ten_chi_cuc_hai_quan_gs', 'TenCucHaiQuan': 'ten_cuc_hai_quan',
+    'TenChiCucHaiQuan': 'ten_chi_cuc_hai_quan', 'LoaiHinh': 'loai_hinh',
+    'TenLoaiHinh': 'ten_loai_hinh', 'MaTrangThaiToKhai': 'ma_trang_thai_to_khai',
+    'TrangThaiToKhai': 'trang_thai_to_khai', 'LuongToKhai': 'luong_to_khai',
+    'So_Luong_Hang': 'so_luong_hang', 'Tong_Trong_Luong_Hang': 'tong_trong_luong_hang',
+    'DVT_So_Luong_Hang': 'dvt_so_luong_hang', 'DVT_Tong_Trong_Luong_Hang': 'dvt_tong_trong_luong_hang',
+    'IsContainer': 'is_container', 'SoDinhDanh': 'so_dinh_danh', 'MaPTVC': 'ma_ptvc',
+    'NgayTau': 'ngay_tau', 'Ghi_Chu': 'ghi_chu', 'ThoiGianLayDuLieu': 'thoi_gian_lay_du_lieu',
+    'ThongBaoLoi': 'thong_bao_loi',
+}
+
+
+def legacy_parse(response_text: str) -> Optional[ContainerDeclarationInfo]:
+    """The previous DOM-based parser (up to three find() calls per field)."""
+    namespaces = {'ns': TEMPURI_NS}
+    root = ET.fromstring(response_text)
+    result = root.find('.//ns:QueryBangKeDanhSachContainerResult', namespaces)
+    if result is None:
+        return None
+    info = ContainerDeclarationInfo()
+    for xml_name, attr in _LEGACY_FIELDS.items():
+        elem = result.find(f'ns:{xml_name}', namespaces)
+        if elem is None:
+            elem = result.find(xml_name)
+        if elem is None:
+            elem = result.find(f'{{{TEMPURI_NS}}}{xml_name}')
+        if elem is not None and elem.text:
+            value = elem.text
+            if attr in ('so_luong_hang', 'tong_trong_luong_hang'):
+                value = float(value)
+            elif attr == 'is_container':
+                value = int(value)
+            setattr(info, attr, value)
+    bang_ke = result.find(f'{{{TEMPURI_NS}}}BangKe')
+    if bang_ke is not None:
+        for table in bang_ke.iter():
+            if 'Table_BangKe' in table.tag or 'Table' in table.tag:
+                container = ContainerInfo()
+                for name in ('Stt', 'SoContainer', 'SoSeal', 'SoSealHQ', 'BarcodeImage', 'GhiChu', 'Trong_Luong'):
+                    elem = table.find(name)
+                    if elem is None or not elem.text:
+                        continue
+                    if name == 'Stt':
+                        container.stt = int(elem.text)
+                    elif name == 'SoContainer':
+                        container.so_container = elem.text.strip()
+                    elif name == 'SoSeal':
+                        container.so_seal = elem.text.strip()
+                    elif name == 'SoSealHQ':
+                        if elem.text.strip() != "#####":
+                            container.so_seal_hq = elem.text.strip()
+                    elif name == 'BarcodeImage':
+                        container.barcode_image = elem.text
+                    elif name == 'GhiChu':
+                        container.ghi_chu = elem.text
+                    else:
+                        container.trong_luong = float(elem.text)
+                if container.so_container:
+                    info.containers.append(container)
+    return info
+
+
+def time_parser(parse: Callable[[str], object], payload: str, repeat: int) -> float:
+    """Best-of-N wall time for one parse, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(payload)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run(payloads: List[tuple], repeat: int) -> None:
+    print(f"{'payload':<28}{'size KB':>10}{'rows':>8}{'legacy ms':>12}{'single-pass ms':>16}{'speed-up':>10}")
+    for label, payload in payloads:
+        info = parse_bang_ke_response(payload)
+        legacy = legacy_parse(payload)
+        if legacy is not None and info != legacy:
+            print(f"WARNING: parsers disagree on {label}")
+        legacy_ms = time_parser(legacy_parse, payload, repeat)
+        new_ms = time_parser(parse_bang_ke_response, payload, repeat)
+        rows = len(info.containers) if info else 0
+        print(f"{label:<28}{len(payload) / 1024:>10.0f}{rows:>8}{legacy_ms:>12.2f}{new_ms:>16.2f}{legacy_ms / new_ms:>9.1f}x")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the QRCode API SOAP parser")
+    parser.add_argument('--containers', type=int, nargs='+', default=[10, 200, 500, 1000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--file', nargs='*', default=[], help="Captured SOAP response files")
+    args = parser.parse_args(argv)
+
+    payloads = [(f"synthetic {n} containers", build_payload(n)) for n in args.containers]
+    for path in args.file:
+        with open(path, encoding='utf-8') as f:
+            payloads.append((os.path.basename(path), f.read()))
+    run(payloads, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Retrieval Load Driver
+
+Pushes many synthetic declarations through BarcodeRetriever (API mode:
+QueryBangKeDanhSachContainer + local PDF render) or ParallelDownloader
+against the stub SOAP server, and reports throughput and latency
+percentiles. Use it to validate concurrency, rate-limit and hedging
+changes without touching the customs service.
+
+Usage:
+    python -m benchmarks.load_driver --declarations 2000
+    python -m benchmarks.load_driver --declarations 5000 --mode downloader --concurrency 12 \\
+        --latency lognormal:0.4:0.6 --slow-rate 0.02 --slow-latency 20 --hedge
+    python -m benchmarks.load_driver --url http://127.0.0.1:8086/WS_Container/QRCode.asmx
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_soap_server import (  # noqa: E402
+    ReplayStore,
+    StubSoapServer,
+    add_behaviour_arguments,
+    behaviour_from_args,
+)
+from file_utils.file_manager import FileManager  # noqa: E402
+from models.config_models import BarcodeServiceConfig  # noqa: E402
+from models.declaration_models import Declaration  # noqa: E402
+from web_utils.api_capture import load_captures  # noqa: E402
+from web_utils.api_response_cache import get_api_response_cache, set_api_response_cache  # noqa: E402
+from web_utils.barcode_retriever import BarcodeRetriever  # noqa: E402
+from web_utils.concurrency_controller import get_concurrency_controller  # noqa: E402
+from web_utils.hedging import get_hedge_policy  # noqa: E402
+from web_utils.parallel_downloader import ParallelDownloader  # noqa: E402
+from web_utils.rate_limiter import get_rate_limiter  # noqa: E402
+
+
+def make_declarations(count: int, start: int = 0) -> List[Declaration]:
+    """Build synthetic declarations with unique numbers."""
+    base = datetime(2024, 12, 1)
+    return [
+        Declaration(
+            declaration_number=f"30{start + i:010d}",
+            tax_code=f"{2300000000 + (start + i) % 997:010d}",
+            declaration_date=base - timedelta(days=i % 30),
+            customs_office_code="18A3",
+            status="T",
+        )
+        for i in range(count)
+    ]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0 if empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = int(round(p / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+def summarize(latencies: List[float], ok: int, wall_time: float) -> Dict[str, float]:
+    """
+    Summarize one load run.
+
+    Args:
+        latencies: Per-declaration latencies in seconds
+        ok: Number of successful declarations
+        wall_time: Total run time in seconds
+
+    Returns:
+        Dictionary with counts, throughput and latency percentiles
+    """
+    ordered = sorted(latencies)
+    return {
+        'total': len(ordered),
+        'ok': ok,
+        'failed': len(ordered) - ok,
+        'wall_time': wall_time,
+        'throughput': len(ordered) / wall_time if wall_time > 0 else 0.0,
+        'p50': percentile(ordered, 50),
+        'p90': percentile(ordered, 90),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'max': ordered[-1] if ordered else 0.0,
+    }
+
+
+class TimedRetriever:
+    """Wraps a retriever and records per-declaration latency and outcome."""
+
+    def __init__(self, retriever: BarcodeRetriever):
+        self._retriever = retriever
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.ok = 0
+
+    def retrieve_barcode(self, declaration):
+        started = time.monotonic()
+        pdf_content = None
+        try:
+            pdf_content = self._retriever.retrieve_barcode(declaration)
+            return pdf_content
+        finally:
+            with self._lock:
+                self.latencies.append(time.monotonic() - started)
+                if pdf_content:
+                    self.ok += 1
+
+    def __getattr__(self, name):
+        return getattr(self._retriever, name)
+
+
+def run_load(
+    url: str,
+    declarations: List[Declaration],
+    mode: str = "retriever",
+    concurrency: int = 8,
+    output_dir: Optional[str] = None,
+    api_timeout: int = 30
+) -> Dict[str, Any]:
+    """
+    Run declarations through the retrieval stack against url.
+
+    The API response cache is switched off for the run so every
+    declaration makes a request.
+
+    Args:
+        url: SOAP service URL (usually a StubSoapServer)
+        declarations: Declarations to retrieve
+        mode: "retriever" (a thread pool calling BarcodeRetriever) or
+              "downloader" (ParallelDownloader, including file writes)
+        concurrency: Worker threads
+        output_dir: Directory for PDFs in downloader mode (default: temp dir)
+        api_timeout: API request timeout in seconds
+
+    Returns:
+        Summary from summarize()
+    """
+    config = BarcodeServiceConfig(
+        api_url=url,
+        primary_web_url="http://127.0.0.1:9/",
+        backup_web_url="",
+        timeout=api_timeout,
+        max_retries=1,
+        retry_delay=0,
+        api_timeout=api_timeout,
+    )
+    retriever = TimedRetriever(BarcodeRetriever(config, Mock(), retrieval_method="api"))
+
+    saved_cache = get_api_response_cache()
+    set_api_response_cache(None)
+    started = time.monotonic()
+    try:
+        if mode == "downloader":
+            with tempfile.TemporaryDirectory() as tmp:
+                file_manager = FileManager(output_dir or tmp)
+                ParallelDownloader(retriever, file_manager, max_concurrent=concurrency).download_batch(declarations)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(retriever.retrieve_barcode, declarations))
+    finally:
+        set_api_response_cache(saved_cache)
+    return summarize(retriever.latencies, retriever.ok, time.monotonic() - started)
+
+
+def print_report(summary: Dict[str, Any], server_stats: Optional[Dict[str, int]] = None) -> None:
+    print(f"declarations   {summary['total']} ({summary['ok']} ok, {summary['failed']} failed)")
+    print(f"wall time      {summary['wall_time']:.1f}s")
+    print(f"throughput     {summary['throughput']:.1f} declarations/s")
+    print("latency (s)    " + "  ".join(f"{k}={summary[k]:.3f}" for k in ('p50', 'p90', 'p95', 'p99', 'max')))
+    if server_stats:
+        print("stub server    " + "  ".join(f"{k}={v}" for k, v in server_stats.items()))
+    controller = get_concurrency_controller().get_stats()
+    print(f"concurrency    final limit={controller['limit']} (max {controller['max_limit']})")
+    hedge = get_hedge_policy().get_stats()
+    if hedge['enabled']:
+        print(f"hedging        hedged={hedge['hedged']} wins={hedge['hedge_wins']} denied={hedge['budget_denied']}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load test the barcode retrieval stack against a stub SOAP server")
+    parser.add_argument('--declarations', type=int, default=1000)
+    parser.add_argument('--mode', choices=("retriever", "downloader"), default="retriever")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--url', help="Use an already running server instead of starting a stub")
+    parser.add_argument('--api-timeout', type=int, default=30)
+    parser.add_argument('--max-concurrency', type=int, default=12, help="Adaptive controller upper bound")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Client rate limit in requests/second (0 = off)")
+    parser.add_argument('--hedge', action='store_true', help="Enable hedged requests")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args(argv)
+
+    get_concurrency_controller().configure(1, args.max_concurrency)
+    get_rate_limiter().configure(args.rate_limit, burst=max(1, int(args.rate_limit)))
+    get_hedge_policy().configure(args.hedge)
+
+    declarations = make_declarations(args.declarations)
+    if args.url:
+        summary = run_load(args.url, declarations, args.mode, args.concurrency, api_timeout=args.api_timeout)
+        print_report(summary)
+        return
+
+    store = ReplayStore(load_captures(args.captures))
+    with StubSoapServer(store, behaviour_from_args(args)) as server:
+        summary = run_load(server.url, declarations, args.mode, args.concurrency, api_timeout=args.api_timeout)
+        print_report(summary, server.stats)
+
+
+if __name__ == '__main__':
+    main()
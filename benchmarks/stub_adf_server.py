@@ -0,0 +1,249 @@
+"""
+Stub ADF Barcode Page Server
+
+Local HTTP server that plays the Oracle ADF barcode page on
+pus.customs.gov.vn from page templates, for tests and load runs of the
+browserless web form client (web_utils.adf_http_client).
+
+The pages in benchmarks/adf_pages are synthetic: hand-written after the
+markup the Selenium path relies on (component ids, labels, the container
+table), not captured from the live site. Replace them with real captures
+(a directory given with --pages) to check the parser against the current
+page. Session values and identifiers are placeholders:
+- loopback.html   window loopback page (__LOOP__)
+- form.html       the form (__CTRL_STATE__, __VIEW_STATE__)
+- result.xml      partial response with the result (__TAX_CODE__,
+                  __DECLARATION_NUMBER__, __DECLARATION_DATE__, __VIEW_STATE__)
+- not_found.xml   partial response for an unknown declaration
+
+Like the real page, the stub keeps per-session state: a request without
+the session cookie gets the loopback page, and a submit whose view state
+doesn't match the one last issued to the session gets an ADF error.
+
+Usage:
+    python -m benchmarks.stub_adf_server --port 8087
+    python -m benchmarks.stub_adf_server --latency lognormal:0.5:0.4 --save-pdf
+"""
+
+import argparse
+import os
+import secrets
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_soap_server import LatencyModel  # noqa: E402
+from web_utils.api_capture import placeholder_png  # noqa: E402
+
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'adf_pages')
+PAGE_PATH = "/faces/ContainerBarcode"
+SESSION_COOKIE = "JSESSIONID"
+
+SAVED_PDF = b"%PDF-1.4\n% stub saved bang ke\n%%EOF\n"
+
+
+def load_pages(directory: str = PAGES_DIR) -> Dict[str, str]:
+    """Load the page templates (file name without extension -> text)."""
+    pages = {}
+    for name in ('loopback.html', 'form.html', 'result.xml', 'not_found.xml'):
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            pages[name.rsplit('.', 1)[0]] = f.read()
+    return pages
+
+
+@dataclass
+class StubAdfBehaviour:
+    """Latency and result settings for the stub ADF server."""
+    latency: str = "fixed:0"  # Per request
+    save_pdf: bool = False  # Save link returns a PDF (otherwise the form page)
+    not_found: Set[str] = field(default_factory=set)  # Declaration numbers without a result
+
+
+class StubAdfServer:
+    """
+    Threaded stub of the ADF barcode page.
+
+    Usage:
+        with StubAdfServer() as server:
+            client = AdfHttpClient(server.url)
+    """
+
+    def __init__(self, behaviour: Optional[StubAdfBehaviour] = None, pages: Optional[Dict[str, str]] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.behaviour = behaviour or StubAdfBehaviour()
+        self.pages = pages or load_pages()
+        self.latency = LatencyModel(self.behaviour.latency)
+        self._lock = threading.Lock()
+        self._view_states: Dict[str, str] = {}  # Session id -> last issued view state
+        self.stats = {'requests': 0, 'sessions': 0, 'submits': 0, 'saves': 0, 'images': 0, 'expired': 0}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{PAGE_PATH}"
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _issue_view_state(self, session_id: str) -> str:
+        token = "!-" + secrets.token_hex(6)
+        with self._lock:
+            self._view_states[session_id] = token
+        return token
+
+    def _check_view_state(self, session_id: Optional[str], token: str) -> bool:
+        with self._lock:
+            ok = bool(session_id) and self._view_states.get(session_id) == token
+            if not ok:
+                self.stats['expired'] += 1
+            return ok
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _session_id(self) -> Optional[str]:
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                morsel = cookie.get(SESSION_COOKIE)
+                return morsel.value if morsel else None
+
+            def _send(self, status: int, payload, content_type: str = "text/html; charset=utf-8",
+                      headers: Optional[Dict[str, str]] = None):
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _delay(self):
+                with server._lock:
+                    server.stats['requests'] += 1
+                delay = server.latency.sample()
+                if delay > 0:
+                    time.sleep(delay)
+
+            def do_GET(self):
+                self._delay()
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                if parts.path.endswith("/qr"):
+                    server._count('images')
+                    self._send(200, placeholder_png(400), "image/png")
+                    return
+                if parts.path != PAGE_PATH:
+                    self._send(404, "Not found", "text/plain")
+                    return
+
+                session_id = self._session_id()
+                if session_id is None or '_afrLoop' not in query:
+                    # New window: ADF answers with its loopback page first
+                    headers = {}
+                    if session_id is None:
+                        session_id = secrets.token_hex(8)
+                        server._count('sessions')
+                        headers["Set-Cookie"] = f"{SESSION_COOKIE}={session_id}; Path=/; HttpOnly"
+                    loop = secrets.token_hex(4)
+                    self._send(200, server.pages['loopback'].replace('__LOOP__', loop), headers=headers)
+                    return
+
+                page = server.pages['form'].replace('__CTRL_STATE__', secrets.token_hex(4))
+                page = page.replace('__VIEW_STATE__', server._issue_view_state(session_id))
+                self._send(200, page)
+
+            def do_POST(self):
+                self._delay()
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8", "replace")
+                form = {k: v[0] for k, v in parse_qs(body, keep_blank_values=True).items()}
+                session_id = self._session_id()
+                partial = self.headers.get("Adf-Rich-Message") == "true"
+
+                if not server._check_view_state(session_id, form.get('javax.faces.ViewState', '')):
+                    error = ('<?xml version="1.0" encoding="UTF-8"?><partial-response><error>'
+                             '<error-name>ViewExpiredException</error-name>'
+                             '<error-message>Phiên làm việc đã hết hạn</error-message></error></partial-response>')
+                    self._send(200, error if partial else "Session expired", "text/xml; charset=utf-8")
+                    return
+
+                event = form.get('event', '')
+                if partial and event == 'pt1:b1':
+                    server._count('submits')
+                    number = form.get('pt1:it2', '')
+                    template = server.pages['not_found' if number in server.behaviour.not_found else 'result']
+                    response = (template.replace('__TAX_CODE__', form.get('pt1:it1', ''))
+                                .replace('__DECLARATION_NUMBER__', number)
+                                .replace('__DECLARATION_DATE__', form.get('pt1:it4', ''))
+                                .replace('__VIEW_STATE__', server._issue_view_state(session_id)))
+                    self._send(200, response, "text/xml; charset=utf-8")
+                elif not partial and event == 'pt1:cl1':
+                    server._count('saves')
+                    if server.behaviour.save_pdf:
+                        self._send(200, SAVED_PDF, "application/pdf",
+                                   {"Content-Disposition": 'attachment; filename="BangKe.pdf"'})
+                    else:
+                        page = server.pages['form'].replace('__CTRL_STATE__', secrets.token_hex(4))
+                        self._send(200, page.replace('__VIEW_STATE__', server._issue_view_state(session_id)))
+                else:
+                    self._send(500, "Unexpected event", "text/plain")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StubAdfServer':
+        threading.Thread(target=self._server.serve_forever, name="stub-adf", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StubAdfServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Stub ADF barcode page for browserless web form tests")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8087)
+    parser.add_argument('--pages', default=PAGES_DIR, help="Directory with the page templates")
+    parser.add_argument('--latency', default="fixed:0", help="fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--save-pdf', action='store_true', help="Save link returns a PDF")
+    args = parser.parse_args(argv)
+
+    behaviour = StubAdfBehaviour(latency=args.latency, save_pdf=args.save_pdf)
+    server = StubAdfServer(behaviour, load_pages(args.pages), args.host, args.port)
+    print(f"Serving ADF pages from {args.pages} on {server.url} (Ctrl+C to stop)")
+    server.start()
+    try:
+        while True:
+            time.sleep(10)
+            print(server.stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
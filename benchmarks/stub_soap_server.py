@@ -0,0 +1,312 @@
+"""
+Stub QRCode SOAP Server
+
+Local HTTP server that answers QueryBangKeDanhSachContainer like the
+customs service, for load tests that must not touch the real one.
+
+Responses come from captured traffic (see web_utils.api_capture): a
+request whose declaration number was captured gets its recorded
+response; any other request gets a captured response used as a template,
+with the tax code and declaration number rewritten to the requested
+ones. Without captures a synthetic template is used.
+
+Behaviour is configurable:
+- latency distribution: fixed, uniform, lognormal or the captured latencies
+- a slow tail (a fraction of requests stalls for a long time)
+- an HTTP 500 error rate
+- a throttle: requests above a rate get HTTP 429
+
+Usage:
+    python -m benchmarks.stub_soap_server --port 8086
+    python -m benchmarks.stub_soap_server --captures captures/ --latency lognormal:0.4:0.6 \\
+        --slow-rate 0.02 --slow-latency 20 --error-rate 0.01 --throttle 30
+"""
+
+import argparse
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_soap_parser import build_payload  # noqa: E402
+from web_utils.api_capture import SOAP_ACTION_BANG_KE, load_captures  # noqa: E402
+
+
+_TK_ID_RE = re.compile(r'<(?:[\w.-]+:)?TK_ID>([^<]*)<')
+_MST_RE = re.compile(r'<(?:[\w.-]+:)?Ma_Doanh_Nghiep>([^<]*)<')
+
+
+def _rewrite(template: str, tag: str, value: str) -> str:
+    return re.sub(rf'(<(?:[\w.-]+:)?{tag}>)[^<]*(<)', lambda m: m.group(1) + value + m.group(2), template, count=1)
+
+
+class LatencyModel:
+    """
+    Samples per-request latency in seconds.
+
+    Specs:
+        fixed:SECONDS
+        uniform:LOW:HIGH
+        lognormal:MEDIAN:SIGMA
+        captured        (sample the latencies recorded in the captures)
+    """
+
+    def __init__(self, spec: str = "fixed:0", captured: Optional[List[float]] = None,
+                 rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, rest = spec.partition(':')
+        params = [float(p) for p in rest.split(':') if p]
+        self.kind = kind
+        if kind == 'fixed':
+            self.params = params or [0.0]
+        elif kind == 'uniform' and len(params) == 2:
+            self.params = params
+        elif kind == 'lognormal' and len(params) == 2:
+            self.params = params
+        elif kind == 'captured':
+            self.params = list(captured or []) or [0.0]
+        else:
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+
+    def sample(self) -> float:
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return self.rng.uniform(*self.params)
+        if self.kind == 'lognormal':
+            median, sigma = self.params
+            return self.rng.lognormvariate(math.log(max(median, 1e-6)), sigma)
+        return self.rng.choice(self.params)
+
+
+@dataclass
+class StubBehaviour:
+    """Latency, failure and throttling settings for the stub server."""
+    latency: str = "fixed:0"
+    slow_rate: float = 0.0  # Fraction of requests that stall
+    slow_latency: float = 20.0  # Seconds a stalled request takes
+    error_rate: float = 0.0  # Fraction answered with HTTP 500
+    throttle_rate: float = 0.0  # Requests/second before HTTP 429 (0 = off)
+    seed: Optional[int] = None
+
+
+class ReplayStore:
+    """Captured responses indexed by declaration number, plus templates."""
+
+    def __init__(self, records: Optional[List[Dict[str, Any]]] = None):
+        self.by_declaration: Dict[str, str] = {}
+        self.templates: List[str] = []
+        self.latencies: List[float] = []
+        for record in records or []:
+            if record.get('action', SOAP_ACTION_BANG_KE) != SOAP_ACTION_BANG_KE or record.get('status') != 200:
+                continue
+            self.latencies.append(float(record.get('latency', 0.0)))
+            match = _TK_ID_RE.search(record.get('request', ''))
+            if match:
+                self.by_declaration[match.group(1).strip()] = record['response']
+            self.templates.append(record['response'])
+        if not self.templates:
+            self.templates.append(build_payload(2, image_bytes=1500))
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def response_for(self, request_body: str) -> str:
+        """
+        Pick the response for a request.
+
+        Args:
+            request_body: SOAP request envelope
+
+        Returns:
+            Captured response for the declaration, or a template rewritten
+            with the request's tax code and declaration number
+        """
+        tk = _TK_ID_RE.search(request_body)
+        so_to_khai = tk.group(1).strip() if tk else ""
+        if so_to_khai in self.by_declaration:
+            return self.by_declaration[so_to_khai]
+
+        with self._lock:
+            template = self.templates[self._next % len(self.templates)]
+            self._next += 1
+        response = _rewrite(template, 'SoToKhai', so_to_khai)
+        mst = _MST_RE.search(request_body)
+        if mst:
+            response = _rewrite(response, 'MaSoThue', mst.group(1).strip())
+        return response
+
+
+class StubSoapServer:
+    """
+    Threaded stub of the QRCode SOAP service.
+
+    Usage:
+        with StubSoapServer(ReplayStore(), StubBehaviour(latency="fixed:0.05")) as server:
+            client = QRCodeContainerApiClient(service_url=server.url)
+    """
+
+    def __init__(self, store: Optional[ReplayStore] = None, behaviour: Optional[StubBehaviour] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.store = store or ReplayStore()
+        self.behaviour = behaviour or StubBehaviour()
+        self._rng = random.Random(self.behaviour.seed)
+        self.latency = LatencyModel(self.behaviour.latency, self.store.latencies, self._rng)
+        self._lock = threading.Lock()
+        self._tokens = max(1.0, self.behaviour.throttle_rate)
+        self._refilled = time.monotonic()
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'throttled': 0, 'slow': 0, 'max_in_flight': 0}
+        self._in_flight = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/WS_Container/QRCode.asmx"
+
+    def _take_token(self) -> bool:
+        rate = self.behaviour.throttle_rate
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(max(1.0, rate), self._tokens + (now - self._refilled) * rate)
+        self._refilled = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def _decide(self):
+        """Pick (status, delay) for one request."""
+        b = self.behaviour
+        with self._lock:
+            self.stats['requests'] += 1
+            if not self._take_token():
+                self.stats['throttled'] += 1
+                return 429, 0.0
+            roll = self._rng.random()
+            if roll < b.error_rate:
+                self.stats['errors'] += 1
+                return 500, self.latency.sample()
+            if self._rng.random() < b.slow_rate:
+                self.stats['slow'] += 1
+                return 200, b.slow_latency
+            return 200, self.latency.sample()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status: int, payload: bytes, content_type: str = "text/xml; charset=utf-8"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._send(200, b"QRCode stub", "text/plain")
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8", "replace")
+                if SOAP_ACTION_BANG_KE not in self.headers.get("SOAPAction", ""):
+                    self._send(500, b"Unsupported SOAP action")
+                    return
+                status, delay = server._decide()
+                with server._lock:
+                    server._in_flight += 1
+                    server.stats['max_in_flight'] = max(server.stats['max_in_flight'], server._in_flight)
+                try:
+                    if delay > 0:
+                        time.sleep(delay)
+                    if status == 200:
+                        self._send(200, server.store.response_for(body).encode("utf-8"))
+                        with server._lock:
+                            server.stats['ok'] += 1
+                    elif status == 429:
+                        self._send(429, b"Too Many Requests", "text/plain")
+                    else:
+                        self._send(500, b"Server Error", "text/plain")
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StubSoapServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-soap", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'StubSoapServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def add_behaviour_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the stub behaviour options (shared with the load driver)."""
+    parser.add_argument('--captures', nargs='*', default=[], help="Capture files or directories to replay")
+    parser.add_argument('--latency', default="lognormal:0.3:0.5",
+                        help="fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA | captured")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument('--slow-latency', type=float, default=20.0, help="Seconds a stalled request takes")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction answered with HTTP 500")
+    parser.add_argument('--throttle', type=float, default=0.0, help="Requests/second before HTTP 429 (0 = off)")
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def behaviour_from_args(args: argparse.Namespace) -> StubBehaviour:
+    return StubBehaviour(
+        latency=args.latency,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle,
+        seed=args.seed,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Stub QRCode SOAP server for load tests")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8086)
+    add_behaviour_arguments(parser)
+    args = parser.parse_args(argv)
+
+    store = ReplayStore(load_captures(args.captures))
+    server = StubSoapServer(store, behaviour_from_args(args), args.host, args.port)
+    print(f"Serving {len(store.templates)} response template(s) on {server.url} (Ctrl+C to stop)")
+    server.start()
+    try:
+        while True:
+            time.sleep(10)
+            print(server.stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
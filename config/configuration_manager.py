@@ -11,6 +11,7 @@ from pathlib import Path
 from typing import Optional
 from cryptography.fernet import Fernet
 
+from file_utils.output_layout import VALID_LAYOUTS
 from models.config_models import DatabaseConfig, DatabaseProfile, BarcodeServiceConfig, LoggingConfig, UIConfig
 
 
@@ -179,7 +180,42 @@ class ConfigurationManager:
                 session_reuse=self.config.getboolean('BarcodeService', 'session_reuse', fallback=True),
                 output_path=output_path,
                 retrieval_method=self.config.get('BarcodeService', 'retrieval_method', fallback='api'),
-                pdf_naming_format=self.config.get('BarcodeService', 'pdf_naming_format', fallback='tax_code')
+                pdf_naming_format=self.config.get('BarcodeService', 'pdf_naming_format', fallback='tax_code'),
+                output_layout=self.get_output_layout(),
+                api_min_concurrency=self.config.getint('BarcodeService', 'api_min_concurrency', fallback=1),
+                api_max_concurrency=self.config.getint('BarcodeService', 'api_max_concurrency', fallback=12),
+                api_latency_target=self.config.getfloat('BarcodeService', 'api_latency_target', fallback=2.0),
+                api_decrease_cooldown=self.config.getfloat('BarcodeService', 'api_decrease_cooldown', fallback=2.0),
+                api_cache_enabled=self.config.getboolean('BarcodeService', 'api_cache_enabled', fallback=True),
+                api_cache_max_entries=self.config.getint('BarcodeService', 'api_cache_max_entries', fallback=5000),
+                api_cache_pending_ttl_minutes=self.config.getint('BarcodeService', 'api_cache_pending_ttl_minutes', fallback=2),
+                rate_limit_per_second=self.config.getfloat('BarcodeService', 'rate_limit_per_second', fallback=5.0),
+                rate_limit_burst=self.config.getint('BarcodeService', 'rate_limit_burst', fallback=5),
+                method_probe_interval=self.config.getfloat('BarcodeService', 'method_probe_interval', fallback=300.0),
+                method_recovery_timeout=self.config.getfloat('BarcodeService', 'method_recovery_timeout', fallback=120.0),
+                api_hedge_enabled=self.config.getboolean('BarcodeService', 'api_hedge_enabled', fallback=False),
+                api_hedge_percentile=self.config.getfloat('BarcodeService', 'api_hedge_percentile', fallback=95.0),
+                api_hedge_min_delay=self.config.getfloat('BarcodeService', 'api_hedge_min_delay', fallback=1.0),
+                api_hedge_max_ratio=self.config.getfloat('BarcodeService', 'api_hedge_max_ratio', fallback=0.1),
+                api_capture_dir=self.config.get('BarcodeService', 'api_capture_dir', fallback=''),
+                web_driver_max_uses=self.config.getint('BarcodeService', 'web_driver_max_uses', fallback=50),
+                web_driver_max_memory_mb=self.config.getint('BarcodeService', 'web_driver_max_memory_mb', fallback=0),
+                pdf_render_workers=self.config.getint('BarcodeService', 'pdf_render_workers', fallback=0),
+                pdf_qr_image_max_dpi=self.config.getint('BarcodeService', 'pdf_qr_image_max_dpi', fallback=0),
+                pdf_image_compression_level=self.config.getint('BarcodeService', 'pdf_image_compression_level', fallback=6),
+                pdf_page_compression=self.config.getboolean('BarcodeService', 'pdf_page_compression', fallback=True),
+                batch_pdf_output=self.config.getboolean('BarcodeService', 'batch_pdf_output', fallback=False),
+                file_writer_threads=self.config.getint('BarcodeService', 'file_writer_threads', fallback=2),
+                file_writer_queue_size=self.config.getint('BarcodeService', 'file_writer_queue_size', fallback=64),
+                output_index_rescan_seconds=self.config.getint('BarcodeService', 'output_index_rescan_seconds', fallback=0),
+                pipeline_fetch_workers=self.config.getint('BarcodeService', 'pipeline_fetch_workers', fallback=4),
+                pipeline_render_workers=self.config.getint('BarcodeService', 'pipeline_render_workers', fallback=2),
+                pipeline_write_workers=self.config.getint('BarcodeService', 'pipeline_write_workers', fallback=2),
+                pipeline_queue_size=self.config.getint('BarcodeService', 'pipeline_queue_size', fallback=16),
+                pipeline_track_batch_size=self.config.getint('BarcodeService', 'pipeline_track_batch_size', fallback=50),
+                batch_journal_enabled=self.config.getboolean('BarcodeService', 'batch_journal_enabled', fallback=True),
+                batch_journal_keep_days=self.config.getint('BarcodeService', 'batch_journal_keep_days', fallback=7),
+                job_queue_max_running=self.config.getint('BarcodeService', 'job_queue_max_running', fallback=2)
             )
         except (configparser.NoSectionError, configparser.NoOptionError) as e:
             raise ConfigurationError(f"Missing barcode service configuration: {e}")
@@ -256,7 +292,7 @@ class ConfigurationManager:
         Get barcode retrieval method
         
         Returns:
-            Retrieval method ('auto', 'api', or 'web')
+            Retrieval method ('auto', 'api', 'web', or 'http')
         """
         return self.config.get('BarcodeService', 'retrieval_method', fallback='api')
     
@@ -265,9 +301,9 @@ class ConfigurationManager:
         Set barcode retrieval method
         
         Args:
-            method: Retrieval method ('auto', 'api', or 'web')
+            method: Retrieval method ('auto', 'api', 'web', or 'http')
         """
-        if method not in ['auto', 'api', 'web']:
+        if method not in ['auto', 'api', 'web', 'http']:
             raise ValueError(f"Invalid retrieval method: {method}")
         
         if not self.config.has_section('BarcodeService'):
@@ -297,6 +333,33 @@ class ConfigurationManager:
             self.config.add_section('BarcodeService')
         self.config.set('BarcodeService', 'pdf_naming_format', format_type)
     
+    def get_output_layout(self) -> str:
+        """
+        Get output directory layout
+        
+        Returns:
+            Output layout ('flat', 'year_month', 'tax_code' or
+            'tax_code_year_month'; 'flat' if the setting is invalid)
+        """
+        layout = self.config.get('BarcodeService', 'output_layout', fallback='flat').strip()
+        if layout not in VALID_LAYOUTS:
+            return 'flat'
+        return layout
+    
+    def set_output_layout(self, layout: str) -> None:
+        """
+        Set output directory layout
+        
+        Args:
+            layout: Output layout ('flat', 'year_month', 'tax_code' or 'tax_code_year_month')
+        """
+        if layout not in VALID_LAYOUTS:
+            raise ValueError(f"Invalid output layout: {layout}")
+        
+        if not self.config.has_section('BarcodeService'):
+            self.config.add_section('BarcodeService')
+        self.config.set('BarcodeService', 'output_layout', layout)
+    
     def save(self) -> None:
         """
         Save configuration to file
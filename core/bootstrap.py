@@ -0,0 +1,301 @@
+"""
+Application Bootstrap
+
+Builds the non-GUI components (configuration, databases, retriever, file
+manager, scheduler) and the shared performance settings. Used by the GUI
+entry point (main.py) and by the headless service (headless.py), so it
+must not import tkinter or any GUI module.
+"""
+
+import os
+import shutil
+import sys
+from dataclasses import dataclass
+from typing import Callable
+
+from core.version import APP_VERSION
+from config.configuration_manager import ConfigurationManager, ConfigurationError
+from logging_system.logger import Logger
+from models.config_models import BarcodeServiceConfig
+from database.ecus_connector import EcusDataConnector
+from database.tracking_database import TrackingDatabase
+from processors.declaration_processor import DeclarationProcessor
+from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.concurrency_controller import get_concurrency_controller
+from web_utils.rate_limiter import get_rate_limiter
+from web_utils.hedging import get_hedge_policy
+from web_utils.barcode_pdf_generator import BarcodeRenderConfig
+from web_utils.pdf_render_pool import get_pdf_render_pool
+from file_utils.file_writer import get_file_writer
+from services.workflow_pipeline import PipelineSettings, configure_pipeline
+from services.batch_journal import get_batch_journal, init_batch_journal
+from services.job_queue import get_job_queue
+from web_utils.api_capture import init_api_capture
+from web_utils.api_response_cache import init_api_response_cache, STATE_PENDING, STATE_ERROR
+from file_utils.file_manager import FileManager
+from file_utils.pdf_naming_service import PdfNamingService
+from scheduler.scheduler import Scheduler
+from error_handling.error_handler import ErrorHandler
+
+
+TRACKING_DB_PATH = "data/tracking.db"
+BATCH_JOURNAL_PATH = "data/batch_journal.db"
+
+
+@dataclass
+class AppComponents:
+    """Components shared by the GUI and the headless service"""
+    config_manager: ConfigurationManager
+    logger: Logger
+    barcode_config: BarcodeServiceConfig
+    ecus_connector: EcusDataConnector
+    db_connected: bool
+    tracking_db: TrackingDatabase
+    processor: DeclarationProcessor
+    barcode_retriever: BarcodeRetriever
+    file_manager: FileManager
+    error_handler: ErrorHandler
+    scheduler: Scheduler
+
+
+def _silent(message: str) -> None:
+    pass
+
+
+def load_configuration(config_path: str = "config.ini") -> ConfigurationManager:
+    """
+    Load and validate the configuration.
+
+    A missing config.ini is created from config.ini.sample (first run),
+    and options added by an update are merged from the sample once per
+    version.
+
+    Args:
+        config_path: Path to config.ini
+
+    Returns:
+        Validated ConfigurationManager
+
+    Raises:
+        FileNotFoundError: If neither config.ini nor the sample exists
+        ConfigurationError: If the configuration is invalid
+    """
+    if not os.path.exists(config_path):
+        # v1.5.4: Auto-create config.ini from sample for first-time users
+        sample_candidates = [
+            os.path.join(os.path.dirname(config_path), 'config.ini.sample'),
+        ]
+        # PyInstaller frozen mode: check _internal/ and executable directory
+        if getattr(sys, 'frozen', False):
+            exe_dir = os.path.dirname(sys.executable)
+            sample_candidates.insert(0, os.path.join(exe_dir, 'config.ini.sample'))
+            internal_dir = os.path.join(exe_dir, '_internal')
+            sample_candidates.insert(1, os.path.join(internal_dir, 'config.ini.sample'))
+
+        sample_found = None
+        for candidate in sample_candidates:
+            if os.path.exists(candidate):
+                sample_found = candidate
+                break
+
+        if not sample_found:
+            raise FileNotFoundError(f"Configuration file not found: {config_path}")
+        shutil.copy2(sample_found, config_path)
+        print(f"INFO: Created config.ini from {sample_found}")
+
+    config_manager = ConfigurationManager(config_path)
+
+    last_run_version = config_manager.get('Update', 'last_run_version', fallback='')
+    if last_run_version != APP_VERSION:
+        sample_path = os.path.join(os.path.dirname(config_path), 'config.ini.sample')
+        if not os.path.exists(sample_path):
+            app_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.getcwd()
+            sample_path = os.path.join(app_dir, 'config.ini.sample')
+
+        merged = config_manager.merge_missing_from_sample(sample_path)
+        config_manager.set('Update', 'last_run_version', APP_VERSION)
+        if merged:
+            print("INFO: Config merged from sample after update")
+
+    config_manager.validate()
+    return config_manager
+
+
+def configure_performance(barcode_config: BarcodeServiceConfig, logger: Logger) -> None:
+    """
+    Apply the [BarcodeService] tuning to the shared components (request
+    concurrency and rate, hedging, render pool, pipeline, job queue, batch
+    journal, API capture and response cache).
+    """
+    get_concurrency_controller(logger).configure(
+        barcode_config.api_min_concurrency,
+        barcode_config.api_max_concurrency,
+        latency_target=barcode_config.api_latency_target,
+        decrease_cooldown=barcode_config.api_decrease_cooldown
+    )
+    get_rate_limiter(logger).configure(
+        barcode_config.rate_limit_per_second,
+        burst=barcode_config.rate_limit_burst
+    )
+    get_hedge_policy(logger).configure(
+        barcode_config.api_hedge_enabled,
+        percentile=barcode_config.api_hedge_percentile,
+        min_delay=barcode_config.api_hedge_min_delay,
+        max_ratio=barcode_config.api_hedge_max_ratio
+    )
+    get_pdf_render_pool(logger).configure(
+        barcode_config.pdf_render_workers,
+        render_config=BarcodeRenderConfig(
+            qr_image_max_dpi=max(0, barcode_config.pdf_qr_image_max_dpi),
+            image_compression_level=min(9, max(1, barcode_config.pdf_image_compression_level)),
+            page_compression=barcode_config.pdf_page_compression
+        )
+    )
+    configure_pipeline(PipelineSettings(
+        fetch_workers=barcode_config.pipeline_fetch_workers,
+        render_workers=barcode_config.pipeline_render_workers,
+        write_workers=barcode_config.pipeline_write_workers,
+        queue_size=barcode_config.pipeline_queue_size,
+        track_batch_size=barcode_config.pipeline_track_batch_size
+    ), logger=logger)
+    get_job_queue(logger).configure(barcode_config.job_queue_max_running)
+    if barcode_config.batch_journal_enabled:
+        journal = init_batch_journal(BATCH_JOURNAL_PATH, logger=logger)
+        pruned = journal.prune(barcode_config.batch_journal_keep_days)
+        if pruned:
+            logger.info(f"Pruned {pruned} finished batches from the batch journal")
+    if barcode_config.api_capture_dir:
+        init_api_capture(barcode_config.api_capture_dir, logger=logger)
+        logger.info(f"Capturing API traffic to {barcode_config.api_capture_dir}")
+    if barcode_config.api_cache_enabled:
+        pending_ttl = barcode_config.api_cache_pending_ttl_minutes * 60
+        init_api_response_cache(
+            max_entries=barcode_config.api_cache_max_entries,
+            ttls={STATE_PENDING: pending_ttl, STATE_ERROR: pending_ttl},
+            logger=logger
+        )
+
+
+def build_components(config_manager: ConfigurationManager, logger: Logger,
+                     echo: Callable[[str], None] = _silent) -> AppComponents:
+    """
+    Create the databases, retriever, file manager and scheduler.
+
+    A failed ECUS5 connection is not fatal (db_connected is False): the GUI
+    lets the user fix the connection, and the connector retries on use.
+
+    Args:
+        config_manager: Loaded configuration
+        logger: Logger instance
+        echo: Receives console progress lines (main.py prints them)
+
+    Returns:
+        AppComponents
+    """
+    # Database connector
+    echo("Initializing database connector...")
+    db_config = config_manager.get_database_config()
+    ecus_connector = EcusDataConnector(db_config, logger)
+
+    # Try to connect to database (don't exit if failed - allow GUI to start)
+    db_connected = False
+    try:
+        db_connected = ecus_connector.connect()
+    except Exception as e:
+        logger.warning(f"Database connection attempt failed: {e}")
+
+    if db_connected:
+        logger.info("Database connection established")
+        echo("OK Database connector initialized")
+    else:
+        logger.warning("Failed to connect to ECUS5 database - application will start without database connection")
+        echo("WARNING: Failed to connect to ECUS5 database")
+
+    # Tracking database
+    echo("Initializing tracking database...")
+    tracking_db = TrackingDatabase(TRACKING_DB_PATH, logger)
+    logger.info("Tracking database initialized")
+    echo("OK Tracking database initialized")
+
+    # Declaration processor
+    echo("Initializing declaration processor...")
+    processor = DeclarationProcessor()
+    logger.info("Declaration processor initialized")
+    echo("OK Declaration processor initialized")
+
+    # Barcode retriever
+    echo("Initializing barcode retriever...")
+    barcode_config = config_manager.get_barcode_service_config()
+    configure_performance(barcode_config, logger)
+    barcode_retriever = BarcodeRetriever(
+        barcode_config,
+        logger,
+        retrieval_method=barcode_config.retrieval_method
+    )
+    logger.info(f"Barcode retriever initialized with method: {barcode_config.retrieval_method}")
+    echo("OK Barcode retriever initialized")
+
+    # File manager with PDF naming service
+    echo("Initializing file manager...")
+    output_path = config_manager.get_output_path()
+    pdf_naming_format = config_manager.get_pdf_naming_format()
+    pdf_naming_service = PdfNamingService(pdf_naming_format)
+    get_file_writer(logger).configure(
+        barcode_config.file_writer_threads,
+        barcode_config.file_writer_queue_size
+    )
+    file_manager = FileManager(output_path, pdf_naming_service)
+    file_manager.batch_output = barcode_config.batch_pdf_output
+    file_manager.output_layout = barcode_config.output_layout
+    file_manager.index_rescan_interval = barcode_config.output_index_rescan_seconds
+    file_manager.ensure_directory_exists()
+    logger.info(f"File manager initialized with output path: {output_path}, naming format: {pdf_naming_format}")
+    echo("OK File manager initialized")
+
+    # Error handler
+    echo("Initializing error handler...")
+    error_handler = ErrorHandler(
+        max_retries=barcode_config.max_retries,
+        base_delay=barcode_config.retry_delay,
+        logger=logger.get_logger()
+    )
+    logger.info("Error handler initialized")
+    echo("OK Error handler initialized")
+
+    # Scheduler
+    echo("Initializing scheduler...")
+    scheduler = Scheduler(
+        config_manager=config_manager,
+        ecus_connector=ecus_connector,
+        tracking_db=tracking_db,
+        processor=processor,
+        barcode_retriever=barcode_retriever,
+        file_manager=file_manager,
+        logger=logger
+    )
+    logger.info("Scheduler initialized")
+    echo("OK Scheduler initialized")
+
+    return AppComponents(
+        config_manager=config_manager,
+        logger=logger,
+        barcode_config=barcode_config,
+        ecus_connector=ecus_connector,
+        db_connected=db_connected,
+        tracking_db=tracking_db,
+        processor=processor,
+        barcode_retriever=barcode_retriever,
+        file_manager=file_manager,
+        error_handler=error_handler,
+        scheduler=scheduler
+    )
+
+
+def shutdown_components(components: AppComponents) -> None:
+    """Stop the scheduler, finish file writes, close the journal and disconnect."""
+    if components.scheduler.is_running():
+        components.scheduler.stop()
+    get_file_writer().shutdown(wait=True)
+    if get_batch_journal():
+        get_batch_journal().close()
+    components.ecus_connector.disconnect()
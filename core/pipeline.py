@@ -0,0 +1,331 @@
+"""
+Staged Pipeline
+
+Runs items through a chain of stages connected by bounded queues, so the
+stages work on different items at the same time and a batch takes about
+as long as its slowest stage instead of the sum of all stages.
+
+Each stage has its own worker threads and inbound queue. A full queue
+blocks the stage in front of it (backpressure), so a slow stage can't make
+a fast one buffer the whole batch in memory. A stage can also collect
+items into batches (e.g. one database transaction per batch).
+
+A stage handler returns True to pass the item to the next stage, or False
+when the item is finished early (failed, or nothing left to do). An
+exception finishes the item with that error. Finished items are reported
+on the thread that called run(), in completion order. Stage workers run
+in a copy of the caller's context, so context variables such as the rate
+limiter's request priority apply to their requests too.
+
+Per-stage metrics (items, failures, busy and blocked time, deepest queue)
+show which stage is the bottleneck.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from logging_system.logger import Logger
+
+
+# Tells a stage worker to exit
+_STOP = object()
+
+# Reported instead of an error for items dropped by cancellation
+_SKIPPED = object()
+
+
+@dataclass
+class Stage:
+    """
+    One pipeline stage.
+
+    Attributes:
+        name: Stage name (metrics and thread names)
+        handler: Called with an item (batch_size 1) or a list of items;
+            returns True to pass them on, False to finish them here
+        workers: Worker threads
+        queue_size: Inbound queue bound (items waiting for this stage)
+        batch_size: Items handed to the handler at once
+        max_delay: Seconds to wait for a batch to fill up
+    """
+    name: str
+    handler: Callable[[Any], bool]
+    workers: int = 1
+    queue_size: int = 16
+    batch_size: int = 1
+    max_delay: float = 0.05
+
+
+class _StageState:
+    """Queue, threads and metrics of a stage during a run."""
+
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self.workers = max(1, int(stage.workers))
+        self.queue: queue.Queue = queue.Queue(maxsize=max(1, int(stage.queue_size)))
+        self.threads: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.passed = 0
+        self.failed = 0
+        self.batches = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+        self.max_queue_depth = 0
+
+    def put(self, item: Any) -> float:
+        """Queue an item for this stage; returns the seconds spent blocked."""
+        blocked = 0.0
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            started = time.monotonic()
+            self.queue.put(item)
+            blocked = time.monotonic() - started
+        depth = self.queue.qsize()
+        with self.lock:
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return blocked
+
+    def get_stats(self, elapsed: float) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue.maxsize,
+                "batch_size": self.stage.batch_size,
+                "processed": self.processed,
+                "passed": self.passed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "busy_seconds": round(self.busy_time, 3),
+                "blocked_seconds": round(self.blocked_time, 3),
+                "utilization": round(self.busy_time / (self.workers * elapsed), 3) if elapsed > 0 else 0.0,
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+
+class Pipeline:
+    """
+    Concurrent stages connected by bounded queues.
+
+    A Pipeline can be run several times, one run at a time; get_stats()
+    describes the last run.
+    """
+
+    def __init__(self, stages: List[Stage], name: str = "pipeline", logger: Optional[Logger] = None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            stages: Stages in processing order
+            name: Label used in thread names and logs
+            logger: Optional logger
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = list(stages)
+        self.name = name
+        self.logger = logger
+        self._states: List[_StageState] = []
+        self._fed = 0
+        self._feeder_blocked = 0.0
+        self._elapsed = 0.0
+        self._run_lock = threading.Lock()
+
+    def run(self, items: Iterable[Any],
+            on_done: Optional[Callable[[Any, Optional[BaseException]], None]] = None,
+            cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Run items through the stages and wait until all are finished.
+
+        Args:
+            items: Items to process (consumed lazily, as the first queue
+                has room)
+            on_done: Called on this thread with (item, error) for every
+                finished item; error is None unless a handler raised
+            cancel_event: When set, no more items are started and queued
+                items are dropped without being reported
+
+        Returns:
+            Number of items reported to on_done
+        """
+        context = contextvars.copy_context()
+        with self._run_lock:
+            return self._run(items, on_done, cancel_event or threading.Event(), context)
+
+    def _run(self, items: Iterable[Any], on_done, cancel_event: threading.Event,
+             context: contextvars.Context) -> int:
+        self._states = [_StageState(stage) for stage in self.stages]
+        self._fed = 0
+        self._feeder_blocked = 0.0
+        started = time.monotonic()
+
+        results: queue.Queue = queue.Queue()
+        abort = threading.Event()
+        feeding_done = threading.Event()
+        feed_errors: List[BaseException] = []
+
+        def stopped() -> bool:
+            return abort.is_set() or cancel_event.is_set()
+
+        def feed() -> None:
+            try:
+                for item in items:
+                    if stopped():
+                        break
+                    self._feeder_blocked += self._states[0].put(item)
+                    self._fed += 1
+            except BaseException as e:  # noqa: BLE001 - raised by run()
+                feed_errors.append(e)
+            finally:
+                feeding_done.set()
+
+        for index, state in enumerate(self._states):
+            following = self._states[index + 1] if index + 1 < len(self._states) else None
+            for number in range(state.workers):
+                # A context can only be entered by one thread at a time
+                thread = threading.Thread(
+                    target=context.copy().run, args=(self._work, state, following, results, stopped),
+                    name=f"{self.name}-{state.stage.name}-{number}", daemon=True
+                )
+                thread.start()
+                state.threads.append(thread)
+
+        feeder = threading.Thread(target=context.copy().run, args=(feed,), name=f"{self.name}-feeder", daemon=True)
+        feeder.start()
+
+        reported = 0
+        finished = 0
+        drained = False
+        try:
+            while not (feeding_done.is_set() and finished >= self._fed):
+                try:
+                    item, error = results.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                finished += 1
+                if error is _SKIPPED:
+                    continue
+                reported += 1
+                if on_done is not None:
+                    on_done(item, error)
+            drained = True
+        finally:
+            if not drained:
+                abort.set()  # on_done raised: drop the remaining items
+            feeder.join()
+            self._shutdown()
+            self._elapsed = time.monotonic() - started
+            self._log_stats()
+
+        if feed_errors:
+            raise feed_errors[0]
+        return reported
+
+    def _work(self, state: _StageState, following: Optional[_StageState],
+              results: queue.Queue, stopped: Callable[[], bool]) -> None:
+        """Worker loop of one stage."""
+        stage = state.stage
+        while True:
+            item = state.queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop_after = False
+            if stage.batch_size > 1:
+                deadline = time.monotonic() + stage.max_delay
+                while len(batch) < stage.batch_size:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        following_item = state.queue.get(timeout=remaining) if remaining > 0 \
+                            else state.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if following_item is _STOP:
+                        stop_after = True
+                        break
+                    batch.append(following_item)
+
+            if stopped():
+                for skipped in batch:
+                    results.put((skipped, _SKIPPED))
+            else:
+                self._handle(state, following, batch, results)
+            if stop_after:
+                return
+
+    def _handle(self, state: _StageState, following: Optional[_StageState],
+                batch: List[Any], results: queue.Queue) -> None:
+        """Run the handler on a batch and pass the items on or finish them."""
+        stage = state.stage
+        error: Optional[BaseException] = None
+        started = time.monotonic()
+        try:
+            passed = stage.handler(batch if stage.batch_size > 1 else batch[0])
+        except Exception as e:  # noqa: BLE001 - reported to on_done
+            passed, error = False, e
+        busy = time.monotonic() - started
+
+        with state.lock:
+            state.processed += len(batch)
+            state.batches += 1
+            state.busy_time += busy
+            if error is not None:
+                state.failed += len(batch)
+            elif passed and following is not None:
+                state.passed += len(batch)
+
+        if error is not None or not passed or following is None:
+            for item in batch:
+                results.put((item, error))
+            return
+
+        blocked = 0.0
+        for item in batch:
+            blocked += following.put(item)
+        if blocked:
+            with state.lock:
+                state.blocked_time += blocked
+
+    def _shutdown(self) -> None:
+        """Stop the stages front to back, so no stage feeds a stopped one."""
+        for state in self._states:
+            for _ in state.threads:
+                state.queue.put(_STOP)
+            for thread in state.threads:
+                thread.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Metrics of the last run.
+
+        Returns:
+            Dictionary with the item count, elapsed seconds, seconds the
+            feeder waited for the first stage, and per-stage metrics
+        """
+        elapsed = self._elapsed
+        return {
+            "items": self._fed,
+            "elapsed_seconds": round(elapsed, 3),
+            "feeder_blocked_seconds": round(self._feeder_blocked, 3),
+            "stages": {state.stage.name: state.get_stats(elapsed) for state in self._states},
+        }
+
+    def _log_stats(self) -> None:
+        if not self.logger or not self._states:
+            return
+        stats = self.get_stats()
+        parts = [
+            f"{name} {s['processed']} items, {s['busy_seconds']}s busy "
+            f"({int(s['utilization'] * 100)}%), {s['blocked_seconds']}s blocked, "
+            f"queue max {s['max_queue_depth']}"
+            for name, s in stats["stages"].items()
+        ]
+        self.logger.info(
+            f"Pipeline '{self.name}': {stats['items']} items in {stats['elapsed_seconds']}s; " + "; ".join(parts)
+        )
@@ -0,0 +1,191 @@
+"""
+Single-Flight Request Coalescing
+
+Concurrent callers asking for the same key share one in-flight call and
+its result (or exception) instead of each doing the work themselves.
+
+Used in front of QRCodeContainerApiClient.query_bang_ke (and the
+asyncio batch engine, through do_async), BarcodeRetriever.retrieve_barcode
+and FileManager.save_barcode so that overlapping automatic and manual runs
+don't duplicate SOAP calls, PDF rendering or file writes for the same
+declaration.
+
+Threads and coroutines share the same in-flight calls. When a coroutine
+leading a call is cancelled, its followers don't inherit the
+cancellation: they try again, and one of them leads the new call.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class _Call:
+    """One in-flight call shared by a leader and its followers."""
+
+    __slots__ = ('done', 'result', 'error', 'followers', 'cancelled', 'async_waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.cancelled = False
+        self.async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """
+    Thread-safe single-flight group.
+
+    Only calls that overlap in time are coalesced; once a call finishes,
+    the next caller for the same key starts a new one.
+    """
+
+    def __init__(self, name: str = ""):
+        """
+        Initialize the group.
+
+        Args:
+            name: Optional label used in stats
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._executions = 0
+        self._shared = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) once per key across concurrent callers.
+
+        Args:
+            key: Hashable identity of the work
+            fn: Function to execute if no call for key is in flight
+
+        Returns:
+            The result of the shared call
+
+        Raises:
+            Whatever the shared call raised
+        """
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            call.done.wait()
+            if not call.cancelled:
+                return self._outcome(call)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        do() for coroutines: await fn(*args, **kwargs) once per key, sharing
+        calls with threads using do() and with other event loops.
+
+        Args:
+            key: Hashable identity of the work
+            fn: Coroutine function to await if no call for key is in flight
+
+        Returns:
+            The result of the shared call
+
+        Raises:
+            Whatever the shared call raised
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                break
+            waiter = (loop, loop.create_future())
+            with self._lock:
+                ready = call.done.is_set()
+                if not ready:
+                    call.async_waiters.append(waiter)
+            if not ready:
+                try:
+                    await waiter[1]
+                finally:
+                    with self._lock:
+                        if waiter in call.async_waiters:
+                            call.async_waiters.remove(waiter)
+            if not call.cancelled:
+                return self._outcome(call)
+
+        try:
+            call.result = await fn(*args, **kwargs)
+            return call.result
+        except asyncio.CancelledError:
+            call.cancelled = True  # Followers try again instead
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    def _join(self, key: Hashable) -> Tuple[_Call, bool]:
+        """The in-flight call for key and whether this caller leads it."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self._shared += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self._executions += 1
+            return call, True
+
+    @staticmethod
+    def _outcome(call: _Call) -> Any:
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        """Publish the call's outcome to threads and coroutines."""
+        with self._lock:
+            self._calls.pop(key, None)
+            call.done.set()
+            waiters, call.async_waiters = call.async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # Event loop already closed
+
+    def in_flight(self) -> int:
+        """Number of keys currently being executed."""
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get coalescing metrics.
+
+        Returns:
+            Dictionary with executions (calls actually run), shared
+            (callers served by another caller's call) and in-flight keys
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'executions': self._executions,
+                'shared': self._shared,
+                'in_flight': len(self._calls),
+            }
@@ -32,18 +32,6 @@ hiddenimports = [
     'logging.handlers',
     'datetime',
     'xml.etree.ElementTree',
-    # Barcode generation libraries - CRITICAL for PDF barcode rendering
-    'barcode',
-    'barcode.codex',      # Contains Code128, Code39 classes - Code39 used for ECUS style
-    'barcode.base',
-    'barcode.writer',
-    'barcode.codabar',
-    'barcode.ean',
-    'barcode.isxn',
-    'barcode.itf',
-    'barcode.upc',
-    'barcode.errors',     # Barcode error classes
-    'barcode.charsets',   # Character sets for barcodes
     # ReportLab PDF generation
     'reportlab',
     'reportlab.lib',
@@ -62,6 +50,10 @@ hiddenimports = [
     'reportlab.pdfbase.pdfmetrics',
     'reportlab.graphics',
     'reportlab.graphics.shapes',
+    # Vector Code39 barcodes - CRITICAL for PDF barcode rendering (ECUS style)
+    'reportlab.graphics.barcode',
+    'reportlab.graphics.barcode.common',
+    'reportlab.graphics.barcode.code39',
     # PIL/Pillow for barcode image generation
     'PIL',
     'PIL.Image',
@@ -71,6 +63,9 @@ hiddenimports = [
     'PIL.ImageFilter',
     # IO modules for barcode buffer
     'io',
+    # Combined batch PDF output
+    'pypdf',
+    'pypdf.generic',
 ]
 
 # Add all submodules from the application
@@ -7,7 +7,7 @@ to prevent duplicate processing and support re-download functionality.
 
 import sqlite3
 import os
-from typing import Set, List, Optional, Any
+from typing import Set, List, Optional, Any, Iterable, Tuple
 from datetime import datetime, timedelta
 from models.declaration_models import Declaration, ProcessedDeclaration, TrackingDeclaration, ClearanceStatus
 from logging_system.logger import Logger
@@ -67,6 +67,7 @@ class TrackingDatabase:
                     file_path TEXT NOT NULL,
                     processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    content_hash TEXT,
                     UNIQUE(declaration_number, tax_code, declaration_date)
                 )
             """)
@@ -99,6 +100,7 @@ class TrackingDatabase:
             """)
             
             conn.commit()
+            self._ensure_content_hash_column(conn)
             
             # Create tracking_declarations table
             cursor.execute('''
@@ -176,6 +178,17 @@ class TrackingDatabase:
 
         return ""
 
+    def _ensure_content_hash_column(self, conn: sqlite3.Connection) -> None:
+        """Add processed_declarations.content_hash to databases created before it existed."""
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info('processed_declarations')")
+        columns = [row[1] for row in cursor.fetchall()]
+        if "content_hash" not in columns:
+            cursor.execute("ALTER TABLE processed_declarations ADD COLUMN content_hash TEXT")
+            conn.commit()
+            if self.logger:
+                self.logger.info("Added content_hash column to processed_declarations")
+
     def _ensure_tracking_unique_constraint(self, conn: Optional[sqlite3.Connection] = None) -> None:
         """
         Ensure tracking_declarations uses UNIQUE(tax_code, declaration_number).
@@ -466,13 +479,14 @@ class TrackingDatabase:
         finally:
             conn.close()
 
-    def add_processed(self, declaration: Declaration, file_path: str) -> None:
+    def add_processed(self, declaration: Declaration, file_path: str, content_hash: Optional[str] = None) -> None:
         """
         Add a processed declaration to the tracking database
         
         Args:
             declaration: Declaration that was processed
             file_path: Path to the saved PDF file
+            content_hash: Hash of the payload the PDF was made from, if known
         """
         conn = self._get_connection()
         try:
@@ -483,13 +497,14 @@ class TrackingDatabase:
             
             cursor.execute("""
                 INSERT OR REPLACE INTO processed_declarations 
-                (declaration_number, tax_code, declaration_date, file_path, processed_at, updated_at)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                (declaration_number, tax_code, declaration_date, file_path, processed_at, updated_at, content_hash)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, ?)
             """, (
                 declaration.declaration_number,
                 declaration.tax_code,
                 date_str,
-                file_path
+                file_path,
+                content_hash
             ))
             
             conn.commit()
@@ -504,6 +519,57 @@ class TrackingDatabase:
         finally:
             conn.close()
     
+    def record_processed_many(self, records: Iterable[Tuple[Declaration, str, Optional[str]]]) -> int:
+        """
+        Record saved declarations as processed, in one transaction
+        
+        New declarations are added; declarations already tracked (forced
+        re-downloads) get the new file path, content hash and updated
+        timestamp but keep their processed timestamp.
+        
+        Args:
+            records: (declaration, file_path, content_hash) tuples
+            
+        Returns:
+            Number of declarations recorded
+        """
+        rows = [
+            (
+                declaration.declaration_number,
+                declaration.tax_code,
+                declaration.declaration_date.strftime('%Y-%m-%d'),
+                file_path,
+                content_hash
+            )
+            for declaration, file_path, content_hash in records
+        ]
+        if not rows:
+            return 0
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO processed_declarations
+                (declaration_number, tax_code, declaration_date, file_path, processed_at, updated_at, content_hash)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, ?)
+                ON CONFLICT(declaration_number, tax_code, declaration_date) DO UPDATE SET
+                    file_path = excluded.file_path,
+                    updated_at = CURRENT_TIMESTAMP,
+                    content_hash = excluded.content_hash
+            """, rows)
+            conn.commit()
+            
+            if self.logger:
+                self.logger.info(f"Recorded {len(rows)} processed declarations")
+            return len(rows)
+            
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Failed to record {len(rows)} processed declarations: {e}", exc_info=True)
+            raise
+        finally:
+            conn.close()
+    
     def is_processed(self, declaration: Declaration) -> bool:
         """
         Check if a declaration has already been processed
@@ -540,6 +606,42 @@ class TrackingDatabase:
         finally:
             conn.close()
     
+    def get_content_hash(self, declaration: Declaration) -> Optional[str]:
+        """
+        Get the payload hash recorded for a declaration's saved PDF
+        
+        Args:
+            declaration: Declaration to look up
+            
+        Returns:
+            Content hash, or None if not processed or not recorded
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            
+            # Format date as string
+            date_str = declaration.declaration_date.strftime('%Y-%m-%d')
+            
+            cursor.execute("""
+                SELECT content_hash FROM processed_declarations
+                WHERE declaration_number = ? AND tax_code = ? AND declaration_date = ?
+            """, (
+                declaration.declaration_number,
+                declaration.tax_code,
+                date_str
+            ))
+            
+            row = cursor.fetchone()
+            return row[0] if row else None
+            
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Failed to get content hash for declaration {declaration.id}: {e}", exc_info=True)
+            raise
+        finally:
+            conn.close()
+    
     def get_all_processed(self) -> Set[str]:
         """
         Get set of all processed declaration IDs
@@ -679,12 +781,14 @@ class TrackingDatabase:
         finally:
             conn.close()
     
-    def update_processed_timestamp(self, declaration: Declaration) -> None:
+    def update_processed_timestamp(self, declaration: Declaration, content_hash: Optional[str] = None) -> None:
         """
         Update the processed timestamp for a declaration (used for re-downloads)
         
         Args:
             declaration: Declaration to update
+            content_hash: Hash of the payload the new PDF was made from
+                (None forgets the old one, the file was rewritten)
         """
         conn = self._get_connection()
         try:
@@ -695,9 +799,10 @@ class TrackingDatabase:
             
             cursor.execute("""
                 UPDATE processed_declarations
-                SET updated_at = CURRENT_TIMESTAMP
+                SET updated_at = CURRENT_TIMESTAMP, content_hash = ?
                 WHERE declaration_number = ? AND tax_code = ? AND declaration_date = ?
             """, (
+                content_hash,
                 declaration.declaration_number,
                 declaration.tax_code,
                 date_str
@@ -715,6 +820,44 @@ class TrackingDatabase:
         finally:
             conn.close()
     
+    def update_file_paths(self, moves: Iterable[Tuple[int, str]]) -> int:
+        """
+        Point processed declarations at moved files, in one transaction
+        
+        Rows are updated by primary key (file_path is not indexed, so
+        matching on it would scan the table once per file).
+        
+        Args:
+            moves: (row id, new_path) pairs
+            
+        Returns:
+            Number of rows updated
+        """
+        moves = [(new_path, row_id) for row_id, new_path in moves]
+        if not moves:
+            return 0
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE processed_declarations
+                SET file_path = ?
+                WHERE id = ?
+            """, moves)
+            updated = cursor.rowcount
+            conn.commit()
+            
+            if self.logger:
+                self.logger.info(f"Updated file paths of {updated} processed declarations")
+            return updated
+            
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Failed to update file paths: {e}", exc_info=True)
+            raise
+        finally:
+            conn.close()
+    
     def add_or_update_company(self, tax_code: str, company_name: str) -> None:
         """
         Add or update company information
@@ -747,6 +890,40 @@ class TrackingDatabase:
         finally:
             conn.close()
     
+    def add_or_update_companies(self, companies: Iterable[Tuple[str, str]]) -> None:
+        """
+        Add or update several companies, in one transaction
+        
+        Args:
+            companies: (tax_code, company_name) pairs
+        """
+        companies = list(companies)
+        if not companies:
+            return
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            
+            cursor.executemany("""
+                INSERT INTO companies (tax_code, company_name, last_seen, created_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON CONFLICT(tax_code) DO UPDATE SET
+                    company_name = excluded.company_name,
+                    last_seen = CURRENT_TIMESTAMP
+            """, companies)
+            
+            conn.commit()
+            
+            if self.logger:
+                self.logger.debug(f"Added/updated {len(companies)} companies")
+                
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Failed to add/update {len(companies)} companies: {e}", exc_info=True)
+            raise
+        finally:
+            conn.close()
+    
     def get_all_companies(self) -> List[tuple]:
         """
         Get all companies from database
@@ -907,6 +1084,19 @@ class TrackingDatabase:
         finally:
             conn.close()
     
+    @staticmethod
+    def _iter_files(directory: str):
+        """Yield (directory, filename) for every file below directory."""
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        pending.append(entry.path)
+                    elif entry.is_file():
+                        yield current, entry.name
+    
     def rebuild_from_directory(self, directory: str) -> None:
         """
         Rebuild tracking database from PDF files in directory (recovery function)
@@ -926,9 +1116,9 @@ class TrackingDatabase:
             # Clear existing records
             cursor.execute("DELETE FROM processed_declarations")
             
-            # Scan directory for PDF files
+            # Scan directory (and the subdirectories of sharded output layouts) for PDF files
             rebuilt_count = 0
-            for filename in os.listdir(directory):
+            for file_dir, filename in self._iter_files(directory):
                 if filename.endswith('.pdf'):
                     try:
                         # Parse filename: TaxCode_DeclarationNumber.pdf
@@ -937,7 +1127,7 @@ class TrackingDatabase:
                         
                         if len(parts) == 2:
                             tax_code, declaration_number = parts
-                            file_path = os.path.join(directory, filename)
+                            file_path = os.path.join(file_dir, filename)
                             
                             # Get file modification time as processed_at
                             file_mtime = os.path.getmtime(file_path)
@@ -3,11 +3,18 @@ File utilities module
 
 This module handles PDF file operations including filename generation,
 directory management, and file saving with overwrite support.
-Also provides error log export functionality.
+Also provides error log export, combined batch PDF output, atomic
+writes on a bounded I/O thread pool, in-memory output directory indexes
+and sharded output layouts (with a migration tool, output_migrator).
 """
 
 from file_utils.file_manager import FileManager
 from file_utils.pdf_naming_service import PdfNamingService, PdfNamingFormat
 from file_utils.error_log_exporter import ErrorLogExporter, ErrorEntry
+from file_utils.batch_pdf_writer import BatchPdfWriter
+from file_utils.file_writer import FileWriter, get_file_writer
+from file_utils.output_index import OutputIndex
+from file_utils.output_layout import OutputLayout
 
-__all__ = ['FileManager', 'PdfNamingService', 'PdfNamingFormat', 'ErrorLogExporter', 'ErrorEntry']
+__all__ = ['FileManager', 'PdfNamingService', 'PdfNamingFormat', 'ErrorLogExporter', 'ErrorEntry', 'BatchPdfWriter',
+           'FileWriter', 'get_file_writer', 'OutputIndex', 'OutputLayout']
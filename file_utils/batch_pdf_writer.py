@@ -0,0 +1,485 @@
+"""
+Batch PDF Writer
+
+Combines the barcode PDFs of a download batch into one printable PDF, so a
+500-declaration shipment is one file to open and print instead of 500.
+
+Pages are streamed to disk as each declaration is added: the declaration
+PDF is parsed with pypdf, the objects its pages use are renumbered and
+written straight to the batch file, and only the page object numbers are
+kept in memory. On close the writer appends a table of contents (rendered
+with ReportLab), one bookmark per declaration, the page tree and the cross
+reference table, then renames the file into place. A companion CSV index
+lists each declaration with its page range in the batch.
+
+Declarations can be added from several download threads; pages are written
+in arrival order but the page tree follows the position given to add(), so
+the combined PDF keeps the order of the batch.
+
+pypdf is optional; without it FileManager.open_batch() returns None and
+downloads only produce the per-declaration files.
+"""
+
+import csv
+import io
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from models.declaration_models import Declaration
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import (
+        ArrayObject,
+        DictionaryObject,
+        IndirectObject,
+        NameObject,
+        NullObject,
+        NumberObject,
+        PdfObject,
+        TextStringObject,
+    )
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+
+logger = logging.getLogger(__name__)
+
+# Object numbers reserved for the document structure, written on close
+_CATALOG = 1
+_PAGES = 2
+_OUTLINES = 3
+
+# Page attributes a page may inherit from its parent in the source PDF
+_INHERITABLE = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+INDEX_COLUMNS = ["STT", "Số tờ khai", "Mã số thuế", "Ngày tờ khai", "Trang đầu", "Số trang", "Tệp nguồn"]
+
+
+@dataclass
+class BatchEntry:
+    """
+    A declaration added to the batch.
+
+    Attributes:
+        position: Order of the declaration in the batch
+        declaration_number: Declaration number (bookmark title)
+        tax_code: Company tax code
+        declaration_date: Declaration date as dd/mm/yyyy
+        source_path: Per-declaration PDF file, if one was saved
+        pages: Object numbers of the declaration's pages in the batch file
+        first_page: 1-based page number in the combined PDF (set on close)
+    """
+    position: int
+    declaration_number: str
+    tax_code: str
+    declaration_date: str
+    source_path: str
+    pages: List[int]
+    first_page: int = 0
+
+
+class BatchPdfWriter:
+    """
+    Streams declaration PDFs into one combined PDF with bookmarks and a
+    table of contents.
+
+    Usage:
+        with BatchPdfWriter(path) as batch:
+            batch.add(declaration, pdf_content, source_path=file_path)
+        # path and the companion index file are written on exit
+    """
+
+    def __init__(self, path: str, title: Optional[str] = None):
+        """
+        Open the batch file (written to a temporary file until close).
+
+        Args:
+            path: Path of the combined PDF
+            title: Document title, also shown above the table of contents
+
+        Raises:
+            ImportError: If pypdf is not installed
+            OSError: If the file can't be created (FileExistsError if
+                another writer is already writing path)
+        """
+        if not PYPDF_AVAILABLE:
+            raise ImportError("pypdf is required for batch PDF output")
+
+        self.path = path
+        self.title = title or os.path.splitext(os.path.basename(path))[0]
+        self.index_path = os.path.splitext(path)[0] + ".csv"
+        self._temp_path = f"{path}.{os.getpid()}.part"
+        self._lock = threading.Lock()
+        self._entries: List[BatchEntry] = []
+        self._offsets: Dict[int, int] = {}
+        self._next_number = _OUTLINES + 1
+        self._added = 0
+        self._failed = 0
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file: BinaryIO = open(self._temp_path, "xb")
+        # Binary comment marks the file as binary for transfer tools
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self) -> "BatchPdfWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def declaration_count(self) -> int:
+        """Number of declarations added so far."""
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def page_count(self) -> int:
+        """Number of declaration pages written so far (without the contents)."""
+        with self._lock:
+            return sum(len(entry.pages) for entry in self._entries)
+
+    def add(
+        self,
+        declaration: Declaration,
+        pdf_content: bytes,
+        source_path: Optional[str] = None,
+        position: Optional[int] = None
+    ) -> bool:
+        """
+        Append the pages of a declaration PDF to the batch.
+
+        A PDF that can't be read is logged and left out of the batch; the
+        download itself is not affected.
+
+        Args:
+            declaration: Declaration the PDF belongs to
+            pdf_content: PDF file content as bytes
+            source_path: Per-declaration file the PDF was saved to
+            position: Order in the batch (defaults to the order of the calls)
+
+        Returns:
+            True if the pages were added
+        """
+        try:
+            # Parse outside the lock; only the writing is serialised
+            reader = PdfReader(io.BytesIO(pdf_content))
+            pages = list(reader.pages)
+            if not pages:
+                raise ValueError("PDF has no pages")
+            with self._lock:
+                if self._closed:
+                    raise ValueError("batch is already closed")
+                numbers = self._write_pages(pages)
+                if position is None:
+                    position = self._added
+                self._added += 1
+                self._entries.append(BatchEntry(
+                    position=position,
+                    declaration_number=declaration.declaration_number,
+                    tax_code=declaration.tax_code,
+                    declaration_date=_format_date(declaration.declaration_date),
+                    source_path=os.path.basename(source_path) if source_path else "",
+                    pages=numbers,
+                ))
+            return True
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            logger.warning(f"Could not add {declaration.id} to batch PDF {self.path}: {e}")
+            return False
+
+    def close(self) -> Optional[str]:
+        """
+        Write the contents, bookmarks and page tree and move the file into place.
+
+        Returns:
+            Path of the combined PDF, or None if no declaration was added
+        """
+        with self._lock:
+            if self._closed:
+                return self.path if os.path.exists(self.path) else None
+            self._closed = True
+            if not self._entries:
+                self._discard()
+                return None
+
+            try:
+                entries = sorted(self._entries, key=lambda entry: entry.position)
+                contents = self._write_contents(entries)
+                self._write_structure(entries, contents)
+                self._file.close()
+                os.replace(self._temp_path, self.path)
+            except BaseException:
+                self._discard()
+                raise
+
+        self._write_index(entries)
+        logger.info(
+            f"Batch PDF written: {self.path} ({len(entries)} declarations, "
+            f"{len(contents) + sum(len(e.pages) for e in entries)} pages, {self._failed} skipped)"
+        )
+        return self.path
+
+    def abort(self) -> None:
+        """Discard the batch file."""
+        with self._lock:
+            self._closed = True
+            self._discard()
+
+    def _discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Object writing
+    # ------------------------------------------------------------------
+
+    def _reserve(self) -> int:
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _write_object(self, number: int, obj: "PdfObject") -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % number)
+        obj.write_to_stream(self._file)
+        self._file.write(b"\nendobj\n")
+
+    def _write_pages(self, pages: list) -> List[int]:
+        """
+        Copy pages and everything they reference into the batch file.
+
+        Returns:
+            Object numbers of the pages, in order
+        """
+        numbers: Dict[Tuple[int, int], int] = {}
+        queue: List[Tuple[int, "PdfObject"]] = []
+        page_numbers: List[int] = []
+
+        # Number every page first, so links between pages stay internal
+        for page in pages:
+            for key in _INHERITABLE:
+                if key not in page:
+                    inherited = _inherited(page, key)
+                    if inherited is not None:
+                        page[NameObject(key)] = inherited
+            if "/Parent" in page:
+                del page["/Parent"]
+            number = self._reserve()
+            reference = page.indirect_reference
+            if reference is not None:
+                numbers[(reference.idnum, reference.generation)] = number
+            page_numbers.append(number)
+            queue.append((number, page))
+
+        pages_written = set(page_numbers)
+        while queue:
+            number, obj = queue.pop()
+            obj = _renumber(obj.get_object() if obj is not None else None, numbers, queue, self._reserve)
+            if number in pages_written:
+                obj[NameObject("/Parent")] = IndirectObject(_PAGES, 0, None)
+            self._write_object(number, obj if obj is not None else NullObject())
+
+        return page_numbers
+
+    def _write_contents(self, entries: List[BatchEntry]) -> List[int]:
+        """
+        Render the table of contents and write its pages.
+
+        The page numbers it lists depend on its own length, so it is
+        rendered again in the rare case that the estimate was wrong.
+
+        Returns:
+            Object numbers of the contents pages
+        """
+        contents_pages = 1
+        while True:
+            page = contents_pages + 1
+            for entry in entries:
+                entry.first_page = page
+                page += len(entry.pages)
+            pdf_content = render_contents(self.title, entries)
+            pages = list(PdfReader(io.BytesIO(pdf_content)).pages)
+            if len(pages) == contents_pages:
+                return self._write_pages(pages)
+            contents_pages = len(pages)
+
+    def _write_structure(self, entries: List[BatchEntry], contents: List[int]) -> None:
+        """Write the outlines, page tree, catalog, cross reference table and trailer."""
+        kids = contents + [number for entry in entries for number in entry.pages]
+        self._write_object(_PAGES, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(n, 0, None) for n in kids),
+            NameObject("/Count"): NumberObject(len(kids)),
+        }))
+
+        items = [self._reserve() for _ in entries]
+        for i, (entry, number) in enumerate(zip(entries, items)):
+            item = DictionaryObject({
+                NameObject("/Title"): TextStringObject(f"{entry.declaration_number} - {entry.tax_code}"),
+                NameObject("/Parent"): IndirectObject(_OUTLINES, 0, None),
+                NameObject("/Dest"): ArrayObject([
+                    IndirectObject(entry.pages[0], 0, None), NameObject("/Fit")
+                ]),
+            })
+            if i > 0:
+                item[NameObject("/Prev")] = IndirectObject(items[i - 1], 0, None)
+            if i < len(items) - 1:
+                item[NameObject("/Next")] = IndirectObject(items[i + 1], 0, None)
+            self._write_object(number, item)
+        self._write_object(_OUTLINES, DictionaryObject({
+            NameObject("/Type"): NameObject("/Outlines"),
+            NameObject("/First"): IndirectObject(items[0], 0, None),
+            NameObject("/Last"): IndirectObject(items[-1], 0, None),
+            NameObject("/Count"): NumberObject(len(items)),
+        }))
+
+        self._write_object(_CATALOG, DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(_PAGES, 0, None),
+            NameObject("/Outlines"): IndirectObject(_OUTLINES, 0, None),
+            NameObject("/PageMode"): NameObject("/UseOutlines"),
+        }))
+        info = self._reserve()
+        self._write_object(info, DictionaryObject({
+            NameObject("/Title"): TextStringObject(self.title),
+            NameObject("/Producer"): TextStringObject("Customs Barcode Automation"),
+        }))
+
+        size = self._next_number
+        for number in range(1, size):
+            if number not in self._offsets:
+                # Reserved by a declaration that failed half-way through
+                self._write_object(number, NullObject())
+        xref_offset = self._file.tell()
+        lines = [b"xref\n0 %d\n0000000000 65535 f \n" % size]
+        for number in range(1, size):
+            lines.append(b"%010d 00000 n \n" % self._offsets[number])
+        self._file.write(b"".join(lines))
+        self._file.write(b"trailer\n")
+        DictionaryObject({
+            NameObject("/Size"): NumberObject(size),
+            NameObject("/Root"): IndirectObject(_CATALOG, 0, None),
+            NameObject("/Info"): IndirectObject(info, 0, None),
+        }).write_to_stream(self._file)
+        self._file.write(b"\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
+
+    def _write_index(self, entries: List[BatchEntry]) -> None:
+        """Write the companion index (UTF-8 with BOM so Excel shows Vietnamese)."""
+        try:
+            with open(self.index_path, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.writer(f)
+                writer.writerow(INDEX_COLUMNS)
+                for i, entry in enumerate(entries, 1):
+                    writer.writerow([
+                        i, entry.declaration_number, entry.tax_code, entry.declaration_date,
+                        entry.first_page, len(entry.pages), entry.source_path,
+                    ])
+        except OSError as e:
+            logger.error(f"Failed to write batch index {self.index_path}: {e}")
+
+
+def _format_date(value) -> str:
+    if hasattr(value, "strftime"):
+        return value.strftime("%d/%m/%Y")
+    return str(value or "")
+
+
+def _inherited(page, key: str):
+    """Look up an inheritable page attribute in the page's ancestors."""
+    parent = page.get("/Parent")
+    while parent is not None:
+        parent = parent.get_object()
+        if key in parent:
+            return parent[key]
+        parent = parent.get("/Parent")
+    return None
+
+
+def _renumber(obj, numbers: Dict[Tuple[int, int], int], queue: list, reserve) -> "PdfObject":
+    """
+    Point the references in obj at batch object numbers, queueing the
+    objects that haven't been copied yet.
+    """
+    if isinstance(obj, IndirectObject):
+        key = (obj.idnum, obj.generation)
+        number = numbers.get(key)
+        if number is None:
+            number = numbers[key] = reserve()
+            queue.append((number, obj))
+        return IndirectObject(number, 0, None)
+    if isinstance(obj, DictionaryObject):  # Also stream objects
+        for key, value in list(dict.items(obj)):
+            obj[key] = _renumber(value, numbers, queue, reserve)
+    elif isinstance(obj, ArrayObject):
+        for i, value in enumerate(obj):
+            obj[i] = _renumber(value, numbers, queue, reserve)
+    return obj
+
+
+def render_contents(title: str, entries: List[BatchEntry]) -> bytes:
+    """
+    Render the table of contents of a batch.
+
+    Args:
+        title: Batch title
+        entries: Declarations in batch order, with first_page set
+
+    Returns:
+        PDF content as bytes
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    from web_utils.barcode_pdf_generator import get_render_fonts
+
+    font_name, font_bold, _ = get_render_fonts()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, title=title,
+        leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm
+    )
+    heading = ParagraphStyle("ContentsTitle", fontName=font_bold, fontSize=14, leading=18, alignment=1)
+    subtitle = ParagraphStyle("ContentsSubtitle", fontName=font_name, fontSize=9, leading=12, alignment=1)
+
+    rows = [["STT", "Số tờ khai", "Mã số thuế", "Ngày tờ khai", "Trang"]]
+    for i, entry in enumerate(entries, 1):
+        rows.append([str(i), entry.declaration_number, entry.tax_code, entry.declaration_date, str(entry.first_page)])
+    table = Table(rows, colWidths=[15 * mm, 45 * mm, 40 * mm, 35 * mm, 20 * mm], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), font_bold),
+        ('FONTNAME', (0, 1), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ]))
+
+    generated = datetime.now().strftime("%d/%m/%Y %H:%M")
+    doc.build([
+        Paragraph("MỤC LỤC", heading),
+        Paragraph(f"{title} - {len(entries)} tờ khai - {generated}", subtitle),
+        Spacer(1, 6 * mm),
+        table,
+    ])
+    return buffer.getvalue()
@@ -2,18 +2,33 @@
 File Manager for PDF barcode operations
 
 This module handles all file operations including filename generation,
-directory management, and PDF saving with overwrite support.
+directory management, and PDF saving with overwrite support. Files are
+written atomically by the shared FileWriter (see file_writer.py), and
+existence checks are answered by in-memory indexes of the output
+directories (see output_index.py). Files are sorted into subdirectories
+by the configured output layout (see output_layout.py).
 """
 
 import os
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
 from models.declaration_models import Declaration
 from file_utils.pdf_naming_service import PdfNamingService
+from file_utils.batch_pdf_writer import BatchPdfWriter, PYPDF_AVAILABLE
+from file_utils.file_writer import FileWriter, get_file_writer
+from file_utils.output_index import OutputIndex
+from file_utils.output_layout import OutputLayout, VALID_LAYOUTS, shard_directory
+from core.single_flight import SingleFlight
 
 
 logger = logging.getLogger(__name__)
 
+# Coalesces concurrent writes of the same output file
+_write_flight = SingleFlight("save_barcode")
+
 
 class FileManager:
     """
@@ -21,14 +36,17 @@ class FileManager:
     
     Responsibilities:
     - Generate standardized filenames using PdfNamingService
+    - Sort files into subdirectories by the configured output layout
     - Create output directories as needed
-    - Save PDF content to disk
-    - Check for existing files
+    - Save PDF content to disk (atomically, optionally without waiting)
+    - Check for existing files (from an index of the output directory)
     - Support file overwriting for re-downloads
+    - Open combined batch PDFs when batch output is enabled
     - Handle file system errors gracefully
     """
     
-    def __init__(self, output_directory: str, pdf_naming_service: Optional[PdfNamingService] = None):
+    def __init__(self, output_directory: str, pdf_naming_service: Optional[PdfNamingService] = None,
+                 file_writer: Optional[FileWriter] = None):
         """
         Initialize FileManager with output directory.
         
@@ -36,11 +54,67 @@ class FileManager:
             output_directory: Path to directory where PDF files will be saved
             pdf_naming_service: Optional PdfNamingService for custom filename generation.
                                If not provided, defaults to tax_code format.
+            file_writer: Optional FileWriter (defaults to the process-wide one)
         """
         self.output_directory = output_directory
         self._pdf_naming_service = pdf_naming_service or PdfNamingService("tax_code")
+        self._file_writer = file_writer
+        self.batch_output = False
+        self._output_layout = OutputLayout.FLAT.value
+        # Rescan output directory indexes after N seconds (0 = never)
+        self.index_rescan_interval = 0.0
+        self._indexes: Dict[str, OutputIndex] = {}
+        self._indexed_root: Optional[str] = None
+        self._indexes_lock = threading.Lock()
         logger.info(f"FileManager initialized with output directory: {output_directory}")
     
+    @property
+    def file_writer(self) -> FileWriter:
+        """FileWriter used for saving (the process-wide one unless given)"""
+        return self._file_writer or get_file_writer()
+    
+    @property
+    def output_layout(self) -> str:
+        """Output layout (OutputLayout value)"""
+        return self._output_layout
+    
+    @output_layout.setter
+    def output_layout(self, layout: str) -> None:
+        """
+        Set the output layout.
+        
+        Raises:
+            ValueError: If layout is not a valid layout
+        """
+        if layout not in VALID_LAYOUTS:
+            raise ValueError(
+                f"Invalid output layout: {layout}. Must be one of: {', '.join(sorted(VALID_LAYOUTS))}"
+            )
+        self._output_layout = layout
+        logger.info(f"Output layout set to: {layout}")
+    
+    @property
+    def output_index(self) -> OutputIndex:
+        """Index of the output directory itself"""
+        return self.index_for(self.output_directory)
+    
+    def index_for(self, directory: str) -> OutputIndex:
+        """
+        Index of a directory (created on first use; all indexes are dropped
+        when the output directory changes).
+        """
+        key = os.path.normcase(os.path.abspath(directory))
+        with self._indexes_lock:
+            if self._indexed_root != self.output_directory:
+                self._indexes.clear()
+                self._indexed_root = self.output_directory
+            index = self._indexes.get(key)
+            if index is None:
+                index = OutputIndex(directory, self.index_rescan_interval, logger=logger)
+                self._indexes[key] = index
+            index.rescan_interval = self.index_rescan_interval
+            return index
+    
     @property
     def pdf_naming_service(self) -> PdfNamingService:
         """Get the PDF naming service"""
@@ -73,6 +147,19 @@ class FileManager:
         logger.debug(f"Generated filename: {filename} (format: {self._pdf_naming_service.naming_format})")
         return filename
     
+    def get_directory(self, declaration: Declaration) -> str:
+        """
+        Get the directory a declaration's PDF is saved in (by output layout).
+        
+        Args:
+            declaration: Declaration object
+            
+        Returns:
+            Output directory, or its layout subdirectory for the declaration
+        """
+        shard = shard_directory(declaration, self._output_layout)
+        return os.path.join(self.output_directory, shard) if shard else self.output_directory
+    
     def get_file_path(self, declaration: Declaration) -> str:
         """
         Get full file path for a declaration.
@@ -84,42 +171,104 @@ class FileManager:
             Full path to the PDF file
         """
         filename = self.generate_filename(declaration)
-        file_path = os.path.join(self.output_directory, filename)
+        file_path = os.path.join(self.get_directory(declaration), filename)
         return file_path
     
-    def file_exists(self, declaration: Declaration) -> bool:
+    def _search_directories(self, declaration: Declaration) -> List[str]:
+        """Layout directory first, then the flat output directory (files not migrated yet)."""
+        directory = self.get_directory(declaration)
+        if directory == self.output_directory:
+            return [directory]
+        return [directory, self.output_directory]
+    
+    def locate(self, declaration: Declaration, verify: bool = False) -> Optional[str]:
+        """
+        Find the declaration's PDF under the configured filename.
+        
+        Looks in the layout directory and, until the files are migrated
+        (see output_migrator.py), in the flat output directory. Answered
+        from the directory indexes, without a stat.
+        
+        Args:
+            declaration: Declaration object
+            verify: Confirm a positive answer on disk (for decisions that
+                must not trust a file deleted by another program)
+            
+        Returns:
+            Full path of the existing file, or None
+        """
+        filename = self.generate_filename(declaration)
+        for directory in self._search_directories(declaration):
+            index = self.index_for(directory)
+            file_path = index.find(filename)
+            if file_path is None:
+                continue
+            if verify and not os.path.exists(file_path):
+                index.discard(file_path)
+                continue
+            return file_path
+        return None
+    
+    def file_exists(self, declaration: Declaration, verify: bool = False) -> bool:
         """
         Check if PDF file already exists for a declaration.
         
+        Answered from the output directory indexes, without a stat (see
+        locate()).
+        
         Args:
             declaration: Declaration object
+            verify: Confirm a positive answer on disk (for decisions that
+                must not trust a file deleted by another program)
             
         Returns:
             True if file exists, False otherwise
         """
-        file_path = self.get_file_path(declaration)
-        exists = os.path.exists(file_path)
-        logger.debug(f"File exists check for {file_path}: {exists}")
+        file_path = self.locate(declaration, verify)
+        exists = file_path is not None
+        logger.debug(f"File exists check for {declaration.id}: {exists}")
         return exists
     
+    def find_existing(self, declaration: Declaration) -> Optional[str]:
+        """
+        Find the declaration's PDF under any naming format.
+        
+        Files saved before the naming format was changed, or not yet
+        moved into the output layout, are found too. Answered from the
+        output directory indexes, without a stat.
+        
+        Args:
+            declaration: Declaration object
+            
+        Returns:
+            Full path of the existing file (configured format first), or None
+        """
+        candidates = self.candidate_filenames(declaration)
+        for directory in self._search_directories(declaration):
+            file_path = self.index_for(directory).find(candidates)
+            if file_path is not None:
+                return file_path
+        return None
+    
+    def candidate_filenames(self, declaration: Declaration) -> List[str]:
+        """Filenames the declaration's PDF may have, configured format first"""
+        return self._pdf_naming_service.candidate_filenames(declaration)
+    
     def ensure_directory_exists(self) -> None:
         """
         Create output directory if it doesn't exist.
         
-        Creates all intermediate directories as needed.
+        Creates all intermediate directories as needed. Directories are
+        checked once per process (FileWriter's directory cache).
         
         Raises:
             OSError: If directory creation fails due to permissions or other errors
         """
-        if not os.path.exists(self.output_directory):
-            try:
-                os.makedirs(self.output_directory, exist_ok=True)
-                logger.info(f"Created output directory: {self.output_directory}")
-            except OSError as e:
-                logger.error(f"Failed to create directory {self.output_directory}: {e}")
-                raise
-        else:
-            logger.debug(f"Output directory already exists: {self.output_directory}")
+        try:
+            self.file_writer.directories.ensure(self.output_directory)
+        except OSError as e:
+            logger.error(f"Failed to create directory {self.output_directory}: {e}")
+            raise
     
     def save_barcode(
         self, 
@@ -128,7 +277,10 @@ class FileManager:
         overwrite: bool = False
     ) -> Optional[str]:
         """
-        Save PDF barcode content to disk.
+        Save PDF barcode content to disk and wait for the write.
+        
+        With overwrite=False the file is skipped if it is still on disk
+        (the index entry is confirmed with a stat, see locate()).
         
         Args:
             declaration: Declaration object
@@ -142,26 +294,21 @@ class FileManager:
             OSError: If file system operations fail
         """
         try:
-            # Ensure directory exists before saving
-            self.ensure_directory_exists()
-            
             file_path = self.get_file_path(declaration)
-            
-            # Check if file already exists
-            if os.path.exists(file_path) and not overwrite:
-                logger.warning(
-                    f"File already exists and overwrite=False, skipping: {file_path}"
-                )
+            index = self.index_for(os.path.dirname(file_path))
+            existing = None if overwrite else self.locate(declaration, verify=True)
+            if existing:
+                logger.warning(f"File already exists and overwrite=False, skipping: {existing}")
                 return None
             
-            # Write PDF content to file
-            with open(file_path, 'wb') as f:
-                f.write(pdf_content)
-            
-            action = "Overwrote" if (os.path.exists(file_path) and overwrite) else "Saved"
-            logger.info(f"{action} barcode PDF: {file_path}")
-            
-            return file_path
+            # Concurrent saves of the same file share a single write
+            key = (os.path.normcase(os.path.abspath(file_path)), overwrite)
+            saved = _write_flight.do(key, self.file_writer.write, file_path, pdf_content, overwrite)
+            # Written now, or found on disk by the writer
+            index.add(file_path)
+            if saved:
+                logger.info(f"Saved barcode PDF: {saved}")
+            return saved
             
         except OSError as e:
             logger.error(
@@ -175,3 +322,74 @@ class FileManager:
                 exc_info=True
             )
             raise
+    
+    def save_barcode_async(
+        self,
+        declaration: Declaration,
+        pdf_content: bytes,
+        overwrite: bool = False,
+        then: Optional[Callable[[str], None]] = None
+    ) -> Future:
+        """
+        Queue the PDF for writing and return without waiting for the disk.
+        
+        Blocks only while the writer's queue is full.
+        
+        Args:
+            declaration: Declaration object
+            pdf_content: PDF file content as bytes
+            overwrite: If True, overwrite existing file; if False, skip if exists
+            then: Called with the file path on the I/O thread after the write
+                (e.g. to record the declaration as processed)
+            
+        Returns:
+            Future resolving to the saved path, or None if skipped (raises
+            OSError if the write failed)
+        """
+        file_path = self.get_file_path(declaration)
+        index = self.index_for(os.path.dirname(file_path))
+        
+        def saved(path: str) -> None:
+            index.add(path)
+            if then is not None:
+                then(path)
+        
+        return self.file_writer.submit(file_path, pdf_content, overwrite=overwrite, then=saved)
+    
+    def open_batch(self, title: Optional[str] = None) -> Optional[BatchPdfWriter]:
+        """
+        Open a combined PDF for a download batch, if batch output is enabled.
+        
+        The batch is written to Batch_<date>_<time>.pdf in the output
+        directory; callers add each saved declaration and close the writer
+        when the batch ends.
+        
+        Args:
+            title: Optional document title
+            
+        Returns:
+            BatchPdfWriter, or None if batch output is off or unavailable
+        """
+        if not self.batch_output:
+            return None
+        if not PYPDF_AVAILABLE:
+            logger.warning("Batch PDF output needs pypdf, writing per-declaration files only")
+            return None
+        
+        try:
+            self.ensure_directory_exists()
+            stem = f"Batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            counter = 1
+            while True:
+                suffix = f"_{counter}" if counter > 1 else ""
+                path = os.path.join(self.output_directory, f"{stem}{suffix}.pdf")
+                counter += 1
+                if self.output_index.contains(os.path.basename(path)):
+                    continue
+                try:
+                    return BatchPdfWriter(path, title=title)
+                except FileExistsError:
+                    continue  # Another batch started in the same second
+        except OSError as e:
+            logger.error(f"Failed to open batch PDF in {self.output_directory}: {e}")
+            return None
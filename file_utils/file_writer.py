@@ -0,0 +1,325 @@
+"""
+File Writer Module
+
+Writes barcode PDFs atomically on a dedicated I/O thread pool.
+
+Each file is written to a temporary file next to the target, flushed to
+disk and moved over the target with os.replace, so a crash mid-write
+leaves the previous file (or none) instead of a truncated PDF.
+
+Writes run on their own threads behind a bounded queue: download threads
+hand the bytes over and go back to the network, a slow network share only
+fills the queue, and a full queue makes submitters wait (back-pressure)
+instead of buffering PDFs without limit. Directories known to exist are
+cached, so a write costs no extra round trips to check its directory.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional, Set
+
+from logging_system.logger import Logger
+
+
+def atomic_write(path: str, content: bytes, fsync: bool = True) -> int:
+    """
+    Write content to path via a temporary file in the same directory.
+
+    Readers see either the old file or the complete new one. The directory
+    must exist.
+
+    Args:
+        path: Target file path
+        content: File content
+        fsync: Flush the data to disk before replacing the target
+
+    Returns:
+        Bytes written
+
+    Raises:
+        OSError: If the file can't be written or replaced
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return len(content)
+
+
+class DirectoryCache:
+    """Directories known to exist (created on first use)."""
+
+    def __init__(self):
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, directory: str) -> None:
+        """
+        Create directory if it isn't known to exist.
+
+        Raises:
+            OSError: If the directory can't be created
+        """
+        if not directory:
+            return
+        key = os.path.normcase(os.path.abspath(directory))
+        with self._lock:
+            if key in self._known:
+                return
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._known.add(key)
+
+    def discard(self, directory: str) -> None:
+        """Forget a directory (it was removed behind our back)."""
+        with self._lock:
+            self._known.discard(os.path.normcase(os.path.abspath(directory)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._known.clear()
+
+
+class FileWriter:
+    """
+    Atomic file writes on a bounded I/O thread pool.
+
+    Usage:
+        future = writer.submit(path, pdf_content)  # Returns at once
+        ...
+        saved_path = future.result()
+
+    With workers = 0 files are written in the calling thread.
+    """
+
+    DEFAULT_WORKERS = 2
+    DEFAULT_QUEUE_SIZE = 64
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 fsync: bool = True, logger: Optional[Logger] = None):
+        """
+        Initialize the writer.
+
+        Args:
+            workers: I/O threads (0 = write in the calling thread)
+            queue_size: Writes queued or running before submit() blocks
+            fsync: Flush each file to disk before replacing the target
+            logger: Optional logger
+        """
+        self.logger = logger
+        self.fsync = fsync
+        self.directories = DirectoryCache()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Set[Future] = set()
+        self._workers = 0
+        self._queue_size = 1
+        self._slots = threading.BoundedSemaphore(1)
+
+        self._written = 0
+        self._skipped = 0
+        self._failed = 0
+        self._bytes = 0
+        self._max_queue_depth = 0
+        self._write_time = 0.0
+        self._max_write_time = 0.0
+        self._wait_time = 0.0
+
+        self.configure(workers, queue_size)
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def configure(self, workers: int, queue_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        """
+        Set the number of I/O threads and the queue bound.
+
+        Pending writes finish on the old threads first.
+
+        Args:
+            workers: I/O threads (0 = write in the calling thread)
+            queue_size: Writes queued or running before submit() blocks
+        """
+        workers = max(0, int(workers))
+        queue_size = max(1, int(queue_size), workers)
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+            self._workers = workers
+            self._queue_size = queue_size
+            self._slots = threading.BoundedSemaphore(queue_size)
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if self.logger:
+            self.logger.info(f"File writer configured: {workers} I/O threads, queue of {queue_size}")
+
+    def _get_executor(self) -> Optional[ThreadPoolExecutor]:
+        with self._lock:
+            if self._workers and self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="file-writer")
+            return self._executor
+
+    def submit(self, path: str, content: bytes, overwrite: bool = True,
+               then: Optional[Callable[[str], None]] = None) -> Future:
+        """
+        Queue an atomic write of content to path.
+
+        Blocks while the queue is full. Must not be called from a `then`
+        callback (the I/O thread would wait for itself).
+
+        Args:
+            path: Target file path (its directory is created if needed)
+            content: File content
+            overwrite: If False, skip the write when path exists
+            then: Called with path on the I/O thread after a successful
+                write, before the future completes
+
+        Returns:
+            Future resolving to path, or None if skipped because it exists
+            (raises the OSError if the write failed)
+        """
+        submitted = time.monotonic()
+        executor = self._get_executor()
+        if executor is None:
+            future = Future()
+            try:
+                future.set_result(self._write(path, content, overwrite, then, submitted))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+
+        slots = self._slots
+        slots.acquire()
+        with self._lock:
+            self._max_queue_depth = max(self._max_queue_depth, len(self._pending) + 1)
+        try:
+            future = executor.submit(self._write, path, content, overwrite, then, submitted)
+        except BaseException:
+            slots.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(lambda f: self._finished(f, slots))
+        return future
+
+    def write(self, path: str, content: bytes, overwrite: bool = True) -> Optional[str]:
+        """
+        Write content to path atomically and wait for it.
+
+        Returns:
+            path, or None if skipped because it exists
+
+        Raises:
+            OSError: If the write failed
+        """
+        return self.submit(path, content, overwrite).result()
+
+    def _finished(self, future: Future, slots: threading.BoundedSemaphore) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        slots.release()
+
+    def _write(self, path: str, content: bytes, overwrite: bool,
+               then: Optional[Callable[[str], None]], submitted: float) -> Optional[str]:
+        started = time.monotonic()
+        try:
+            if not overwrite and os.path.exists(path):
+                if self.logger:
+                    self.logger.warning(f"File already exists and overwrite=False, skipping: {path}")
+                with self._lock:
+                    self._skipped += 1
+                return None
+
+            directory = os.path.dirname(path)
+            self.directories.ensure(directory)
+            try:
+                size = atomic_write(path, content, self.fsync)
+            except FileNotFoundError:
+                # Directory removed since it was cached: recreate once
+                self.directories.discard(directory)
+                self.directories.ensure(directory)
+                size = atomic_write(path, content, self.fsync)
+        except BaseException:
+            with self._lock:
+                self._failed += 1
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._written += 1
+            self._bytes += size
+            self._write_time += elapsed
+            self._max_write_time = max(self._max_write_time, elapsed)
+            self._wait_time += started - submitted
+        if self.logger:
+            self.logger.debug(f"Wrote {size} bytes to {path} in {elapsed * 1000:.0f} ms")
+
+        if then is not None:
+            then(path)
+        return path
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for all queued writes.
+
+        Returns:
+            True if none is pending any more
+        """
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Finish (or, with wait=False, abandon waiting for) queued writes and stop the threads."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def get_stats(self) -> dict:
+        """Get write latency and queue depth statistics."""
+        with self._lock:
+            writes = self._written or 1
+            return {
+                'workers': self._workers,
+                'queue_size': self._queue_size,
+                'queue_depth': len(self._pending),
+                'max_queue_depth': self._max_queue_depth,
+                'written': self._written,
+                'skipped': self._skipped,
+                'failed': self._failed,
+                'bytes': self._bytes,
+                'avg_write_ms': self._write_time / writes * 1000,
+                'max_write_ms': self._max_write_time * 1000,
+                'avg_wait_ms': self._wait_time / writes * 1000,
+            }
+
+
+# Global instance
+_file_writer: Optional[FileWriter] = None
+_file_writer_lock = threading.Lock()
+
+
+def get_file_writer(logger: Optional[Logger] = None) -> FileWriter:
+    """Get or create the process-wide file writer."""
+    global _file_writer
+    with _file_writer_lock:
+        if _file_writer is None:
+            _file_writer = FileWriter(logger=logger)
+        elif logger and _file_writer.logger is None:
+            _file_writer.logger = logger
+        return _file_writer
@@ -0,0 +1,178 @@
+"""
+Output Index Module
+
+In-memory index of the files in the output directory.
+
+Checking whether a declaration's PDF exists used to cost a stat per
+declaration, which on a network share is a round trip to the server per
+row. OutputIndex lists the directory once with os.scandir, records the
+files FileManager writes as it writes them, and answers existence and
+path questions from memory. Files added or removed by other programs are
+picked up by refresh(), which also runs on access once rescan_interval
+seconds have passed (0 = only our own writes keep it current).
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from logging_system.logger import Logger
+
+
+class OutputIndex:
+    """
+    Filenames in one directory, looked up case-insensitively where the
+    platform is (os.path.normcase).
+    """
+
+    def __init__(self, directory: str, rescan_interval: float = 0.0, logger: Optional[Logger] = None):
+        """
+        Initialize the index (the directory is scanned on first use).
+
+        Args:
+            directory: Directory to index (need not exist yet)
+            rescan_interval: Rescan on access after this many seconds
+                (0 = never, only our own writes update the index)
+            logger: Optional logger
+        """
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self.logger = logger
+        self._directory_key = self._normalize(directory)
+        self._entries: Dict[str, str] = {}
+        self._changes: Optional[Dict[str, Optional[str]]] = None  # Recorded while scanning
+        self._scanned_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+
+        self._scans = 0
+        self._last_scan_time = 0.0
+        self._lookups = 0
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _is_stale(self) -> bool:
+        if self._scanned_at is None:
+            return True
+        return bool(self.rescan_interval) and time.monotonic() - self._scanned_at >= self.rescan_interval
+
+    def refresh(self) -> int:
+        """
+        Rescan the directory.
+
+        Files recorded with add() or discard() during the scan are kept. If
+        the directory can't be listed the previous entries are kept.
+
+        Returns:
+            Number of files indexed
+        """
+        with self._scan_lock:
+            with self._lock:
+                self._changes = {}
+            started = time.monotonic()
+            entries: Dict[str, str] = {}
+            try:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_file():
+                                entries[os.path.normcase(entry.name)] = entry.name
+                        except OSError:
+                            continue
+            except FileNotFoundError:
+                pass  # Created by the first write
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"Could not scan output directory {self.directory}: {e}")
+                entries = None
+            elapsed = time.monotonic() - started
+
+            with self._lock:
+                if entries is not None:
+                    for key, name in self._changes.items():
+                        if name is None:
+                            entries.pop(key, None)
+                        else:
+                            entries[key] = name
+                    self._entries = entries
+                self._changes = None
+                # Also after a failed scan, so every lookup doesn't retry it
+                self._scanned_at = time.monotonic()
+                self._scans += 1
+                self._last_scan_time = elapsed
+                count = len(self._entries)
+
+        if self.logger:
+            self.logger.debug(f"Indexed {count} files in {self.directory} in {elapsed * 1000:.0f} ms")
+        return count
+
+    def _ensure_current(self) -> None:
+        if self._is_stale():
+            with self._scan_lock:
+                stale = self._is_stale()  # Another thread may have just scanned
+            if stale:
+                self.refresh()
+
+    def _record(self, path: str, present: bool) -> None:
+        if self._normalize(os.path.dirname(path)) != self._directory_key:
+            return
+        name = os.path.basename(path)
+        key = os.path.normcase(name)
+        with self._lock:
+            if present:
+                self._entries[key] = name
+            else:
+                self._entries.pop(key, None)
+            if self._changes is not None:
+                self._changes[key] = name if present else None
+
+    def add(self, path: str) -> None:
+        """Record a file we wrote (ignored if it is in another directory)."""
+        self._record(path, True)
+
+    def discard(self, path: str) -> None:
+        """Record a file that no longer exists."""
+        self._record(path, False)
+
+    def contains(self, filename: str) -> bool:
+        """Check whether a file with this name is in the directory."""
+        return self.find(filename) is not None
+
+    def find(self, filenames: Iterable[str]) -> Optional[str]:
+        """
+        Path of the first of filenames that is in the directory.
+
+        Args:
+            filenames: A filename or filenames in order of preference
+
+        Returns:
+            Full path (with the name's case on disk), or None
+        """
+        if isinstance(filenames, str):
+            filenames = (filenames,)
+        self._ensure_current()
+        with self._lock:
+            self._lookups += 1
+            for filename in filenames:
+                name = self._entries.get(os.path.normcase(filename))
+                if name is not None:
+                    return os.path.join(self.directory, name)
+        return None
+
+    def __len__(self) -> int:
+        self._ensure_current()
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self) -> dict:
+        """Get index statistics."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'scans': self._scans,
+                'last_scan_ms': self._last_scan_time * 1000,
+                'lookups': self._lookups,
+            }
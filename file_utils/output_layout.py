@@ -0,0 +1,76 @@
+"""
+Output Layout
+
+Subdirectories of the output directory that barcode PDFs are sorted into.
+
+A flat output directory with hundreds of thousands of files makes every
+listing slow (Explorer, rebuild_from_directory, the output index). The
+sharded layouts keep each directory small:
+
+- flat: <output>/MV_....pdf
+- year_month: <output>/<yyyy>/<mm>/MV_....pdf (declaration date)
+- tax_code: <output>/<tax_code>/MV_....pdf
+- tax_code_year_month: <output>/<tax_code>/<yyyy>/<mm>/MV_....pdf
+"""
+
+import os
+import re
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+
+from models.declaration_models import Declaration
+
+
+class OutputLayout(Enum):
+    """Output directory layout options"""
+    FLAT = "flat"
+    YEAR_MONTH = "year_month"
+    TAX_CODE = "tax_code"
+    TAX_CODE_YEAR_MONTH = "tax_code_year_month"
+
+
+VALID_LAYOUTS = {layout.value for layout in OutputLayout}
+
+# Shard for declarations without a usable tax code or date
+UNKNOWN_SHARD = "_unknown"
+
+
+def _year_month(declaration_date: Any) -> str:
+    """yyyy/mm of a declaration date (datetime, date or a date string)."""
+    if isinstance(declaration_date, (datetime, date)):
+        return os.path.join(f"{declaration_date.year:04d}", f"{declaration_date.month:02d}")
+    digits = re.sub(r"\D", "", str(declaration_date or ""))
+    if len(digits) >= 6 and 1 <= int(digits[4:6]) <= 12:
+        return os.path.join(digits[:4], digits[4:6])
+    return UNKNOWN_SHARD
+
+
+def _tax_code(tax_code: Any) -> str:
+    value = re.sub(r'[<>:"/\\|?*]', "_", str(tax_code or "")).strip().strip(".")
+    return value or UNKNOWN_SHARD
+
+
+def shard_directory(declaration: Declaration, layout: str) -> str:
+    """
+    Subdirectory (relative to the output directory) for a declaration.
+
+    Args:
+        declaration: Declaration object
+        layout: OutputLayout value
+
+    Returns:
+        Relative directory ("" for the flat layout)
+
+    Raises:
+        ValueError: If layout is not a valid layout
+    """
+    if layout == OutputLayout.FLAT.value:
+        return ""
+    if layout == OutputLayout.YEAR_MONTH.value:
+        return _year_month(declaration.declaration_date)
+    if layout == OutputLayout.TAX_CODE.value:
+        return _tax_code(declaration.tax_code)
+    if layout == OutputLayout.TAX_CODE_YEAR_MONTH.value:
+        return os.path.join(_tax_code(declaration.tax_code), _year_month(declaration.declaration_date))
+    raise ValueError(f"Invalid output layout: {layout}. Must be one of: {', '.join(sorted(VALID_LAYOUTS))}")
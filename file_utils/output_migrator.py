@@ -0,0 +1,238 @@
+"""
+Output Migrator
+
+Moves saved barcode PDFs into the configured output layout.
+
+The files to move come from the tracking database (processed_declarations
+has the tax code and declaration date the sharded layouts need). Files are
+moved on a thread pool, and the rows of all moved files are updated in one
+transaction at the end. Until a file is moved FileManager still finds it
+in the flat output directory, so the layout can be switched before the
+files are migrated. A migration can be stopped and run again: files
+already in place are skipped, and rows whose file was moved but not yet
+updated are updated.
+
+Usage:
+    python -m file_utils.output_migrator --layout year_month --dry-run
+    python -m file_utils.output_migrator --layout tax_code --workers 16
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from file_utils.file_manager import FileManager
+from file_utils.file_writer import DirectoryCache
+from models.declaration_models import Declaration
+
+MOVED = "moved"
+ALREADY_MOVED = "already_moved"
+DUPLICATE = "duplicate"
+MISSING = "missing"
+FAILED = "failed"
+
+
+@dataclass
+class MigrationResult:
+    """
+    Outcome of a migration.
+
+    Attributes:
+        planned: Files not in their layout directory
+        moved: Files moved
+        already_moved: Files found in place (only the row was updated)
+        duplicates: Files also saved in place by a later download (the
+            newer copy was kept)
+        missing: Files in neither place
+        failed: Files that could not be moved
+        rows_updated: Tracking rows pointed at the new paths
+        errors: Error messages of the failed moves
+    """
+    planned: int = 0
+    moved: int = 0
+    already_moved: int = 0
+    duplicates: int = 0
+    missing: int = 0
+    failed: int = 0
+    rows_updated: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+class OutputMigrator:
+    """Moves the files of processed declarations into the output layout."""
+
+    def __init__(self, file_manager: FileManager, tracking_db, workers: int = 8, logger=None):
+        """
+        Initialize the migrator.
+
+        Args:
+            file_manager: FileManager with the target output layout
+            tracking_db: TrackingDatabase with the saved file paths
+            workers: Files moved in parallel
+            logger: Optional logger
+        """
+        self.file_manager = file_manager
+        self.tracking_db = tracking_db
+        self.workers = max(1, workers)
+        self.logger = logger
+        self._directories = DirectoryCache()
+
+    def plan(self) -> List[Tuple[int, str, str]]:
+        """
+        List the files to move.
+
+        Only files inside the output directory are moved; rows pointing
+        elsewhere (an earlier output directory) are left alone.
+
+        Returns:
+            (tracking row id, source, target) triples
+        """
+        root = os.path.normcase(os.path.abspath(self.file_manager.output_directory))
+        moves = []
+        for row in self.tracking_db.get_all_processed_details():
+            source = row.file_path
+            if not source:
+                continue
+            source_key = os.path.normcase(os.path.abspath(source))
+            try:
+                if os.path.commonpath([root, source_key]) != root:
+                    continue
+            except ValueError:
+                continue  # Another drive
+            declaration = Declaration(row.declaration_number, row.tax_code, row.declaration_date)
+            target = os.path.join(self.file_manager.get_directory(declaration), os.path.basename(source))
+            if os.path.normcase(os.path.abspath(target)) != source_key:
+                moves.append((row.id, source, target))
+        return moves
+
+    def migrate(self, dry_run: bool = False,
+                progress: Optional[Callable[[int, int], None]] = None) -> MigrationResult:
+        """
+        Move the planned files and update their tracking rows.
+
+        Args:
+            dry_run: Only count the files that would be moved
+            progress: Called with (done, total) after each file
+
+        Returns:
+            MigrationResult
+        """
+        moves = self.plan()
+        result = MigrationResult(planned=len(moves))
+        if dry_run or not moves:
+            return result
+
+        updates: List[Tuple[int, str]] = []
+        lock = threading.Lock()
+        done = [0]
+
+        def move(planned: Tuple[int, str, str]) -> None:
+            row_id, source, target = planned
+            try:
+                outcome = self._move(source, target)
+                error = None
+            except OSError as e:
+                outcome, error = FAILED, f"{source}: {e}"
+            with lock:
+                if outcome == MOVED:
+                    result.moved += 1
+                elif outcome == ALREADY_MOVED:
+                    result.already_moved += 1
+                elif outcome == DUPLICATE:
+                    result.duplicates += 1
+                elif outcome == MISSING:
+                    result.missing += 1
+                else:
+                    result.failed += 1
+                    result.errors.append(error)
+                if outcome in (MOVED, ALREADY_MOVED, DUPLICATE):
+                    updates.append((row_id, target))
+                done[0] += 1
+                count = done[0]
+            if progress:
+                progress(count, len(moves))
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="output-migrator") as executor:
+            list(executor.map(move, moves))
+
+        result.rows_updated = self.tracking_db.update_file_paths(updates)
+        if self.logger:
+            self.logger.info(
+                f"Output migration: {result.moved} moved, {result.already_moved} already in place, "
+                f"{result.duplicates} duplicates, {result.missing} missing, {result.failed} failed, "
+                f"{result.rows_updated} rows updated"
+            )
+        return result
+
+    def _move(self, source: str, target: str) -> str:
+        """Move one file; the newer copy wins if both exist."""
+        if not os.path.exists(source):
+            return ALREADY_MOVED if os.path.exists(target) else MISSING
+
+        self._directories.ensure(os.path.dirname(target))
+        outcome = MOVED
+        if os.path.exists(target):
+            outcome = DUPLICATE
+            if os.path.getmtime(source) <= os.path.getmtime(target):
+                os.remove(source)
+                self._forget(source)
+                self._record(target)
+                return outcome
+            os.replace(source, target)
+        else:
+            shutil.move(source, target)  # Renames on the same volume
+        self._forget(source)
+        self._record(target)
+        return outcome
+
+    def _forget(self, path: str) -> None:
+        self.file_manager.index_for(os.path.dirname(path)).discard(path)
+
+    def _record(self, path: str) -> None:
+        self.file_manager.index_for(os.path.dirname(path)).add(path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    from config.configuration_manager import ConfigurationManager
+    from database.tracking_database import TrackingDatabase
+    from file_utils.output_layout import VALID_LAYOUTS
+    from file_utils.pdf_naming_service import PdfNamingService
+
+    parser = argparse.ArgumentParser(description="Move saved barcode PDFs into an output layout")
+    parser.add_argument("--config", default="config.ini", help="Configuration file (default: config.ini)")
+    parser.add_argument("--db", default="data/tracking.db", help="Tracking database (default: data/tracking.db)")
+    parser.add_argument("--layout", choices=sorted(VALID_LAYOUTS),
+                        help="Target layout (default: output_layout from the configuration)")
+    parser.add_argument("--workers", type=int, default=8, help="Files moved in parallel (default: 8)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the files to move")
+    args = parser.parse_args(argv)
+
+    config = ConfigurationManager(args.config)
+    file_manager = FileManager(config.get_output_path(), PdfNamingService(config.get_pdf_naming_format()))
+    file_manager.output_layout = args.layout or config.get_output_layout()
+    migrator = OutputMigrator(file_manager, TrackingDatabase(args.db), workers=args.workers)
+
+    def progress(done: int, total: int) -> None:
+        if done % 1000 == 0 or done == total:
+            print(f"  {done}/{total}")
+
+    print(f"Migrating {file_manager.output_directory} to layout '{file_manager.output_layout}'")
+    result = migrator.migrate(dry_run=args.dry_run, progress=progress)
+    if args.dry_run:
+        print(f"{result.planned} files would be moved")
+        return 0
+    print(f"{result.moved} moved, {result.already_moved} already in place, {result.duplicates} duplicates, "
+          f"{result.missing} missing, {result.failed} failed, {result.rows_updated} rows updated")
+    for error in result.errors[:20]:
+        print(f"  {error}")
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
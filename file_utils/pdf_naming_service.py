@@ -11,7 +11,7 @@ Requirements: 5.3, 5.4, 5.5, 5.6
 import re
 import logging
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
 from models.declaration_models import Declaration
 
@@ -181,6 +181,41 @@ class PdfNamingService:
         logger.debug(f"Generated filename: {filename} (format: {self.naming_format})")
         return filename
     
+    def candidate_filenames(self, declaration: Declaration) -> List[str]:
+        """
+        Filenames the declaration's PDF may have been saved under.
+        
+        The configured format comes first, followed by the other formats
+        (files saved before the naming format was changed). Fallbacks
+        apply as in generate_filename, and duplicates are removed.
+        
+        Args:
+            declaration: Declaration object containing the data
+            
+        Returns:
+            List of filenames, configured format first
+            
+        Raises:
+            ValueError: If the declaration number is empty
+        """
+        declaration_number = self._sanitize_filename_part(declaration.declaration_number)
+        if not declaration_number:
+            raise ValueError("Declaration number cannot be empty")
+        
+        names: List[str] = []
+        formats = [self.naming_format] + sorted(self.VALID_FORMATS - {self.naming_format})
+        for format_type in formats:
+            prefix = self._get_prefix_for_format(declaration, format_type)
+            if prefix is None:
+                prefix = self._get_prefix_for_format(declaration, "tax_code")
+            if prefix is None:
+                name = f"MV_{declaration_number}.pdf"
+            else:
+                name = f"MV_{self._sanitize_filename_part(prefix)}_{declaration_number}.pdf"
+            if name not in names:
+                names.append(name)
+        return names
+    
     def set_naming_format(self, naming_format: str) -> None:
         """
         Update the naming format.
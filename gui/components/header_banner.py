@@ -25,7 +25,7 @@ class HeaderBanner:
     Displays:
     - Logo with motto
     - Company name and slogan
-    - About and Update buttons
+    - About, Update and (optional) Jobs buttons
     - Version info
     """
     
@@ -34,7 +34,8 @@ class HeaderBanner:
         parent: tk.Tk,
         logger: Logger,
         on_about_click: Callable,
-        on_update_click: Callable
+        on_update_click: Callable,
+        on_jobs_click: Optional[Callable] = None
     ):
         """
         Create header banner.
@@ -44,11 +45,13 @@ class HeaderBanner:
             logger: Logger instance
             on_about_click: Callback for about button
             on_update_click: Callback for update button
+            on_jobs_click: Callback for the jobs button (hidden if None)
         """
         self.parent = parent
         self.logger = logger
         self.on_about_click = on_about_click
         self.on_update_click = on_update_click
+        self.on_jobs_click = on_jobs_click
         self._logo_photo = None
         
         self._create_banner()
@@ -139,6 +142,25 @@ class HeaderBanner:
         button_row = tk.Frame(right_frame, bg=BRAND_PRIMARY_COLOR)
         button_row.pack(anchor=tk.E)
         
+        # Jobs button
+        if self.on_jobs_click is not None:
+            jobs_btn = tk.Button(
+                button_row,
+                text="⏱  Tác vụ",
+                font=("Segoe UI", 11, "bold"),
+                fg=BRAND_GOLD_COLOR,
+                bg=BRAND_SECONDARY_COLOR,
+                activebackground=BRAND_PRIMARY_COLOR,
+                activeforeground=BRAND_ACCENT_COLOR,
+                relief=tk.RIDGE,
+                bd=2,
+                cursor="hand2",
+                padx=12,
+                pady=4,
+                command=self.on_jobs_click
+            )
+            jobs_btn.pack(side=tk.LEFT, padx=(0, 5))
+        
         # About button
         about_btn = tk.Button(
             button_row,
@@ -13,6 +13,7 @@ from models.declaration_models import Declaration, WorkflowResult
 from services.workflow_service import WorkflowService
 from database.tracking_database import TrackingDatabase
 from logging_system.logger import Logger
+from web_utils.rate_limiter import PRIORITY_INTERACTIVE, request_priority
 
 
 class DownloadController:
@@ -84,10 +85,12 @@ class DownloadController:
                             self.on_progress(current, total, event.message)
                     self.workflow_service.add_event_listener(event_handler)
                 
-                result = self.workflow_service.execute(
-                    declarations=declarations,
-                    force_redownload=force
-                )
+                # User-initiated: interactive rate-limit lane
+                with request_priority(PRIORITY_INTERACTIVE):
+                    result = self.workflow_service.execute(
+                        declarations=declarations,
+                        force_redownload=force
+                    )
                 
                 self.logger.info(f"Redownload complete: {result.success_count} success, {result.error_count} errors")
                 
@@ -13,6 +13,7 @@ from typing import Callable, Optional, List
 
 from models.declaration_models import Declaration, WorkflowResult
 from logging_system.logger import Logger
+from web_utils.rate_limiter import PRIORITY_INTERACTIVE, request_priority
 
 
 class RedownloadController:
@@ -96,8 +97,9 @@ class RedownloadController:
                 if redownload_button:
                     self.root.after(0, lambda: redownload_button.config(state=tk.DISABLED))
                 
-                # Execute re-download
-                result = self.scheduler.redownload_declarations(declarations)
+                # Execute re-download (user-initiated: interactive rate-limit lane)
+                with request_priority(PRIORITY_INTERACTIVE):
+                    result = self.scheduler.redownload_declarations(declarations)
                 
                 # Callbacks
                 if self.on_complete:
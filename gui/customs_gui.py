@@ -147,7 +147,7 @@ class CustomsAutomationGUI:
         self._load_processed_declarations()
         
         # Initialize ClearanceChecker (Phase 4)
-        from gui.clearance_checker import ClearanceChecker
+        from services.clearance_checker import ClearanceChecker
         from config.user_preferences import get_preferences
         prefs = get_preferences()
         
@@ -238,9 +238,20 @@ class CustomsAutomationGUI:
             parent=self.root,
             logger=self.logger,
             on_about_click=self._show_about_dialog,
-            on_update_click=self._check_for_updates
+            on_update_click=self._check_for_updates,
+            on_jobs_click=self._show_job_queue_dialog
         )
     
+    def _show_job_queue_dialog(self) -> None:
+        """Show the job queue (running, paused and waiting jobs)."""
+        from gui.dialogs.job_queue_dialog import show_job_queue_dialog
+        from services.job_queue import get_job_queue
+        dialog = getattr(self, '_job_queue_dialog', None)
+        if dialog is not None and dialog.dialog.winfo_exists():
+            dialog.dialog.lift()
+            return
+        self._job_queue_dialog = show_job_queue_dialog(self.root, get_job_queue(self.logger))
+    
     def _create_footer(self) -> None:
         """Create footer - v2.0: Uses extracted Footer component."""
         self._footer = Footer(self.root)
@@ -0,0 +1,155 @@
+"""
+Job Queue Dialog
+
+Shows the jobs of the job queue (downloads, scheduled runs, retries,
+redownloads, clearance checks): what is running, paused for
+higher-priority work or waiting, with progress, and lets the user cancel
+a job.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Optional
+
+from services.job_queue import (
+    CANCELLED, COMPLETED, FAILED, KIND_CLEARANCE, KIND_MANUAL, KIND_REDOWNLOAD, KIND_RETRY, KIND_SCHEDULED,
+    PAUSED, QUEUED, RUNNING, FINISHED_STATES, JobInfo, JobQueue
+)
+
+
+KIND_LABELS = {
+    KIND_SCHEDULED: "Tự động",
+    KIND_MANUAL: "Tải thủ công",
+    KIND_RETRY: "Tải lại lỗi",
+    KIND_REDOWNLOAD: "Tải lại",
+    KIND_CLEARANCE: "Kiểm tra TQ",
+}
+
+PRIORITY_LABELS = {
+    "interactive": "Cao",
+    "normal": "Thường",
+    "background": "Nền",
+}
+
+STATE_LABELS = {
+    QUEUED: "Đang chờ",
+    RUNNING: "Đang chạy",
+    PAUSED: "Tạm dừng (ưu tiên)",
+    COMPLETED: "Hoàn thành",
+    CANCELLED: "Đã hủy",
+    FAILED: "Lỗi",
+}
+
+
+class JobQueueDialog:
+    """
+    Non-modal window listing the job queue, refreshed every second.
+    """
+
+    REFRESH_MS = 1000
+    COLUMNS = ("name", "kind", "priority", "state", "progress", "started")
+
+    def __init__(self, parent: tk.Tk, job_queue: JobQueue):
+        """
+        Create and show the dialog.
+
+        Args:
+            parent: Parent window
+            job_queue: Job queue to show
+        """
+        self.parent = parent
+        self.job_queue = job_queue
+        self._refresh_id: Optional[str] = None
+        self._create_dialog()
+        self._refresh()
+
+    def _create_dialog(self) -> None:
+        self.dialog = tk.Toplevel(self.parent)
+        self.dialog.title("Tác vụ")
+        self.dialog.geometry("760x360")
+        self.dialog.transient(self.parent)
+        self.dialog.protocol("WM_DELETE_WINDOW", self.close)
+
+        main_frame = ttk.Frame(self.dialog, padding=10)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.summary_label = ttk.Label(main_frame, text="")
+        self.summary_label.pack(anchor=tk.W, pady=(0, 6))
+
+        table_frame = ttk.Frame(main_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(table_frame, columns=self.COLUMNS, show="headings", selectmode="browse")
+        for column, heading, width in (
+            ("name", "Tác vụ", 240), ("kind", "Loại", 100), ("priority", "Ưu tiên", 70),
+            ("state", "Trạng thái", 130), ("progress", "Tiến độ", 90), ("started", "Bắt đầu", 80),
+        ):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=width, anchor=tk.W if column == "name" else tk.CENTER)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.bind("<<TreeviewSelect>>", lambda event: self._update_buttons())
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=(8, 0))
+        self.cancel_button = ttk.Button(button_frame, text="Hủy tác vụ", command=self._cancel_selected,
+                                        state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Đóng", command=self.close).pack(side=tk.RIGHT)
+
+    def _refresh(self) -> None:
+        """Redraw the job list, keeping the selection."""
+        selected = self.tree.selection()
+        jobs = self.job_queue.jobs()
+        self._states = {str(info.job_id): info.state for info in jobs}
+        self.tree.delete(*self.tree.get_children())
+        for info in jobs:
+            self.tree.insert("", tk.END, iid=str(info.job_id), values=self._row(info))
+        still_there = [iid for iid in selected if self.tree.exists(iid)]
+        if still_there:
+            self.tree.selection_set(still_there)
+
+        stats = self.job_queue.get_stats()
+        self.summary_label.config(
+            text=f"Đang chạy: {stats['running']}   Tạm dừng: {stats['paused']}   "
+                 f"Đang chờ: {stats['queued']}   Lần nhường ưu tiên: {stats['preemptions']}"
+        )
+        self._update_buttons()
+        self._refresh_id = self.dialog.after(self.REFRESH_MS, self._refresh)
+
+    @staticmethod
+    def _row(info: JobInfo) -> tuple:
+        progress = f"{info.done}/{info.total}" if info.total else (str(info.done) if info.done else "")
+        state = STATE_LABELS.get(info.state, info.state)
+        if info.state == FAILED and info.error:
+            state = f"{state}: {info.error}"
+        return (
+            info.name,
+            KIND_LABELS.get(info.kind, info.kind),
+            PRIORITY_LABELS.get(info.priority_name, info.priority_name),
+            state,
+            progress,
+            info.started_at.strftime("%H:%M:%S") if info.started_at else "",
+        )
+
+    def _update_buttons(self) -> None:
+        selected = self.tree.selection()
+        cancellable = bool(selected) and self._states.get(selected[0]) not in FINISHED_STATES
+        self.cancel_button.config(state=tk.NORMAL if cancellable else tk.DISABLED)
+
+    def _cancel_selected(self) -> None:
+        selected = self.tree.selection()
+        if selected:
+            self.job_queue.cancel(int(selected[0]))
+
+    def close(self) -> None:
+        if self._refresh_id is not None:
+            self.dialog.after_cancel(self._refresh_id)
+            self._refresh_id = None
+        self.dialog.destroy()
+
+
+def show_job_queue_dialog(parent: tk.Tk, job_queue: JobQueue) -> JobQueueDialog:
+    """Show the job queue dialog."""
+    return JobQueueDialog(parent, job_queue)
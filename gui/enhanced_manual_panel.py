@@ -28,6 +28,10 @@ from gui.keyboard_shortcuts import KeyboardShortcutManager
 from processors.batch_limiter import BatchLimiter
 from config.configuration_manager import ConfigurationManager
 from web_utils.parallel_downloader import ParallelDownloader, DownloadResult
+from web_utils.rate_limiter import PRIORITY_INTERACTIVE, run_with_priority
+from services.job_queue import KIND_MANUAL, KIND_RETRY, get_job_queue
+from services import batch_journal as journal_states
+from services.batch_journal import JournalEntry, get_batch_journal
 from gui.company_tag_picker import CompanyTagPicker
 from config.user_preferences import get_preferences
 from gui.components.tooltip import ToolTip
@@ -94,6 +98,7 @@ class EnhancedManualPanel(ttk.Frame):
         self.is_operation_running = False
         self.stop_download_flag = False
         self.download_thread = None
+        self._download_job = None  # Job queue job of the running download
         
         # Error tracking for current session (Requirements 1.1, 1.2)
         self._error_log_exporter = ErrorLogExporter()
@@ -1199,8 +1204,12 @@ class EnhancedManualPanel(ttk.Frame):
                 filtered_count = len(declarations)
                 excluded_count = total_count - filtered_count
                 
+                # Mark rows whose PDF is already saved (from the output
+                # directory index, no stat per row)
+                existing = self._find_existing_files(declarations)
+                
                 # Update preview table
-                self.after(0, lambda: self._populate_preview_table(declarations))
+                self.after(0, lambda: self._populate_preview_table(declarations, existing))
                 
                 # Update status with filtered count (Requirements 3.1, 3.3)
                 if declarations:
@@ -1420,8 +1429,15 @@ class EnhancedManualPanel(ttk.Frame):
         self.perform_download(target_declarations)
         return
 
-    def perform_download(self, target_declarations) -> None:
-        """Execute download for a list of Declaration objects."""
+    def perform_download(self, target_declarations, resume_entries: Optional[List[JournalEntry]] = None) -> None:
+        """
+        Execute download for a list of Declaration objects.
+        
+        Args:
+            target_declarations: Declarations to download
+            resume_entries: Journal entries of the declarations when resuming
+                an interrupted batch (see resume_download)
+        """
         if not target_declarations:
             messagebox.showwarning("Cảnh báo", "Không có dữ liệu hợp lệ để tải.")
             return
@@ -1431,13 +1447,22 @@ class EnhancedManualPanel(ttk.Frame):
             return
 
         self._update_pdf_naming_service()
-        if self.barcode_retriever and hasattr(self.barcode_retriever, 'reset_method_skip_list'):
-            self.barcode_retriever.reset_method_skip_list()
-            self._log('debug', "Barcode retriever skip list reset for batch")
         naming_format = ""
         if self.file_manager and self.file_manager.pdf_naming_service:
             naming_format = self.file_manager.pdf_naming_service.naming_format
         self._log('info', f"Starting download batch: total={len(target_declarations)}, naming_format={naming_format}")
+        
+        # Journal the batch so it can be resumed after a crash
+        journal = get_batch_journal()
+        journal_entries = resume_entries
+        if journal is not None and journal_entries is None:
+            try:
+                batch_id = journal.start_batch(target_declarations, journal_states.SOURCE_MANUAL, force_redownload=True)
+                journal_entries = [JournalEntry(batch_id, seq, decl) for seq, decl in enumerate(target_declarations)]
+            except Exception as e:
+                self._log('warning', f"Download batch not journaled: {e}")
+        journal_batch_id = journal_entries[0].batch_id if journal is not None and journal_entries else None
+        
         self.stop_download_flag = False
         self.clear_session_errors()
         self._set_state("downloading")
@@ -1445,29 +1470,50 @@ class EnhancedManualPanel(ttk.Frame):
         if self._external_preview_panel:
             self._external_preview_panel.set_downloading_state(True)
 
-        def download_thread():
+        def download_job(job):
             from concurrent.futures import ThreadPoolExecutor, as_completed
             from threading import Lock
+            
+            self._download_job = job
+            job.add_cancel_callback(lambda: setattr(self, 'stop_download_flag', True))
 
             success = 0
             error = 0
             skipped = 0
+            unchanged = 0
             total = len(target_declarations)
             completed = 0
             lock = Lock()
             output_dir = self.output_var.get()
 
+            # Pool sized to the adaptive controller's bound; the controller
+            # throttles how many workers actually hit the API at once.
+            from web_utils.concurrency_controller import get_concurrency_controller
+            max_workers = get_concurrency_controller().max_limit
+            batch = None
+            interrupted = False
+
             try:
                 self.file_manager.output_directory = output_dir
+                batch = self.file_manager.open_batch()
+                if hasattr(self.barcode_retriever, 'warm_up_connections'):
+                    self.barcode_retriever.warm_up_connections(min(max_workers, total))
 
-                with ThreadPoolExecutor(max_workers=3) as executor:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
                     futures = []
-                    for decl in target_declarations:
-                        futures.append(executor.submit(self._process_single_download, decl, output_dir, lock))
+                    for position, decl in enumerate(target_declarations):
+                        entry = journal_entries[position] if journal_batch_id else None
+                        # Manual downloads are served ahead of background polling
+                        futures.append(executor.submit(
+                            run_with_priority, PRIORITY_INTERACTIVE,
+                            self._process_single_download, decl, output_dir, lock, batch, position, entry
+                        ))
 
                     for future in as_completed(futures):
                         try:
                             result_type, declaration, file_path, error_message = future.result()
+                            if result_type == 'saving':
+                                result_type, file_path, error_message = self._finish_save(declaration, file_path)
                         except Exception as e:
                             self._log('error', f"Download worker failed: {e}", exc_info=True)
                             error += 1
@@ -1475,9 +1521,12 @@ class EnhancedManualPanel(ttk.Frame):
                             continue
 
                         completed += 1
+                        job.report(completed, message=declaration.declaration_number)
 
-                        if result_type == 'success':
+                        if result_type in ('success', 'unchanged'):
                             success += 1
+                            if result_type == 'unchanged':
+                                unchanged += 1
                             self.after(0, lambda dn=declaration.declaration_number, fp=file_path:
                                 self._update_download_result(dn, True, file_path=fp))
                         elif result_type == 'skipped':
@@ -1500,47 +1549,204 @@ class EnhancedManualPanel(ttk.Frame):
                 remaining = total - completed
                 if remaining > 0:
                     error += remaining
+                interrupted = True
             finally:
+                if journal_batch_id:
+                    try:
+                        self.file_manager.file_writer.flush()  # Queued writes still journal their state
+                        if interrupted:
+                            journal.release(journal_batch_id)  # Offered for resuming at the next start
+                        else:
+                            journal.finish_batch(
+                                journal_batch_id,
+                                journal_states.CANCELLED if self.stop_download_flag else journal_states.COMPLETED
+                            )
+                    except Exception as e:
+                        self._log('warning', f"Failed to finish journaled batch: {e}")
+                if batch is not None:
+                    try:
+                        self.file_manager.file_writer.flush()  # Queued writes still add to the batch
+                        batch_path = batch.close()
+                        if batch_path:
+                            self._log('info', f"Batch PDF saved: {batch_path}")
+                    except Exception as e:
+                        self._log('error', f"Failed to write batch PDF: {e}", exc_info=True)
                 # Always restore UI state, even if the background thread errors.
-                self.after(0, lambda: self._show_download_result_popup(success, error, skipped, total))
+                if unchanged:
+                    self._log('info', f"{unchanged} of {success} downloaded barcodes unchanged, files not rewritten")
+                self.after(0, lambda: self._show_download_result_popup(success, error, skipped, total, unchanged))
                 if self.on_download_complete:
                     self.after(0, lambda sc=success, ec=error: self.on_download_complete(sc, ec))
                 self.after(0, lambda: self._set_state("complete"))
                 if self._external_preview_panel:
                     self.after(0, lambda: self._external_preview_panel.set_downloading_state(False))
+                self._download_job = None
+
+        tax_codes = {decl.tax_code for decl in target_declarations}
+
+        def download_thread():
+            # User downloads are interactive jobs: they start at once and
+            # background polling pauses for them
+            get_job_queue(self.logger).run(
+                download_job, f"Tải {len(target_declarations)} tờ khai", KIND_MANUAL, PRIORITY_INTERACTIVE,
+                company=next(iter(tax_codes)) if len(tax_codes) == 1 else None, total=len(target_declarations)
+            )
 
         import threading
         t = threading.Thread(target=download_thread, daemon=True)
         t.start()
 
-    def _process_single_download(self, declaration, output_dir, lock):
-        """Helper for list download"""
+    def _process_single_download(self, declaration, output_dir, lock, batch=None, position=None, entry=None):
+        """
+        Helper for list download (also adds the PDF to the batch file, if any)
+        
+        With a journal entry, each step is journaled, and a resumed
+        declaration continues from its last journaled step.
+        """
+        import os
+        journal = get_batch_journal() if entry is not None else None
+        
+        def record(state, **values):
+            if journal is not None:
+                journal.record(entry.batch_id, entry.seq, state, **values)
+        
         try:
             if self.stop_download_flag:
                 self._log('info', f"Skipping download for {declaration.id} (stop flag set)")
                 return 'skipped', declaration, None, 'Stopped'
             
-            self._log('info', f"Downloading barcode for {declaration.id}")
-            pdf_content = self.barcode_retriever.retrieve_barcode(declaration)
-            if pdf_content:
-                file_path = self.file_manager.save_barcode(declaration, pdf_content, overwrite=True)
+            if journal is not None and entry.state == journal_states.WRITTEN and entry.file_path \
+                    and os.path.exists(entry.file_path):
+                # Saved before the interruption: only the tracking row is missing
+                with open(entry.file_path, 'rb') as f:
+                    pdf_content = f.read()
+                if batch is not None:
+                    batch.add(declaration, pdf_content, source_path=entry.file_path, position=position)
+                self.tracking_db.add_processed(declaration, entry.file_path, content_hash=entry.content_hash)
+                record(journal_states.TRACKED)
+                return 'success', declaration, entry.file_path, None
+            
+            file_path = self.file_manager.locate(declaration, verify=True)
+            if journal is not None and entry.has_payload:
+                self._log('info', f"Using journaled barcode data for {declaration.id}")
+                fetched = entry.to_result()
+            else:
+                self._log('info', f"Downloading barcode for {declaration.id}")
+                known_hash = None
                 if file_path:
-                    self.tracking_db.add_processed(declaration, file_path)
+                    known_hash = self.tracking_db.get_content_hash(declaration)
+                fetched = self.barcode_retriever.fetch_barcode(declaration, known_hash, render=False)
+            if fetched.unchanged:
+                # Same payload as the saved PDF: leave the file (and its mtime) alone
+                self._log('info', f"Barcode for {declaration.id} unchanged, file not rewritten")
+                record(journal_states.TRACKED, file_path=file_path)
+                if batch is not None:
+                    with open(file_path, 'rb') as f:
+                        batch.add(declaration, f.read(), source_path=file_path, position=position)
+                return 'unchanged', declaration, file_path, None
+            if fetched.status == 'success':
+                record(journal_states.FETCHED, content_hash=fetched.content_hash,
+                       info=fetched.info, pdf_content=fetched.pdf_content)
+            pdf_content = self.barcode_retriever.render_barcode(fetched) if fetched.needs_render \
+                else fetched.pdf_content
+            if pdf_content:
+                record(journal_states.RENDERED)
+                
+                def saved(file_path):
+                    record(journal_states.WRITTEN, file_path=file_path)
+                    if batch is not None:
+                        batch.add(declaration, pdf_content, source_path=file_path, position=position)
+                    self.tracking_db.add_processed(declaration, file_path, content_hash=fetched.content_hash)
+                    record(journal_states.TRACKED)
                     try:
                         self.tracking_db.save_recent_company(declaration.tax_code)
                     except: pass
-                    return 'success', declaration, file_path, None
-                else:
-                    self._log('warning', f"Failed to save barcode PDF for {declaration.id}")
-                    return 'skipped', declaration, None, 'File could not be saved (skipped)'
+                
+                # Written on the file writer's I/O threads; this thread goes
+                # back to the network (the caller waits via _finish_save)
+                write = self.file_manager.save_barcode_async(declaration, pdf_content, overwrite=True, then=saved)
+                return 'saving', declaration, write, None
             else:
                 self._log('warning', f"Barcode retrieval returned no content for {declaration.id}")
+                record(journal_states.FAILED, error='Failed to retrieve barcode from API')
                 return 'error', declaration, None, 'Failed to retrieve barcode from API'
         except Exception as e:
             self._log('error', f"Download error for {getattr(declaration, 'id', 'unknown')}: {e}", exc_info=True)
+            record(journal_states.FAILED, error=str(e))
             return 'error', declaration, None, str(e)
     
-    def _show_download_result_popup(self, success_count: int, error_count: int, skipped_count: int, total: int) -> None:
+    def _finish_save(self, declaration, write):
+        """
+        Wait for a PDF queued by _process_single_download to be written.
+        
+        Returns:
+            Tuple of (result_type, file_path, error_message)
+        """
+        try:
+            file_path = write.result()
+        except Exception as e:
+            self._log('error', f"Failed to save barcode PDF for {declaration.id}: {e}", exc_info=True)
+            return 'error', None, str(e)
+        if not file_path:
+            self._log('warning', f"Failed to save barcode PDF for {declaration.id}")
+            return 'skipped', None, 'File could not be saved (skipped)'
+        return 'success', file_path, None
+
+    def offer_resume(self) -> None:
+        """
+        Offer to resume the last manual download batch interrupted by a
+        crash or shutdown (called once at start-up).
+        """
+        journal = get_batch_journal()
+        if journal is None:
+            return
+        try:
+            batches = journal.unfinished_batches(journal_states.SOURCE_MANUAL)
+        except Exception as e:
+            self._log('warning', f"Failed to read batch journal: {e}")
+            return
+        if not batches:
+            return
+        latest = batches[-1]
+        for stale in batches[:-1]:
+            journal.finish_batch(stale.batch_id, journal_states.ABANDONED)
+        if latest.pending == 0:
+            journal.finish_batch(latest.batch_id, journal_states.COMPLETED)
+            return
+
+        resume = messagebox.askyesno(
+            "Tiếp tục tải",
+            f"Lần tải lúc {latest.created_at:%H:%M %d/%m/%Y} bị gián đoạn, "
+            f"còn {latest.pending}/{latest.total} tờ khai chưa xong.\n\n"
+            f"Tiếp tục tải các tờ khai còn lại?"
+        )
+        if resume:
+            self.resume_download(latest.batch_id)
+        else:
+            journal.finish_batch(latest.batch_id, journal_states.ABANDONED)
+
+    def resume_download(self, batch_id: str) -> None:
+        """
+        Continue an interrupted manual download batch.
+
+        Declarations already saved and tracked are skipped; fetched ones
+        are not queried again.
+
+        Args:
+            batch_id: Journaled batch identifier
+        """
+        journal = get_batch_journal()
+        if journal is None or not journal.claim(batch_id):
+            return
+        entries = journal.pending_entries(batch_id)
+        if not entries:
+            journal.finish_batch(batch_id, journal_states.COMPLETED)
+            return
+        self._log('info', f"Resuming download batch {batch_id}: {len(entries)} declarations left")
+        self.perform_download([entry.declaration for entry in entries], resume_entries=entries)
+
+    def _show_download_result_popup(self, success_count: int, error_count: int, skipped_count: int, total: int,
+                                    unchanged_count: int = 0) -> None:
         """
         Show download result popup with option to open output folder
         
@@ -1549,6 +1755,7 @@ class EnhancedManualPanel(ttk.Frame):
             error_count: Number of failed downloads
             skipped_count: Number of skipped downloads
             total: Total number of declarations
+            unchanged_count: Successful downloads whose file was already up to date
         """
         import subprocess
         import platform
@@ -1607,6 +1814,8 @@ class EnhancedManualPanel(ttk.Frame):
             results_text = f"Tổng số tờ khai: {total}\n"
             if success_count > 0:
                 results_text += f"✅ Thành công: {success_count}\n"
+            if unchanged_count > 0:
+                results_text += f"🔁 Không thay đổi: {unchanged_count}\n"
             if error_count > 0:
                 results_text += f"❌ Lỗi: {error_count}\n"
             if skipped_count > 0:
@@ -1719,6 +1928,8 @@ class EnhancedManualPanel(ttk.Frame):
             
             # Set stop flag
             self.stop_download_flag = True
+            if self._download_job is not None:
+                self._download_job.cancel()
             
             # Update UI
             self.stop_button.config(state=tk.DISABLED)
@@ -1848,9 +2059,6 @@ class EnhancedManualPanel(ttk.Frame):
                 return
             
             self._log('info', f"Retrying download for {len(failed_declarations)} failed declarations")
-            if self.barcode_retriever and hasattr(self.barcode_retriever, 'reset_method_skip_list'):
-                self.barcode_retriever.reset_method_skip_list()
-                self._log('debug', "Barcode retriever skip list reset for retry batch")
             
             # Reset stop flag
             self.stop_download_flag = False
@@ -1858,14 +2066,17 @@ class EnhancedManualPanel(ttk.Frame):
             # Set state to downloading
             self._set_state("downloading")
             
-            # Run retry in background thread
-            def retry_in_thread():
+            # Run retry in background thread (as an interactive job)
+            def retry_job(job):
                 success_count = 0
                 error_count = 0
                 total = len(failed_declarations)
+                self._download_job = job
+                job.add_cancel_callback(lambda: setattr(self, 'stop_download_flag', True))
                 
                 try:
                     for i, declaration in enumerate(failed_declarations):
+                        job.report(i, message=declaration.declaration_number)
                         # Check stop flag
                         if self.stop_download_flag:
                             self._log('info', f"Retry stopped by user at {i}/{total}")
@@ -1955,6 +2166,13 @@ class EnhancedManualPanel(ttk.Frame):
                     # Reset state
                     self.after(0, lambda: self._set_state("complete"))
                     self.is_operation_running = False
+                    self._download_job = None
+            
+            def retry_in_thread():
+                get_job_queue(self.logger).run(
+                    retry_job, f"Tải lại {len(failed_declarations)} tờ khai lỗi", KIND_RETRY,
+                    PRIORITY_INTERACTIVE, total=len(failed_declarations)
+                )
             
             # Start retry thread
             self.is_operation_running = True
@@ -2524,8 +2742,40 @@ class EnhancedManualPanel(ttk.Frame):
         except Exception as e:
             self._log('warning', f"Failed to save recent company: {e}")
     
-    def _populate_preview_table(self, declarations: List[Declaration]) -> None:
-        """Populate preview table with declarations and alternating row colors (Requirement 4.8)"""
+    def _find_existing_files(self, declarations: List[Declaration]) -> Dict[str, str]:
+        """
+        Find the saved PDFs of declarations in the output directory.
+        
+        Looks under every naming format in the file manager's directory
+        index, so no file system calls are made per declaration.
+        
+        Returns:
+            Dict of declaration number to file path
+        """
+        existing = {}
+        try:
+            output_dir = self.output_var.get()
+            if output_dir:
+                self.file_manager.output_directory = output_dir
+            for decl in declarations:
+                file_path = self.file_manager.find_existing(decl)
+                if file_path:
+                    existing[decl.declaration_number] = file_path
+        except Exception as e:
+            self._log('warning', f"Could not check for saved PDFs: {e}")
+        return existing
+    
+    def _populate_preview_table(self, declarations: List[Declaration],
+                                existing_files: Optional[Dict[str, str]] = None) -> None:
+        """
+        Populate preview table with declarations and alternating row colors (Requirement 4.8)
+        
+        Args:
+            declarations: Declarations to show
+            existing_files: Declaration number to saved PDF path; these rows
+                are marked as downloaded and open their file on double-click
+        """
+        existing_files = existing_files or {}
         # Build items list for both internal and external preview
         preview_items = []
         
@@ -2558,7 +2808,7 @@ class EnhancedManualPanel(ttk.Frame):
                 'declaration_type': declaration_type,
                 'bill_of_lading': bill_of_lading,
                 'invoice_number': invoice_number,
-                'result': '',
+                'result': '✔' if decl.declaration_number in existing_files else '',
                 # Include for Add to Tracking feature
                 'customs_office_code': decl.customs_office_code if hasattr(decl, 'customs_office_code') else '',
                 'company_name': decl.company_name if hasattr(decl, 'company_name') else ''
@@ -2602,12 +2852,14 @@ class EnhancedManualPanel(ttk.Frame):
                     item_data['invoice_number'],
                     item_data['result']
                 ),
-                tags=(row_tag,)
+                tags=(row_tag, 'success_result') if item_data['result'] else (row_tag,)
             )
         
         # Store items in controller for filtering/sorting
         if hasattr(self, '_preview_table_controller'):
             self._preview_table_controller.store_items(preview_items)
+            for declaration_number, file_path in existing_files.items():
+                self._preview_table_controller.set_file_path(declaration_number, file_path)
             # Reset filter to "All" (only if filter_var exists)
             if hasattr(self, 'filter_var'):
                 self.filter_var.set("Tất cả")
@@ -0,0 +1,277 @@
+"""
+Customs Barcode Automation - Headless Service
+
+Runs the automation without the Tkinter GUI, e.g. as a background service
+on a server next to the ECUS5 database:
+
+    python -m headless serve                 # poll, download and check clearance until stopped
+    python -m headless run-once --days-back 3
+    python -m headless resume [BATCH_ID]     # continue an interrupted download batch
+
+Only the non-GUI components are imported (see core/bootstrap.py), so no
+display or tkinter is needed; PIL is still required, since the PDF
+renderer uses it for the barcode images. Progress is logged as structured
+records; --log-format json writes one JSON object per line.
+"""
+
+import argparse
+import multiprocessing
+import signal
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config.configuration_manager import ConfigurationError
+from config.user_preferences import get_preferences
+from core.bootstrap import AppComponents, build_components, load_configuration, shutdown_components
+from logging_system.logger import JsonFormatter, Logger
+from models.declaration_models import OperationMode, WorkflowResult
+from services.batch_journal import get_batch_journal
+from services.clearance_checker import ClearanceChecker
+from services.job_queue import get_job_queue
+from services.job_scheduler import JobScheduler
+from services.workflow_events import WorkflowEvent, WorkflowEventType
+from services.workflow_service import WorkflowService
+
+
+MAINTENANCE_INTERVAL_SECONDS = 24 * 3600
+
+
+class JobStateLogger:
+    """Logs each state change of the job queue's jobs as a structured record."""
+
+    def __init__(self, logger: Logger):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._states: Dict[int, str] = {}
+
+    def __call__(self) -> None:
+        changed = []
+        with self._lock:
+            for info in get_job_queue().jobs():
+                if self._states.get(info.job_id) != info.state:
+                    self._states[info.job_id] = info.state
+                    changed.append(info)
+        for info in changed:
+            self.logger.info(
+                f"Job {info.job_id} {info.state}: {info.name}",
+                extra={
+                    "event": "job_state", "job_id": info.job_id, "kind": info.kind,
+                    "priority": info.priority_name, "state": info.state,
+                    "done": info.done, "total": info.total,
+                    "paused_seconds": info.paused_seconds, "error": info.error,
+                }
+            )
+
+
+class WorkflowProgressLogger:
+    """Logs WorkflowService events as structured records (progress every 10%)."""
+
+    def __init__(self, logger: Logger):
+        self.logger = logger
+        self._last_step = -1
+
+    def __call__(self, event: WorkflowEvent) -> None:
+        data = dict(event.data or {})
+        data.pop("declaration_id", None)  # Kept out of structured fields (not sanitized)
+        extra = {"event": f"workflow_{event.event_type.value}", **data}
+        if event.event_type == WorkflowEventType.PROGRESS:
+            step = data.get("percent", 0) // 10
+            if step == self._last_step and data.get("current") != data.get("total"):
+                return
+            self._last_step = step
+        elif event.event_type == WorkflowEventType.DECLARATION_PROCESSED:
+            return
+        if event.event_type == WorkflowEventType.ERROR:
+            self.logger.warning(event.message, extra=extra)
+        else:
+            self.logger.info(event.message, extra=extra)
+
+
+def _log_result(logger: Logger, result: WorkflowResult) -> None:
+    logger.info(
+        f"Finished: {result.success_count} success, {result.error_count} errors",
+        extra={
+            "event": "run_completed",
+            "eligible": result.total_eligible,
+            "success": result.success_count,
+            "unchanged": result.unchanged_count,
+            "errors": result.error_count,
+            "duration_seconds": result.duration.total_seconds() if result.duration else 0,
+        }
+    )
+
+
+def _log_status(components: AppComponents) -> None:
+    """Periodic status record: job queue and last scheduler run."""
+    stats = get_job_queue().get_stats()
+    components.logger.info(
+        f"Service status: {stats['running']} jobs running, {stats['paused']} paused, {stats['queued']} queued",
+        extra={
+            "event": "status",
+            "jobs": stats,
+            "pipeline": components.scheduler.pipeline_stats,
+        }
+    )
+
+
+def _maintenance(components: AppComponents) -> None:
+    """Daily cleanup of old tracking records and finished journal batches."""
+    try:
+        components.tracking_db.cleanup_old_records(get_preferences().retention_days)
+    except Exception as e:
+        components.logger.warning(f"Tracking cleanup failed: {e}")
+    journal = get_batch_journal()
+    if journal:
+        pruned = journal.prune(components.barcode_config.batch_journal_keep_days)
+        if pruned:
+            components.logger.info(f"Pruned {pruned} finished batches from the batch journal")
+
+
+def _workflow_service(components: AppComponents) -> WorkflowService:
+    service = WorkflowService(
+        ecus_connector=components.ecus_connector,
+        tracking_db=components.tracking_db,
+        processor=components.processor,
+        barcode_retriever=components.barcode_retriever,
+        file_manager=components.file_manager,
+        logger=components.logger
+    )
+    service.add_event_listener(WorkflowProgressLogger(components.logger))
+    return service
+
+
+def serve(components: AppComponents, status_interval: int) -> int:
+    """
+    Run until SIGINT/SIGTERM: the scheduler polls ECUS5 and downloads (in
+    automatic mode), and the JobScheduler runs clearance checks, status
+    records and daily maintenance.
+    """
+    logger = components.logger
+    stop = threading.Event()
+
+    def request_stop(sig, frame):
+        logger.info(f"Received signal {sig}, shutting down")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    prefs = get_preferences()
+    clearance_checker = ClearanceChecker(
+        tracking_db=components.tracking_db,
+        ecus_connector=components.ecus_connector,
+        notification_manager=None,
+        logger=logger
+    )
+    job_scheduler = JobScheduler(logger)
+    if prefs.auto_check_enabled:
+        job_scheduler.add_job("clearance_check", clearance_checker.check_pending,
+                              max(1, prefs.auto_check_interval) * 60)
+    else:
+        logger.info("Automatic clearance checks are disabled in the preferences")
+    if status_interval > 0:
+        job_scheduler.add_job("status", _log_status, status_interval, args=(components,))
+    job_scheduler.add_job("maintenance", _maintenance, MAINTENANCE_INTERVAL_SECONDS, args=(components,))
+
+    scheduler = components.scheduler
+    if scheduler.get_operation_mode() != OperationMode.AUTOMATIC:
+        logger.warning("Operation mode is manual: the service does not poll ECUS5 "
+                       "(set operation_mode = automatic in config.ini)")
+    scheduler.start()
+    job_scheduler.start()
+    logger.info("Headless service started", extra={
+        "event": "service_started",
+        "operation_mode": scheduler.get_operation_mode().value,
+        "polling_interval": components.config_manager.get_polling_interval(),
+        "clearance_check_minutes": prefs.auto_check_interval if prefs.auto_check_enabled else 0,
+    })
+
+    while not stop.wait(1):
+        pass
+
+    clearance_checker.stop_current_check()
+    for info in get_job_queue().jobs(include_finished=False):
+        get_job_queue().cancel(info.job_id)
+    job_scheduler.stop()
+    logger.info("Headless service stopped", extra={"event": "service_stopped"})
+    return 0
+
+
+def run_once(components: AppComponents, days_back: int, tax_codes: Optional[List[str]],
+             force_redownload: bool) -> int:
+    """Download the new declarations once; exit code 1 if any failed."""
+    result = _workflow_service(components).execute(
+        days_back=days_back, tax_codes=tax_codes, force_redownload=force_redownload
+    )
+    _log_result(components.logger, result)
+    return 1 if result.error_count else 0
+
+
+def resume(components: AppComponents, batch_id: Optional[str]) -> int:
+    """Continue an interrupted download batch; exit code 1 if any failed."""
+    result = _workflow_service(components).resume(batch_id)
+    _log_result(components.logger, result)
+    return 1 if result.error_count else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m headless", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--config", default="config.ini", help="Configuration file (default: config.ini)")
+    parser.add_argument("--log-format", choices=("text", "json"), default="text",
+                        help="Log record format for the console and the log file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run as a service until stopped")
+    serve_parser.add_argument("--status-interval", type=int, default=300,
+                              help="Seconds between status records (0: none)")
+
+    run_parser = commands.add_parser("run-once", help="Download the new declarations once and exit")
+    run_parser.add_argument("--days-back", type=int, default=7)
+    run_parser.add_argument("--tax-code", action="append", dest="tax_codes",
+                            help="Only this company (repeatable)")
+    run_parser.add_argument("--force", action="store_true", help="Download again even if already processed")
+
+    resume_parser = commands.add_parser("resume", help="Continue an interrupted download batch")
+    resume_parser.add_argument("batch_id", nargs="?", help="Batch to resume (default: the most recent)")
+    return parser.parse_args(argv)
+
+
+def start(args: argparse.Namespace) -> Tuple[Optional[AppComponents], int]:
+    """Load the configuration and build the components (exit code 1 on failure)."""
+    try:
+        config_manager = load_configuration(args.config)
+    except (FileNotFoundError, ConfigurationError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return None, 1
+    logger = Logger(config_manager.get_logging_config())
+    if args.log_format == "json":
+        logger.set_formatter(JsonFormatter())
+    components = build_components(config_manager, logger)
+    get_job_queue(logger).add_listener(JobStateLogger(logger))
+    return components, 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    components, exit_code = start(args)
+    if components is None:
+        return exit_code
+    logger = components.logger
+    try:
+        if args.command == "serve":
+            return serve(components, args.status_interval)
+        if args.command == "run-once":
+            return run_once(components, args.days_back, args.tax_codes, args.force)
+        return resume(components, args.batch_id)
+    except Exception as e:
+        logger.critical(f"Headless {args.command} failed: {e}", exc_info=True)
+        return 1
+    finally:
+        shutdown_components(components)
+
+
+if __name__ == "__main__":
+    # PDF render worker processes are spawned from the frozen executable
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -4,6 +4,6 @@ Logging System Module
 This module provides centralized logging functionality with file rotation support.
 """
 
-from .logger import Logger
+from .logger import JsonFormatter, Logger
 
-__all__ = ['Logger']
+__all__ = ['JsonFormatter', 'Logger']
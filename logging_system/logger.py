@@ -5,6 +5,7 @@ This module provides a centralized logging system with file and console handlers
 log rotation, and support for multiple log levels with sensitive data protection.
 """
 
+import json
 import logging
 import os
 import re
@@ -41,6 +42,33 @@ class SensitiveDataFilter(logging.Filter):
         return True
 
 
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line (for log collectors).
+    
+    Fields passed with extra={...} become keys of the object, so
+    progress can be logged as data: logger.info("Batch done",
+    extra={"event": "batch_completed", "success": 10}).
+    """
+    
+    # Attributes every LogRecord has; anything else came from extra=
+    _RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
 class Logger:
     """
     Centralized logging system with file rotation and console output.
@@ -115,6 +143,17 @@ class Logger:
         
         self._logger.addHandler(console_handler)
     
+    def set_formatter(self, formatter: logging.Formatter) -> None:
+        """
+        Use another formatter (e.g. JsonFormatter) for all handlers
+        
+        Args:
+            formatter: Formatter for file and console output
+        """
+        self._formatter = formatter
+        for handler in self._logger.handlers:
+            handler.setFormatter(formatter)
+    
     def debug(self, message: str, **kwargs) -> None:
         """
         Log a debug message
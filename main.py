@@ -6,6 +6,7 @@ from the ECUS5 database and retrieving barcodes from the General Department of C
 """
 
 import sys
+import multiprocessing
 import signal
 import tkinter as tk
 from tkinter import messagebox
@@ -17,22 +18,13 @@ import threading
 from core.version import APP_VERSION
 
 # Import configuration and logging
-from config.configuration_manager import ConfigurationManager, ConfigurationError
+from config.configuration_manager import ConfigurationError
 from logging_system.logger import Logger
 
-# Import data layer components
-from database.ecus_connector import EcusDataConnector
-from database.tracking_database import TrackingDatabase
-
-# Import service layer components
-from processors.declaration_processor import DeclarationProcessor
-from web_utils.barcode_retriever import BarcodeRetriever
-from file_utils.file_manager import FileManager
-from file_utils.pdf_naming_service import PdfNamingService
-
-# Import application layer components
-from scheduler.scheduler import Scheduler
-from error_handling.error_handler import ErrorHandler
+# Import the non-GUI components (shared with the headless service)
+from core.bootstrap import build_components, load_configuration, shutdown_components
+from file_utils.file_writer import get_file_writer
+from services.batch_journal import get_batch_journal
 
 # Import GUI
 from gui.customs_gui import CustomsAutomationGUI
@@ -51,6 +43,11 @@ def signal_handler(sig, frame):
             print("Stopping scheduler...")
             _app.scheduler.stop()
         
+        print("Finishing file writes...")
+        get_file_writer().shutdown(wait=True)
+        if get_batch_journal():
+            get_batch_journal().close()
+        
         if _app.ecus_connector:
             print("Closing database connection...")
             _app.ecus_connector.disconnect()
@@ -77,50 +74,13 @@ def main():
         print("Loading configuration...")
         config_path = "config.ini"
         
-        if not os.path.exists(config_path):
-            # v1.5.4: Auto-create config.ini from sample for first-time users
-            sample_candidates = [
-                os.path.join(os.path.dirname(config_path), 'config.ini.sample'),
-            ]
-            # PyInstaller frozen mode: check _internal/ and executable directory
-            if getattr(sys, 'frozen', False):
-                exe_dir = os.path.dirname(sys.executable)
-                sample_candidates.insert(0, os.path.join(exe_dir, 'config.ini.sample'))
-                internal_dir = os.path.join(exe_dir, '_internal')
-                sample_candidates.insert(1, os.path.join(internal_dir, 'config.ini.sample'))
-            
-            sample_found = None
-            for candidate in sample_candidates:
-                if os.path.exists(candidate):
-                    sample_found = candidate
-                    break
-            
-            if sample_found:
-                import shutil
-                shutil.copy2(sample_found, config_path)
-                print(f"INFO: Created config.ini from {sample_found}")
-            else:
-                print(f"ERROR: Configuration file not found: {config_path}")
-                print("Please create a config.ini file based on config.ini.sample")
-                sys.exit(1)
-        
         try:
-            config_manager = ConfigurationManager(config_path)
-
-            last_run_version = config_manager.get('Update', 'last_run_version', fallback='')
-            if last_run_version != APP_VERSION:
-                sample_path = os.path.join(os.path.dirname(config_path), 'config.ini.sample')
-                if not os.path.exists(sample_path):
-                    app_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.getcwd()
-                    sample_path = os.path.join(app_dir, 'config.ini.sample')
-
-                merged = config_manager.merge_missing_from_sample(sample_path)
-                config_manager.set('Update', 'last_run_version', APP_VERSION)
-                if merged:
-                    print("INFO: Config merged from sample after update")
-
-            config_manager.validate()
+            config_manager = load_configuration(config_path)
             print("OK Configuration loaded successfully")
+        except FileNotFoundError:
+            print(f"ERROR: Configuration file not found: {config_path}")
+            print("Please create a config.ini file based on config.ini.sample")
+            sys.exit(1)
         except ConfigurationError as e:
             print(f"ERROR: Configuration validation failed:")
             print(f"  {e}")
@@ -136,87 +96,18 @@ def main():
         logger.info("=" * 60)
         print("OK Logging system initialized")
         
-        # 3. Initialize Database Connector
-        print("Initializing database connector...")
-        db_config = config_manager.get_database_config()
-        ecus_connector = EcusDataConnector(db_config, logger)
-        ecus_connector_instance = ecus_connector
-        
-        # Try to connect to database (don't exit if failed - allow GUI to start)
-        db_connected = False
-        try:
-            db_connected = ecus_connector.connect()
-        except Exception as e:
-            logger.warning(f"Database connection attempt failed: {e}")
-        
-        if db_connected:
-            logger.info("Database connection established")
-            print("OK Database connector initialized")
-        else:
-            logger.warning("Failed to connect to ECUS5 database - application will start without database connection")
-            print("WARNING: Failed to connect to ECUS5 database")
+        # 3-9. Initialize database connector, tracking database, processor,
+        # barcode retriever, file manager, error handler and scheduler
+        components = build_components(config_manager, logger, echo=print)
+        ecus_connector = components.ecus_connector
+        tracking_db = components.tracking_db
+        barcode_retriever = components.barcode_retriever
+        file_manager = components.file_manager
+        scheduler = components.scheduler
+        if not components.db_connected:
             print("  Application will start, but you need to configure database connection.")
             print("  Use the 'DB Config' button in the application to set up database.")
         
-        # 4. Initialize Tracking Database
-        print("Initializing tracking database...")
-        tracking_db_path = "data/tracking.db"
-        tracking_db = TrackingDatabase(tracking_db_path, logger)
-        logger.info("Tracking database initialized")
-        print("OK Tracking database initialized")
-        
-        # 5. Initialize Declaration Processor
-        print("Initializing declaration processor...")
-        processor = DeclarationProcessor()
-        logger.info("Declaration processor initialized")
-        print("OK Declaration processor initialized")
-        
-        # 6. Initialize Barcode Retriever
-        print("Initializing barcode retriever...")
-        barcode_config = config_manager.get_barcode_service_config()
-        barcode_retriever = BarcodeRetriever(
-            barcode_config, 
-            logger,
-            retrieval_method=barcode_config.retrieval_method
-        )
-        logger.info(f"Barcode retriever initialized with method: {barcode_config.retrieval_method}")
-        print("OK Barcode retriever initialized")
-        
-        # 7. Initialize File Manager with PDF Naming Service
-        print("Initializing file manager...")
-        output_path = config_manager.get_output_path()
-        pdf_naming_format = config_manager.get_pdf_naming_format()
-        pdf_naming_service = PdfNamingService(pdf_naming_format)
-        file_manager = FileManager(output_path, pdf_naming_service)
-        file_manager.ensure_directory_exists()
-        logger.info(f"File manager initialized with output path: {output_path}, naming format: {pdf_naming_format}")
-        print("OK File manager initialized")
-        
-        # 8. Initialize Error Handler
-        print("Initializing error handler...")
-        error_handler = ErrorHandler(
-            max_retries=barcode_config.max_retries,
-            base_delay=barcode_config.retry_delay,
-            logger=logger.get_logger()
-        )
-        logger.info("Error handler initialized")
-        print("OK Error handler initialized")
-        
-        # 9. Initialize Scheduler
-        print("Initializing scheduler...")
-        scheduler = Scheduler(
-            config_manager=config_manager,
-            ecus_connector=ecus_connector,
-            tracking_db=tracking_db,
-            processor=processor,
-            barcode_retriever=barcode_retriever,
-            file_manager=file_manager,
-            logger=logger
-        )
-        scheduler_instance = scheduler
-        logger.info("Scheduler initialized")
-        print("OK Scheduler initialized")
-        
         # 10. Initialize GUI
         print("Initializing GUI...")
         root = tk.Tk()
@@ -227,13 +118,12 @@ def main():
             if scheduler.is_running():
                 if messagebox.askokcancel("Quit", "Scheduler is running. Do you want to stop it and quit?"):
                     logger.info("User requested application shutdown")
-                    scheduler.stop()
-                    ecus_connector.disconnect()
+                    shutdown_components(components)
                     logger.info("Application shutdown complete")
                     root.destroy()
             else:
                 logger.info("Application shutdown")
-                ecus_connector.disconnect()
+                shutdown_components(components)
                 root.destroy()
         
         root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -252,6 +142,10 @@ def main():
         logger.info("GUI initialized")
         print("OK GUI initialized")
         
+        # Offer to resume a manual download interrupted by a crash
+        if get_batch_journal() and getattr(app, 'enhanced_manual_panel', None):
+            root.after(1500, app.enhanced_manual_panel.offer_resume)
+        
         # 11. Check for updates in background
         def check_updates_background():
             """Check for updates in background thread."""
@@ -425,6 +319,8 @@ def main():
         logger.info("GUI closed, cleaning up...")
         if scheduler.is_running():
             scheduler.stop()
+        if get_batch_journal():
+            get_batch_journal().close()
         ecus_connector.disconnect()
         logger.info("Application terminated normally")
         
@@ -442,4 +338,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # PDF render worker processes are spawned from the frozen executable
+    multiprocessing.freeze_support()
     main()
@@ -86,6 +86,67 @@ class BarcodeServiceConfig:
     retrieval_method: str = "auto"
     # V1.1: PDF naming format - 'tax_code', 'invoice', or 'bill_of_lading'
     pdf_naming_format: str = "tax_code"
+    # Sort PDFs into subdirectories: flat, year_month, tax_code or
+    # tax_code_year_month (move existing files with file_utils.output_migrator)
+    output_layout: str = "flat"
+    # Adaptive (AIMD) concurrency bounds for QRCode API calls
+    api_min_concurrency: int = 1
+    api_max_concurrency: int = 12
+    api_latency_target: float = 2.0  # Seconds; faster responses let concurrency grow
+    api_decrease_cooldown: float = 2.0  # Seconds between two overload back-offs
+    # Persistent QRCode API response cache (cleared results are reused for days)
+    api_cache_enabled: bool = True
+    api_cache_max_entries: int = 5000
+    api_cache_pending_ttl_minutes: int = 2
+    # Process-wide token-bucket limit on requests to customs (0 = unlimited)
+    rate_limit_per_second: float = 5.0
+    rate_limit_burst: int = 5
+    # AUTO-mode method router: probe idle methods / retry failed methods (seconds)
+    method_probe_interval: float = 300.0
+    method_recovery_timeout: float = 120.0
+    # Hedged API requests: re-send requests slower than this latency percentile
+    api_hedge_enabled: bool = False
+    api_hedge_percentile: float = 95.0
+    api_hedge_min_delay: float = 1.0  # Seconds
+    api_hedge_max_ratio: float = 0.1  # At most 10% extra requests
+    # Record scrubbed API request/response pairs here for load-test replay ("" = off)
+    api_capture_dir: str = ""
+    # Web fallback browser pool: recycle a driver after N sessions or above
+    # a memory threshold in MB (0 = no memory limit)
+    web_driver_max_uses: int = 50
+    web_driver_max_memory_mb: int = 0
+    # Render PDFs in N worker processes (0 = in the download threads,
+    # -1 = one per CPU core)
+    pdf_render_workers: int = 0
+    # PDF size: downsample QR images above this DPI (0 = keep), zlib level
+    # for image streams (1-9), Flate-compress page content streams
+    pdf_qr_image_max_dpi: int = 0
+    pdf_image_compression_level: int = 6
+    pdf_page_compression: bool = True
+    # Also combine each download batch into one PDF with bookmarks, a table
+    # of contents and a CSV index (requires pypdf)
+    batch_pdf_output: bool = False
+    # Write PDFs atomically on N I/O threads (0 = in the download threads);
+    # submitters wait when file_writer_queue_size writes are pending
+    file_writer_threads: int = 2
+    file_writer_queue_size: int = 64
+    # Rescan the output directory index every N seconds to see files other
+    # programs added or removed (0 = only our own writes update it)
+    output_index_rescan_seconds: int = 0
+    # Workflow pipeline: threads per stage (fetch, render, write), items
+    # queued in front of each stage, declarations per tracking transaction
+    pipeline_fetch_workers: int = 4
+    pipeline_render_workers: int = 2
+    pipeline_write_workers: int = 2
+    pipeline_queue_size: int = 16
+    pipeline_track_batch_size: int = 50
+    # Journal download batches so an interrupted batch can be resumed;
+    # finished batches are deleted after batch_journal_keep_days days
+    batch_journal_enabled: bool = True
+    batch_journal_keep_days: int = 7
+    # Job queue: scheduled runs, retries and clearance checks running at
+    # once (interactive downloads always start immediately)
+    job_queue_max_running: int = 2
 
 
 @dataclass
@@ -141,6 +141,7 @@ class WorkflowResult:
     total_eligible: int = 0
     success_count: int = 0
     error_count: int = 0
+    unchanged_count: int = 0  # Successes whose saved PDF was already up to date (not rewritten)
     start_time: datetime = field(default_factory=datetime.now)
     end_time: Optional[datetime] = None
     
@@ -18,6 +18,10 @@ from processors.declaration_processor import DeclarationProcessor
 from web_utils.barcode_retriever import BarcodeRetriever
 from file_utils.file_manager import FileManager
 from logging_system.logger import Logger
+from web_utils.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from services.batch_journal import SOURCE_SCHEDULER, get_batch_journal
+from services.job_queue import KIND_REDOWNLOAD, KIND_SCHEDULED, Job, checkpointed, fair_order, get_job_queue
+from services.workflow_pipeline import WorkflowItem, WorkflowPipeline
 
 
 class Scheduler:
@@ -67,6 +71,9 @@ class Scheduler:
         self._job_id = "workflow_job"
         self._is_running = False
         
+        # Per-stage metrics of the last workflow run (see WorkflowPipeline.get_stats)
+        self.pipeline_stats: dict = {}
+        
         # Load operation mode from configuration
         mode_str = self.config_manager.get_operation_mode()
         self._operation_mode = OperationMode(mode_str)
@@ -176,12 +183,24 @@ class Scheduler:
         """
         Re-download barcodes for specific declarations
         
+        Runs as an interactive job of the job queue.
+        
         Args:
             declarations: List of declarations to re-download
             
         Returns:
             WorkflowResult with execution statistics
         """
+        tax_codes = {declaration.tax_code for declaration in declarations}
+        result = get_job_queue(self.logger).run(
+            lambda job: self._redownload(job, declarations),
+            f"Tải lại {len(declarations)} tờ khai", KIND_REDOWNLOAD, PRIORITY_INTERACTIVE,
+            company=tax_codes.pop() if len(tax_codes) == 1 else None, total=len(declarations)
+        )
+        return result if result is not None else WorkflowResult()
+    
+    def _redownload(self, job: Job, declarations: List[Declaration]) -> WorkflowResult:
+        """Re-download job (see redownload_declarations)"""
         self.logger.info(f"Re-downloading {len(declarations)} declarations")
         
         result = WorkflowResult()
@@ -189,25 +208,27 @@ class Scheduler:
         result.total_fetched = len(declarations)
         result.total_eligible = len(declarations)
 
-        if self.barcode_retriever and hasattr(self.barcode_retriever, 'reset_method_skip_list'):
-            self.barcode_retriever.reset_method_skip_list()
-        
-        for declaration in declarations:
+        for done, declaration in enumerate(checkpointed(declarations, job)):
+            job.report(done, message=declaration.id)
             try:
-                # Retrieve barcode
-                pdf_content = self.barcode_retriever.retrieve_barcode(declaration)
+                # Retrieve barcode (skipped if the payload of the saved PDF is unchanged)
+                fetched = self.barcode_retriever.fetch_barcode(declaration, self._known_content_hash(declaration))
                 
-                if pdf_content:
+                if fetched.unchanged:
+                    result.success_count += 1
+                    result.unchanged_count += 1
+                    self.logger.info(f"Barcode for {declaration.id} unchanged, file not rewritten")
+                elif fetched.pdf_content:
                     # Save to file (overwrite existing)
                     file_path = self.file_manager.save_barcode(
                         declaration,
-                        pdf_content,
+                        fetched.pdf_content,
                         overwrite=True
                     )
                     
                     if file_path:
                         # Update timestamp
-                        self.tracking_db.update_processed_timestamp(declaration)
+                        self.tracking_db.update_processed_timestamp(declaration, content_hash=fetched.content_hash)
                         result.success_count += 1
                         self.logger.info(f"Successfully re-downloaded barcode for {declaration.id}")
                     else:
@@ -224,12 +245,27 @@ class Scheduler:
         result.end_time = datetime.now()
         
         self.logger.info(
-            f"Re-download completed: {result.success_count} successful, "
+            f"Re-download completed: {result.success_count} successful "
+            f"({result.unchanged_count} unchanged), "
             f"{result.error_count} errors, duration: {result.duration}"
         )
         
         return result
     
+    def _known_content_hash(self, declaration: Declaration) -> Optional[str]:
+        """
+        Content hash of the declaration's saved PDF, if the file still exists
+        
+        Args:
+            declaration: Declaration to look up
+            
+        Returns:
+            Hash to pass to BarcodeRetriever.fetch_barcode, or None
+        """
+        if not self.file_manager.file_exists(declaration, verify=True):
+            return None
+        return self.tracking_db.get_content_hash(declaration)
+    
     def _execute_workflow_safe(self) -> None:
         """
         Execute workflow with exception handling (for scheduled execution)
@@ -237,23 +273,39 @@ class Scheduler:
         This wrapper ensures that exceptions don't crash the scheduler.
         """
         try:
-            self._execute_workflow()
+            self._execute_workflow(priority=PRIORITY_BACKGROUND)
         except Exception as e:
             self.logger.error(f"Workflow execution failed: {e}", exc_info=True)
     
-    def _execute_workflow(self, force_redownload: bool = False, days_back: int = None, tax_codes: Optional[List[str]] = None, progress_callback=None) -> WorkflowResult:
+    def _execute_workflow(self, force_redownload: bool = False, days_back: int = None, tax_codes: Optional[List[str]] = None,
+                          progress_callback=None, priority: int = PRIORITY_NORMAL) -> WorkflowResult:
         """
         Execute the main workflow
         
+        Runs as a job of the job queue: scheduled polling in the background
+        lane (paused while interactive work runs), manual triggers in the
+        normal lane.
+        
         Args:
             force_redownload: If True, re-download all declarations regardless of tracking
             days_back: Number of days to look back (None = use default based on mode)
             tax_codes: Optional list of tax codes to filter by
             progress_callback: Optional callback function for progress updates
+            priority: Job priority (rate limiter PRIORITY_* lane)
             
         Returns:
             WorkflowResult with execution statistics
         """
+        result = get_job_queue(self.logger).run(
+            lambda job: self._run_workflow(job, force_redownload, days_back, tax_codes, progress_callback),
+            "Tải tự động" if priority == PRIORITY_BACKGROUND else "Chạy quy trình", KIND_SCHEDULED, priority,
+            company=tax_codes[0] if tax_codes and len(tax_codes) == 1 else None
+        )
+        return result if result is not None else WorkflowResult()
+    
+    def _run_workflow(self, job: Job, force_redownload: bool, days_back: Optional[int],
+                      tax_codes: Optional[List[str]], progress_callback) -> WorkflowResult:
+        """Workflow job (see _execute_workflow)"""
         result = WorkflowResult()
         result.start_time = datetime.now()
         
@@ -267,6 +319,10 @@ class Scheduler:
                 else:
                     days_back = 7  # Manual mode default: 7 days
             
+            # Finish a run interrupted by a crash or shutdown first, so its
+            # declarations are tracked (and not queried again below)
+            self._resume_interrupted_batches()
+            
             if progress_callback:
                 progress_callback("Đang tải danh sách tờ khai đã xử lý...", 0, 100)
             
@@ -289,61 +345,43 @@ class Scheduler:
             eligible = self.processor.filter_declarations(declarations)
             result.total_eligible = len(eligible)
             self.logger.info(f"{result.total_eligible} declarations are eligible for processing")
+            job.report(0, len(eligible))
 
-            if self.barcode_retriever and hasattr(self.barcode_retriever, 'reset_method_skip_list'):
-                self.barcode_retriever.reset_method_skip_list()
-            
             if progress_callback:
                 progress_callback(f"Đang xử lý {result.total_eligible} tờ khai hợp lệ...", 30, 100)
             
-            # 4. Process each eligible declaration
-            for idx, declaration in enumerate(eligible):
-                try:
-                    # Update progress
-                    if progress_callback:
-                        progress = 30 + int((idx / len(eligible)) * 60)
-                        progress_callback(f"Đang xử lý tờ khai {idx+1}/{len(eligible)}: {declaration.declaration_number}", progress, 100)
-                    
-                    self.logger.debug(f"Processing declaration: {declaration.id}")
-                    
-                    # Retrieve barcode
-                    pdf_content = self.barcode_retriever.retrieve_barcode(declaration)
-                    
-                    if pdf_content:
-                        # Save to file (overwrite if force_redownload)
-                        file_path = self.file_manager.save_barcode(
-                            declaration,
-                            pdf_content,
-                            overwrite=force_redownload
-                        )
-                        
-                        if file_path:
-                            # Mark as processed or update timestamp
-                            if force_redownload and self.tracking_db.is_processed(declaration):
-                                self.tracking_db.update_processed_timestamp(declaration)
-                            else:
-                                self.tracking_db.add_processed(declaration, file_path)
-                            
-                            # Store company information
-                            try:
-                                company_name = self.ecus_connector.get_company_name(declaration.tax_code)
-                                if company_name:
-                                    self.tracking_db.add_or_update_company(declaration.tax_code, company_name)
-                            except Exception as e:
-                                self.logger.warning(f"Failed to store company info for {declaration.tax_code}: {e}")
-                            
-                            result.success_count += 1
-                            self.logger.info(f"Successfully processed declaration: {declaration.id}")
-                        else:
-                            result.error_count += 1
-                            self.logger.warning(f"File save skipped for declaration: {declaration.id}")
-                    else:
-                        result.error_count += 1
-                        self.logger.error(f"Failed to retrieve barcode for declaration: {declaration.id}")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error processing declaration {declaration.id}: {e}", exc_info=True)
+            # 4. Process the eligible declarations through the staged pipeline
+            # (a forced re-download skips PDFs whose payload is unchanged)
+            completed = 0
+            
+            def on_done(item: WorkflowItem) -> None:
+                nonlocal completed
+                completed += 1
+                if item.success:
+                    result.success_count += 1
+                    if item.unchanged:
+                        result.unchanged_count += 1
+                else:
                     result.error_count += 1
+                job.report(completed, message=item.declaration.declaration_number)
+                if progress_callback:
+                    progress = 30 + int((completed / len(eligible)) * 60)
+                    progress_callback(
+                        f"Đã xử lý tờ khai {completed}/{len(eligible)}: {item.declaration.declaration_number}",
+                        progress, 100
+                    )
+            
+            pipeline = WorkflowPipeline(
+                self.tracking_db, self.barcode_retriever, self.file_manager,
+                self.ecus_connector, self.logger
+            )
+            # Companies take turns; fetching pauses while higher-priority jobs run
+            pipeline.run(
+                fair_order(eligible, key=lambda d: d.tax_code),
+                force_redownload, on_done, job.cancel_event, source=SOURCE_SCHEDULER,
+                checkpoint=job.checkpoint
+            )
+            self.pipeline_stats = pipeline.get_stats()
             
             result.end_time = datetime.now()
             
@@ -351,7 +389,8 @@ class Scheduler:
                 progress_callback(f"Hoàn thành: {result.success_count} thành công, {result.error_count} lỗi", 100, 100)
             
             self.logger.info(
-                f"Workflow execution completed: {result.success_count} successful, "
+                f"Workflow execution completed: {result.success_count} successful "
+                f"({result.unchanged_count} unchanged), "
                 f"{result.error_count} errors, duration: {result.duration}"
             )
             
@@ -362,6 +401,21 @@ class Scheduler:
         
         return result
     
+    def _resume_interrupted_batches(self) -> None:
+        """Resume scheduler batches left unfinished in the batch journal."""
+        journal = get_batch_journal()
+        if journal is None:
+            return
+        for batch in journal.unfinished_batches(SOURCE_SCHEDULER):
+            try:
+                pipeline = WorkflowPipeline(
+                    self.tracking_db, self.barcode_retriever, self.file_manager,
+                    self.ecus_connector, self.logger, journal=journal
+                )
+                pipeline.resume(batch.batch_id)
+            except Exception as e:
+                self.logger.error(f"Failed to resume batch {batch.batch_id}: {e}", exc_info=True)
+    
     def is_running(self) -> bool:
         """
         Check if scheduler is running
@@ -0,0 +1,616 @@
+"""
+Batch Journal
+
+Crash-safe record of download batches, so a batch interrupted by a crash,
+a Windows update or a power cut can be resumed where it stopped.
+
+Every declaration of a batch is journaled with its progress:
+
+    queued -> fetched -> rendered -> written -> tracked
+                     \\-> failed
+
+A fetched item keeps its payload (the API / web form data to render, or
+the downloaded PDF), so resuming never queries the customs services again
+for it; a written item only needs its tracking row.
+
+Progress updates are buffered in memory and written by a background
+thread, many per transaction (every flush_interval seconds or
+flush_size updates), so journaling costs almost nothing per declaration.
+A crash loses at most the last interval of updates; those steps are
+simply redone on resume.
+
+Usage:
+    python -m services.batch_journal --list
+    python -m services.batch_journal --discard <batch id>
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from logging_system.logger import Logger
+from models.declaration_models import Declaration
+from web_utils.barcode_retriever import RetrievalResult
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
+
+
+# Item states, in processing order
+QUEUED = "queued"
+FETCHED = "fetched"
+RENDERED = "rendered"
+WRITTEN = "written"
+TRACKED = "tracked"
+FAILED = "failed"
+
+ITEM_STATES = (QUEUED, FETCHED, RENDERED, WRITTEN, TRACKED)
+FINISHED_STATES = (TRACKED, FAILED)
+
+# Batch states
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+ABANDONED = "abandoned"
+
+# Batch sources
+SOURCE_SCHEDULER = "scheduler"
+SOURCE_WORKFLOW = "workflow"
+SOURCE_MANUAL = "manual"
+
+_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+@dataclass
+class JournalBatch:
+    """
+    A journaled batch.
+
+    Attributes:
+        batch_id: Batch identifier
+        source: Who started it (SOURCE_* value)
+        force_redownload: Existing files are overwritten
+        total: Declarations in the batch
+        pending: Declarations not finished yet
+        status: Batch state (RUNNING until finished)
+        created_at: Start time
+    """
+    batch_id: str
+    source: str
+    force_redownload: bool
+    total: int
+    pending: int
+    status: str
+    created_at: datetime
+
+
+@dataclass
+class JournalEntry:
+    """
+    Journaled progress of one declaration.
+
+    Attributes:
+        batch_id: Batch identifier
+        seq: Position in the batch
+        declaration: Declaration
+        state: Item state
+        content_hash: Payload hash (fetched and later)
+        info: Declaration info to render (fetched API / web form data)
+        pdf_content: Downloaded PDF (fetched from the web)
+        file_path: Saved file (written and later)
+        error: Why the item failed
+    """
+    batch_id: str
+    seq: int
+    declaration: Declaration
+    state: str = QUEUED
+    content_hash: Optional[str] = None
+    info: Optional[ContainerDeclarationInfo] = None
+    pdf_content: Optional[bytes] = None
+    file_path: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def has_payload(self) -> bool:
+        """The fetched payload was kept, so the item needs no new fetch"""
+        return self.info is not None or self.pdf_content is not None
+
+    def to_result(self) -> RetrievalResult:
+        """The fetched payload as a fetch_barcode(render=False) result"""
+        return RetrievalResult(pdf_content=self.pdf_content, content_hash=self.content_hash, info=self.info)
+
+
+def _declaration_to_json(declaration: Declaration) -> str:
+    data = {f.name: getattr(declaration, f.name) for f in fields(Declaration)}
+    if isinstance(data["declaration_date"], datetime):
+        data["declaration_date"] = data["declaration_date"].strftime(_DATE_FORMAT)
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _declaration_from_json(text: str) -> Declaration:
+    data = json.loads(text)
+    known = {f.name for f in fields(Declaration)}
+    return Declaration(**{k: v for k, v in data.items() if k in known})
+
+
+def _info_to_json(info: Any) -> Optional[str]:
+    if not isinstance(info, ContainerDeclarationInfo):
+        return None
+    return json.dumps(asdict(info), ensure_ascii=False)
+
+
+def _info_from_json(text: Optional[str]) -> Optional[ContainerDeclarationInfo]:
+    if not text:
+        return None
+    data = json.loads(text)
+    containers = [ContainerInfo(**c) for c in data.pop("containers", [])]
+    known = {f.name for f in fields(ContainerDeclarationInfo)}
+    info = ContainerDeclarationInfo(**{k: v for k, v in data.items() if k in known})
+    info.containers = containers
+    return info
+
+
+class BatchJournal:
+    """
+    SQLite journal of download batches.
+
+    Thread-safe; progress updates are buffered and written in batches by
+    a background thread (see record() and flush()).
+    """
+
+    DEFAULT_DB_PATH = os.path.join("data", "batch_journal.db")
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, flush_interval: float = 0.5,
+                 flush_size: int = 200, logger: Optional[Logger] = None):
+        """
+        Initialize the journal.
+
+        Args:
+            db_path: Path to the SQLite journal file
+            flush_interval: Seconds between background writes of buffered updates
+            flush_size: Buffered updates that trigger a write right away
+            logger: Optional logger instance
+        """
+        self.db_path = db_path
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.flush_size = max(1, int(flush_size))
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._active: set = set()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        self._flushes = 0
+        self._updates = 0
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        self._initialize_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _initialize_database(self) -> None:
+        conn = self._get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal_batches (
+                    batch_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    force_redownload INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal_items (
+                    batch_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    declaration TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    content_hash TEXT,
+                    info TEXT,
+                    pdf BLOB,
+                    file_path TEXT,
+                    error TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (batch_id, seq)
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def start_batch(self, declarations: Iterable[Declaration], source: str,
+                    force_redownload: bool = False) -> str:
+        """
+        Journal a new batch with all its declarations queued.
+
+        Args:
+            declarations: Declarations in processing order (their position
+                is the item's seq)
+            source: Who starts the batch (SOURCE_* value)
+            force_redownload: Existing files are overwritten
+
+        Returns:
+            Batch identifier
+        """
+        batch_id = uuid.uuid4().hex
+        now = datetime.now().strftime(_DATE_FORMAT)
+        rows = [
+            (batch_id, seq, _declaration_to_json(declaration), QUEUED, now)
+            for seq, declaration in enumerate(declarations)
+        ]
+        conn = self._get_connection()
+        try:
+            conn.execute(
+                "INSERT INTO journal_batches (batch_id, source, force_redownload, total, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (batch_id, source, int(force_redownload), len(rows), RUNNING, now)
+            )
+            conn.executemany(
+                "INSERT INTO journal_items (batch_id, seq, declaration, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._active.add(batch_id)
+        if self.logger:
+            self.logger.debug(f"Journaling {source} batch {batch_id} ({len(rows)} declarations)")
+        return batch_id
+
+    def claim(self, batch_id: str) -> bool:
+        """
+        Mark an unfinished batch as being resumed by this process.
+
+        Returns:
+            False if it is already running here
+        """
+        with self._lock:
+            if batch_id in self._active:
+                return False
+            self._active.add(batch_id)
+            return True
+
+    def record(self, batch_id: str, seq: int, state: str, content_hash: Optional[str] = None,
+               info: Any = None, pdf_content: Optional[bytes] = None,
+               file_path: Optional[str] = None, error: Optional[str] = None) -> None:
+        """
+        Buffer a progress update of one item (written in the background).
+
+        Args:
+            batch_id: Batch identifier
+            seq: Item position in the batch
+            state: New item state
+            content_hash: Payload hash, if known
+            info: Fetched declaration info to keep for rendering
+            pdf_content: Downloaded PDF to keep
+            file_path: Saved file
+            error: Why the item failed
+        """
+        update = {
+            "state": state, "content_hash": content_hash, "info": _info_to_json(info),
+            "pdf": pdf_content, "file_path": file_path, "error": error,
+        }
+        with self._lock:
+            if self._closed:
+                return
+            merged = self._pending.get((batch_id, seq))
+            if merged is None:
+                self._pending[(batch_id, seq)] = update
+            else:
+                merged.update({k: v for k, v in update.items() if v is not None or k in ("state", "error")})
+            if state in FINISHED_STATES:
+                merged = self._pending[(batch_id, seq)]
+                merged["info"] = merged["pdf"] = None  # Not needed any more
+            self._updates += 1
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="batch-journal", daemon=True)
+                self._flusher.start()
+            if len(self._pending) >= self.flush_size:
+                self._wakeup.notify()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed and len(self._pending) < self.flush_size:
+                    self._wakeup.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                if self.logger:
+                    self.logger.warning(f"Batch journal write failed, retrying: {e}")
+            if closed:
+                return
+
+    def flush(self) -> int:
+        """
+        Write the buffered updates now, in one transaction.
+
+        Returns:
+            Number of item updates written
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            now = datetime.now().strftime(_DATE_FORMAT)
+            rows = []
+            for (batch_id, seq), update in pending.items():
+                finished = update["state"] in FINISHED_STATES
+                rows.append((
+                    update["state"], update["content_hash"],
+                    finished, update["info"], finished, update["pdf"],
+                    update["file_path"], update["error"], now, batch_id, seq
+                ))
+            conn = self._get_connection()
+            try:
+                conn.executemany("""
+                    UPDATE journal_items SET
+                        state = ?,
+                        content_hash = COALESCE(?, content_hash),
+                        info = CASE WHEN ? THEN NULL ELSE COALESCE(?, info) END,
+                        pdf = CASE WHEN ? THEN NULL ELSE COALESCE(?, pdf) END,
+                        file_path = COALESCE(?, file_path),
+                        error = ?,
+                        updated_at = ?
+                    WHERE batch_id = ? AND seq = ?
+                """, rows)
+                conn.commit()
+            except sqlite3.Error:
+                with self._lock:
+                    # Keep the updates (newer ones for the same item win)
+                    for key, update in pending.items():
+                        self._pending.setdefault(key, update)
+                raise
+            finally:
+                conn.close()
+            with self._lock:
+                self._flushes += 1
+            return len(rows)
+
+    def finish_batch(self, batch_id: str, status: str = COMPLETED) -> None:
+        """
+        Mark a batch as finished (no longer offered for resuming).
+
+        Args:
+            batch_id: Batch identifier
+            status: COMPLETED, CANCELLED or ABANDONED
+        """
+        self.flush()
+        conn = self._get_connection()
+        try:
+            conn.execute(
+                "UPDATE journal_batches SET status = ?, finished_at = ? WHERE batch_id = ?",
+                (status, datetime.now().strftime(_DATE_FORMAT), batch_id)
+            )
+            conn.execute("UPDATE journal_items SET info = NULL, pdf = NULL WHERE batch_id = ?", (batch_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._active.discard(batch_id)
+        if self.logger:
+            self.logger.debug(f"Batch {batch_id} {status}")
+
+    def release(self, batch_id: str) -> None:
+        """
+        Stop running a batch without finishing it (it stays resumable).
+
+        Args:
+            batch_id: Batch identifier
+        """
+        self.flush()
+        with self._lock:
+            self._active.discard(batch_id)
+
+    def unfinished_batches(self, source: Optional[str] = None) -> List[JournalBatch]:
+        """
+        Batches interrupted before they finished (oldest first).
+
+        Batches running in this process are not listed.
+
+        Args:
+            source: Only batches started by this source
+
+        Returns:
+            List of JournalBatch
+        """
+        self.flush()
+        query = """
+            SELECT b.batch_id, b.source, b.force_redownload, b.total, b.status, b.created_at,
+                   (SELECT COUNT(*) FROM journal_items i
+                    WHERE i.batch_id = b.batch_id AND i.state NOT IN (?, ?))
+            FROM journal_batches b
+            WHERE b.status = ?
+        """
+        params: List[Any] = [TRACKED, FAILED, RUNNING]
+        if source is not None:
+            query += " AND b.source = ?"
+            params.append(source)
+        query += " ORDER BY b.created_at, b.rowid"
+        conn = self._get_connection()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            active = set(self._active)
+        return [
+            JournalBatch(batch_id, batch_source, bool(force), total, pending, status,
+                         datetime.strptime(created_at, _DATE_FORMAT))
+            for batch_id, batch_source, force, total, status, created_at, pending in rows
+            if batch_id not in active
+        ]
+
+    def get_batch(self, batch_id: str) -> Optional[JournalBatch]:
+        """Look up a batch (finished or not)."""
+        conn = self._get_connection()
+        try:
+            row = conn.execute("""
+                SELECT b.batch_id, b.source, b.force_redownload, b.total, b.status, b.created_at,
+                       (SELECT COUNT(*) FROM journal_items i
+                        WHERE i.batch_id = b.batch_id AND i.state NOT IN (?, ?))
+                FROM journal_batches b WHERE b.batch_id = ?
+            """, (TRACKED, FAILED, batch_id)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        batch_id, source, force, total, status, created_at, pending = row
+        return JournalBatch(batch_id, source, bool(force), total, pending, status,
+                            datetime.strptime(created_at, _DATE_FORMAT))
+
+    def pending_entries(self, batch_id: str) -> List[JournalEntry]:
+        """
+        Items of a batch that are not finished, in batch order.
+
+        Args:
+            batch_id: Batch identifier
+
+        Returns:
+            List of JournalEntry with their kept payloads
+        """
+        self.flush()
+        conn = self._get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT seq, declaration, state, content_hash, info, pdf, file_path, error
+                FROM journal_items
+                WHERE batch_id = ? AND state NOT IN (?, ?)
+                ORDER BY seq
+            """, (batch_id, TRACKED, FAILED)).fetchall()
+        finally:
+            conn.close()
+        entries = []
+        for seq, declaration, state, content_hash, info, pdf, file_path, error in rows:
+            entry = JournalEntry(batch_id, seq, _declaration_from_json(declaration), state,
+                                 content_hash, None, pdf, file_path, error)
+            try:
+                entry.info = _info_from_json(info)
+            except (ValueError, TypeError) as e:
+                if self.logger:
+                    self.logger.warning(f"Discarding unreadable journaled payload of item {seq}: {e}")
+            if state in (FETCHED, RENDERED) and not entry.has_payload:
+                entry.state = QUEUED  # Fetch again
+            entries.append(entry)
+        return entries
+
+    def prune(self, keep_days: int = 7) -> int:
+        """
+        Delete batches finished more than keep_days ago.
+
+        Returns:
+            Number of batches deleted
+        """
+        cutoff = (datetime.now() - timedelta(days=keep_days)).strftime(_DATE_FORMAT)
+        conn = self._get_connection()
+        try:
+            ids = [row[0] for row in conn.execute(
+                "SELECT batch_id FROM journal_batches WHERE status != ? AND finished_at < ?",
+                (RUNNING, cutoff)
+            )]
+            conn.executemany("DELETE FROM journal_items WHERE batch_id = ?", [(i,) for i in ids])
+            conn.executemany("DELETE FROM journal_batches WHERE batch_id = ?", [(i,) for i in ids])
+            conn.commit()
+        finally:
+            conn.close()
+        return len(ids)
+
+    def close(self) -> None:
+        """Write the buffered updates and stop the background writer."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join(timeout=10)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get journal statistics.
+
+        Returns:
+            Dictionary with buffered updates, updates recorded and
+            transactions written
+        """
+        with self._lock:
+            return {
+                "buffered": len(self._pending),
+                "updates": self._updates,
+                "flushes": self._flushes,
+            }
+
+
+# Global instance (None until initialized at start-up)
+_batch_journal: Optional[BatchJournal] = None
+
+
+def init_batch_journal(db_path: str = BatchJournal.DEFAULT_DB_PATH,
+                       logger: Optional[Logger] = None) -> BatchJournal:
+    """Create the process-wide batch journal."""
+    global _batch_journal
+    _batch_journal = BatchJournal(db_path, logger=logger)
+    return _batch_journal
+
+
+def get_batch_journal() -> Optional[BatchJournal]:
+    """Get the process-wide batch journal, or None if journaling is disabled."""
+    return _batch_journal
+
+
+def set_batch_journal(journal: Optional[BatchJournal]) -> None:
+    """Replace (or disable with None) the process-wide batch journal."""
+    global _batch_journal
+    _batch_journal = journal
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="List or discard interrupted download batches")
+    parser.add_argument("--db", default=BatchJournal.DEFAULT_DB_PATH,
+                        help=f"Journal database (default: {BatchJournal.DEFAULT_DB_PATH})")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--list", action="store_true", help="List interrupted batches")
+    group.add_argument("--discard", metavar="BATCH_ID", help="Stop offering a batch for resuming")
+    args = parser.parse_args(argv)
+
+    journal = BatchJournal(args.db)
+    if args.discard:
+        if journal.get_batch(args.discard) is None:
+            print(f"No batch {args.discard}")
+            return 1
+        journal.finish_batch(args.discard, ABANDONED)
+        print(f"Batch {args.discard} discarded")
+        return 0
+
+    batches = journal.unfinished_batches()
+    if not batches:
+        print("No interrupted batches")
+    for batch in batches:
+        print(f"{batch.batch_id}  {batch.created_at:%Y-%m-%d %H:%M}  {batch.source:<9}  "
+              f"{batch.pending}/{batch.total} declarations left")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,8 @@
 Clearance Checker Background Service
 
 Periodically checks status of pending declarations and triggers notifications.
+Used by the GUI (desktop notifications) and by the headless service
+(log only), so it must not import GUI modules.
 
 Requirements: Phase 4
 """
@@ -9,14 +11,18 @@ Requirements: Phase 4
 import threading
 import time
 from datetime import datetime
-from typing import List, Callable, Optional, Dict
+from typing import List, Callable, Optional, Dict, TYPE_CHECKING
 
 from logging_system.logger import Logger
 from database.tracking_database import TrackingDatabase
 from database.ecus_connector import EcusDataConnector
-from gui.notification_manager import NotificationManager
 from config.user_preferences import get_preferences
 from models.declaration_models import ClearanceStatus
+from web_utils.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, request_priority, run_with_priority
+from services.job_queue import KIND_CLEARANCE, Job, get_job_queue
+
+if TYPE_CHECKING:
+    from gui.notification_manager import NotificationManager
 
 class ClearanceChecker:
     """Background service for self-checking clearance status."""
@@ -25,7 +31,7 @@ class ClearanceChecker:
         self,
         tracking_db: TrackingDatabase,
         ecus_connector: EcusDataConnector,
-        notification_manager: NotificationManager,
+        notification_manager: Optional['NotificationManager'],
         logger: Logger
     ):
         """
@@ -34,7 +40,8 @@ class ClearanceChecker:
         Args:
             tracking_db: TrackingDatabase instance
             ecus_connector: EcusDataConnector instance
-            notification_manager: NotificationManager instance
+            notification_manager: NotificationManager instance (None: no
+                desktop notifications, e.g. headless)
             logger: Logger instance
         """
         self.tracking_db = tracking_db
@@ -94,7 +101,7 @@ class ClearanceChecker:
         
     def check_now(self, ids_to_check: Optional[List[int]] = None, progress_callback: Optional[Callable] = None) -> int:
         """
-        Force an immediate check.
+        Force an immediate check (an interactive job of the job queue).
         
         Args:
             ids_to_check: Optional list of declaration IDs to check. If None, check all pending.
@@ -103,14 +110,26 @@ class ClearanceChecker:
         Returns:
             Number of declarations cleared in this check
         """
-        return self._check_pending_declarations(ids_to_check, progress_callback)
+        return self._check_pending_declarations(ids_to_check, progress_callback, priority=PRIORITY_INTERACTIVE)
+    
+    def check_pending(self) -> int:
+        """
+        Run a periodic check of all pending declarations (a background job).
+        
+        Called by the checking thread (start) or by an external scheduler
+        such as the JobScheduler of the headless service.
+        
+        Returns:
+            Number of declarations cleared in this check
+        """
+        return self._check_pending_declarations()
         
     def _run_loop(self):
         """Main loop."""
         while not self._stop_event.is_set():
             try:
                 if self.auto_check_enabled:
-                    self._check_pending_declarations()
+                    self.check_pending()
                 
                 # Sleep for interval or until stopped
                 # We interpret check_interval_minutes as time BETWEEN checks
@@ -129,15 +148,35 @@ class ClearanceChecker:
         self._cancel_check.set()
         self.logger.info("Signal received to stop current check")
 
-    def _check_pending_declarations(self, ids_to_check: Optional[List[int]] = None, progress_callback: Optional[Callable] = None) -> int:
+    def _check_pending_declarations(self, ids_to_check: Optional[List[int]] = None, progress_callback: Optional[Callable] = None,
+                                    priority: int = PRIORITY_BACKGROUND) -> int:
+        """
+        Run a clearance check as a job of the job queue (see _check).
+        
+        Periodic checks run in the background lane and pause while
+        interactive work (downloads, a user's check) runs.
+        
+        Returns:
+            Number of cleared declarations (0 if the job was cancelled
+            before it started)
+        """
+        name = f"Kiểm tra {len(ids_to_check)} tờ khai" if ids_to_check else "Kiểm tra thông quan"
+        cleared = get_job_queue(self.logger).run(
+            lambda job: self._check(job, ids_to_check, progress_callback), name, KIND_CLEARANCE, priority
+        )
+        return cleared or 0
+    
+    def _check(self, job: Job, ids_to_check: Optional[List[int]] = None, progress_callback: Optional[Callable] = None) -> int:
         """
         Check for pending declarations using API-first strategy with parallel processing.
         
         Strategy:
-        1. Call API in parallel (with retry on failure)
-        2. If API fails after retry, fallback to ECUS database
+        1. Query the API for the whole batch with the asyncio engine
+           (many requests in flight over shared keep-alive connections)
+        2. Retry failed API calls once, then fallback to ECUS database
         
         Args:
+            job: Job running the check
             ids_to_check: Optional list of IDs to check.
             progress_callback: Optional callback for progress updates
             
@@ -148,6 +187,7 @@ class ClearanceChecker:
         
         try:
             self._cancel_check.clear()
+            job.add_cancel_callback(self._cancel_check.set)
             
             # Get API timeout from preferences
             prefs = get_preferences()
@@ -169,11 +209,31 @@ class ClearanceChecker:
             self.logger.info(f"Checking status for {len(pending_list)} declarations (API-first, parallel)...")
             
             total_count = len(pending_list)
+            job.report(0, total_count)
             cleared_count = 0
+            completed_count = 0
             results_lock = threading.Lock()
             
-            def check_single_declaration(pending):
-                """Check single declaration: API first, then DB fallback."""
+            # One client for the whole batch, backed by the shared keep-alive pool
+            try:
+                from web_utils.qrcode_api_client import QRCodeContainerApiClient, BangKeQuery
+                api_client = QRCodeContainerApiClient(logger=self.logger, timeout=api_timeout)
+            except ImportError:
+                self.logger.debug("QRCodeContainerApiClient not available")
+                api_client = None
+            
+            def query_api_once(pending, decl_date):
+                """Single synchronous API call used to retry a failed batch request."""
+                return api_client.query_bang_ke(
+                    ma_so_thue=pending.tax_code,
+                    so_to_khai=pending.declaration_number,
+                    ma_hai_quan=pending.customs_code if hasattr(pending, 'customs_code') and pending.customs_code else "",
+                    ngay_dang_ky=decl_date,
+                    use_cache=False
+                )
+            
+            def check_single_declaration(pending, decl_date, batch_result):
+                """Evaluate API result (retry once on failure), then DB fallback."""
                 nonlocal cleared_count
                 
                 if self._cancel_check.is_set():
@@ -187,36 +247,18 @@ class ClearanceChecker:
                 is_transfer = False
                 company_name = pending.company_name or ""
                 
-                # STEP 1: Try API first (with retry)
+                # STEP 1: Use batch API result (with one retry on failure)
                 api_success = False
-                for attempt in range(2):  # 2 attempts = 1 original + 1 retry
-                    if self._cancel_check.is_set():
+                for attempt in range(2):  # 2 attempts = batch request + 1 retry
+                    if self._cancel_check.is_set() or api_client is None:
                         break
                     try:
-                        from web_utils.qrcode_api_client import QRCodeContainerApiClient
-                        api_client = QRCodeContainerApiClient(logger=self.logger, timeout=api_timeout)
-                        
-                        # Convert declaration_date to datetime if it's a string
-                        decl_date = pending.declaration_date
-                        if isinstance(decl_date, str):
-                            try:
-                                # Try common date formats
-                                if ' ' in decl_date:
-                                    decl_date = decl_date.split(' ')[0]  # Remove time part
-                                if '-' in decl_date:
-                                    decl_date = datetime.strptime(decl_date, '%Y-%m-%d')
-                                elif '/' in decl_date:
-                                    decl_date = datetime.strptime(decl_date, '%d/%m/%Y')
-                            except Exception as date_err:
-                                self.logger.warning(f"Failed to parse date '{pending.declaration_date}': {date_err}")
-                                decl_date = datetime.now()  # Fallback to today
-                        
-                        result = api_client.query_bang_ke(
-                            ma_so_thue=pending.tax_code,
-                            so_to_khai=pending.declaration_number,
-                            ma_hai_quan=pending.customs_code if hasattr(pending, 'customs_code') and pending.customs_code else "",
-                            ngay_dang_ky=decl_date
-                        )
+                        if attempt == 0 and batch_result is not None:
+                            if batch_result.error is not None:
+                                raise batch_result.error
+                            result = batch_result.info
+                        else:
+                            result = query_api_once(pending, decl_date)
                         
                         if result and result.is_valid:
                             api_success = True
@@ -256,9 +298,6 @@ class ClearanceChecker:
                                 self.logger.debug(f"API check {pending.declaration_number}: pending (chưa được cấp phép)")
                                 break
                             
-                    except ImportError:
-                        self.logger.debug("QRCodeContainerApiClient not available")
-                        break
                     except Exception as e:
                         if attempt == 0:
                             self.logger.debug(f"API check failed for {pending.declaration_number}, retrying... ({e})")
@@ -309,30 +348,75 @@ class ClearanceChecker:
                 
                 return (pending.id, status_text, now_str, cleared_at_str)
             
-            # Run parallel checks with ThreadPoolExecutor
-            current_idx = 0
+            def process(pending, decl_date, batch_result):
+                """Run one check and report progress as soon as it finishes."""
+                nonlocal completed_count
+                try:
+                    # Yield to higher-priority jobs between declarations
+                    result = check_single_declaration(pending, decl_date, batch_result) if job.checkpoint() else None
+                except Exception as e:
+                    self.logger.error(f"Check failed for {pending.declaration_number}: {e}")
+                    result = None
+                
+                with results_lock:
+                    completed_count += 1
+                    current_idx = completed_count
+                job.report(current_idx, message=pending.declaration_number)
+                
+                if result and progress_callback:
+                    decl_id, status_text, now_str, cleared_at_str = result
+                    try:
+                        progress_callback(current_idx, total_count, decl_id, status_text, now_str, cleared_at_str)
+                    except:
+                        pass
+            
+            dated = [(p, self._parse_declaration_date(p)) for p in pending_list]
+            
+            # Workers only post-process results (retry, ECUS fallback, DB update);
+            # the API requests themselves run concurrently on the asyncio engine.
             with ThreadPoolExecutor(max_workers=3) as executor:
-                future_to_pending = {
-                    executor.submit(check_single_declaration, p): p 
-                    for p in pending_list
-                }
+                futures = []
                 
-                for future in as_completed(future_to_pending):
-                    current_idx += 1
-                    pending = future_to_pending[future]
+                if api_client is not None:
+                    by_query: Dict = {}
+                    for pending, decl_date in dated:
+                        query = BangKeQuery(
+                            pending.tax_code,
+                            pending.declaration_number,
+                            pending.customs_code if hasattr(pending, 'customs_code') and pending.customs_code else "",
+                            decl_date
+                        )
+                        by_query.setdefault(query, []).append((pending, decl_date))
                     
-                    try:
-                        result = future.result()
-                        if result:
-                            decl_id, status_text, now_str, cleared_at_str = result
-                            
-                            if progress_callback:
-                                try:
-                                    progress_callback(current_idx, total_count, decl_id, status_text, now_str, cleared_at_str)
-                                except:
-                                    pass
-                    except Exception as e:
-                        self.logger.error(f"Check failed for {pending.declaration_number}: {e}")
+                    def on_result(batch_result):
+                        for pending, decl_date in by_query.get(batch_result.query, []):
+                            futures.append(executor.submit(
+                                run_with_priority, job.priority, process, pending, decl_date, batch_result
+                            ))
+                    
+                    # Concurrency follows the shared adaptive controller. Status checks
+                    # always go to the network; fresh results still refresh the
+                    # response cache so a following download needs no request.
+                    # Runs at the job priority: background polling yields the rate
+                    # budget to interactive downloads, and the job's checkpoint is
+                    # passed before each request so a paused job stops sending.
+                    with request_priority(job.priority):
+                        api_client.query_many(
+                            list(by_query.keys()),
+                            timeout=api_timeout,
+                            cancel_event=self._cancel_check,
+                            on_result=on_result,
+                            use_cache=False,
+                            checkpoint=job.checkpoint
+                        )
+                else:
+                    for pending, decl_date in dated:
+                        futures.append(executor.submit(
+                            run_with_priority, job.priority, process, pending, decl_date, None
+                        ))
+                
+                for future in as_completed(list(futures)):
+                    future.result()
             
             # Always refresh UI after check completes (even if no status changes)
             if self.on_status_changed:
@@ -343,11 +427,32 @@ class ClearanceChecker:
         except Exception as e:
             self.logger.error(f"Failed during _check_pending_declarations: {e}", exc_info=True)
             return 0
+    
+    def _parse_declaration_date(self, pending) -> datetime:
+        """Convert a tracking declaration date (string or datetime) to datetime."""
+        decl_date = pending.declaration_date
+        if isinstance(decl_date, str):
+            try:
+                # Try common date formats
+                if ' ' in decl_date:
+                    decl_date = decl_date.split(' ')[0]  # Remove time part
+                if '-' in decl_date:
+                    decl_date = datetime.strptime(decl_date, '%Y-%m-%d')
+                elif '/' in decl_date:
+                    decl_date = datetime.strptime(decl_date, '%d/%m/%Y')
+            except Exception as date_err:
+                self.logger.warning(f"Failed to parse date '{pending.declaration_date}': {date_err}")
+                decl_date = datetime.now()  # Fallback to today
+        if isinstance(decl_date, str) or decl_date is None:
+            decl_date = datetime.now()
+        return decl_date
             
     def _notify_cleared(self, decl_number: str, company_name: str):
         """Send notification for cleared declaration."""
         title = "Thông quan thành công!"
         msg = f"Tờ khai {decl_number}\n{company_name}\nĐã được thông quan."
+        if self.notification_manager is None:
+            return
         try:
             self.notification_manager.show_notification(title, msg, icon='info')
         except Exception:
@@ -357,6 +462,8 @@ class ClearanceChecker:
         """Send notification for red channel transfer (chuyển địa điểm kiểm tra)."""
         title = "Chuyển địa điểm kiểm tra!"
         msg = f"Tờ khai {decl_number}\n{company_name}\nĐã được duyệt chuyển địa điểm.\nCó thể lấy mã vạch."
+        if self.notification_manager is None:
+            return
         try:
             self.notification_manager.show_notification(title, msg, icon='info')
         except Exception:
@@ -0,0 +1,543 @@
+"""
+Job Queue
+
+Central queue for the work that competes for the customs API, the
+databases and the disk: scheduled workflow runs, manual downloads,
+retries, redownloads and clearance checks.
+
+- Every job has a priority (the rate limiter's lanes: interactive, normal,
+  background). Interactive jobs start at once; the others take one of
+  max_running slots, highest priority first.
+- Preemption: a running job calls checkpoint() between declarations; while
+  a job of higher priority is queued or running it waits there (paused,
+  its slot freed), so a user's download never waits for a 500-declaration
+  automatic run to finish.
+- Per-company fair queuing: jobs of the same priority are admitted by how
+  many jobs their company has had so far, so one company's stream of jobs
+  can't hold back another's. fair_order() interleaves the declarations of
+  a single job by company the same way.
+- Per-job cancellation: cancel(job_id) drops a queued job, or sets the
+  running job's cancel_event (and calls its cancel callbacks) so it stops
+  at its next checkpoint.
+- Introspection: jobs() lists JobInfo snapshots for the GUI; listeners are
+  called on every state change.
+
+Jobs run on the thread that calls run() (submit() starts one), with their
+priority set as the request priority of the rate limiter.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from logging_system.logger import Logger
+from web_utils.rate_limiter import (
+    PRIORITY_INTERACTIVE, PRIORITY_NAMES, PRIORITY_NORMAL, request_priority
+)
+
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, CANCELLED, FAILED)
+
+# Job kinds
+KIND_SCHEDULED = "scheduled"
+KIND_MANUAL = "manual"
+KIND_RETRY = "retry"
+KIND_REDOWNLOAD = "redownload"
+KIND_CLEARANCE = "clearance"
+
+T = TypeVar("T")
+
+
+@dataclass
+class JobInfo:
+    """
+    Snapshot of a job for display.
+
+    Attributes:
+        job_id: Job identifier
+        name: Description
+        kind: KIND_* value
+        priority: Rate limiter priority lane
+        company: Tax code the job is for (None for several companies)
+        state: Job state
+        done: Items finished
+        total: Items in the job (0 if unknown)
+        message: Last progress message
+        created_at: Submission time
+        started_at: First start
+        finished_at: End time
+        paused_seconds: Time spent paused for higher-priority jobs
+        error: Error message of a failed job
+    """
+    job_id: int
+    name: str
+    kind: str
+    priority: int
+    company: Optional[str]
+    state: str
+    done: int
+    total: int
+    message: str
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    paused_seconds: float
+    error: Optional[str]
+
+    @property
+    def priority_name(self) -> str:
+        return PRIORITY_NAMES.get(self.priority, str(self.priority))
+
+
+class Job:
+    """A unit of work run by the JobQueue."""
+
+    def __init__(self, queue: "JobQueue", job_id: int, name: str, kind: str, priority: int,
+                 company: Optional[str], total: int):
+        self.queue = queue
+        self.job_id = job_id
+        self.name = name
+        self.kind = kind
+        self.priority = priority
+        self.company = company
+        self.cancel_event = threading.Event()
+        self.state = QUEUED
+        self.done = 0
+        self.total = total
+        self.message = ""
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.paused_seconds = 0.0
+        self._cancel_callbacks: List[Callable[[], None]] = []
+        self._finished = threading.Event()
+        self._result: Any = None
+        self._exception: Optional[BaseException] = None
+
+    @property
+    def cancelled(self) -> bool:
+        """Cancellation was requested"""
+        return self.cancel_event.is_set()
+
+    def checkpoint(self) -> bool:
+        """
+        Yield to higher-priority jobs between items.
+
+        Blocks while a higher-priority job is queued or running. May be
+        called from any thread working for the job.
+
+        Returns:
+            False if the job was cancelled (stop working), else True
+        """
+        return self.queue._checkpoint(self)
+
+    def report(self, done: Optional[int] = None, total: Optional[int] = None, message: Optional[str] = None) -> None:
+        """
+        Update the job's progress (shown by the GUI).
+
+        Args:
+            done: Items finished so far
+            total: Items in the job
+            message: Progress message
+        """
+        with self.queue._condition:
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            if message is not None:
+                self.message = message
+        self.queue._notify_listeners()
+
+    def add_cancel_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Call callback when the job is cancelled (right away if it already is).
+
+        Used by jobs with their own stop flag (e.g. ClearanceChecker).
+        """
+        with self.queue._condition:
+            if not self.cancelled:
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self) -> bool:
+        """Cancel the job (see JobQueue.cancel)."""
+        return self.queue.cancel(self.job_id)
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """
+        Wait for the job to finish.
+
+        Returns:
+            The job function's result (None if cancelled before it started)
+
+        Raises:
+            TimeoutError: If the job is still running after timeout
+            Exception: Whatever the job function raised
+        """
+        if not self._finished.wait(timeout):
+            raise TimeoutError(f"Job {self.job_id} still running")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def info(self) -> JobInfo:
+        """Snapshot of the job."""
+        with self.queue._condition:
+            return JobInfo(
+                self.job_id, self.name, self.kind, self.priority, self.company, self.state,
+                self.done, self.total, self.message, self.created_at, self.started_at,
+                self.finished_at, round(self.paused_seconds, 3), self.error
+            )
+
+
+class JobQueue:
+    """
+    Priority job queue with preemption at checkpoints.
+
+    Usage:
+        result = get_job_queue().run(
+            lambda job: do_work(job), "Download 12 declarations",
+            KIND_MANUAL, PRIORITY_INTERACTIVE, company=tax_code
+        )
+    """
+
+    DEFAULT_MAX_RUNNING = 2
+    HISTORY_SIZE = 50
+
+    def __init__(self, max_running: int = DEFAULT_MAX_RUNNING, logger: Optional[Logger] = None):
+        """
+        Initialize the queue.
+
+        Args:
+            max_running: Non-interactive jobs running at the same time
+                (interactive jobs always start at once)
+            logger: Optional logger instance
+        """
+        self.logger = logger
+        self.max_running = max(1, int(max_running))
+        self._condition = threading.Condition()
+        self._ids = itertools.count(1)
+        self._waiting: List[Job] = []  # Queued or paused
+        self._running: List[Job] = []
+        self._history: "OrderedDict[int, Job]" = OrderedDict()
+        self._served: Dict[Optional[str], int] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._started = 0
+        self._preemptions = 0
+
+    def configure(self, max_running: int) -> None:
+        """Update the number of slots for non-interactive jobs."""
+        with self._condition:
+            self.max_running = max(1, int(max_running))
+            self._condition.notify_all()
+        if self.logger:
+            self.logger.info(f"Job queue configured: {self.max_running} concurrent background jobs")
+
+    def run(self, fn: Callable[[Job], T], name: str, kind: str, priority: int = PRIORITY_NORMAL,
+            company: Optional[str] = None, total: int = 0) -> Optional[T]:
+        """
+        Queue a job and run it on this thread once admitted.
+
+        Args:
+            fn: Job function, called with the Job
+            name: Description shown in the GUI
+            kind: KIND_* value
+            priority: PRIORITY_INTERACTIVE, PRIORITY_NORMAL or PRIORITY_BACKGROUND
+            company: Tax code the job is for, if one (fair queuing)
+            total: Items in the job, if known
+
+        Returns:
+            fn's result, or None if the job was cancelled before it started
+
+        Raises:
+            Exception: Whatever fn raised
+        """
+        job = self._create(name, kind, priority, company, total)
+        self._execute(job, fn)
+        return job.wait()
+
+    def submit(self, fn: Callable[[Job], Any], name: str, kind: str, priority: int = PRIORITY_NORMAL,
+               company: Optional[str] = None, total: int = 0) -> Job:
+        """
+        Queue a job to run on a new thread.
+
+        Returns:
+            The Job (see Job.wait)
+        """
+        job = self._create(name, kind, priority, company, total)
+        thread = threading.Thread(target=self._execute, args=(job, fn), daemon=True)
+        thread.name = f"job-{job.job_id}-{kind}"
+        thread.start()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a job.
+
+        A queued job is dropped; a running or paused job has its
+        cancel_event set and stops at its next checkpoint.
+
+        Returns:
+            False if the job is unknown or already finished
+        """
+        with self._condition:
+            job = self._find(job_id)
+            if job is None or job.state in FINISHED_STATES or job.cancelled:
+                return False
+            job.cancel_event.set()
+            callbacks, job._cancel_callbacks = job._cancel_callbacks, []
+            self._condition.notify_all()
+        if self.logger:
+            self.logger.info(f"Cancelling job {job_id} ({job.name})")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Cancel callback of job {job_id} failed: {e}")
+        self._notify_listeners()
+        return True
+
+    def get_job(self, job_id: int) -> Optional[Job]:
+        """Look up a job (also recently finished ones)."""
+        with self._condition:
+            return self._find(job_id)
+
+    def jobs(self, include_finished: bool = True) -> List[JobInfo]:
+        """
+        Snapshots of the jobs: running and paused first, then queued in
+        admission order, then recently finished ones (newest first).
+        """
+        with self._condition:
+            active = list(self._running) + sorted(self._waiting, key=self._key)
+            finished = list(reversed(self._history.values())) if include_finished else []
+        return [job.info() for job in active + finished]
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        """Call listener (on the changing thread) whenever a job changes."""
+        with self._condition:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        with self._condition:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get queue statistics.
+
+        Returns:
+            Dictionary with running, paused and queued job counts, jobs
+            started and preemptions (pauses for higher-priority jobs)
+        """
+        with self._condition:
+            return {
+                "running": len(self._running),
+                "paused": sum(1 for job in self._waiting if job.state == PAUSED),
+                "queued": sum(1 for job in self._waiting if job.state == QUEUED),
+                "started": self._started,
+                "preemptions": self._preemptions,
+                "max_running": self.max_running,
+            }
+
+    # --- Internals -------------------------------------------------------
+
+    def _create(self, name: str, kind: str, priority: int, company: Optional[str], total: int) -> Job:
+        with self._condition:
+            job = Job(self, next(self._ids), name, kind, priority, company, total)
+            self._waiting.append(job)
+            self._condition.notify_all()
+        self._notify_listeners()
+        return job
+
+    def _find(self, job_id: int) -> Optional[Job]:
+        for job in itertools.chain(self._running, self._waiting):
+            if job.job_id == job_id:
+                return job
+        return self._history.get(job_id)
+
+    def _key(self, job: Job):
+        """Admission order: priority, then least-served company, then age."""
+        return job.priority, self._served.get(job.company, 0), job.job_id
+
+    def _outranked(self, job: Job) -> bool:
+        """A higher-priority job is queued or running. Called with the lock held."""
+        return any(
+            other.priority < job.priority and other.state != PAUSED
+            for other in itertools.chain(self._running, self._waiting)
+        )
+
+    def _admissible(self, job: Job) -> bool:
+        """The job may start (or resume) now. Called with the lock held."""
+        if job.cancelled or job.priority <= PRIORITY_INTERACTIVE:
+            return True
+        if self._outranked(job):
+            return False
+        free = self.max_running - sum(1 for other in self._running if other.priority > PRIORITY_INTERACTIVE)
+        candidates = sorted(
+            (other for other in self._waiting
+             if other.priority > PRIORITY_INTERACTIVE and not self._outranked(other)),
+            key=self._key
+        )
+        return job in candidates[:max(0, free)]
+
+    def _admit(self, job: Job) -> None:
+        """Wait for a slot and mark the job running. Called with the lock held."""
+        while not self._admissible(job):
+            self._condition.wait()
+        self._waiting.remove(job)
+        self._running.append(job)
+        job.state = RUNNING
+
+    def _execute(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        with self._condition:
+            self._admit(job)
+            if not job.cancelled:
+                job.started_at = datetime.now()
+                self._served[job.company] = self._served.get(job.company, 0) + 1
+                self._started += 1
+            else:
+                self._finish(job, CANCELLED)
+        self._notify_listeners()
+        if job.state == CANCELLED:
+            return
+        if self.logger:
+            self.logger.debug(f"Job {job.job_id} started: {job.name} ({PRIORITY_NAMES.get(job.priority)})")
+
+        try:
+            with request_priority(job.priority):
+                job._result = fn(job)
+            state = CANCELLED if job.cancelled else COMPLETED
+        except BaseException as e:  # noqa: BLE001 - re-raised by wait()
+            job._exception = e
+            job.error = str(e)
+            state = FAILED
+        with self._condition:
+            self._finish(job, state)
+        self._notify_listeners()
+
+    def _finish(self, job: Job, state: str) -> None:
+        """Called with the lock held."""
+        if job in self._running:
+            self._running.remove(job)
+        if job in self._waiting:
+            self._waiting.remove(job)
+        job.state = state
+        job.finished_at = datetime.now()
+        job._cancel_callbacks = []
+        self._history[job.job_id] = job
+        while len(self._history) > self.HISTORY_SIZE:
+            self._history.popitem(last=False)
+        self._condition.notify_all()
+        job._finished.set()
+        if self.logger:
+            self.logger.debug(f"Job {job.job_id} {state}: {job.name}")
+
+    def _checkpoint(self, job: Job) -> bool:
+        notify = False
+        with self._condition:
+            if job.cancelled:
+                return False
+            if job.state == RUNNING and self._outranked(job):
+                self._running.remove(job)
+                self._waiting.append(job)
+                job.state = PAUSED
+                self._preemptions += 1
+                self._condition.notify_all()
+                notify = True
+                if self.logger:
+                    self.logger.info(f"Job {job.job_id} ({job.name}) paused for higher-priority work")
+            if job.state == PAUSED:
+                paused_at = datetime.now()
+                while job.state == PAUSED and not self._admissible(job):
+                    self._condition.wait()
+                if job.state == PAUSED:  # Not resumed by another of its threads
+                    self._waiting.remove(job)
+                    self._running.append(job)
+                    job.state = RUNNING
+                    job.paused_seconds += (datetime.now() - paused_at).total_seconds()
+                    notify = True
+        if notify:
+            self._notify_listeners()
+        return not job.cancelled
+
+    def _notify_listeners(self) -> None:
+        with self._condition:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                if self.logger:
+                    self.logger.debug(f"Job queue listener failed: {e}")
+
+
+def fair_order(items: Iterable[T], key: Callable[[T], Any]) -> List[T]:
+    """
+    Interleave items round-robin by key (e.g. company tax code), keeping
+    the order within each key, so no company waits for all of another's.
+
+    Args:
+        items: Items in their original order
+        key: Fairness key of an item
+
+    Returns:
+        Reordered list
+    """
+    groups: "OrderedDict[Any, deque]" = OrderedDict()
+    for item in items:
+        groups.setdefault(key(item), deque()).append(item)
+    ordered: List[T] = []
+    while groups:
+        for group_key in list(groups):
+            group = groups[group_key]
+            ordered.append(group.popleft())
+            if not group:
+                del groups[group_key]
+    return ordered
+
+
+def checkpointed(items: Iterable[T], job: Job) -> Iterable[T]:
+    """
+    Yield items, calling job.checkpoint() before each; stops when the job
+    is cancelled.
+
+    Args:
+        items: Work items of the job
+        job: Running job
+    """
+    for item in items:
+        if not job.checkpoint():
+            return
+        yield item
+
+
+# Global instance
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(logger: Optional[Logger] = None) -> JobQueue:
+    """Get the process-wide job queue."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(logger=logger)
+        elif logger is not None and _job_queue.logger is None:
+            _job_queue.logger = logger
+        return _job_queue
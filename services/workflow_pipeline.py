@@ -0,0 +1,360 @@
+"""
+Workflow Pipeline
+
+The per-declaration part of the workflow (retrieve -> render -> save ->
+track) as concurrent stages (see core/pipeline.py):
+
+- fetch: API / web form queries on I/O threads; the PDF is not rendered
+  here (BarcodeRetriever.fetch_barcode with render=False)
+- render: PDF rendering, in the PDF render worker processes when configured
+- write: atomic file writes (FileManager.save_barcode)
+- track: tracking database updates, one transaction per batch
+
+Used by WorkflowService.execute and Scheduler._execute_workflow, which
+turn finished items into WorkflowEvents / progress callbacks.
+
+When the batch journal is enabled (services/batch_journal.py), each
+stage journals its progress, and resume() continues an interrupted batch
+from the last journaled step of every declaration.
+"""
+
+import threading
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.pipeline import Pipeline, Stage
+from models.declaration_models import Declaration
+from services import batch_journal as journal_states
+from services.batch_journal import BatchJournal, get_batch_journal
+from web_utils.barcode_retriever import RetrievalResult
+from logging_system.logger import Logger
+
+
+@dataclass
+class PipelineSettings:
+    """
+    Concurrency of the workflow pipeline stages.
+
+    Attributes:
+        fetch_workers: Declarations queried at the same time
+        render_workers: PDFs rendered at the same time (bounded by the
+            PDF render worker processes when those are used)
+        write_workers: Files saved at the same time
+        queue_size: Items waiting in front of each stage (backpressure)
+        track_batch_size: Declarations recorded per database transaction
+    """
+    fetch_workers: int = 4
+    render_workers: int = 2
+    write_workers: int = 2
+    queue_size: int = 16
+    track_batch_size: int = 50
+
+
+@dataclass
+class WorkflowItem:
+    """
+    One declaration moving through the workflow pipeline.
+
+    Attributes:
+        declaration: Declaration being processed
+        fetched: Retrieval result (fetch stage)
+        pdf_content: Rendered or downloaded PDF (render stage, dropped
+            once written)
+        file_path: Saved file, or the existing file if unchanged
+        success: Saved and recorded, or unchanged
+        unchanged: The payload equals the saved PDF's, nothing was rewritten
+        error: Why the declaration failed
+        exception: Exception raised by a stage, if that is why
+        seq: Position in the journaled batch
+        state: Last journaled state (batch_journal item states)
+    """
+    declaration: Declaration
+    fetched: Optional[RetrievalResult] = None
+    pdf_content: Optional[bytes] = None
+    file_path: Optional[str] = None
+    success: bool = False
+    unchanged: bool = False
+    error: Optional[str] = None
+    exception: Optional[BaseException] = None
+    seq: int = 0
+    state: str = journal_states.QUEUED
+
+
+class WorkflowPipeline:
+    """Processes declarations through the fetch, render, write and track stages."""
+
+    def __init__(self, tracking_db, barcode_retriever, file_manager, ecus_connector,
+                 logger: Logger, settings: Optional[PipelineSettings] = None,
+                 journal: Optional[BatchJournal] = None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            tracking_db: Tracking database instance
+            barcode_retriever: Barcode retriever instance
+            file_manager: File manager for saving
+            ecus_connector: ECUS5 connector (company names)
+            logger: Logger instance
+            settings: Stage concurrency (defaults to get_pipeline_settings())
+            journal: Batch journal (defaults to get_batch_journal(); None
+                when journaling is disabled)
+        """
+        self.tracking_db = tracking_db
+        self.barcode_retriever = barcode_retriever
+        self.file_manager = file_manager
+        self.ecus_connector = ecus_connector
+        self.logger = logger
+        self.settings = settings or get_pipeline_settings()
+        self.journal = journal if journal is not None else get_batch_journal()
+        self._force = False
+        self._resuming = False
+        self._checkpoint: Optional[Callable[[], bool]] = None
+        self._batch_id: Optional[str] = None
+        self._companies: Dict[str, Optional[str]] = {}
+        self._last_stats: Dict = {}
+
+    def run(self, declarations: Iterable[Declaration], force_redownload: bool = False,
+            on_done: Optional[Callable[[WorkflowItem], None]] = None,
+            cancel_event: Optional[threading.Event] = None,
+            source: str = journal_states.SOURCE_WORKFLOW,
+            checkpoint: Optional[Callable[[], bool]] = None) -> int:
+        """
+        Process declarations and wait until all are finished.
+
+        Args:
+            declarations: Declarations to process
+            force_redownload: Overwrite existing files (unless their payload
+                is unchanged) instead of skipping them
+            on_done: Called on this thread with each finished WorkflowItem,
+                in completion order
+            cancel_event: When set, declarations not started yet are dropped
+            source: Who runs the batch (batch journal SOURCE_* value)
+            checkpoint: Called by the fetch stage before each query (e.g.
+                Job.checkpoint, which blocks while higher-priority work
+                runs); returning False drops the declaration
+
+        Returns:
+            Number of declarations finished
+        """
+        declarations = list(declarations)
+        batch_id = None
+        if self.journal is not None and declarations:
+            batch_id = self.journal.start_batch(declarations, source, force_redownload)
+        items = [WorkflowItem(d, seq=seq) for seq, d in enumerate(declarations)]
+        return self._run(items, force_redownload, batch_id, False, on_done, cancel_event, checkpoint)
+
+    def resume(self, batch_id: str, on_done: Optional[Callable[[WorkflowItem], None]] = None,
+               cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Continue an interrupted journaled batch.
+
+        Declarations already tracked or failed are not processed again;
+        the others continue from their last journaled step (fetched
+        payloads are rendered without querying the customs services again,
+        written files are only recorded).
+
+        Args:
+            batch_id: Batch identifier (see BatchJournal.unfinished_batches)
+            on_done: Called on this thread with each finished WorkflowItem
+            cancel_event: When set, declarations not started yet are dropped
+
+        Returns:
+            Number of declarations finished
+
+        Raises:
+            ValueError: If journaling is disabled, the batch is unknown or
+                it is already running
+        """
+        if self.journal is None:
+            raise ValueError("Batch journal is disabled")
+        batch = self.journal.get_batch(batch_id)
+        if batch is None:
+            raise ValueError(f"Unknown batch {batch_id}")
+        if not self.journal.claim(batch_id):
+            raise ValueError(f"Batch {batch_id} is already running")
+
+        items = []
+        for entry in self.journal.pending_entries(batch_id):
+            item = WorkflowItem(entry.declaration, seq=entry.seq, state=entry.state, file_path=entry.file_path)
+            if entry.state != journal_states.QUEUED:
+                item.fetched = entry.to_result()
+            items.append(item)
+        self.logger.info(
+            f"Resuming batch {batch_id}: {len(items)} of {batch.total} declarations left "
+            f"({sum(1 for item in items if item.state != journal_states.QUEUED)} already fetched)"
+        )
+        return self._run(items, batch.force_redownload, batch_id, True, on_done, cancel_event)
+
+    def _run(self, items: List[WorkflowItem], force_redownload: bool, batch_id: Optional[str],
+             resuming: bool, on_done, cancel_event: Optional[threading.Event],
+             checkpoint: Optional[Callable[[], bool]] = None) -> int:
+        self._force = force_redownload
+        self._checkpoint = checkpoint
+        self._batch_id = batch_id
+        self._resuming = resuming
+        self._companies = {}
+        settings = self.settings
+        pipeline = Pipeline([
+            Stage("fetch", self._fetch, settings.fetch_workers, settings.queue_size),
+            Stage("render", self._render, settings.render_workers, settings.queue_size),
+            Stage("write", self._write, settings.write_workers, settings.queue_size),
+            # SQLite has one writer; batches make it one transaction per batch
+            Stage("track", self._track, 1, max(settings.queue_size, settings.track_batch_size),
+                  batch_size=max(1, settings.track_batch_size)),
+        ], name="workflow", logger=self.logger)
+
+        def done(item: WorkflowItem, error: Optional[BaseException]) -> None:
+            if error is not None:
+                item.success = False
+                item.error = str(error)
+                item.exception = error
+                self.logger.error(f"Error processing {item.declaration.id}: {error}")
+                self._record(item, journal_states.FAILED, error=item.error)
+            if on_done is not None:
+                on_done(item)
+
+        finished = False
+        try:
+            count = pipeline.run(items, done, cancel_event)
+            finished = True
+            return count
+        finally:
+            self._last_stats = pipeline.get_stats()
+            if batch_id is not None:
+                if not finished:
+                    self.journal.release(batch_id)  # Left for resuming
+                elif cancel_event is not None and cancel_event.is_set():
+                    self.journal.finish_batch(batch_id, journal_states.CANCELLED)
+                else:
+                    self.journal.finish_batch(batch_id, journal_states.COMPLETED)
+
+    def get_stats(self) -> Dict:
+        """Per-stage metrics of the last run (see Pipeline.get_stats)"""
+        return self._last_stats
+
+    def _record(self, item: WorkflowItem, state: str, **values) -> None:
+        """Journal the item's new state (buffered; no-op without a journal)."""
+        item.state = state
+        if self._batch_id is not None:
+            self.journal.record(self._batch_id, item.seq, state, **values)
+
+    def _fetch(self, item: WorkflowItem) -> bool:
+        """Query the declaration; unchanged and failed ones end here."""
+        if item.state != journal_states.QUEUED:
+            return True  # Fetched before the batch was interrupted
+        declaration = item.declaration
+        if self._checkpoint is not None and not self._checkpoint():
+            item.error = "Cancelled"
+            return False
+        self.logger.debug(f"Processing declaration: {declaration.id}")
+        known_hash = None
+        existing_path = None
+        if self._force:
+            existing_path = self.file_manager.locate(declaration, verify=True)
+            if existing_path:
+                known_hash = self.tracking_db.get_content_hash(declaration)
+
+        item.fetched = self.barcode_retriever.fetch_barcode(declaration, known_hash, render=False)
+        if item.fetched.unchanged:
+            self.logger.info(f"Barcode for {declaration.id} unchanged, file not rewritten")
+            item.success = item.unchanged = True
+            item.file_path = existing_path
+            self._record(item, journal_states.TRACKED, file_path=existing_path)
+            return False
+        if item.fetched.status == "failed":
+            item.error = "Failed to retrieve barcode"
+            self.logger.error(f"Failed to retrieve barcode for {declaration.id}")
+            self._record(item, journal_states.FAILED, error=item.error)
+            return False
+        self._record(item, journal_states.FETCHED, content_hash=item.fetched.content_hash,
+                     info=item.fetched.info, pdf_content=item.fetched.pdf_content)
+        return True
+
+    def _render(self, item: WorkflowItem) -> bool:
+        """Render the PDF (downloaded PDFs pass straight through)."""
+        if item.state == journal_states.WRITTEN:
+            return True
+        fetched = item.fetched
+        item.pdf_content = self.barcode_retriever.render_barcode(fetched) if fetched.needs_render \
+            else fetched.pdf_content
+        if not item.pdf_content:
+            item.error = "Failed to generate PDF"
+            self.logger.error(f"Failed to generate PDF for {item.declaration.id}")
+            self._record(item, journal_states.FAILED, error=item.error)
+            return False
+        self._record(item, journal_states.RENDERED)
+        return True
+
+    def _write(self, item: WorkflowItem) -> bool:
+        """Save the PDF (overwriting only on forced re-downloads)."""
+        if item.state == journal_states.WRITTEN and item.file_path:
+            return True
+        file_path = self.file_manager.save_barcode(item.declaration, item.pdf_content, overwrite=self._force)
+        item.pdf_content = None
+        if not file_path and self._resuming and not self._force:
+            # Saved before the interruption, but not journaled as written yet
+            file_path = self.file_manager.locate(item.declaration, verify=True)
+        if not file_path:
+            item.error = "File save skipped"
+            self.logger.warning(f"File save skipped for {item.declaration.id}")
+            self._record(item, journal_states.FAILED, error=item.error)
+            return False
+        item.file_path = file_path
+        self._record(item, journal_states.WRITTEN, file_path=file_path)
+        return True
+
+    def _track(self, items: List[WorkflowItem]) -> bool:
+        """Record a batch of saved declarations and their companies."""
+        self.tracking_db.record_processed_many(
+            [(item.declaration, item.file_path, item.fetched.content_hash) for item in items]
+        )
+        for item in items:
+            item.success = True
+            self._record(item, journal_states.TRACKED)
+            self.logger.info(f"Successfully processed: {item.declaration.id}")
+
+        companies = []
+        for tax_code in {item.declaration.tax_code for item in items} - set(self._companies):
+            try:
+                self._companies[tax_code] = self.ecus_connector.get_company_name(tax_code)
+            except Exception as e:
+                self._companies[tax_code] = None
+                self.logger.warning(f"Failed to get company name for {tax_code}: {e}")
+                continue
+            if self._companies[tax_code]:
+                companies.append((tax_code, self._companies[tax_code]))
+        try:
+            self.tracking_db.add_or_update_companies(companies)
+        except Exception as e:
+            self.logger.warning(f"Failed to store company info: {e}")
+        return True
+
+
+# Global settings
+_pipeline_settings = PipelineSettings()
+_pipeline_settings_lock = threading.Lock()
+
+
+def get_pipeline_settings() -> PipelineSettings:
+    """Get the workflow pipeline settings (a copy)."""
+    with _pipeline_settings_lock:
+        return replace(_pipeline_settings)
+
+
+def configure_pipeline(settings: PipelineSettings, logger: Optional[Logger] = None) -> None:
+    """
+    Set the workflow pipeline settings used by later runs.
+
+    Args:
+        settings: Stage concurrency
+        logger: Optional logger
+    """
+    global _pipeline_settings
+    with _pipeline_settings_lock:
+        _pipeline_settings = replace(settings)
+    if logger:
+        logger.info(
+            f"Workflow pipeline configured: {settings.fetch_workers} fetch, {settings.render_workers} render, "
+            f"{settings.write_workers} write workers, queues of {settings.queue_size}, "
+            f"tracking batches of {settings.track_batch_size}"
+        )
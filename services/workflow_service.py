@@ -4,7 +4,8 @@ Workflow Service v2.0
 Unified workflow pipeline for both scheduler and manual mode.
 Extracts core workflow logic from Scheduler to enable reuse.
 
-Pipeline: fetch -> filter -> retrieve -> save -> track
+Pipeline: fetch -> filter -> retrieve -> render -> save -> track
+(the last four as concurrent stages, see workflow_pipeline.py)
 
 Benefits:
 1. Single source of truth for workflow logic
@@ -25,6 +26,8 @@ from web_utils.barcode_retriever import BarcodeRetriever
 from file_utils.file_manager import FileManager
 from logging_system.logger import Logger
 from services.workflow_events import WorkflowEvent, WorkflowEventType
+from services.batch_journal import get_batch_journal
+from services.workflow_pipeline import WorkflowItem, WorkflowPipeline
 
 
 class WorkflowService:
@@ -68,6 +71,9 @@ class WorkflowService:
         # Cancellation support
         self._cancel_event = threading.Event()
         self._is_running = False
+        
+        # Per-stage metrics of the last run (see WorkflowPipeline.get_stats)
+        self.pipeline_stats: dict = {}
     
     def add_event_listener(self, listener: Callable[[WorkflowEvent], None]) -> None:
         """Add a listener for workflow events."""
@@ -158,37 +164,11 @@ class WorkflowService:
 
             self._emit_event(WorkflowEvent.started(len(declarations)))
 
-            if self.barcode_retriever and hasattr(self.barcode_retriever, 'reset_method_skip_list'):
-                self.barcode_retriever.reset_method_skip_list()
-            
-            # 2. Process each declaration
-            for idx, declaration in enumerate(declarations):
-                if self._cancel_event.is_set():
-                    self._emit_event(WorkflowEvent.cancelled())
-                    break
-                
-                self._emit_event(WorkflowEvent.progress(
-                    idx + 1, len(declarations), declaration.id
-                ))
-                
-                try:
-                    success, file_path = self._process_declaration(
-                        declaration, force_redownload
-                    )
-                    
-                    if success:
-                        result.success_count += 1
-                    else:
-                        result.error_count += 1
-                    
-                    self._emit_event(WorkflowEvent.declaration_processed(
-                        declaration.id, success, file_path
-                    ))
-                    
-                except Exception as e:
-                    result.error_count += 1
-                    self.logger.error(f"Error processing {declaration.id}: {e}")
-                    self._emit_event(WorkflowEvent.error(str(e), declaration.id))
+            # 2. Process the declarations through the staged pipeline
+            self._run_pipeline(
+                result, len(declarations),
+                lambda pipeline, on_done: pipeline.run(declarations, force_redownload, on_done, self._cancel_event)
+            )
             
             result.end_time = datetime.now()
             
@@ -199,8 +179,8 @@ class WorkflowService:
             ))
             
             self.logger.info(
-                f"Workflow completed: {result.success_count} success, "
-                f"{result.error_count} errors"
+                f"Workflow completed: {result.success_count} success "
+                f"({result.unchanged_count} unchanged), {result.error_count} errors"
             )
             
         except Exception as e:
@@ -213,58 +193,111 @@ class WorkflowService:
             self._is_running = False
         
         return result
-    
-    def _process_declaration(
-        self, 
-        declaration: Declaration, 
-        force_overwrite: bool = False
-    ) -> tuple:
+
+    def resume(self, batch_id: Optional[str] = None) -> WorkflowResult:
         """
-        Process a single declaration.
+        Continue a download batch interrupted by a crash or shutdown.
+        
+        Declarations already done are not fetched again (see
+        WorkflowPipeline.resume).
         
         Args:
-            declaration: Declaration to process
-            force_overwrite: If True, overwrite existing file
+            batch_id: Batch to resume (default: the most recent unfinished
+                batch of any source)
             
         Returns:
-            Tuple of (success: bool, file_path: Optional[str])
+            WorkflowResult with execution statistics (empty if there is
+            nothing to resume)
         """
-        self.logger.debug(f"Processing declaration: {declaration.id}")
-        
-        # Retrieve barcode
-        pdf_content = self.barcode_retriever.retrieve_barcode(declaration)
-        
-        if not pdf_content:
-            self.logger.error(f"Failed to retrieve barcode for {declaration.id}")
-            return False, None
+        journal = get_batch_journal()
+        if journal is None:
+            self.logger.warning("Batch journal is disabled, nothing to resume")
+            return WorkflowResult()
+        if batch_id is None:
+            batches = journal.unfinished_batches()
+            if not batches:
+                self.logger.info("No interrupted batch to resume")
+                return WorkflowResult()
+            batch_id = batches[-1].batch_id
+        batch = journal.get_batch(batch_id)
+        if batch is None:
+            self.logger.warning(f"Unknown batch {batch_id}")
+            return WorkflowResult()
+        if self._is_running:
+            self.logger.warning("Workflow already running")
+            return WorkflowResult()
         
-        # Save to file
-        file_path = self.file_manager.save_barcode(
-            declaration,
-            pdf_content,
-            overwrite=force_overwrite
-        )
+        self._is_running = True
+        self._cancel_event.clear()
+        result = WorkflowResult()
+        result.start_time = datetime.now()
+        try:
+            self.logger.info(f"Resuming batch {batch_id}")
+            total = batch.pending
+            result.total_fetched = result.total_eligible = total
+            self._emit_event(WorkflowEvent.started(total))
+            self._run_pipeline(
+                result, total,
+                lambda pipeline, on_done: pipeline.resume(batch_id, on_done, self._cancel_event)
+            )
+            result.end_time = datetime.now()
+            self._emit_event(WorkflowEvent.completed(
+                result.success_count,
+                result.error_count,
+                result.duration.total_seconds() if result.duration else 0
+            ))
+            self.logger.info(
+                f"Resumed batch completed: {result.success_count} success, {result.error_count} errors"
+            )
+        except Exception as e:
+            result.end_time = datetime.now()
+            self.logger.error(f"Resuming batch {batch_id} failed: {e}", exc_info=True)
+            self._emit_event(WorkflowEvent.error(str(e)))
+            raise
+        finally:
+            self._is_running = False
+        return result
+    
+    def _run_pipeline(self, result: WorkflowResult, total: int,
+                      start: Callable[[WorkflowPipeline, Callable[[WorkflowItem], None]], int]) -> None:
+        """
+        Run the staged pipeline, turning finished declarations into events.
         
-        if not file_path:
-            self.logger.warning(f"File save skipped for {declaration.id}")
-            return False, None
+        Args:
+            result: Result to count successes and errors in
+            total: Declarations to process (progress events)
+            start: Runs the pipeline (run or resume) with the on_done callback
+        """
+        completed = 0
         
-        # Update tracking
-        if force_overwrite and self.tracking_db.is_processed(declaration):
-            self.tracking_db.update_processed_timestamp(declaration)
-        else:
-            self.tracking_db.add_processed(declaration, file_path)
+        def on_done(item: WorkflowItem) -> None:
+            nonlocal completed
+            completed += 1
+            declaration_id = item.declaration.id
+            self._emit_event(WorkflowEvent.progress(completed, total, declaration_id))
+            if item.exception is not None:
+                result.error_count += 1
+                self._emit_event(WorkflowEvent.error(item.error, declaration_id))
+                return
+            if item.success:
+                result.success_count += 1
+                if item.unchanged:
+                    result.unchanged_count += 1
+            else:
+                result.error_count += 1
+            self._emit_event(WorkflowEvent.declaration_processed(
+                declaration_id, item.success, item.file_path
+            ))
         
-        # Store company info
-        try:
-            company_name = self.ecus_connector.get_company_name(declaration.tax_code)
-            if company_name:
-                self.tracking_db.add_or_update_company(declaration.tax_code, company_name)
-        except Exception as e:
-            self.logger.warning(f"Failed to store company info: {e}")
+        pipeline = WorkflowPipeline(
+            self.tracking_db, self.barcode_retriever, self.file_manager,
+            self.ecus_connector, self.logger
+        )
+        start(pipeline, on_done)
+        self.pipeline_stats = pipeline.get_stats()
         
-        self.logger.info(f"Successfully processed: {declaration.id}")
-        return True, file_path
+        if self._cancel_event.is_set():
+            self._emit_event(WorkflowEvent.cancelled())
 
 
 # Global instance
@@ -0,0 +1,227 @@
+"""
+Unit tests for the browserless ADF web form client
+
+These tests verify form, partial-response and result parsing, and the
+full HTTP flow (loopback, view state, partial submit, save link) against
+the stub ADF server serving synthetic pages.
+"""
+
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from benchmarks.stub_adf_server import StubAdfBehaviour, StubAdfServer, load_pages
+from models.config_models import BarcodeServiceConfig
+from models.declaration_models import Declaration
+from web_utils import adf_http_client
+from web_utils.adf_http_client import (
+    AdfHttpClient,
+    AdfHttpError,
+    parse_form,
+    parse_page,
+    parse_partial_response,
+    parse_result,
+)
+from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.rate_limiter import TokenBucketRateLimiter
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit():
+    with patch('web_utils.adf_http_client.get_rate_limiter', return_value=TokenBucketRateLimiter(rate=0)):
+        yield
+
+
+def fetch(url: str, number: str = "308010891440"):
+    client = AdfHttpClient(url, logger=Mock(), timeout=5)
+    return client.fetch("0101234567", number, "02CI", date(2024, 12, 1))
+
+
+class TestParsing:
+    """Unit tests for the page parsers"""
+
+    def test_form_fields_and_submit_button(self):
+        page = load_pages()['form'].replace('__VIEW_STATE__', '!-abc').replace('__CTRL_STATE__', 'x1')
+        form = parse_form(page, "http://host/faces/ContainerBarcode")
+
+        assert form.action == "http://host/faces/ContainerBarcode?_adf.ctrl-state=x1"
+        assert form.hidden['javax.faces.ViewState'] == '!-abc'
+        assert form.hidden['Adf-Window-Id'] == 'w0'
+        assert form.input_names['pt1:it2::content'] == 'pt1:it2'
+        assert form.submit_id == 'pt1:b1'
+
+    def test_loopback_page_has_no_form(self):
+        assert parse_form(load_pages()['loopback'], "http://host/") is None
+
+    def test_partial_response(self):
+        fragments, view_state, error = parse_partial_response(
+            load_pages()['result'].replace('__VIEW_STATE__', '!-next')
+        )
+
+        assert len(fragments) == 1
+        assert view_state == '!-next'
+        assert error is None
+
+    def test_partial_response_error(self):
+        text = '<partial-response><error><error-name>ViewExpiredException</error-name></error></partial-response>'
+        assert parse_partial_response(text)[2] == 'ViewExpiredException'
+        with pytest.raises(AdfHttpError):
+            parse_partial_response('<html>not xml')
+
+    def test_result_labels_and_containers(self):
+        fragments, _, _ = parse_partial_response(
+            load_pages()['result'].replace('__DECLARATION_NUMBER__', '123').replace('__TAX_CODE__', '0101')
+        )
+        page = parse_page(fragments[0])
+        info = parse_result(page)
+
+        assert page.save_link_id == 'pt1:cl1'
+        assert info.so_to_khai == '123'
+        assert info.ma_so_thue == '0101'
+        assert info.luong_to_khai == 'Xanh'
+        assert info.ghi_chu == 'Hàng đã qua khu vực giám sát'
+        assert info.is_container_declaration
+        assert [c.so_container for c in info.containers] == ['TEMU1234567', 'MSKU7654321']
+        assert info.containers[0].so_seal_hq == ''
+        assert info.containers[1].so_seal_hq == 'HQ0002'
+        assert info.containers[1].ghi_chu == 'Soi chiếu'
+        assert info.containers[1].barcode_image == 'qr?c=MSKU7654321'
+
+    def test_message_page_has_no_result(self):
+        assert parse_result(parse_page('<div><span>Không tìm thấy thông tin tờ khai</span></div>')) is None
+
+    def test_echoed_search_field_is_not_a_result(self):
+        page = parse_page('<div><label>Mã số thuế:</label><span>0101234567</span>'
+                          '<span>Không có dữ liệu</span></div>')
+        assert parse_result(page, '308010891440') is None
+
+    def test_other_declaration_is_not_a_result(self):
+        fragments, _, _ = parse_partial_response(
+            load_pages()['result'].replace('__DECLARATION_NUMBER__', '999').replace('__TAX_CODE__', '0101')
+        )
+        page = parse_page(fragments[0])
+
+        assert parse_result(page, '123') is None
+        assert parse_result(page, '999').so_to_khai == '999'
+
+
+class TestAdfHttpClient:
+    """The HTTP flow against the stub ADF server"""
+
+    def test_full_flow_parses_result(self):
+        with StubAdfServer() as server:
+            result = fetch(server.url)
+            stats = dict(server.stats)
+
+        assert result.pdf_content is None
+        assert result.info.so_to_khai == "308010891440"
+        assert result.info.ngay_to_khai == "01/12/2024"
+        assert all(c.barcode_image for c in result.info.containers)
+        assert stats['sessions'] == 1
+        assert stats['submits'] == 1
+        assert stats['expired'] == 0
+        assert stats['images'] == 2
+
+    def test_save_link_pdf_is_used(self):
+        with StubAdfServer(StubAdfBehaviour(save_pdf=True)) as server:
+            result = fetch(server.url)
+
+        assert result.pdf_content.startswith(b"%PDF")
+        assert result.info is None
+
+    def test_not_found_returns_message(self):
+        with StubAdfServer(StubAdfBehaviour(not_found={"999"})) as server:
+            result = fetch(server.url, "999")
+
+        assert result.info is None
+        assert "Không tìm thấy" in result.message
+
+    def test_stale_view_state_is_an_error(self):
+        original = adf_http_client.parse_form
+
+        def stale(html, url):
+            form = original(html, url)
+            if form is not None:
+                form.hidden['javax.faces.ViewState'] = '!-stale'
+            return form
+
+        with StubAdfServer() as server, patch('web_utils.adf_http_client.parse_form', side_effect=stale):
+            with pytest.raises(AdfHttpError, match="ViewExpired"):
+                fetch(server.url)
+            assert server.stats['expired'] == 1
+
+    def test_rate_limit_wait_is_bounded_by_timeout(self):
+        limiter = Mock()
+        limiter.acquire.return_value = False
+        with StubAdfServer() as server, \
+                patch('web_utils.adf_http_client.get_rate_limiter', return_value=limiter):
+            with pytest.raises(AdfHttpError, match="rate limit"):
+                fetch(server.url)
+            assert server.stats['sessions'] == 0
+        limiter.acquire.assert_called_once_with(timeout=5)
+
+    def test_concurrent_flows_keep_separate_sessions(self):
+        with StubAdfServer(StubAdfBehaviour(latency="fixed:0.02")) as server:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda i: fetch(server.url, f"30{i:010d}"), range(16)))
+            stats = dict(server.stats)
+
+        assert [r.info.so_to_khai for r in results] == [f"30{i:010d}" for i in range(16)]
+        assert stats['sessions'] == 16
+        assert stats['expired'] == 0
+
+
+class TestRetrieverHttpMethod:
+    """BarcodeRetriever with retrieval_method='http'"""
+
+    def test_http_method_renders_pdf(self):
+        declaration = Declaration(
+            declaration_number='308010891440',
+            tax_code='2300782217',
+            declaration_date=datetime(2024, 12, 1),
+            customs_office_code='02CI',
+            status='T'
+        )
+        with StubAdfServer() as server:
+            config = BarcodeServiceConfig(
+                api_url='http://127.0.0.1:9/QRCode.asmx',
+                primary_web_url=server.url,
+                backup_web_url='',
+                timeout=5,
+                max_retries=1,
+                retry_delay=0
+            )
+            retriever = BarcodeRetriever(config, Mock(), retrieval_method="http")
+            pdf = retriever.retrieve_barcode(declaration)
+
+        assert pdf.startswith(b"%PDF")
+        assert retriever.get_method_stats()['methods']['web_http']['attempts'] == 1
+
+    def test_auto_mode_uses_http_method_only_for_adf_page(self):
+        config = BarcodeServiceConfig(
+            api_url='http://127.0.0.1:9/QRCode.asmx',
+            primary_web_url='https://pus.customs.gov.vn/faces/ContainerBarcode',
+            backup_web_url='',
+            timeout=5,
+            max_retries=1,
+            retry_delay=0
+        )
+        retriever = BarcodeRetriever(config, Mock(), retrieval_method="auto")
+        declaration = Mock(id="x")
+        attempted = []
+
+        def attempt(method, decl):
+            attempted.append(method)
+            return None
+
+        with patch.object(retriever, '_attempt_method', side_effect=attempt):
+            retriever._retrieve_barcode_uncoalesced(declaration)
+            config_other = dataclasses.replace(config, primary_web_url='http://primary.example.com')
+            retriever.config = config_other
+            retriever._retrieve_barcode_uncoalesced(declaration)
+
+        assert attempted[:4] == ['api_render', 'api', 'web_http', 'primary_web']
+        assert attempted[4:] == ['api_render', 'api', 'primary_web']
@@ -0,0 +1,242 @@
+"""
+Unit tests for ApiResponseCache
+
+These tests verify status-aware TTLs, size-bounded eviction, persistence
+and the integration with QRCodeContainerApiClient.query_bang_ke.
+"""
+
+import time
+from datetime import date, datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from web_utils.api_response_cache import (
+    ApiResponseCache,
+    STATE_CLEARED,
+    STATE_ERROR,
+    STATE_PENDING,
+    STATE_TRANSFER,
+    classify_declaration_state,
+    set_api_response_cache,
+)
+from web_utils.qrcode_api_client import (
+    BangKeQuery,
+    ContainerDeclarationInfo,
+    ContainerInfo,
+    QRCodeContainerApiClient,
+)
+
+
+def make_info(so_to_khai="308010891440", trang_thai="Thông quan", error="", containers=None):
+    return ContainerDeclarationInfo(
+        ma_so_thue="2300782217",
+        so_to_khai=so_to_khai,
+        ten_don_vi_xnk="CÔNG TY TNHH ABC",
+        trang_thai_to_khai=trang_thai,
+        so_luong_hang=12.5,
+        is_container=1,
+        thong_bao_loi=error,
+        containers=containers or [],
+    )
+
+
+def make_query(so_to_khai="308010891440"):
+    return BangKeQuery("2300782217", so_to_khai, "18A3", date(2024, 12, 1))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ApiResponseCache(db_path=str(tmp_path / "api_cache.db"), max_entries=100)
+
+
+class TestClassifyDeclarationState:
+    """Tests for classify_declaration_state"""
+
+    def test_cleared(self):
+        assert classify_declaration_state(make_info(trang_thai="Thông quan")) == STATE_CLEARED
+
+    @pytest.mark.parametrize("trang_thai", ["Chưa thông quan", "Chua thong quan", "Không thông quan"])
+    def test_negated_status_is_not_cleared(self, trang_thai):
+        info = make_info(trang_thai=trang_thai, containers=[ContainerInfo(so_container="C1", barcode_image="abc")])
+        assert classify_declaration_state(info) == STATE_PENDING
+
+    def test_transfer(self):
+        info = make_info(trang_thai="Chuyển địa điểm kiểm tra")
+        assert classify_declaration_state(info) == STATE_TRANSFER
+
+    def test_pending(self):
+        assert classify_declaration_state(make_info(trang_thai="Chờ xử lý")) == STATE_PENDING
+
+    def test_error(self):
+        info = make_info(error="Tờ khai chưa được cấp phép")
+        assert classify_declaration_state(info) == STATE_ERROR
+
+    def test_barcodes_without_status_count_as_cleared(self):
+        info = make_info(trang_thai="", containers=[ContainerInfo(so_container="C1", barcode_image="abc")])
+        assert classify_declaration_state(info) == STATE_CLEARED
+
+
+class TestApiResponseCache:
+    """Unit tests for ApiResponseCache class"""
+
+    def test_round_trip_preserves_fields_and_containers(self, cache):
+        """Cached results should deserialize to an equal dataclass"""
+        info = make_info(containers=[ContainerInfo(stt=1, so_container="TEMU1234567", so_seal="S1", trong_luong=2.5)])
+        cache.put(make_query(), info)
+
+        cached = cache.get(make_query())
+
+        assert cached == info
+        assert isinstance(cached.containers[0], ContainerInfo)
+
+    def test_key_ignores_time_part_and_case(self, cache):
+        """datetime vs date and customs code case should map to the same key"""
+        cache.put(make_query(), make_info())
+        query = BangKeQuery("2300782217", "308010891440", "18a3", datetime(2024, 12, 1, 15, 30))
+        assert cache.get(query) is not None
+
+    def test_miss_and_hit_metrics(self, cache):
+        """Hits and misses should be counted"""
+        assert cache.get(make_query()) is None
+        cache.put(make_query(), make_info())
+        assert cache.get(make_query()) is not None
+
+        stats = cache.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == pytest.approx(0.5)
+        assert stats['size'] == 1
+
+    def test_pending_entries_expire(self, tmp_path):
+        """Pending results should expire after their short TTL"""
+        cache = ApiResponseCache(db_path=str(tmp_path / "c.db"), ttls={STATE_PENDING: 0.2})
+        cache.put(make_query(), make_info(trang_thai="Chờ xử lý"))
+        assert cache.get(make_query()) is not None
+
+        time.sleep(0.3)
+
+        assert cache.get(make_query()) is None
+        assert cache.get_stats()['expired'] == 1
+
+    def test_cleared_entries_outlive_pending(self, tmp_path):
+        """Cleared results use the long TTL while pending ones expire"""
+        cache = ApiResponseCache(db_path=str(tmp_path / "c.db"), ttls={STATE_PENDING: 0.2})
+        cache.put(make_query("1"), make_info("1", trang_thai="Thông quan"))
+        cache.put(make_query("2"), make_info("2", trang_thai="Chờ xử lý"))
+
+        time.sleep(0.3)
+
+        assert cache.get(make_query("1")) is not None
+        assert cache.get(make_query("2")) is None
+
+    def test_zero_ttl_is_not_stored(self, tmp_path):
+        """A state with TTL 0 should not be cached at all"""
+        cache = ApiResponseCache(db_path=str(tmp_path / "c.db"), ttls={STATE_ERROR: 0})
+        cache.put(make_query(), make_info(error="lỗi"))
+        assert len(cache) == 0
+
+    def test_lru_eviction_bounds_size(self, tmp_path):
+        """The least recently used entries should be evicted beyond max_entries"""
+        cache = ApiResponseCache(db_path=str(tmp_path / "c.db"), max_entries=3)
+        for i in range(3):
+            cache.put(make_query(str(i)), make_info(str(i)))
+            time.sleep(0.01)
+        cache.get(make_query("0"))  # refresh entry 0
+        time.sleep(0.01)
+        cache.put(make_query("3"), make_info("3"))
+
+        assert len(cache) == 3
+        assert cache.get(make_query("1")) is None
+        assert cache.get(make_query("0")) is not None
+        assert cache.get_stats()['evictions'] == 1
+
+    def test_hits_buffer_last_access(self, cache):
+        """A hit should not write; last-access times are written in batches"""
+        def last_access():
+            conn = cache._get_connection()
+            try:
+                return conn.execute("SELECT last_access FROM api_response_cache").fetchone()[0]
+            finally:
+                conn.close()
+
+        cache.put(make_query(), make_info())
+        stored = last_access()
+        time.sleep(0.01)
+        assert cache.get(make_query()) is not None
+        assert last_access() == stored
+
+        cache.flush_access()
+
+        assert last_access() > stored
+
+    def test_persists_across_instances(self, tmp_path):
+        """Entries should survive re-opening the database"""
+        path = str(tmp_path / "c.db")
+        ApiResponseCache(db_path=path).put(make_query(), make_info())
+        assert ApiResponseCache(db_path=path).get(make_query()) is not None
+
+    def test_invalidate_and_clear(self, cache):
+        cache.put(make_query("1"), make_info("1"))
+        cache.put(make_query("2"), make_info("2"))
+        cache.invalidate(make_query("1"))
+        assert cache.get(make_query("1")) is None
+        cache.clear()
+        assert len(cache) == 0
+
+
+SOAP_RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <QueryBangKeDanhSachContainerResponse xmlns="http://tempuri.org/">
+      <QueryBangKeDanhSachContainerResult>
+        <MaSoThue>2300782217</MaSoThue>
+        <SoToKhai>308010891440</SoToKhai>
+        <TrangThaiToKhai>Thông quan</TrangThaiToKhai>
+      </QueryBangKeDanhSachContainerResult>
+    </QueryBangKeDanhSachContainerResponse>
+  </soap:Body>
+</soap:Envelope>"""
+
+
+class TestClientIntegration:
+    """query_bang_ke should consult and populate the cache"""
+
+    def setup_method(self):
+        self.client = QRCodeContainerApiClient(logger=Mock(), session=Mock())
+        response = Mock(status_code=200, text=SOAP_RESPONSE)
+        self.client.session.post.return_value = response
+
+    def teardown_method(self):
+        set_api_response_cache(None)
+
+    def _query(self, **kwargs):
+        return self.client.query_bang_ke("2300782217", "308010891440", "18A3", date(2024, 12, 1), **kwargs)
+
+    def test_cleared_result_served_without_network(self, cache):
+        """A second query for a cleared declaration makes zero requests"""
+        set_api_response_cache(cache)
+
+        first = self._query()
+        second = self._query()
+
+        assert first == second
+        assert self.client.session.post.call_count == 1
+        assert cache.get_stats()['hits'] == 1
+
+    def test_use_cache_false_forces_request_and_refreshes(self, cache):
+        """Bypassing the cache should still write the fresh result back"""
+        set_api_response_cache(cache)
+
+        self._query(use_cache=False)
+        self._query(use_cache=False)
+
+        assert self.client.session.post.call_count == 2
+        assert cache.get_stats()['stores'] == 2
+
+    def test_no_cache_configured(self):
+        """Without a configured cache every call goes to the network"""
+        set_api_response_cache(None)
+        self._query()
+        self._query()
+        assert self.client.session.post.call_count == 2
@@ -0,0 +1,373 @@
+"""
+Unit tests for the asyncio QRCode batch engine
+
+These tests run AsyncQRCodeClient / QRCodeContainerApiClient.query_many
+against a local stub SOAP server.
+"""
+
+import re
+import threading
+import time
+from datetime import date
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+import pytest
+
+from web_utils.async_qrcode_client import AsyncQRCodeClient
+from web_utils.concurrency_controller import AdaptiveConcurrencyController
+from web_utils.qrcode_api_client import BangKeQuery, QRCodeContainerApiClient
+from web_utils.rate_limiter import TokenBucketRateLimiter
+
+
+def build_response(so_to_khai: str) -> str:
+    """Build a QueryBangKeDanhSachContainer response with one container."""
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <QueryBangKeDanhSachContainerResponse xmlns="http://tempuri.org/">
+      <QueryBangKeDanhSachContainerResult>
+        <MaSoThue>0101234567</MaSoThue>
+        <SoToKhai>{so_to_khai}</SoToKhai>
+        <TenDonViXNK>CÔNG TY TNHH THỬ NGHIỆM</TenDonViXNK>
+        <TrangThaiToKhai>Thông quan</TrangThaiToKhai>
+        <MaPTVC>2</MaPTVC>
+        <BangKe>
+          <diffgr:diffgram xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1">
+            <DocumentElement xmlns="">
+              <Table_BangKe diffgr:id="Table_BangKe1">
+                <Stt>1</Stt>
+                <SoContainer>TEMU1234567</SoContainer>
+                <SoSeal>SEAL01</SoSeal>
+              </Table_BangKe>
+            </DocumentElement>
+          </diffgr:diffgram>
+        </BangKe>
+      </QueryBangKeDanhSachContainerResult>
+    </QueryBangKeDanhSachContainerResponse>
+  </soap:Body>
+</soap:Envelope>"""
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.delay = 0.0
+        self.chunked = False
+        self.paths = []
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            if urlsplit(self.path).path.startswith("/old/"):
+                self.send_response(307)
+                self.send_header("Location", "/WS_Container/QRCode.asmx")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            tk = re.search(r"<TK_ID>(.*?)</TK_ID>", body).group(1)
+            with state.lock:
+                state.paths.append(self.path)
+                state.requests += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                if tk.startswith("SLOW"):
+                    time.sleep(2)
+                elif state.delay:
+                    time.sleep(state.delay)
+
+                if tk.startswith("THROTTLE"):
+                    payload = b"Too Many Requests"
+                    self.send_response(429)
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                if tk.startswith("FAIL"):
+                    payload = b"Server Error"
+                    self.send_response(500)
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                payload = build_response(tk).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml; charset=utf-8")
+                if state.chunked:
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for i in range(0, len(payload), 100):
+                        chunk = payload[i:i + 100]
+                        self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cancelled/timed-out clients close sockets mid-response
+        pass
+
+
+@pytest.fixture
+def stub():
+    state = StubState()
+    server = QuietServer(("127.0.0.1", 0), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{server.server_address[1]}/WS_Container/QRCode.asmx"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def make_keys(prefix: str, count: int):
+    return [BangKeQuery("0101234567", f"{prefix}{i}", "18A3", date(2024, 12, 1)) for i in range(count)]
+
+
+class TestAsyncQRCodeClient:
+    """Unit tests for the asyncio batch engine"""
+
+    def test_query_many_returns_results_in_order(self, stub):
+        """Results should be parsed and aligned with the input keys"""
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+        keys = make_keys("1000", 5)
+
+        results = client.run_many(keys, concurrency=3)
+
+        assert [r.query for r in results] == keys
+        assert all(r.ok for r in results)
+        assert [r.info.so_to_khai for r in results] == [k.so_to_khai for k in keys]
+        assert results[0].info.containers[0].so_container == "TEMU1234567"
+
+    def test_concurrency_keeps_many_requests_in_flight(self, stub):
+        """Dozens of requests should be in flight at once, bounded by concurrency"""
+        stub.delay = 0.3
+        controller = AdaptiveConcurrencyController(max_limit=12, initial_limit=12)
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5, controller=controller)
+
+        started = time.monotonic()
+        results = client.run_many(make_keys("2000", 24), concurrency=12)
+        elapsed = time.monotonic() - started
+
+        assert all(r.ok for r in results)
+        assert stub.max_in_flight <= 12
+        assert stub.max_in_flight >= 6
+        # 24 requests x 0.3s sequentially would take 7.2s
+        assert elapsed < 3.0
+
+    def test_connections_are_reused(self, stub):
+        """Keep-alive connections should be reused within a batch"""
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+        client.run_many(make_keys("3000", 10), concurrency=2)
+        assert client._transport.connections_opened <= 2
+        assert client._transport.requests_sent == 10
+
+    def test_chunked_responses_are_supported(self, stub):
+        """Chunked transfer encoding should be decoded"""
+        stub.chunked = True
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+        results = client.run_many(make_keys("4000", 3), concurrency=2)
+        assert all(r.ok and r.info.so_to_khai.startswith("4000") for r in results)
+
+    def test_http_error_is_reported_per_request(self, stub):
+        """A 5xx on one key should not fail the rest of the batch"""
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+        keys = make_keys("5000", 2) + make_keys("FAIL", 1)
+
+        results = client.run_many(keys, concurrency=3)
+
+        assert results[0].ok and results[1].ok
+        assert not results[2].ok
+        assert "HTTP 500" in str(results[2].error)
+
+    def test_http_429_is_reported_and_slows_the_limiter(self, stub):
+        """A 429 should be a per-request error that reaches on_result and the limiter"""
+        limiter = TokenBucketRateLimiter(rate=100, burst=10)
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5, rate_limiter=limiter)
+        keys = make_keys("5500", 1) + make_keys("THROTTLE", 1)
+        seen = []
+
+        results = client.run_many(keys, concurrency=2, on_result=seen.append)
+
+        assert results[0].ok
+        assert not results[1].ok and not results[1].cancelled
+        assert "HTTP 429" in str(results[1].error)
+        assert len(seen) == 2
+        assert limiter.get_stats()['throttled'] == 1
+
+    def test_unexpected_error_is_reported_not_cancelled(self, stub):
+        """A bug inside a request should surface as an error result, not a cancellation"""
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+        client._codec._parse_soap_response = Mock(side_effect=RuntimeError("boom"))
+        seen = []
+
+        results = client.run_many(make_keys("5600", 1), on_result=seen.append)
+
+        assert not results[0].ok and not results[0].cancelled
+        assert "boom" in str(results[0].error)
+        assert seen == results
+
+    def test_per_request_timeout(self, stub):
+        """Slow requests should time out individually"""
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+        keys = make_keys("6000", 1) + make_keys("SLOW", 1)
+
+        results = client.run_many(keys, concurrency=2, timeout=0.5)
+
+        assert results[0].ok
+        assert not results[1].ok
+        assert "timed out" in str(results[1].error)
+
+    def test_cancel_event_cancels_pending_requests(self, stub):
+        """Setting the cancel event should cancel everything still pending"""
+        stub.delay = 0.5
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+        cancel = threading.Event()
+        threading.Timer(0.2, cancel.set).start()
+
+        started = time.monotonic()
+        results = client.run_many(make_keys("7000", 20), concurrency=2, cancel_event=cancel)
+
+        assert time.monotonic() - started < 2.0
+        assert all(r.cancelled for r in results)
+
+    def test_paused_checkpoint_holds_back_requests(self, stub):
+        """While the checkpoint blocks (job paused) no further request is sent"""
+        client = QRCodeContainerApiClient(service_url=stub.url, logger=Mock(), timeout=5)
+        resume = threading.Event()
+        calls = []
+
+        def checkpoint():
+            calls.append(1)
+            if len(calls) > 2:
+                resume.wait()
+            return True
+
+        results = []
+        worker = threading.Thread(target=lambda: results.extend(
+            client.query_many(make_keys("8600", 6), concurrency=1, checkpoint=checkpoint)
+        ))
+        worker.start()
+        time.sleep(0.5)
+
+        assert stub.requests == 2
+        resume.set()
+        worker.join(5)
+        assert stub.requests == 6
+        assert all(r.ok for r in results)
+
+    def test_checkpoint_false_cancels_queries(self, stub):
+        """A checkpoint returning False (job cancelled) cancels without a request"""
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5)
+
+        results = client.run_many(make_keys("8700", 4), concurrency=2, checkpoint=lambda: False)
+
+        assert stub.requests == 0
+        assert all(r.cancelled for r in results)
+
+    def test_redirect_is_followed(self, stub):
+        """A redirected service URL should be followed like the sync client does"""
+        url = stub.url.replace("/WS_Container/", "/old/WS_Container/")
+        client = AsyncQRCodeClient(service_url=url, logger=Mock(), timeout=5)
+
+        results = client.run_many(make_keys("8500", 2), concurrency=2)
+
+        assert all(r.ok for r in results)
+        assert [r.info.so_to_khai for r in results] == ["85000", "85001"]
+
+    def test_proxy_settings_are_honored(self, stub, monkeypatch):
+        """With a proxy configured, requests should go through it, not straight to the host"""
+        proxy = stub.url.split("/WS_Container/")[0]
+        for name in ("NO_PROXY", "no_proxy"):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv("HTTP_PROXY", proxy)
+        monkeypatch.setenv("http_proxy", proxy)
+        # Only reachable through the proxy (the stub answers the proxied request)
+        client = AsyncQRCodeClient(service_url="http://customs.invalid/WS_Container/QRCode.asmx",
+                                   logger=Mock(), timeout=5)
+
+        results = client.run_many(make_keys("8600", 3), concurrency=2)
+
+        assert all(r.ok for r in results)
+        assert all(path.startswith("http://customs.invalid/") for path in stub.paths)
+
+    def test_unreachable_server_reports_errors(self):
+        """Connection failures should become per-request errors"""
+        client = AsyncQRCodeClient(service_url="http://127.0.0.1:9/QRCode.asmx", logger=Mock(), timeout=2)
+        results = client.run_many(make_keys("8000", 2), concurrency=2)
+        assert all(not r.ok for r in results)
+
+
+class TestSyncFacade:
+    """Verify the blocking query_many facade on QRCodeContainerApiClient"""
+
+    def test_query_many_accepts_tuples_and_streams_results(self, stub):
+        """Tuple keys are accepted and on_result fires for each completion"""
+        client = QRCodeContainerApiClient(service_url=stub.url, logger=Mock(), timeout=5)
+        seen = []
+
+        results = client.query_many(
+            [("0101234567", "9001", "18A3", date(2024, 12, 1)),
+             ("0101234567", "9002", "18A3", date(2024, 12, 1))],
+            concurrency=2,
+            on_result=seen.append
+        )
+
+        assert [r.info.so_to_khai for r in results] == ["9001", "9002"]
+        assert len(seen) == 2
+
+    def test_query_many_empty(self):
+        """An empty batch should return immediately"""
+        client = QRCodeContainerApiClient(logger=Mock())
+        assert client.query_many([]) == []
+
+
+class TestAdaptiveConcurrency:
+    """Verify the batch engine respects the shared concurrency controller"""
+
+    def test_controller_limit_caps_in_flight_requests(self, stub):
+        """The controller's current limit applies below the concurrency bound"""
+        stub.delay = 0.2
+        controller = AdaptiveConcurrencyController(max_limit=2, initial_limit=2)
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5, controller=controller)
+
+        results = client.run_many(make_keys("9100", 8), concurrency=8)
+
+        assert all(r.ok for r in results)
+        assert stub.max_in_flight <= 2
+        assert controller.in_flight == 0
+
+    def test_server_errors_reduce_limit(self, stub):
+        """5xx responses should feed back into the controller as overload"""
+        controller = AdaptiveConcurrencyController(max_limit=8, initial_limit=8)
+        client = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5, controller=controller)
+
+        client.run_many(make_keys("FAIL", 4), concurrency=4)
+
+        assert controller.limit < 8
+        assert controller.get_stats()['overloads'] == 4
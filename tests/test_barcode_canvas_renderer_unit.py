@@ -0,0 +1,189 @@
+"""
+Unit tests for the barcode canvas renderer
+
+These tests verify that the direct-canvas fast path draws the same page as
+the Platypus layout (pixel diff of both renders), that text blocks only
+bypass Paragraph for plain one-line text, and that pages which don't fit
+fall back to Platypus.
+"""
+
+import base64
+import dataclasses
+import re
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from web_utils.api_capture import placeholder_png
+from web_utils.barcode_canvas_renderer import CanvasLayoutError, CanvasPageRenderer, TextBlock
+from web_utils.barcode_pdf_generator import CONTAINER_COL_WIDTHS, CONTAINER_TABLE_HEADER, BarcodePdfGenerator
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
+
+FROZEN_NOW = datetime(2024, 12, 1, 9, 30)
+MAX_DIFF_PIXELS = 20  # Anti-aliasing noise allowance at 144 DPI
+
+
+def make_info(containers: int = 0, **fields) -> ContainerDeclarationInfo:
+    info = ContainerDeclarationInfo(
+        ma_so_thue="2300782217",
+        so_to_khai="308010891440",
+        ngay_to_khai="01/12/2024",
+        ten_don_vi_xnk="CÔNG TY TNHH ABC",
+        ma_ddgs="18A3OZZ",
+        ten_ddgs="Cảng Hải Phòng",
+        ten_loai_hinh="A11 - Nhập kinh doanh tiêu dùng",
+        trang_thai_to_khai="Thông quan",
+        luong_to_khai="Xanh",
+        so_luong_hang=1250,
+        dvt_so_luong_hang="PK",
+        tong_trong_luong_hang=24567.5,
+        dvt_tong_trong_luong_hang="KGM",
+        so_dinh_danh="DD2412010001",
+        ma_ptvc="2" if containers else "1",
+    )
+    image = base64.b64encode(placeholder_png(200)).decode("ascii")
+    for i in range(1, containers + 1):
+        info.containers.append(ContainerInfo(
+            stt=i, so_container=f"TEMU{i:07d}", so_seal=f"S{i:06d}", barcode_image=image
+        ))
+    return dataclasses.replace(info, **fields)
+
+
+@pytest.fixture
+def generator():
+    return BarcodePdfGenerator(logger=Mock())
+
+
+@pytest.fixture(autouse=True)
+def frozen_clock():
+    with patch("web_utils.barcode_pdf_generator.datetime") as clock:
+        clock.now.return_value = FROZEN_NOW
+        yield
+
+
+def render_both(generator, info):
+    fast = generator.generate_pdf(info)
+    generator.fast_render = False
+    try:
+        reference = generator.generate_pdf(info)
+    finally:
+        generator.fast_render = True
+    return fast, reference
+
+
+class TestPixelDiff:
+    """The fast path draws the page Platypus draws"""
+
+    @pytest.fixture(autouse=True)
+    def pdfium(self):
+        return pytest.importorskip("pypdfium2")
+
+    def diff_pixels(self, pdfium, fast: bytes, reference: bytes) -> int:
+        from PIL import ImageChops
+
+        fast_doc, reference_doc = pdfium.PdfDocument(fast), pdfium.PdfDocument(reference)
+        assert len(fast_doc) == len(reference_doc) == 1
+        images = [doc[0].render(scale=2).to_pil().convert("L") for doc in (fast_doc, reference_doc)]
+        difference = ImageChops.difference(*images)
+        return sum(difference.histogram()[16:])
+
+    @pytest.mark.parametrize("containers, fields", [
+        (0, {}),
+        (3, {}),
+        (0, {"ten_don_vi_xnk": "CÔNG TY TRÁCH NHIỆM HỮU HẠN THƯƠNG MẠI DỊCH VỤ XUẤT NHẬP KHẨU "
+                                "VẬN TẢI QUỐC TẾ ĐẠI DƯƠNG XANH VIỆT NAM CHI NHÁNH BẮC NINH"}),
+        (0, {"ten_don_vi_xnk": "A &amp; B <b>Co</b>", "ghi_chu": "  hai  khoảng trắng "}),
+        (0, {"ten_cuc_hai_quan": "Chi cục Hải quan khu vực V và một tên rất dài",
+             "dvt_so_luong_hang": "PACKAGES AND MORE UNITS OF MEASURE"}),
+        (0, {"so_luong_hang": 0, "tong_trong_luong_hang": 0, "so_dinh_danh": ""}),
+        (2, {"so_to_khai": "30~8"}),
+    ], ids=["cargo", "containers", "wrapped-item", "markup", "wrapped-header-and-cell", "empty-cells",
+            "no-barcode"])
+    def test_matches_platypus(self, generator, pdfium, containers, fields):
+        fast, reference = render_both(generator, make_info(containers, **fields))
+
+        assert fast != reference  # Really two different renderers
+        assert self.diff_pixels(pdfium, fast, reference) <= MAX_DIFF_PIXELS
+
+
+class TestTextBlock:
+    """Plain one-line text skips Paragraph"""
+
+    @pytest.fixture
+    def styles(self, generator):
+        return generator._get_styles()
+
+    def test_label_and_value_drawn_directly(self, generator, styles):
+        block = TextBlock(f"<font name='{generator.font_bold}'>4. Số tờ khai:</font> 308010891440", styles["info"])
+
+        assert block.wrap(400, 100) == (400, styles["info"].leading)
+        assert block._paragraph is None
+        assert block.segments == [(generator.font_bold, "4. Số tờ khai:"), (generator.font_name, " 308010891440")]
+
+    def test_italic_note_uses_italic_font(self, styles):
+        block = TextBlock("<i>Ghi chú:</i>", styles["note"])
+
+        assert block.segments[0][0] != styles["note"].fontName
+        assert block.segments[0][1] == "Ghi chú:"
+
+    def test_indented_note_collapses_like_paragraph(self, styles):
+        assert TextBlock("    + Cột số (3)", styles["note"]).segments[0][1] == "+ Cột số (3)"
+
+    @pytest.mark.parametrize("markup", ["A &amp; B", "<b>bold</b>", "", "<font color='red'>4.</font> x"])
+    def test_other_markup_uses_paragraph(self, styles, markup):
+        block = TextBlock(markup, styles["info"])
+        block.wrap(400, 100)
+
+        assert block.segments is None
+        assert block._paragraph is not None
+
+    def test_too_wide_text_wraps_with_paragraph(self, styles):
+        block = TextBlock("Hải quan " * 20, styles["info"])
+        _, height = block.wrap(200, 1000)
+
+        assert block._paragraph is not None
+        assert height > styles["info"].leading
+
+
+class TestFallback:
+    """Pages that don't fit use Platypus"""
+
+    def test_long_container_list_raises(self, generator):
+        texts = generator._page_texts(make_info(40), is_container=True)
+        rows = generator._container_rows(make_info(40).containers)
+        renderer = CanvasPageRenderer(
+            generator.config, generator._get_styles(),
+            (generator.font_name, generator.font_bold, generator.font_italic)
+        )
+
+        with pytest.raises(CanvasLayoutError):
+            renderer.render_container(texts, CONTAINER_TABLE_HEADER, CONTAINER_COL_WIDTHS, rows)
+
+    def test_long_container_list_paginated_by_platypus(self, generator):
+        with patch.object(generator, "_render_platypus", wraps=generator._render_platypus) as platypus:
+            pdf = generator.generate_pdf(make_info(40))
+
+        platypus.assert_called_once()
+        assert int(re.search(rb"/Count (\d+)", pdf).group(1)) > 1
+
+    def test_single_page_skips_platypus(self, generator):
+        with patch.object(generator, "_render_platypus") as platypus:
+            assert generator.generate_pdf(make_info(2)).startswith(b"%PDF")
+            assert generator.generate_pdf(make_info()).startswith(b"%PDF")
+
+        platypus.assert_not_called()
+
+    def test_renderer_error_falls_back(self, generator):
+        with patch.object(CanvasPageRenderer, "render_cargo", side_effect=ValueError("boom")):
+            pdf = generator.generate_pdf(make_info())
+
+        assert pdf.startswith(b"%PDF")
+        generator.logger.warning.assert_called_once()
+
+    def test_seal_status_corrected_once(self, generator):
+        with patch.object(generator, "_auto_correct_seal_status", return_value="x") as correct, \
+                patch.object(CanvasPageRenderer, "render_cargo", side_effect=CanvasLayoutError("full")):
+            generator.generate_pdf(make_info())
+
+        correct.assert_called_once()
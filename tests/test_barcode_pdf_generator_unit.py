@@ -0,0 +1,165 @@
+"""
+Unit tests for BarcodePdfGenerator rendering assets
+
+These tests verify that fonts, paragraph styles and table styles are built
+once per process and shared by generator instances, and that the
+declaration barcode is drawn as vector Code39 rather than an embedded image,
+and that the same payload renders the same bytes and the same payload hash
+under the same render settings and seal note preferences.
+"""
+
+import dataclasses
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from web_utils import barcode_pdf_generator
+from web_utils.barcode_pdf_generator import (
+    BarcodePdfGenerator,
+    BarcodeRenderConfig,
+    Code39Barcode,
+    get_paragraph_styles,
+    get_render_fonts,
+    payload_hash,
+)
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
+
+
+def cargo_info(so_to_khai: str = "308010891440") -> ContainerDeclarationInfo:
+    return ContainerDeclarationInfo(
+        so_to_khai=so_to_khai,
+        ma_so_thue="2300782217",
+        ten_don_vi_xnk="CÔNG TY TNHH ABC",
+        so_luong_hang=10,
+        dvt_so_luong_hang="PK",
+        ma_ptvc="1",
+    )
+
+
+class TestRenderAssetCaching:
+    """Fonts and styles are shared across generator instances"""
+
+    def test_fonts_registered_once(self):
+        with patch.object(barcode_pdf_generator, '_fonts', None), \
+                patch.object(barcode_pdf_generator, 'TTFont'), \
+                patch.object(barcode_pdf_generator.pdfmetrics, 'registerFont') as register:
+            first = BarcodePdfGenerator(logger=None)
+            second = BarcodePdfGenerator(logger=None)
+
+        assert register.call_count == 3
+        assert (first.font_name, first.font_bold, first.font_italic) == ('Arial', 'Arial-Bold', 'Arial-Italic')
+        assert second.font_bold == 'Arial-Bold'
+
+    def test_font_fallback_is_cached(self):
+        with patch.object(barcode_pdf_generator, '_fonts', None), \
+                patch.object(barcode_pdf_generator, 'TTFont', side_effect=IOError("no arial")) as ttfont:
+            assert get_render_fonts() == ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique')
+            assert get_render_fonts() == ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique')
+
+        assert ttfont.call_count == 1
+
+    def test_styles_shared_between_instances(self):
+        first = BarcodePdfGenerator(logger=None)
+        second = BarcodePdfGenerator(logger=None)
+
+        assert first._get_styles() is second._get_styles()
+        assert first._get_table_styles() is second._get_table_styles()
+        assert first._get_styles()['info'].fontName == first.font_name
+        assert first._get_styles()['cell_wrap'].parent is first._get_styles()['info']
+
+    def test_styles_keyed_by_font_set(self):
+        helvetica = get_paragraph_styles(('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique'))
+        times = get_paragraph_styles(('Times-Roman', 'Times-Bold', 'Times-Italic'))
+
+        assert helvetica is not times
+        assert times['title'].fontName == 'Times-Bold'
+
+
+class TestVectorBarcode:
+    """The declaration barcode is vector Code39"""
+
+    @pytest.fixture
+    def generator(self):
+        return BarcodePdfGenerator(logger=None)
+
+    def test_barcode_fits_configured_box(self, generator):
+        barcode = generator._generate_barcode_image("308010891440")
+
+        assert isinstance(barcode, Code39Barcode)
+        assert barcode.wrap(500, 500) == (generator.config.barcode_width, generator.config.barcode_height)
+        assert barcode.hAlign == 'RIGHT'
+        assert barcode.barcode.validated == "308010891440"
+
+    def test_unencodable_value_is_dropped(self, generator):
+        assert generator._generate_barcode_image("") is None
+        assert generator._generate_barcode_image("3080~1") is None
+
+    def test_cargo_pdf_has_no_raster_images(self, generator):
+        pdf = generator.generate_pdf(cargo_info())
+
+        assert pdf.startswith(b"%PDF")
+        assert b"/Subtype /Image" not in pdf
+
+    def test_pdf_still_generated_without_barcode(self, generator):
+        with patch.object(generator, '_generate_barcode_image', return_value=None):
+            assert generator.generate_pdf(cargo_info()).startswith(b"%PDF")
+
+
+class TestDeterministicOutput:
+    """Same payload, same PDF and payload hash"""
+
+    @pytest.fixture(autouse=True)
+    def frozen_clock(self):
+        with patch("web_utils.barcode_pdf_generator.datetime") as clock:
+            clock.now.return_value = datetime(2024, 12, 1, 9, 30)
+            yield
+
+    @pytest.mark.parametrize("fast_render", [True, False])
+    def test_same_info_same_bytes(self, fast_render):
+        generator = BarcodePdfGenerator(logger=None)
+        generator.fast_render = fast_render
+
+        first = generator.generate_pdf(cargo_info())
+        time.sleep(1.1)  # Creation dates have one-second resolution
+
+        assert generator.generate_pdf(cargo_info()) == first
+        assert b"D:20000101000000" in first
+
+    def test_payload_hash_ignores_retrieval_time(self):
+        info = cargo_info()
+
+        assert payload_hash(info) == payload_hash(cargo_info())
+        assert payload_hash(info) == payload_hash(dataclasses.replace(info, thoi_gian_lay_du_lieu="09:31"))
+
+    def test_payload_hash_follows_printed_data(self):
+        info = cargo_info()
+        with_container = cargo_info()
+        with_container.containers.append(ContainerInfo(stt=1, so_container="TEMU0000001"))
+
+        assert payload_hash(info) != payload_hash(cargo_info("308010891441"))
+        assert payload_hash(info) != payload_hash(dataclasses.replace(info, luong_to_khai="Vàng"))
+        assert payload_hash(info) != payload_hash(with_container)
+
+    def test_layout_version_changes_hash(self):
+        before = payload_hash(cargo_info())
+        with patch.object(barcode_pdf_generator, "PDF_LAYOUT_VERSION", barcode_pdf_generator.PDF_LAYOUT_VERSION + 1):
+            assert payload_hash(cargo_info()) != before
+
+    def test_render_settings_change_hash(self):
+        before = payload_hash(cargo_info())
+
+        assert payload_hash(cargo_info(), BarcodeRenderConfig()) == before
+        assert payload_hash(cargo_info(), BarcodeRenderConfig(qr_image_max_dpi=150)) != before
+        assert payload_hash(cargo_info(), BarcodeRenderConfig(image_compression_level=9)) != before
+        assert payload_hash(cargo_info(), BarcodeRenderConfig(page_compression=False)) != before
+
+    def test_seal_correction_preferences_change_hash(self):
+        enabled = MagicMock(auto_correct_seal_green_yellow=True, auto_correct_seal_red=True)
+        disabled = MagicMock(auto_correct_seal_green_yellow=False, auto_correct_seal_red=True)
+
+        with patch("config.preferences_service.get_preferences_service", return_value=enabled):
+            before = payload_hash(cargo_info())
+        with patch("config.preferences_service.get_preferences_service", return_value=disabled):
+            assert payload_hash(cargo_info()) != before
@@ -37,7 +37,7 @@ def declaration_strategy(draw):
 def test_property_barcode_retrieval_fallback_chain(declaration):
     """
     For any eligible CustomsDeclaration, when attempting barcode retrieval,
-    the system should try API first (fastest),
+    the system should try the API (render, then legacy GetBarcode) first,
     then primary website, then backup website, in that order.
     
     **Validates: Requirements 4.1, 4.2, 4.3**
@@ -67,6 +67,10 @@ def test_property_barcode_retrieval_fallback_chain(declaration):
     original_try_api = retriever._try_api
     original_try_web_scraping = retriever._try_web_scraping
     
+    def mock_try_api_method(decl):
+        call_order.append('api_render')
+        return None  # Simulate failure
+    
     def mock_try_api(decl):
         call_order.append('api')
         return None  # Simulate failure
@@ -78,15 +82,16 @@ def test_property_barcode_retrieval_fallback_chain(declaration):
             call_order.append('backup')
         return None  # Simulate failure
     
+    retriever._try_api_method = mock_try_api_method
     retriever._try_api = mock_try_api
     retriever._try_web_scraping = mock_try_web_scraping
     
     # Attempt retrieval
     result = retriever.retrieve_barcode(declaration)
     
-    # Verify fallback chain order: api -> primary -> backup
-    assert call_order == ['api', 'primary', 'backup'], \
-        f"Expected fallback order ['api', 'primary', 'backup'], but got {call_order}"
+    # Verify fallback chain order: api_render -> api -> primary -> backup
+    assert call_order == ['api_render', 'api', 'primary', 'backup'], \
+        f"Expected fallback order ['api_render', 'api', 'primary', 'backup'], but got {call_order}"
     
     # Result should be None since all methods failed
     assert result is None, "Expected None when all methods fail"
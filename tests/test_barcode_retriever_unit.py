@@ -6,12 +6,15 @@ These tests verify specific examples and edge cases for barcode retrieval.
 
 import pytest
 from datetime import datetime
-from unittest.mock import Mock, MagicMock, patch
+from unittest.mock import Mock, MagicMock, call, patch
 import base64
+import time
 
 from models.declaration_models import Declaration
 from models.config_models import BarcodeServiceConfig
+from web_utils.barcode_pdf_generator import BarcodeRenderConfig, payload_hash
 from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.qrcode_api_client import ContainerDeclarationInfo
 
 
 class TestBarcodeRetriever:
@@ -237,6 +240,24 @@ class TestBarcodeRetriever:
             # Driver should be quit
             assert mock_driver.quit.called
     
+    def test_web_scraping_rate_limit_timeout(self):
+        """A rate limit wait longer than web_timeout fails the attempt without navigating"""
+        limiter = Mock()
+        limiter.acquire.return_value = False
+        with patch.object(self.retriever, '_setup_webdriver') as mock_setup, \
+                patch('web_utils.barcode_retriever.get_rate_limiter', return_value=limiter):
+            mock_driver = Mock()
+            mock_setup.return_value = mock_driver
+            
+            result = self.retriever._try_web_scraping(
+                self.config.primary_web_url,
+                self.test_declaration
+            )
+            
+            assert result is None
+            assert call(self.config.primary_web_url) not in mock_driver.get.call_args_list
+            assert limiter.acquire.call_args.kwargs['timeout'] == self.config.web_timeout
+    
     def test_cleanup(self):
         """Test cleanup of resources"""
         mock_driver = Mock()
@@ -687,29 +708,26 @@ class TestPerformanceOptimizations:
                 # Call count should not increase (method is skipped)
                 assert api_call_count_after == api_call_count_before
     
-    def test_reset_method_skip_list(self):
-        """Test that method skip list can be reset for new batches"""
+    def test_skipped_methods_recover_after_timeout(self):
+        """Skipped methods come back through the breaker recovery timeout, not per batch"""
+        self.config.method_recovery_timeout = 0.1
+        retriever = BarcodeRetriever(self.config, self.mock_logger)
+        
         # Record failures to trigger skipping
         for i in range(3):
-            self.retriever._record_method_failure('api')
-            self.retriever._record_method_failure('primary_web')
+            retriever._record_method_failure('api')
+            retriever._record_method_failure('primary_web')
         
         # Methods should be skipped
-        assert not self.retriever._should_try_method('api')
-        assert not self.retriever._should_try_method('primary_web')
+        assert not retriever._should_try_method('api')
+        assert not retriever._should_try_method('primary_web')
+        assert retriever._should_try_method('backup_web')
         
-        # Reset skip list
-        self.retriever.reset_method_skip_list()
+        time.sleep(0.15)
         
-        # All methods should be tried again
-        assert self.retriever._should_try_method('api')
-        assert self.retriever._should_try_method('primary_web')
-        assert self.retriever._should_try_method('backup_web')
-        
-        # Failure counts should be reset
-        assert self.retriever._failed_methods['api'] == 0
-        assert self.retriever._failed_methods['primary_web'] == 0
-        assert self.retriever._failed_methods['backup_web'] == 0
+        # Half-open: the methods are tried again
+        assert retriever._should_try_method('api')
+        assert retriever._should_try_method('primary_web')
     
     def test_retry_logic_respects_new_max_retries(self):
         """Test that retry logic respects the new max_retries configuration"""
@@ -758,3 +776,120 @@ class TestPerformanceOptimizations:
         # Session should still exist (for basic functionality)
         assert hasattr(retriever, 'session')
         assert retriever.session is not None
+
+
+class TestContentHashSkip:
+    """fetch_barcode skips PDFs whose payload is unchanged"""
+    
+    def setup_method(self):
+        self.config = BarcodeServiceConfig(
+            api_url='http://test-api.example.com/QRCode.asmx',
+            primary_web_url='http://primary.example.com',
+            backup_web_url='http://backup.example.com',
+            timeout=30,
+            max_retries=1,
+            retry_delay=0
+        )
+        self.declaration = Declaration(
+            declaration_number='308010891440',
+            tax_code='2300782217',
+            declaration_date=datetime(2023, 1, 5),
+            customs_office_code='18A3'
+        )
+        self.info = ContainerDeclarationInfo(so_to_khai='308010891440', ma_so_thue='2300782217', ma_ptvc='1')
+    
+    def api_retriever(self):
+        retriever = BarcodeRetriever(self.config, Mock(), retrieval_method='api')
+        retriever._api_client = Mock()
+        retriever._api_client.query_bang_ke.return_value = self.info
+        return retriever
+    
+    def test_unchanged_payload_not_rendered(self):
+        retriever = self.api_retriever()
+        
+        with patch.object(retriever, '_render_pdf') as render:
+            result = retriever.fetch_barcode(self.declaration, payload_hash(self.info))
+        
+        render.assert_not_called()
+        assert result.status == 'unchanged'
+        assert result.pdf_content is None
+        assert result.content_hash == payload_hash(self.info)
+    
+    def test_changed_payload_rendered_with_new_hash(self):
+        retriever = self.api_retriever()
+        
+        with patch.object(retriever, '_render_pdf', return_value=b'%PDF-new') as render:
+            result = retriever.fetch_barcode(self.declaration, 'old-hash')
+        
+        render.assert_called_once()
+        assert result.status == 'success'
+        assert result.pdf_content == b'%PDF-new'
+        assert result.content_hash == payload_hash(self.info)
+    
+    def test_changed_render_settings_rendered(self):
+        retriever = self.api_retriever()
+        known = payload_hash(self.info, retriever._pdf_generator.config)
+        retriever._pdf_generator.config = BarcodeRenderConfig(qr_image_max_dpi=150)
+        
+        with patch.object(retriever, '_render_pdf', return_value=b'%PDF-new') as render:
+            result = retriever.fetch_barcode(self.declaration, known)
+        
+        render.assert_called_once()
+        assert not result.unchanged
+        assert result.content_hash == payload_hash(self.info, BarcodeRenderConfig(qr_image_max_dpi=150))
+    
+    def test_no_known_hash_always_rendered(self):
+        retriever = self.api_retriever()
+        
+        with patch.object(retriever, '_render_pdf', return_value=b'%PDF-1.4'):
+            result = retriever.fetch_barcode(self.declaration)
+        
+        assert result.pdf_content == b'%PDF-1.4'
+        assert result.content_hash == payload_hash(self.info)
+    
+    def test_downloaded_pdf_hashed_by_content(self):
+        import hashlib
+        retriever = BarcodeRetriever(self.config, Mock(), retrieval_method='web')
+        known = hashlib.sha256(b'%PDF-web').hexdigest()
+        
+        with patch.object(retriever, '_try_web_method', return_value=b'%PDF-web'):
+            assert retriever.fetch_barcode(self.declaration, known).unchanged
+            assert retriever.fetch_barcode(self.declaration, 'other').pdf_content == b'%PDF-web'
+    
+    def test_failure_reported(self):
+        retriever = self.api_retriever()
+        retriever._api_client.query_bang_ke.return_value = None
+        
+        result = retriever.fetch_barcode(self.declaration, 'old-hash')
+        
+        assert result.status == 'failed'
+        assert not result.unchanged
+    
+    def test_retrieve_barcode_never_skips(self):
+        retriever = self.api_retriever()
+        
+        with patch.object(retriever, '_render_pdf', return_value=b'%PDF-1.4'):
+            assert retriever.retrieve_barcode(self.declaration) == b'%PDF-1.4'
+    
+    def test_render_deferred(self):
+        retriever = self.api_retriever()
+        retriever._pdf_generator = Mock(config=BarcodeRenderConfig())
+        retriever._pdf_generator.generate_pdf.return_value = b'%PDF-1.4'
+        
+        result = retriever.fetch_barcode(self.declaration, 'old-hash', render=False)
+        
+        retriever._pdf_generator.generate_pdf.assert_not_called()
+        assert result.status == 'success'
+        assert result.needs_render and result.info is self.info
+        assert result.content_hash == payload_hash(self.info)
+        assert retriever.render_barcode(result) == b'%PDF-1.4'
+        retriever._pdf_generator.generate_pdf.assert_called_once_with(self.info)
+    
+    def test_downloaded_pdf_not_deferred(self):
+        retriever = BarcodeRetriever(self.config, Mock(), retrieval_method='web')
+        
+        with patch.object(retriever, '_try_web_method', return_value=b'%PDF-web'):
+            result = retriever.fetch_barcode(self.declaration, render=False)
+        
+        assert not result.needs_render
+        assert retriever.render_barcode(result) == b'%PDF-web'
@@ -0,0 +1,237 @@
+"""
+Unit tests for the batch journal
+
+These tests verify that batches and their items are journaled, that item
+updates are buffered and written many per transaction, that fetched
+payloads survive a restart until the item is finished, and that the
+workflow pipeline resumes an interrupted batch without fetching the
+declarations it had already fetched.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+from database.tracking_database import TrackingDatabase
+from models.declaration_models import Declaration
+from services import batch_journal as journal_states
+from services.batch_journal import BatchJournal, main
+from services.workflow_pipeline import PipelineSettings, WorkflowPipeline
+from web_utils.barcode_retriever import RetrievalResult
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
+
+
+def make_declaration(number, tax_code="2300782217"):
+    return Declaration(number, tax_code, datetime(2024, 12, 1, 8, 30), customs_office_code="18A3")
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.db"), flush_interval=60)
+    yield journal
+    journal.close()
+
+
+def reopen(journal):
+    """A new journal on the same file, as after a restart"""
+    return BatchJournal(journal.db_path, flush_interval=60)
+
+
+class TestBatchJournal:
+    """Journaled batches and items"""
+
+    def test_start_batch(self, journal):
+        declarations = [make_declaration("1"), make_declaration("2")]
+
+        batch_id = journal.start_batch(declarations, journal_states.SOURCE_MANUAL, force_redownload=True)
+
+        batch = journal.get_batch(batch_id)
+        assert (batch.source, batch.force_redownload, batch.total, batch.pending) == ("manual", True, 2, 2)
+        entries = reopen(journal).pending_entries(batch_id)
+        assert [entry.declaration for entry in entries] == declarations
+        assert all(entry.state == journal_states.QUEUED for entry in entries)
+
+    def test_updates_buffered_and_merged(self, journal):
+        batch_id = journal.start_batch([make_declaration(str(i)) for i in range(3)], "workflow")
+
+        journal.record(batch_id, 0, journal_states.FETCHED, content_hash="h0", pdf_content=b"%PDF 0")
+        journal.record(batch_id, 0, journal_states.RENDERED)
+        journal.record(batch_id, 1, journal_states.FAILED, error="Failed to retrieve barcode")
+
+        assert reopen(journal).pending_entries(batch_id)[0].state == journal_states.QUEUED  # Not written yet
+        assert journal.get_stats()["buffered"] == 2
+        assert journal.flush() == 2  # One row update per item, in one transaction
+
+        entries = {entry.seq: entry for entry in reopen(journal).pending_entries(batch_id)}
+        assert set(entries) == {0, 2}
+        assert entries[0].state == journal_states.RENDERED
+        assert (entries[0].content_hash, entries[0].pdf_content) == ("h0", b"%PDF 0")
+
+    def test_flush_size_wakes_writer(self, tmp_path):
+        journal = BatchJournal(str(tmp_path / "journal.db"), flush_interval=60, flush_size=2)
+        batch_id = journal.start_batch([make_declaration("1"), make_declaration("2")], "workflow")
+
+        journal.record(batch_id, 0, journal_states.TRACKED)
+        journal.record(batch_id, 1, journal_states.TRACKED)
+        for _ in range(100):
+            if journal.get_stats()["flushes"]:
+                break
+            journal._flusher.join(0.05)
+
+        assert journal.get_stats()["flushes"] == 1
+        assert reopen(journal).pending_entries(batch_id) == []
+        journal.close()
+
+    def test_payload_kept_until_finished(self, journal):
+        info = ContainerDeclarationInfo(so_to_khai="1", containers=[ContainerInfo(so_container="ABCU1234567")])
+        batch_id = journal.start_batch([make_declaration("1"), make_declaration("2")], "workflow")
+        journal.record(batch_id, 0, journal_states.FETCHED, content_hash="h", info=info)
+        journal.record(batch_id, 1, journal_states.FETCHED, content_hash="h", pdf_content=b"%PDF")
+        journal.flush()
+
+        restored = reopen(journal).pending_entries(batch_id)[0]
+        assert restored.info == info
+        assert restored.to_result().needs_render
+
+        journal.record(batch_id, 0, journal_states.TRACKED)
+        journal.flush()
+        conn = sqlite3.connect(journal.db_path)
+        assert conn.execute("SELECT info FROM journal_items WHERE seq = 0").fetchone() == (None,)
+        conn.close()
+
+    def test_fetched_without_payload_fetched_again(self, journal):
+        batch_id = journal.start_batch([make_declaration("1")], "workflow")
+        journal.record(batch_id, 0, journal_states.FETCHED, content_hash="h", info="not serializable")
+
+        assert journal.pending_entries(batch_id)[0].state == journal_states.QUEUED
+
+    def test_unfinished_batches(self, journal):
+        finished = journal.start_batch([make_declaration("1")], "scheduler")
+        journal.finish_batch(finished)
+        interrupted = journal.start_batch([make_declaration("2")], "scheduler")
+        manual = journal.start_batch([make_declaration("3")], "manual")
+
+        assert journal.unfinished_batches() == []  # Still running in this process
+        after_restart = reopen(journal)
+        assert [b.batch_id for b in after_restart.unfinished_batches()] == [interrupted, manual]
+        assert [b.batch_id for b in after_restart.unfinished_batches("manual")] == [manual]
+        assert after_restart.claim(manual) and not after_restart.claim(manual)
+
+        journal.release(interrupted)
+        assert [b.batch_id for b in journal.unfinished_batches()] == [interrupted]
+
+    def test_prune(self, journal):
+        old = journal.start_batch([make_declaration("1")], "workflow")
+        journal.finish_batch(old, journal_states.CANCELLED)
+        recent = journal.start_batch([make_declaration("2")], "workflow")
+        journal.finish_batch(recent)
+        conn = sqlite3.connect(journal.db_path)
+        conn.execute("UPDATE journal_batches SET finished_at = ? WHERE batch_id = ?",
+                     ((datetime.now() - timedelta(days=10)).strftime("%Y-%m-%dT%H:%M:%S"), old))
+        conn.commit()
+        conn.close()
+
+        assert journal.prune(keep_days=7) == 1
+        assert journal.get_batch(old) is None
+        assert journal.get_batch(recent).status == journal_states.COMPLETED
+
+    def test_cli(self, journal, capsys):
+        batch_id = journal.start_batch([make_declaration("1")], "manual")
+
+        assert main(["--db", journal.db_path, "--list"]) == 0
+        assert batch_id in capsys.readouterr().out
+        assert main(["--db", journal.db_path, "--discard", batch_id]) == 0
+        assert journal.get_batch(batch_id).status == journal_states.ABANDONED
+        assert main(["--db", journal.db_path, "--discard", "unknown"]) == 1
+
+
+class TestPipelineResume:
+    """Journaled workflow pipeline runs"""
+
+    @pytest.fixture
+    def components(self, tmp_path):
+        retriever = MagicMock()
+        retriever.fetch_barcode.side_effect = lambda declaration, known_hash, render: RetrievalResult(
+            content_hash=f"hash-{declaration.declaration_number}",
+            info=ContainerDeclarationInfo(so_to_khai=declaration.declaration_number)
+        )
+        retriever.render_barcode.side_effect = lambda result: f"%PDF {result.info.so_to_khai}".encode()
+        file_manager = MagicMock()
+        file_manager.save_barcode.side_effect = lambda declaration, pdf, overwrite: f"/out/{declaration.declaration_number}.pdf"
+        db = TrackingDatabase(str(tmp_path / "tracking.db"))
+        return db, retriever, file_manager, MagicMock()
+
+    def pipeline(self, components, journal):
+        db, retriever, file_manager, ecus = components
+        return WorkflowPipeline(db, retriever, file_manager, ecus, MagicMock(), PipelineSettings(), journal=journal)
+
+    def test_completed_batch(self, components, journal):
+        db = components[0]
+        self.pipeline(components, journal).run([make_declaration(str(i)) for i in range(5)])
+
+        assert len(db.get_all_processed_details()) == 5
+        assert reopen(journal).unfinished_batches() == []
+
+    def test_resume_does_not_refetch(self, components, journal):
+        db, retriever, file_manager, ecus = components
+        declarations = [make_declaration(str(i)) for i in range(4)]
+        batch_id = journal.start_batch(declarations, "workflow")
+        # Interrupted: 0 tracked, 1 written, 2 fetched, 3 not started
+        db.add_processed(declarations[0], "/out/0.pdf", content_hash="hash-0")
+        journal.record(batch_id, 0, journal_states.TRACKED)
+        journal.record(batch_id, 1, journal_states.FETCHED, content_hash="hash-1",
+                       info=ContainerDeclarationInfo(so_to_khai="1"))
+        journal.record(batch_id, 1, journal_states.WRITTEN, file_path="/out/1.pdf")
+        journal.record(batch_id, 2, journal_states.FETCHED, content_hash="hash-2",
+                       info=ContainerDeclarationInfo(so_to_khai="2"))
+        journal.close()
+        restarted = reopen(journal)
+        finished = []
+
+        self.pipeline(components, restarted).resume(batch_id, on_done=finished.append)
+
+        assert sorted(item.declaration.declaration_number for item in finished) == ["1", "2", "3"]
+        assert all(item.success for item in finished)
+        assert [call.args[0] for call in retriever.fetch_barcode.call_args_list] == [declarations[3]]
+        assert sorted(call.args[0].declaration_number for call in file_manager.save_barcode.call_args_list) == ["2", "3"]
+        file_manager.save_barcode.assert_any_call(declarations[2], b"%PDF 2", overwrite=False)
+        assert {row.declaration_number: row.file_path for row in db.get_all_processed_details()} == {
+            str(i): f"/out/{i}.pdf" for i in range(4)
+        }
+        assert db.get_content_hash(declarations[1]) == "hash-1"
+        assert restarted.get_batch(batch_id).status == journal_states.COMPLETED
+        assert restarted.unfinished_batches() == []
+
+    def test_resume_accepts_files_saved_before_the_crash(self, components, journal):
+        db, retriever, file_manager, ecus = components
+        declaration = make_declaration("1")
+        batch_id = journal.start_batch([declaration], "workflow")
+        journal.record(batch_id, 0, journal_states.RENDERED, content_hash="hash-1",
+                       info=ContainerDeclarationInfo(so_to_khai="1"))
+        journal.release(batch_id)
+        file_manager.save_barcode.side_effect = None
+        file_manager.save_barcode.return_value = None  # Already saved, overwrite=False
+        file_manager.locate.return_value = "/out/1.pdf"
+        finished = []
+
+        self.pipeline(components, journal).resume(batch_id, on_done=finished.append)
+
+        assert finished[0].success and finished[0].file_path == "/out/1.pdf"
+        retriever.fetch_barcode.assert_not_called()
+
+    def test_error_leaves_item_failed(self, components, journal):
+        components[1].render_barcode.side_effect = RuntimeError("renderer crashed")
+        pipeline = self.pipeline(components, journal)
+
+        pipeline.run([make_declaration("1")])
+
+        assert reopen(journal).unfinished_batches() == []
+        conn = sqlite3.connect(journal.db_path)
+        assert conn.execute("SELECT state, error FROM journal_items").fetchone() == ("failed", "renderer crashed")
+        conn.close()
+
+    def test_resume_unknown_batch(self, components, journal):
+        with pytest.raises(ValueError):
+            self.pipeline(components, journal).resume("unknown")
@@ -0,0 +1,174 @@
+"""
+Unit tests for the batch PDF writer
+
+These tests verify that declaration PDFs are combined in batch order behind
+a table of contents, with one bookmark per declaration and a companion
+index, that unreadable PDFs are left out, and that FileManager and
+ParallelDownloader open and close batches when batch output is enabled.
+"""
+
+import csv
+import io
+import os
+import random
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+pypdf = pytest.importorskip("pypdf")
+
+from file_utils.batch_pdf_writer import BatchPdfWriter  # noqa: E402
+from file_utils.file_manager import FileManager  # noqa: E402
+from models.declaration_models import Declaration  # noqa: E402
+from web_utils.barcode_pdf_generator import BarcodePdfGenerator  # noqa: E402
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo  # noqa: E402
+
+
+def make_declaration(i: int) -> Declaration:
+    return Declaration(f"30{i:010d}", "2300782217", datetime(2024, 12, 1))
+
+
+@pytest.fixture(scope="module")
+def pdfs():
+    """Ten one-page PDFs and one long container list (several pages)."""
+    generator = BarcodePdfGenerator(logger=None)
+    result = []
+    for i in range(11):
+        info = ContainerDeclarationInfo(so_to_khai=f"30{i:010d}", ma_so_thue="2300782217", ma_ptvc="2")
+        for n in range(1, (60 if i == 5 else 2) + 1):
+            info.containers.append(ContainerInfo(stt=n, so_container=f"TEMU{n:07d}"))
+        result.append(generator.generate_pdf(info))
+    return result
+
+
+def page_text(page) -> str:
+    return page.extract_text().replace("\n", " ")
+
+
+class TestBatchPdfWriter:
+    """Combining declaration PDFs"""
+
+    def test_pages_follow_batch_order(self, tmp_path, pdfs):
+        path = str(tmp_path / "Batch.pdf")
+        order = list(range(len(pdfs)))
+        random.Random(7).shuffle(order)
+
+        with BatchPdfWriter(path) as batch:
+            for i in order:
+                assert batch.add(make_declaration(i), pdfs[i], source_path=f"/out/{i}.pdf", position=i)
+
+        reader = pypdf.PdfReader(path)
+        source_pages = [len(pypdf.PdfReader(io.BytesIO(pdf)).pages) for pdf in pdfs]
+        assert source_pages[5] > 1
+        contents_pages = len(reader.pages) - sum(source_pages)
+        assert contents_pages == 1
+        first = contents_pages
+        for i, count in enumerate(source_pages):
+            assert f"30{i:010d}" in page_text(reader.pages[first])
+            first += count
+
+    def test_bookmarks_and_index_point_at_first_pages(self, tmp_path, pdfs):
+        path = str(tmp_path / "Batch.pdf")
+        with BatchPdfWriter(path, title="Lô hàng 12") as batch:
+            for i, pdf in enumerate(pdfs):
+                batch.add(make_declaration(i), pdf, source_path=f"/out/{i}.pdf")
+
+        reader = pypdf.PdfReader(path)
+        with open(batch.index_path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f))[1:]
+
+        assert len(reader.outline) == len(rows) == len(pdfs)
+        for i, (bookmark, row) in enumerate(zip(reader.outline, rows)):
+            page = reader.get_destination_page_number(bookmark)
+            assert bookmark.title == f"30{i:010d} - 2300782217"
+            assert row[1] == f"30{i:010d}"
+            assert int(row[4]) == page + 1
+            assert f"30{i:010d}" in page_text(reader.pages[page])
+            assert row[6] == f"{i}.pdf"
+        assert rows[5][5] != "1"
+        assert reader.metadata.title == "Lô hàng 12"
+        assert "300000000000" in page_text(reader.pages[0])  # Contents page first
+
+    def test_contents_spanning_pages_lists_right_numbers(self, tmp_path, pdfs):
+        path = str(tmp_path / "Batch.pdf")
+        with BatchPdfWriter(path) as batch:
+            for i in range(120):
+                batch.add(make_declaration(i), pdfs[i % 5])
+
+        reader = pypdf.PdfReader(path)
+        contents_pages = len(reader.pages) - 120
+        assert contents_pages > 1
+        assert reader.get_destination_page_number(reader.outline[0]) == contents_pages
+        last = page_text(reader.pages[contents_pages - 1])
+        assert f"{len(reader.pages)}" in last.split()
+
+    def test_unreadable_pdf_is_skipped(self, tmp_path, pdfs):
+        path = str(tmp_path / "Batch.pdf")
+        with BatchPdfWriter(path) as batch:
+            assert batch.add(make_declaration(0), b"not a pdf") is False
+            assert batch.add(make_declaration(1), pdfs[1]) is True
+
+        assert batch.declaration_count == 1
+        assert len(pypdf.PdfReader(path).pages) == 2
+
+    def test_empty_batch_writes_nothing(self, tmp_path):
+        batch = BatchPdfWriter(str(tmp_path / "Batch.pdf"))
+
+        assert batch.close() is None
+        assert os.listdir(tmp_path) == []
+
+    def test_error_discards_partial_file(self, tmp_path, pdfs):
+        with pytest.raises(RuntimeError):
+            with BatchPdfWriter(str(tmp_path / "Batch.pdf")) as batch:
+                batch.add(make_declaration(0), pdfs[0])
+                raise RuntimeError("stopped")
+
+        assert os.listdir(tmp_path) == []
+
+
+class TestFileManagerBatch:
+    """FileManager.open_batch"""
+
+    def test_disabled_by_default(self, tmp_path):
+        assert FileManager(str(tmp_path)).open_batch() is None
+
+    def test_opens_batch_in_output_directory(self, tmp_path, pdfs):
+        manager = FileManager(str(tmp_path / "out"))
+        manager.batch_output = True
+
+        first, second = manager.open_batch(), manager.open_batch()
+        first.add(make_declaration(0), pdfs[0])
+        path = first.close()
+        second.abort()
+
+        assert os.path.dirname(path) == str(tmp_path / "out")
+        assert os.path.basename(path).startswith("Batch_")
+        assert first.path != second.path
+
+    def test_without_pypdf(self, tmp_path):
+        manager = FileManager(str(tmp_path))
+        manager.batch_output = True
+
+        with patch("file_utils.file_manager.PYPDF_AVAILABLE", False):
+            assert manager.open_batch() is None
+
+
+class TestParallelDownloaderBatch:
+    """Batch downloads feed the batch file"""
+
+    def test_download_batch_combines_saved_pdfs(self, tmp_path, pdfs):
+        from web_utils.parallel_downloader import ParallelDownloader
+
+        manager = FileManager(str(tmp_path))
+        manager.batch_output = True
+        retriever = Mock(spec=["retrieve_barcode"])
+        retriever.retrieve_barcode.side_effect = lambda d: pdfs[int(d.declaration_number) % 10]
+        declarations = [make_declaration(i) for i in range(6)]
+
+        downloader = ParallelDownloader(retriever, manager, max_concurrent=3)
+        results = downloader.download_batch(declarations)
+
+        assert all(results.values())
+        reader = pypdf.PdfReader(downloader.last_batch_path)
+        assert [b.title.split()[0] for b in reader.outline] == [d.declaration_number for d in declarations]
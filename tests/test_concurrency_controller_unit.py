@@ -0,0 +1,238 @@
+"""
+Unit tests for AdaptiveConcurrencyController
+
+These tests verify the AIMD behaviour (additive increase on healthy
+responses, multiplicative decrease on overload), slot accounting and
+bounded slot waits.
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from web_utils.concurrency_controller import (
+    AdaptiveConcurrencyController,
+    SlotTimeoutError,
+    get_concurrency_controller,
+    is_overload_error,
+    is_overload_status,
+)
+from web_utils.qrcode_api_client import QRCodeApiError, QRCodeContainerApiClient
+from web_utils.rate_limiter import TokenBucketRateLimiter
+
+
+class TestAdaptiveConcurrencyController:
+    """Unit tests for AdaptiveConcurrencyController class"""
+
+    def test_healthy_responses_increase_limit(self):
+        """Fast successful responses should raise the limit additively"""
+        controller = AdaptiveConcurrencyController(max_limit=10, initial_limit=2, latency_target=1.0)
+
+        for _ in range(20):
+            assert controller.try_acquire()
+            controller.release(latency=0.1, success=True)
+
+        assert controller.limit > 2
+        assert controller.get_stats()['increases'] > 0
+
+    def test_limit_never_exceeds_max(self):
+        """The limit should stop growing at max_limit"""
+        controller = AdaptiveConcurrencyController(max_limit=4, initial_limit=1)
+        for _ in range(200):
+            controller.try_acquire()
+            controller.release(latency=0.01, success=True)
+        assert controller.limit == 4
+
+    def test_overload_halves_limit(self):
+        """A timeout/5xx should cut the limit multiplicatively"""
+        controller = AdaptiveConcurrencyController(max_limit=16, initial_limit=8)
+        controller.try_acquire()
+        controller.release(latency=5.0, success=False, overload=True)
+        assert controller.limit == 4
+
+    def test_burst_of_overloads_decreases_once_per_cooldown(self):
+        """Failures from the same window should not collapse the limit"""
+        controller = AdaptiveConcurrencyController(max_limit=16, initial_limit=8, decrease_cooldown=10.0)
+        for _ in range(5):
+            controller.try_acquire()
+            controller.release(latency=1.0, success=False, overload=True)
+        assert controller.limit == 4
+        assert controller.get_stats()['decreases'] == 1
+        assert controller.get_stats()['overloads'] == 5
+
+    def test_cooldown_independent_of_latency_target(self):
+        """The back-off period is its own setting, not the latency target"""
+        controller = AdaptiveConcurrencyController(max_limit=16, initial_limit=8, latency_target=10.0,
+                                                   decrease_cooldown=0.0)
+        for _ in range(2):
+            controller.try_acquire()
+            controller.release(latency=1.0, success=False, overload=True)
+        assert controller.limit == 2
+        controller.configure(1, 16, decrease_cooldown=60.0)
+        controller.try_acquire()
+        controller.release(latency=1.0, success=False, overload=True)
+        assert controller.limit == 2
+
+    def test_limit_never_drops_below_min(self):
+        """Backing off should stop at min_limit"""
+        controller = AdaptiveConcurrencyController(min_limit=2, max_limit=8, initial_limit=2, decrease_cooldown=0.0)
+        controller.try_acquire()
+        controller.release(latency=1.0, success=False, overload=True)
+        assert controller.limit == 2
+
+    def test_slow_success_holds_limit(self):
+        """Slow but successful responses should neither raise nor lower the limit"""
+        controller = AdaptiveConcurrencyController(max_limit=8, initial_limit=3, latency_target=1.0)
+        for _ in range(10):
+            controller.try_acquire()
+            controller.release(latency=3.0, success=True)
+        assert controller.limit == 3
+
+    def test_try_acquire_respects_limit(self):
+        """try_acquire should fail once the limit is reached"""
+        controller = AdaptiveConcurrencyController(max_limit=2, initial_limit=2)
+        assert controller.try_acquire()
+        assert controller.try_acquire()
+        assert not controller.try_acquire()
+        assert controller.in_flight == 2
+
+    def test_acquire_times_out(self):
+        """Blocking acquire should return False after the timeout"""
+        controller = AdaptiveConcurrencyController(max_limit=1, initial_limit=1)
+        assert controller.acquire()
+        started = time.monotonic()
+        assert not controller.acquire(timeout=0.2)
+        assert time.monotonic() - started >= 0.15
+
+    def test_acquire_wakes_on_release(self):
+        """A waiting thread should get the slot as soon as it is released"""
+        controller = AdaptiveConcurrencyController(max_limit=1, initial_limit=1)
+        controller.acquire()
+        acquired = []
+
+        def waiter():
+            acquired.append(controller.acquire(timeout=2))
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.1)
+        controller.release(latency=0.1, success=True)
+        thread.join(timeout=2)
+        assert acquired == [True]
+
+    def test_async_acquire_wakes_on_release_from_thread(self):
+        """acquire_async should wake when another thread releases a slot"""
+        controller = AdaptiveConcurrencyController(max_limit=1, initial_limit=1)
+        controller.acquire()
+        timer = threading.Timer(0.1, controller.release, kwargs={'latency': 0.1, 'success': True})
+
+        async def run():
+            timer.start()
+            return await controller.acquire_async(timeout=2)
+
+        assert asyncio.run(run())
+        assert controller.in_flight == 1
+
+    def test_async_acquire_times_out_and_cancel_holds_no_slot(self):
+        """A timed-out or cancelled acquire_async should not hold a slot"""
+        controller = AdaptiveConcurrencyController(max_limit=1, initial_limit=1)
+        controller.acquire()
+
+        async def run():
+            assert not await controller.acquire_async(timeout=0.1)
+            task = asyncio.create_task(controller.acquire_async())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        controller.release(latency=0.1, success=True)
+        assert controller.in_flight == 0
+        assert controller._async_waiters == []
+
+    def test_slot_records_timeout_as_overload(self):
+        """Timeouts escaping a slot block should count as overload"""
+        controller = AdaptiveConcurrencyController(max_limit=8, initial_limit=8)
+        with pytest.raises(requests.Timeout):
+            with controller.slot():
+                raise requests.Timeout("boom")
+        assert controller.limit == 4
+        assert controller.in_flight == 0
+
+    def test_slot_other_errors_are_neutral(self):
+        """Non-overload exceptions should release the slot without changing the limit"""
+        controller = AdaptiveConcurrencyController(max_limit=8, initial_limit=4)
+        with pytest.raises(ValueError):
+            with controller.slot():
+                raise ValueError("parse error")
+        assert controller.limit == 4
+        assert controller.in_flight == 0
+
+    def test_slot_wait_is_bounded(self):
+        """slot(timeout) should raise instead of waiting forever for a slot"""
+        controller = AdaptiveConcurrencyController(max_limit=1, initial_limit=1)
+        controller.acquire()
+        started = time.monotonic()
+        with pytest.raises(SlotTimeoutError):
+            with controller.slot(timeout=0.2):
+                pass
+        assert time.monotonic() - started >= 0.15
+        assert controller.in_flight == 1
+        assert controller.get_stats()['overloads'] == 0
+
+    def test_sync_api_client_gives_up_waiting_for_a_slot(self):
+        """A collapsed limit should fail a sync API request after its timeout, not hang it"""
+        controller = AdaptiveConcurrencyController(max_limit=1, initial_limit=1)
+        controller.acquire()
+        client = QRCodeContainerApiClient(logger=Mock(), timeout=0.2)
+        client.session = Mock()
+
+        with patch('web_utils.qrcode_api_client.get_concurrency_controller', return_value=controller), \
+                patch('web_utils.qrcode_api_client.get_rate_limiter', return_value=TokenBucketRateLimiter(rate=0)):
+            with pytest.raises(QRCodeApiError, match="concurrency slot"):
+                client._post_soap_request("<soap/>")
+
+        client.session.post.assert_not_called()
+
+    def test_configure_clamps_current_limit(self):
+        """Reconfiguring bounds should clamp the current limit"""
+        controller = AdaptiveConcurrencyController(max_limit=10, initial_limit=8)
+        controller.configure(1, 5)
+        assert controller.limit == 5
+        assert controller.max_limit == 5
+
+    def test_overload_classification(self):
+        """Statuses and exceptions should be classified correctly"""
+        assert is_overload_status(503)
+        assert is_overload_status(429)
+        assert not is_overload_status(200)
+        assert not is_overload_status(404)
+        assert is_overload_error(requests.Timeout())
+        assert is_overload_error(requests.ConnectionError())
+        assert not is_overload_error(ValueError())
+
+    def test_global_controller_is_singleton(self):
+        """get_concurrency_controller should always return the same instance"""
+        assert get_concurrency_controller() is get_concurrency_controller()
+
+    @settings(max_examples=50, deadline=None)
+    @given(st.lists(st.tuples(st.floats(0, 10), st.booleans(), st.booleans()), max_size=60))
+    def test_limit_stays_within_bounds(self, outcomes):
+        """
+        **Feature: adaptive-concurrency, Property 1: Limit stays within bounds**
+
+        For any sequence of outcomes, min_limit <= limit <= max_limit.
+        """
+        controller = AdaptiveConcurrencyController(min_limit=2, max_limit=9, initial_limit=3, latency_target=1.0)
+        controller._last_decrease = -1e9
+        for latency, success, overload in outcomes:
+            controller.try_acquire()
+            controller.release(latency, success, overload)
+            assert 2 <= controller.limit <= 9
+        assert controller.in_flight == 0
@@ -176,6 +176,20 @@ def test_save_barcode_success(sample_declaration, temp_directory):
     assert saved_content == pdf_content
 
 
+def test_save_barcode_rewrites_file_deleted_outside_app(sample_declaration, temp_directory):
+    """A file deleted behind the index's back is written again with overwrite=False"""
+    file_manager = FileManager(temp_directory)
+    first = file_manager.save_barcode(sample_declaration, b'%PDF-1.4 first', overwrite=False)
+    os.remove(first)
+    
+    result = file_manager.save_barcode(sample_declaration, b'%PDF-1.4 second', overwrite=False)
+    
+    assert result == first
+    with open(result, 'rb') as f:
+        assert f.read() == b'%PDF-1.4 second'
+    assert file_manager.save_barcode(sample_declaration, b'%PDF-1.4 third', overwrite=False) is None
+
+
 def test_save_barcode_creates_directory(sample_declaration):
     """
     Test that save_barcode creates directory if it doesn't exist.
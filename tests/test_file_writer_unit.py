@@ -0,0 +1,175 @@
+"""
+Unit tests for the file writer
+
+These tests verify that files are replaced atomically, that failed writes
+leave neither a partial target nor a temporary file, that known directories
+are cached (and recreated if removed), that the queue bound applies
+back-pressure, and that FileManager saves through the writer.
+"""
+
+import os
+import shutil
+import threading
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from file_utils.file_manager import FileManager
+from file_utils.file_writer import DirectoryCache, FileWriter, atomic_write
+from models.declaration_models import Declaration
+
+
+@pytest.fixture
+def writer():
+    writer = FileWriter(workers=2, queue_size=4)
+    yield writer
+    writer.shutdown()
+
+
+class TestAtomicWrite:
+    """Temp file plus os.replace"""
+
+    def test_replaces_existing_file(self, tmp_path):
+        path = str(tmp_path / "a.pdf")
+        atomic_write(path, b"old")
+
+        assert atomic_write(path, b"new content") == 11
+        assert open(path, "rb").read() == b"new content"
+        assert os.listdir(tmp_path) == ["a.pdf"]
+
+    def test_failed_write_keeps_old_file_and_no_temp(self, tmp_path):
+        path = str(tmp_path / "a.pdf")
+        atomic_write(path, b"old")
+
+        with patch("file_utils.file_writer.os.replace", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                atomic_write(path, b"new")
+
+        assert open(path, "rb").read() == b"old"
+        assert os.listdir(tmp_path) == ["a.pdf"]
+
+
+class TestDirectoryCache:
+    """Directories are checked once"""
+
+    def test_creates_once(self, tmp_path):
+        cache = DirectoryCache()
+        directory = str(tmp_path / "out")
+
+        with patch("file_utils.file_writer.os.makedirs", wraps=os.makedirs) as makedirs:
+            cache.ensure(directory)
+            cache.ensure(directory)
+
+        assert os.path.isdir(directory)
+        assert makedirs.call_count == 1
+
+    def test_recreates_removed_directory(self, tmp_path, writer):
+        directory = tmp_path / "out"
+        writer.write(str(directory / "a.pdf"), b"a")
+        shutil.rmtree(directory)
+
+        assert writer.write(str(directory / "b.pdf"), b"b") == str(directory / "b.pdf")
+        assert os.listdir(directory) == ["b.pdf"]
+
+
+class TestFileWriter:
+    """Queued writes"""
+
+    def test_submit_writes_and_calls_back(self, tmp_path, writer):
+        path = str(tmp_path / "a.pdf")
+        called = []
+
+        future = writer.submit(path, b"pdf", then=called.append)
+
+        assert future.result() == path
+        assert called == [path]
+        assert open(path, "rb").read() == b"pdf"
+
+    def test_no_overwrite_skips_existing(self, tmp_path, writer):
+        path = str(tmp_path / "a.pdf")
+        writer.write(path, b"first")
+
+        assert writer.write(path, b"second", overwrite=False) is None
+        assert open(path, "rb").read() == b"first"
+        assert writer.get_stats()["skipped"] == 1
+
+    def test_failure_reaches_future(self, tmp_path, writer):
+        with patch("file_utils.file_writer.atomic_write", side_effect=PermissionError("denied")):
+            future = writer.submit(str(tmp_path / "a.pdf"), b"pdf")
+
+            with pytest.raises(PermissionError):
+                future.result()
+        assert writer.get_stats()["failed"] == 1
+
+    def test_inline_without_workers(self, tmp_path):
+        writer = FileWriter(workers=0)
+        threads = []
+
+        writer.submit(str(tmp_path / "a.pdf"), b"pdf", then=lambda p: threads.append(threading.current_thread()))
+
+        assert threads == [threading.current_thread()]
+
+    def test_full_queue_blocks_submitters(self, tmp_path):
+        writer = FileWriter(workers=1, queue_size=2)
+        release = threading.Event()
+        real_write = atomic_write
+
+        def slow_write(*args):
+            release.wait(5)
+            return real_write(*args)
+
+        with patch("file_utils.file_writer.atomic_write", side_effect=slow_write):
+            writer.submit(str(tmp_path / "1.pdf"), b"1")
+            writer.submit(str(tmp_path / "2.pdf"), b"2")
+            third = threading.Thread(target=writer.submit, args=(str(tmp_path / "3.pdf"), b"3"))
+            third.start()
+            third.join(0.2)
+            assert third.is_alive()  # Waiting for a free slot
+
+            release.set()
+            third.join(5)
+            assert writer.flush(5)
+        writer.shutdown()
+
+        stats = writer.get_stats()
+        assert stats["written"] == 3
+        assert stats["max_queue_depth"] == 2
+        assert stats["queue_depth"] == 0
+        assert stats["bytes"] == 3
+
+    def test_stats(self, tmp_path, writer):
+        for i in range(3):
+            writer.submit(str(tmp_path / f"{i}.pdf"), b"12345")
+        assert writer.flush(5)
+
+        stats = writer.get_stats()
+        assert (stats["workers"], stats["queue_size"]) == (2, 4)
+        assert (stats["written"], stats["bytes"]) == (3, 15)
+        assert stats["max_write_ms"] >= stats["avg_write_ms"] >= 0
+
+
+class TestFileManagerSaves:
+    """FileManager writes through the FileWriter"""
+
+    def make_declaration(self):
+        return Declaration("308010891440", "2300782217", datetime(2024, 12, 1))
+
+    def test_save_barcode_is_atomic(self, tmp_path, writer):
+        manager = FileManager(str(tmp_path / "out"), file_writer=writer)
+        declaration = self.make_declaration()
+
+        path = manager.save_barcode(declaration, b"old")
+        assert manager.save_barcode(declaration, b"new", overwrite=True) == path
+
+        assert open(path, "rb").read() == b"new"
+        assert os.listdir(tmp_path / "out") == [os.path.basename(path)]
+
+    def test_save_barcode_async(self, tmp_path, writer):
+        manager = FileManager(str(tmp_path / "out"), file_writer=writer)
+        saved = []
+
+        future = manager.save_barcode_async(self.make_declaration(), b"pdf", then=saved.append)
+
+        assert future.result() == manager.get_file_path(self.make_declaration())
+        assert saved == [future.result()]
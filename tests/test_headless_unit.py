@@ -0,0 +1,132 @@
+"""
+Unit tests for the headless service
+
+These tests verify that the headless entry point does not import any GUI
+module, that its commands run the workflow service and report failures in
+the exit code, and that workflow and job progress is logged as structured
+records.
+"""
+
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+import headless
+from models.declaration_models import WorkflowResult
+from services.job_queue import KIND_MANUAL, JobQueue
+from services.workflow_events import WorkflowEvent
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def logged(logger, level="info"):
+    """(message, extra) of the calls to logger.<level>"""
+    return [(call.args[0], call.kwargs.get("extra", {})) for call in getattr(logger, level).call_args_list]
+
+
+def make_result(success, errors):
+    result = WorkflowResult()
+    result.start_time = datetime(2024, 12, 1, 8, 0)
+    result.end_time = result.start_time + timedelta(seconds=12)
+    result.total_eligible = success + errors
+    result.success_count = success
+    result.error_count = errors
+    return result
+
+
+class TestHeadless:
+    """Commands and structured logging"""
+
+    def test_no_gui_imports(self):
+        code = ("import sys, headless; "
+                "print(sorted(m for m in sys.modules if m.split('.')[0] in ('gui', 'tkinter', 'tkcalendar')))")
+
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout
+
+        assert output.strip() == "[]"
+
+    def test_parse_args(self):
+        args = headless.parse_args(["--log-format", "json", "run-once", "--days-back", "3",
+                                    "--tax-code", "2300782217", "--tax-code", "0101234567", "--force"])
+
+        assert (args.command, args.log_format, args.days_back, args.force) == ("run-once", "json", 3, True)
+        assert args.tax_codes == ["2300782217", "0101234567"]
+        assert headless.parse_args(["resume"]).batch_id is None
+        with pytest.raises(SystemExit):
+            headless.parse_args([])
+
+    @pytest.mark.parametrize("errors, exit_code", [(0, 0), (2, 1)])
+    def test_run_once(self, monkeypatch, errors, exit_code):
+        service = MagicMock()
+        service.execute.return_value = make_result(5, errors)
+        monkeypatch.setattr(headless, "_workflow_service", lambda components: service)
+        components = MagicMock()
+
+        assert headless.run_once(components, 3, ["2300782217"], False) == exit_code
+
+        service.execute.assert_called_once_with(days_back=3, tax_codes=["2300782217"], force_redownload=False)
+        message, extra = logged(components.logger)[-1]
+        assert extra["event"] == "run_completed"
+        assert (extra["success"], extra["errors"], extra["duration_seconds"]) == (5, errors, 12.0)
+
+    def test_resume(self, monkeypatch):
+        service = MagicMock()
+        service.resume.return_value = make_result(3, 0)
+        monkeypatch.setattr(headless, "_workflow_service", lambda components: service)
+
+        assert headless.resume(MagicMock(), "batch-1") == 0
+        service.resume.assert_called_once_with("batch-1")
+
+    def test_missing_configuration(self, tmp_path, capsys):
+        assert headless.main(["--config", str(tmp_path / "missing" / "config.ini"), "run-once"]) == 1
+        assert "Configuration file not found" in capsys.readouterr().err
+
+
+class TestWorkflowProgressLogger:
+    """Structured workflow events"""
+
+    def test_progress_every_ten_percent(self):
+        logger = MagicMock()
+        progress = headless.WorkflowProgressLogger(logger)
+
+        progress(WorkflowEvent.started(40))
+        for current in range(1, 41):
+            progress(WorkflowEvent.progress(current, 40, "declaration"))
+            progress(WorkflowEvent.declaration_processed("declaration", True, "/out/1.pdf"))
+        progress(WorkflowEvent.completed(40, 0, 12.0))
+
+        records = logged(logger)
+        assert records[0][1] == {"event": "workflow_started", "total": 40}
+        percents = [extra["percent"] for _, extra in records if extra["event"] == "workflow_progress"]
+        assert percents == [2, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+        assert all("declaration_id" not in extra for _, extra in records)
+        assert records[-1][1]["event"] == "workflow_completed"
+
+    def test_error_logged_as_warning(self):
+        logger = MagicMock()
+
+        headless.WorkflowProgressLogger(logger)(WorkflowEvent.error("ECUS5 unavailable"))
+
+        assert logged(logger, "warning")[0][1]["event"] == "workflow_error"
+
+
+class TestJobStateLogger:
+    """Structured job state changes"""
+
+    def test_logs_each_state_once(self, monkeypatch):
+        queue = JobQueue()
+        monkeypatch.setattr(headless, "get_job_queue", lambda *args: queue)
+        logger = MagicMock()
+        queue.add_listener(headless.JobStateLogger(logger))
+
+        queue.run(lambda job: job.report(1, 2), "Download", KIND_MANUAL)
+
+        states = [extra["state"] for _, extra in logged(logger)]
+        assert states == ["queued", "running", "completed"]
+        assert logged(logger)[-1][1]["kind"] == KIND_MANUAL
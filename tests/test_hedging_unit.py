@@ -0,0 +1,326 @@
+"""
+Unit tests for hedged API requests
+
+These tests verify the latency percentile tracker, the hedge policy's
+delay and budget rules, and hedging in the sync and async QRCode clients.
+"""
+
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler
+from unittest.mock import Mock, patch
+
+import pytest
+
+from tests.test_async_qrcode_client_unit import QuietServer, build_response
+from web_utils.async_qrcode_client import AsyncQRCodeClient
+from web_utils.concurrency_controller import AdaptiveConcurrencyController
+from web_utils.hedging import HedgePolicy, LatencyTracker, mark_request_sent
+from web_utils.qrcode_api_client import BangKeQuery, QRCodeApiError, QRCodeContainerApiClient
+from web_utils.rate_limiter import TokenBucketRateLimiter
+
+
+def warm_policy(latency: float = 0.01, samples: int = 20, **kwargs) -> HedgePolicy:
+    """Create an enabled policy that already has enough latency samples."""
+    kwargs.setdefault('min_delay', 0.05)
+    kwargs.setdefault('max_ratio', 1.0)
+    policy = HedgePolicy(enabled=True, min_samples=samples, **kwargs)
+    for _ in range(samples):
+        policy.record_latency(latency)
+    return policy
+
+
+class TestLatencyTracker:
+    """Unit tests for LatencyTracker"""
+
+    def test_empty_tracker_has_no_percentile(self):
+        assert LatencyTracker().percentile(95) is None
+
+    def test_nearest_rank_percentile(self):
+        tracker = LatencyTracker()
+        for value in range(0, 101):
+            tracker.record(value / 100)
+
+        assert tracker.percentile(50) == 0.5
+        assert tracker.percentile(95) == 0.95
+        assert tracker.percentile(100) == 1.0
+
+    def test_window_drops_old_samples(self):
+        tracker = LatencyTracker(window=3)
+        for value in (10.0, 1.0, 1.0, 1.0):
+            tracker.record(value)
+
+        assert len(tracker) == 3
+        assert tracker.percentile(100) == 1.0
+
+
+class TestHedgePolicy:
+    """Unit tests for HedgePolicy"""
+
+    def test_disabled_policy_never_hedges(self):
+        policy = warm_policy()
+        policy.configure(False)
+        assert policy.hedge_delay() is None
+
+    def test_no_hedging_without_enough_samples(self):
+        policy = HedgePolicy(enabled=True, min_samples=20)
+        for _ in range(19):
+            policy.record_latency(0.1)
+        assert policy.hedge_delay() is None
+
+        policy.record_latency(0.1)
+        assert policy.hedge_delay() == 1.0  # min_delay floor
+
+    def test_delay_follows_percentile(self):
+        policy = warm_policy(latency=2.5)
+        assert policy.hedge_delay() == 2.5
+
+    def test_fast_call_is_not_hedged(self):
+        policy = warm_policy()
+        fn = Mock(return_value="ok")
+
+        assert policy.call(fn, 1) == "ok"
+        fn.assert_called_once_with(1)
+        assert policy.get_stats()['hedged'] == 0
+
+    def test_slow_call_is_hedged_and_hedge_wins(self):
+        policy = warm_policy()
+        calls = []
+
+        def request():
+            mark_request_sent()
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                time.sleep(1.0)
+                return "slow"
+            return "fast"
+
+        started = time.monotonic()
+        assert policy.call(request) == "fast"
+
+        assert time.monotonic() - started < 0.5
+        stats = policy.get_stats()
+        assert stats['hedged'] == 1
+        assert stats['hedge_wins'] == 1
+
+    def test_failed_hedge_falls_back_to_primary(self):
+        policy = warm_policy()
+        calls = []
+
+        def request():
+            mark_request_sent()
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                return "primary"
+            raise QRCodeApiError("HTTP 500")
+
+        assert policy.call(request) == "primary"
+        assert policy.get_stats()['hedge_wins'] == 0
+
+    def test_error_raised_when_both_fail(self):
+        policy = warm_policy()
+
+        def request():
+            mark_request_sent()
+            time.sleep(0.1)
+            raise QRCodeApiError("down")
+
+        with pytest.raises(QRCodeApiError):
+            policy.call(request)
+
+    def test_wait_before_sending_is_not_latency(self):
+        """Time queued for a token or slot should not count toward the hedge delay"""
+        policy = warm_policy()
+        fn_calls = []
+
+        def request():
+            fn_calls.append(1)
+            time.sleep(0.3)  # Queued at the limiter
+            mark_request_sent()
+            time.sleep(0.01)
+            return "ok"
+
+        assert policy.call(request) == "ok"
+        assert len(fn_calls) == 1
+        assert policy.get_stats()['hedged'] == 0
+
+    def test_no_hedge_while_requests_are_queued(self):
+        """A hedge should not compete for tokens with queued requests"""
+        policy = warm_policy()
+        limiter = TokenBucketRateLimiter(rate=1, burst=1)
+        assert limiter.acquire()
+        waiter = threading.Thread(target=limiter.acquire, kwargs={'timeout': 2})
+        waiter.start()
+        while not limiter.queued():
+            time.sleep(0.01)
+
+        def request():
+            mark_request_sent()
+            time.sleep(0.2)
+            return "slow"
+
+        with patch('web_utils.hedging.get_rate_limiter', return_value=limiter):
+            assert policy.call(request) == "slow"
+        waiter.join(3)
+
+        stats = policy.get_stats()
+        assert stats['hedged'] == 0
+        assert stats['queue_denied'] == 1
+
+    def test_budget_limits_hedges(self):
+        """max_ratio should cap hedges to a fraction of requests (plus one)"""
+        policy = warm_policy(max_ratio=0.1)
+        for _ in range(10):
+            policy.hedge_delay()
+
+        assert policy.try_start_hedge()
+        assert policy.try_start_hedge()
+        assert not policy.try_start_hedge()
+        assert policy.get_stats()['budget_denied'] == 1
+
+
+class TestSyncClientHedging:
+    """Hedging in QRCodeContainerApiClient"""
+
+    def test_slow_post_is_hedged(self):
+        policy = warm_policy()
+        session = Mock()
+        calls = []
+
+        def post(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(1.0)
+            return Mock(status_code=200, text=build_response("308010891440"))
+
+        session.post.side_effect = post
+        client = QRCodeContainerApiClient(logger=Mock(), session=session)
+
+        started = time.monotonic()
+        with patch('web_utils.qrcode_api_client.get_hedge_policy', return_value=policy), \
+                patch('web_utils.qrcode_api_client.get_concurrency_controller',
+                      return_value=AdaptiveConcurrencyController(max_limit=4, initial_limit=4)), \
+                patch('web_utils.qrcode_api_client.get_rate_limiter', return_value=TokenBucketRateLimiter(rate=0)):
+            info = client.query_bang_ke("0101234567", "308010891440", "18A3", date(2024, 12, 1), use_cache=False)
+
+        assert info.so_to_khai == "308010891440"
+        assert session.post.call_count == 2
+        assert time.monotonic() - started < 0.8
+        assert policy.get_stats()['hedge_wins'] == 1
+
+    def test_saturated_limiter_does_not_trigger_hedges(self):
+        """Fast requests queued behind the rate limit should not be hedged"""
+        policy = warm_policy(latency=0.05, min_delay=0.2)
+        session = Mock()
+
+        def post(*args, **kwargs):
+            time.sleep(0.05)
+            return Mock(status_code=200, text=build_response("308010891440"))
+
+        session.post.side_effect = post
+        client = QRCodeContainerApiClient(logger=Mock(), session=session, timeout=5)
+        limiter = TokenBucketRateLimiter(rate=10, burst=1)
+        errors = []
+
+        def query(number):
+            try:
+                client.query_bang_ke("0101234567", number, "18A3", date(2024, 12, 1), use_cache=False)
+            except Exception as e:
+                errors.append(e)
+
+        with patch('web_utils.qrcode_api_client.get_hedge_policy', return_value=policy), \
+                patch('web_utils.qrcode_api_client.get_concurrency_controller',
+                      return_value=AdaptiveConcurrencyController(max_limit=10, initial_limit=10)), \
+                patch('web_utils.qrcode_api_client.get_rate_limiter', return_value=limiter), \
+                patch('web_utils.hedging.get_rate_limiter', return_value=limiter):
+            threads = [threading.Thread(target=query, args=(f"3080108914{i:02d}",)) for i in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+
+        assert errors == []
+        assert session.post.call_count == 10
+        assert policy.get_stats()['hedged'] == 0
+
+
+class FirstSlowState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.completed = 0
+
+
+def make_first_slow_handler(state: FirstSlowState):
+    """The first request for each declaration stalls; repeats answer at once."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            tk = re.search(r"<TK_ID>(.*?)</TK_ID>", body).group(1)
+            with state.lock:
+                attempt = state.seen.get(tk, 0)
+                state.seen[tk] = attempt + 1
+            if attempt == 0:
+                time.sleep(2)
+            payload = build_response(tk).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            with state.lock:
+                state.completed += 1
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def first_slow_stub():
+    state = FirstSlowState()
+    server = QuietServer(("127.0.0.1", 0), make_first_slow_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{server.server_address[1]}/WS_Container/QRCode.asmx"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+class TestAsyncClientHedging:
+    """Hedging in AsyncQRCodeClient"""
+
+    def test_hedge_answers_before_stalled_request(self, first_slow_stub):
+        policy = warm_policy(min_delay=0.1)
+        controller = AdaptiveConcurrencyController(max_limit=8, initial_limit=8)
+        client = AsyncQRCodeClient(
+            service_url=first_slow_stub.url, logger=Mock(), timeout=5,
+            controller=controller, rate_limiter=TokenBucketRateLimiter(rate=0), hedge_policy=policy
+        )
+        keys = [BangKeQuery("0101234567", f"70{i}", "18A3", date(2024, 12, 1)) for i in range(3)]
+
+        started = time.monotonic()
+        results = client.run_many(keys, concurrency=3, use_cache=False)
+
+        assert all(r.ok for r in results)
+        assert [r.info.so_to_khai for r in results] == ["700", "701", "702"]
+        assert time.monotonic() - started < 1.5
+        assert policy.get_stats()['hedge_wins'] == 3
+
+    def test_disabled_policy_sends_one_request(self, first_slow_stub):
+        policy = warm_policy()
+        policy.configure(False)
+        client = AsyncQRCodeClient(service_url=first_slow_stub.url, logger=Mock(), timeout=5, hedge_policy=policy)
+        keys = [BangKeQuery("0101234567", "800", "18A3", date(2024, 12, 1))]
+
+        results = client.run_many(keys, use_cache=False)
+
+        assert results[0].ok
+        assert first_slow_stub.seen == {"800": 1}
@@ -0,0 +1,145 @@
+"""
+Unit tests for HttpSessionPool
+
+These tests verify keep-alive reuse, pool sizing and warm-up against a
+local HTTP/1.1 server.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+import pytest
+
+from web_utils.http_session_pool import HttpSessionPool, get_http_session_pool
+from web_utils.qrcode_api_client import QRCodeContainerApiClient
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        body = b"<ok/>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self._reply()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/WS_Container/QRCode.asmx"
+    server.shutdown()
+    server.server_close()
+
+
+class TestHttpSessionPool:
+    """Unit tests for HttpSessionPool class"""
+
+    def test_sequential_requests_reuse_one_connection(self, server_url):
+        """Sequential requests should share a single keep-alive connection"""
+        pool = HttpSessionPool(pool_size=2)
+        try:
+            for _ in range(5):
+                assert pool.session.get(server_url, timeout=5).status_code == 200
+
+            stats = pool.get_stats()
+            assert stats['requests'] == 5
+            assert stats['connections_opened'] == 1
+            assert stats['connections_reused'] == 4
+            assert stats['reuse_ratio'] == pytest.approx(0.8)
+        finally:
+            pool.close()
+
+    def test_ensure_capacity_grows_pool_and_keeps_counters(self, server_url):
+        """Resizing should mount a larger adapter without losing metrics"""
+        pool = HttpSessionPool(pool_size=1)
+        try:
+            pool.session.get(server_url, timeout=5)
+            pool.ensure_capacity(4)
+            pool.session.get(server_url, timeout=5)
+
+            stats = pool.get_stats()
+            assert stats['pool_size'] == 4
+            assert stats['requests'] == 2
+        finally:
+            pool.close()
+
+    def test_ensure_capacity_never_shrinks(self):
+        """A smaller worker count should leave the pool size unchanged"""
+        pool = HttpSessionPool(pool_size=8)
+        pool.ensure_capacity(3)
+        assert pool.pool_size == 8
+
+    def test_warm_up_opens_connections(self, server_url):
+        """Warm-up should open connections that later requests reuse"""
+        pool = HttpSessionPool(pool_size=3)
+        try:
+            assert pool.warm_up(server_url, 3) == 3
+            opened = pool.get_stats()['connections_opened']
+            assert 1 <= opened <= 3
+
+            for _ in range(3):
+                pool.session.get(server_url, timeout=5)
+
+            stats = pool.get_stats()
+            assert stats['connections_opened'] == opened
+            assert stats['warm_ups'] == 1
+        finally:
+            pool.close()
+
+    def test_warm_up_unreachable_host_returns_zero(self):
+        """Warm-up failures should be swallowed and reported as zero"""
+        pool = HttpSessionPool(pool_size=1)
+        pool.WARM_UP_TIMEOUT = 0.5
+        assert pool.warm_up("http://127.0.0.1:9/", 1) == 0
+
+    def test_global_pool_is_singleton(self):
+        """get_http_session_pool should always return the same instance"""
+        assert get_http_session_pool() is get_http_session_pool()
+
+
+class TestQRCodeClientSharedSession:
+    """Verify QRCodeContainerApiClient uses the shared pool"""
+
+    def test_clients_share_pooled_session(self):
+        """Clients created separately should share one session"""
+        first = QRCodeContainerApiClient(logger=Mock())
+        second = QRCodeContainerApiClient(logger=Mock())
+        assert first.session is second.session
+        assert first.session is get_http_session_pool().session
+
+    def test_close_does_not_close_shared_session(self):
+        """Closing one client must not tear down the shared pool"""
+        client = QRCodeContainerApiClient(logger=Mock())
+        shared = client.session
+        shared_close = Mock()
+        original_close = shared.close
+        shared.close = shared_close
+        try:
+            client.close()
+            assert not shared_close.called
+        finally:
+            shared.close = original_close
+
+    def test_injected_session_is_used(self):
+        """An explicitly injected session should be used as-is"""
+        session = Mock()
+        client = QRCodeContainerApiClient(logger=Mock(), session=session)
+        assert client.session is session
+        assert client.warm_up(2) == 0
@@ -0,0 +1,189 @@
+"""
+Unit tests for the job queue
+
+These tests verify that jobs run on the caller's thread with their request
+priority, that interactive jobs start at once while others wait for a
+slot, that a background job pauses at its checkpoints while higher-priority
+work runs, that companies are served fairly, that jobs can be cancelled
+queued or running, and that job snapshots describe the queue.
+"""
+
+import threading
+import time
+
+import pytest
+
+from services.job_queue import (
+    CANCELLED, COMPLETED, FAILED, KIND_CLEARANCE, KIND_MANUAL, KIND_SCHEDULED, PAUSED, QUEUED, RUNNING,
+    JobQueue, fair_order
+)
+from web_utils.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, current_priority
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+def blocking_job(gate, started=None, checkpoints=None):
+    """Job function that waits for gate, calling checkpoint() meanwhile"""
+    def fn(job):
+        if started is not None:
+            started.set()
+        while not gate.is_set():
+            if not job.checkpoint():
+                return "cancelled"
+            if checkpoints is not None:
+                checkpoints.append(job.state)
+            time.sleep(0.01)
+        return "done"
+    return fn
+
+
+class TestJobQueue:
+    """Admission, preemption, fairness and cancellation"""
+
+    def test_run_on_caller_thread(self):
+        queue = JobQueue()
+        caller = threading.current_thread()
+
+        result = queue.run(lambda job: (threading.current_thread(), current_priority()), "job", KIND_MANUAL,
+                           PRIORITY_INTERACTIVE)
+
+        assert result == (caller, PRIORITY_INTERACTIVE)
+        assert queue.jobs()[0].state == COMPLETED
+
+    def test_error_reraised(self):
+        queue = JobQueue()
+
+        with pytest.raises(ValueError):
+            queue.run(lambda job: (_ for _ in ()).throw(ValueError("broken")), "job", KIND_MANUAL)
+
+        assert queue.jobs()[0].state == FAILED
+        assert queue.jobs()[0].error == "broken"
+
+    def test_slots_limit_background_jobs(self):
+        queue = JobQueue(max_running=1)
+        gate = threading.Event()
+        first = queue.submit(blocking_job(gate), "first", KIND_SCHEDULED, PRIORITY_BACKGROUND)
+        wait_for(lambda: first.state == RUNNING)
+
+        second = queue.submit(lambda job: "second", "second", KIND_CLEARANCE, PRIORITY_BACKGROUND)
+        time.sleep(0.1)
+        assert second.state == QUEUED
+
+        gate.set()
+        assert second.wait(5) == "second"
+        assert first.wait(5) == "done"
+
+    def test_interactive_preempts_background(self):
+        queue = JobQueue(max_running=1)
+        gate = threading.Event()
+        checkpoints = []
+        background = queue.submit(blocking_job(gate, checkpoints=checkpoints), "poll", KIND_SCHEDULED,
+                                  PRIORITY_BACKGROUND)
+        wait_for(lambda: background.state == RUNNING)
+
+        interactive_gate = threading.Event()
+        interactive = queue.submit(blocking_job(interactive_gate), "manual", KIND_MANUAL, PRIORITY_INTERACTIVE)
+        wait_for(lambda: interactive.state == RUNNING)  # No slot needed
+        wait_for(lambda: background.state == PAUSED)
+        paused_count = len(checkpoints)
+        time.sleep(0.1)
+        assert len(checkpoints) == paused_count  # Held at its checkpoint
+
+        interactive_gate.set()
+        interactive.wait(5)
+        wait_for(lambda: background.state == RUNNING)
+        gate.set()
+        assert background.wait(5) == "done"
+        assert background.info().paused_seconds > 0
+        assert queue.get_stats()["preemptions"] == 1
+
+    def test_normal_job_takes_the_slot_of_a_paused_background_job(self):
+        queue = JobQueue(max_running=1)
+        gate = threading.Event()
+        background = queue.submit(blocking_job(gate), "poll", KIND_SCHEDULED, PRIORITY_BACKGROUND)
+        wait_for(lambda: background.state == RUNNING)
+
+        normal = queue.submit(lambda job: "normal", "run once", KIND_SCHEDULED, PRIORITY_NORMAL)
+
+        assert normal.wait(5) == "normal"
+        gate.set()
+        assert background.wait(5) == "done"
+
+    def test_companies_served_fairly(self):
+        queue = JobQueue(max_running=1)
+        gate = threading.Event()
+        blocker = queue.submit(blocking_job(gate), "blocker", KIND_MANUAL, PRIORITY_NORMAL, company="A")
+        wait_for(lambda: blocker.state == RUNNING)
+        order = []
+        jobs = [
+            queue.submit(lambda job, n=name: order.append(n), name, KIND_MANUAL, PRIORITY_NORMAL, company=company)
+            for name, company in [("A1", "A"), ("A2", "A"), ("B1", "B")]
+        ]
+        wait_for(lambda: all(job.state == QUEUED for job in jobs))
+
+        assert [info.name for info in queue.jobs(include_finished=False)] == ["blocker", "B1", "A1", "A2"]
+        gate.set()
+        for job in jobs:
+            job.wait(5)
+        assert order == ["B1", "A1", "A2"]
+
+    def test_cancel_queued_job(self):
+        queue = JobQueue(max_running=1)
+        gate = threading.Event()
+        running = queue.submit(blocking_job(gate), "running", KIND_SCHEDULED, PRIORITY_BACKGROUND)
+        wait_for(lambda: running.state == RUNNING)
+        calls = []
+        queued = queue.submit(lambda job: calls.append(1), "queued", KIND_SCHEDULED, PRIORITY_BACKGROUND)
+
+        assert queue.cancel(queued.job_id)
+
+        assert queued.wait(5) is None
+        assert queued.state == CANCELLED and calls == []
+        gate.set()
+        running.wait(5)
+
+    def test_cancel_running_job(self):
+        queue = JobQueue()
+        gate = threading.Event()
+        stopped = threading.Event()
+        job = queue.submit(blocking_job(gate), "running", KIND_MANUAL, PRIORITY_INTERACTIVE)
+        wait_for(lambda: job.state == RUNNING)
+        job.add_cancel_callback(stopped.set)
+
+        assert job.cancel()
+
+        assert job.wait(5) == "cancelled"
+        assert job.state == CANCELLED and stopped.is_set()
+        assert not job.cancel()  # Already finished
+
+    def test_listeners_and_snapshots(self):
+        queue = JobQueue()
+        changes = []
+        queue.add_listener(lambda: changes.append(1))
+
+        queue.run(lambda job: job.report(3, 5, "3/5"), "Download", KIND_MANUAL, PRIORITY_INTERACTIVE,
+                  company="2300782217")
+
+        info = queue.jobs()[0]
+        assert (info.done, info.total, info.message, info.company) == (3, 5, "3/5", "2300782217")
+        assert info.priority_name == "interactive"
+        assert info.started_at is not None and info.finished_at is not None
+        assert len(changes) >= 3  # Queued, started, progress, finished
+
+
+class TestFairOrder:
+    """Round-robin interleaving"""
+
+    def test_interleaves_by_key(self):
+        items = ["a1", "a2", "a3", "b1", "c1", "c2"]
+
+        assert fair_order(items, key=lambda item: item[0]) == ["a1", "b1", "c1", "a2", "c2", "a3"]
+
+    def test_empty(self):
+        assert fair_order([], key=str) == []
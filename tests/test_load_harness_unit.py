@@ -0,0 +1,181 @@
+"""
+Unit tests for the record/replay load-test harness
+
+These tests verify API capture scrubbing, the stub SOAP server's replay
+and failure behaviour, and the load driver's summary.
+"""
+
+import base64
+import io
+import json
+import os
+import re
+from datetime import date
+from unittest.mock import Mock, patch
+
+import pytest
+from PIL import Image
+
+from benchmarks.bench_soap_parser import build_payload
+from benchmarks.load_driver import make_declarations, percentile, run_load, summarize
+from benchmarks.stub_soap_server import LatencyModel, ReplayStore, StubBehaviour, StubSoapServer
+from web_utils.api_capture import ApiCapture, Scrubber, load_captures, placeholder_png, set_api_capture
+from web_utils.concurrency_controller import AdaptiveConcurrencyController
+from web_utils.qrcode_api_client import QRCodeApiError, QRCodeContainerApiClient
+from web_utils.rate_limiter import TokenBucketRateLimiter
+
+
+def soap_request(mst: str = "2300782217", tk: str = "308010891440") -> str:
+    return QRCodeContainerApiClient(session=Mock(), logger=Mock())._build_soap_request(
+        mst, tk, "18A3", date(2024, 12, 1)
+    )
+
+
+@pytest.fixture
+def isolated_limits():
+    """Keep shared limiter/controller state from other tests out of the way."""
+    with patch('web_utils.qrcode_api_client.get_concurrency_controller',
+               return_value=AdaptiveConcurrencyController(max_limit=8, initial_limit=8)), \
+            patch('web_utils.qrcode_api_client.get_rate_limiter', return_value=TokenBucketRateLimiter(rate=0)):
+        yield
+
+
+class TestScrubber:
+    """Unit tests for capture scrubbing"""
+
+    def test_identifiers_are_pseudonymised_consistently(self):
+        scrubber = Scrubber(salt=b"test")
+        request = scrubber.scrub(soap_request())
+        response = scrubber.scrub(build_payload(1))
+
+        assert "2300782217" not in request and "308010891440" not in request
+        assert "308010891440" not in response
+        tk = re.search(r"<TK_ID>(\d+)</TK_ID>", request).group(1)
+        assert len(tk) == 12
+        assert f"<SoToKhai>{tk}</SoToKhai>" in response
+
+    def test_container_format_and_marker_kept(self):
+        scrubbed = Scrubber().scrub("<SoContainer>TEMU1234567</SoContainer><SoSealHQ>#####</SoSealHQ>")
+
+        container = re.search(r"<SoContainer>(.*?)</SoContainer>", scrubbed).group(1)
+        assert re.fullmatch(r"[A-Z]{4}\d{7}", container)
+        assert container != "TEMU1234567"
+        assert "<SoSealHQ>#####</SoSealHQ>" in scrubbed
+
+    def test_names_and_images_replaced(self):
+        payload = build_payload(2, image_bytes=1500)
+        scrubbed = Scrubber().scrub(payload)
+
+        assert "CÔNG TY TNHH ABC" not in scrubbed
+        images = re.findall(r"<BarcodeImage>(.*?)</BarcodeImage>", scrubbed)
+        assert len(images) == 2
+        for data in images:
+            png = base64.b64decode(data)
+            assert abs(len(png) - 1500) <= 3
+            Image.open(io.BytesIO(png)).load()
+
+    def test_placeholder_png_is_valid_for_small_sizes(self):
+        Image.open(io.BytesIO(placeholder_png(0))).load()
+
+
+class TestApiCapture:
+    """Unit tests for ApiCapture"""
+
+    def test_record_and_load(self, tmp_path):
+        capture = ApiCapture(str(tmp_path))
+        capture.record(soap_request(), 200, build_payload(1), 0.42)
+
+        records = load_captures([str(tmp_path)])
+
+        assert len(records) == 1
+        assert records[0]['status'] == 200
+        assert records[0]['latency'] == 0.42
+        assert "308010891440" not in json.dumps(records[0])
+
+    def test_sync_client_records_traffic(self, tmp_path, isolated_limits):
+        set_api_capture(ApiCapture(str(tmp_path)))
+        try:
+            with StubSoapServer() as server:
+                client = QRCodeContainerApiClient(service_url=server.url, logger=Mock())
+                info = client.query_bang_ke("2300782217", "308010891440", "18A3", date(2024, 12, 1), use_cache=False)
+        finally:
+            set_api_capture(None)
+
+        assert info.so_to_khai == "308010891440"
+        records = load_captures([str(tmp_path)])
+        assert len(records) == 1
+        assert "308010891440" not in records[0]['request']
+
+
+class TestStubSoapServer:
+    """Unit tests for the replay server"""
+
+    def test_template_rewritten_for_request(self):
+        store = ReplayStore()
+        response = store.response_for(soap_request("0101234567", "555000111222"))
+
+        assert "<SoToKhai>555000111222</SoToKhai>" in response
+        assert "<MaSoThue>0101234567</MaSoThue>" in response
+
+    def test_captured_response_replayed_exactly(self):
+        record = {'action': 'QueryBangKeDanhSachContainer', 'status': 200, 'latency': 0.3,
+                  'request': soap_request(tk="111"), 'response': "<captured/>"}
+        store = ReplayStore([record])
+
+        assert store.response_for(soap_request(tk="111")) == "<captured/>"
+        assert store.latencies == [0.3]
+
+    def test_error_rate_returns_http_500(self, isolated_limits):
+        with StubSoapServer(behaviour=StubBehaviour(error_rate=1.0)) as server:
+            client = QRCodeContainerApiClient(service_url=server.url, logger=Mock())
+            with pytest.raises(QRCodeApiError, match="HTTP 500"):
+                client.query_bang_ke("1", "2", "18A3", date(2024, 12, 1), use_cache=False)
+            assert server.stats['errors'] == 1
+
+    def test_throttle_returns_http_429(self, isolated_limits):
+        with StubSoapServer(behaviour=StubBehaviour(throttle_rate=1.0)) as server:
+            client = QRCodeContainerApiClient(service_url=server.url, logger=Mock())
+            client.query_bang_ke("1", "2", "18A3", date(2024, 12, 1), use_cache=False)
+            with pytest.raises(QRCodeApiError, match="HTTP 429"):
+                client.query_bang_ke("1", "3", "18A3", date(2024, 12, 1), use_cache=False)
+            assert server.stats['throttled'] == 1
+
+    def test_latency_models(self):
+        assert LatencyModel("fixed:0.2").sample() == 0.2
+        assert 0.1 <= LatencyModel("uniform:0.1:0.3").sample() <= 0.3
+        assert LatencyModel("lognormal:0.5:0.4").sample() > 0
+        assert LatencyModel("captured", captured=[1.5]).sample() == 1.5
+        with pytest.raises(ValueError):
+            LatencyModel("gamma:1")
+
+
+class TestLoadDriver:
+    """Unit tests for the load driver"""
+
+    def test_percentiles_and_summary(self):
+        summary = summarize([float(i) for i in range(101)], ok=100, wall_time=10.0)
+
+        assert summary['total'] == 101
+        assert summary['failed'] == 1
+        assert summary['throughput'] == pytest.approx(10.1)
+        assert summary['p50'] == 50.0
+        assert summary['p99'] == 99.0
+        assert percentile([], 50) == 0.0
+
+    def test_small_run_against_stub(self, isolated_limits):
+        declarations = make_declarations(12)
+        assert len({d.declaration_number for d in declarations}) == 12
+
+        with StubSoapServer() as server:
+            summary = run_load(server.url, declarations, concurrency=4, api_timeout=5)
+
+        assert summary['ok'] == 12
+        assert server.stats['requests'] == 12
+
+    def test_downloader_mode_writes_files(self, tmp_path, isolated_limits):
+        with StubSoapServer() as server:
+            summary = run_load(server.url, make_declarations(3), mode="downloader",
+                               concurrency=2, output_dir=str(tmp_path), api_timeout=5)
+
+        assert summary['ok'] == 3
+        assert len([f for f in os.listdir(tmp_path) if f.endswith('.pdf')]) == 3
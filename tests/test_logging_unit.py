@@ -348,3 +348,40 @@ def test_multiple_loggers():
             os.unlink(log_file_path1)
         if os.path.exists(log_file_path2):
             os.unlink(log_file_path2)
+
+
+def test_json_formatter():
+    """Test that JsonFormatter writes one JSON object per record with extra fields"""
+    import json
+    from logging_system.logger import JsonFormatter
+    
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.log', delete=False) as f:
+        log_file_path = f.name
+    
+    try:
+        config = LoggingConfig(
+            log_level='INFO',
+            log_file=log_file_path,
+            max_log_size=10485760,
+            backup_count=5
+        )
+        
+        logger = Logger(config, name="TestJsonLogger")
+        logger.set_formatter(JsonFormatter())
+        logger.info("Batch completed", extra={"event": "batch_completed", "success": 3})
+        
+        for handler in logger.get_logger().handlers[:]:
+            handler.close()
+            logger.get_logger().removeHandler(handler)
+        
+        with open(log_file_path, 'r', encoding='utf-8') as f:
+            entry = json.loads(f.readline())
+        
+        assert entry["message"] == "Batch completed"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "TestJsonLogger"
+        assert (entry["event"], entry["success"]) == ("batch_completed", 3)
+        
+    finally:
+        if os.path.exists(log_file_path):
+            os.unlink(log_file_path)
@@ -0,0 +1,213 @@
+"""
+Unit tests for MethodRouter
+
+These tests verify latency-aware ordering, circuit breakers, probing and
+the integration with BarcodeRetriever's AUTO mode.
+"""
+
+import time
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+from hypothesis import given, settings, strategies as st
+
+from models.config_models import BarcodeServiceConfig
+from models.declaration_models import Declaration
+from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.method_router import MethodRouter
+
+
+METHODS = ["api", "primary_web", "backup_web", "api_render"]
+
+
+class TestMethodRouter:
+    """Unit tests for MethodRouter class"""
+
+    def test_fresh_router_keeps_configured_order(self):
+        router = MethodRouter(METHODS)
+        assert router.plan(METHODS) == METHODS
+
+    def test_fastest_healthy_method_first(self):
+        """Methods with successes should be ordered by latency"""
+        router = MethodRouter(METHODS)
+        router.record("api", True, 2.0)
+        router.record("api_render", True, 0.3)
+        router.record("primary_web", True, 8.0)
+
+        assert router.plan(METHODS) == ["api_render", "api", "primary_web", "backup_web"]
+
+    def test_unreliable_method_ranks_below_reliable(self):
+        """Success rate should weigh into the score"""
+        router = MethodRouter(METHODS)
+        router.record("api", True, 0.5)
+        for _ in range(3):
+            router.record("api", False, 0.5)
+            router.record("api", True, 0.5)
+        router.record("primary_web", True, 0.8)
+
+        assert router.plan(["api", "primary_web"])[0] == "primary_web"
+
+    def test_only_failing_methods_go_last(self):
+        """A method that has never succeeded should come after unknown ones"""
+        router = MethodRouter(METHODS)
+        router.record("api", False, 0.1)
+
+        assert router.plan(METHODS) == ["primary_web", "backup_web", "api_render", "api"]
+
+    def test_breaker_opens_after_threshold(self):
+        router = MethodRouter(METHODS, failure_threshold=3)
+        for _ in range(3):
+            router.record("api", False, 0.1)
+
+        assert not router.is_available("api")
+        assert "api" not in router.plan(METHODS)
+        assert router.get_stats()['methods']['api']['state'] == "OPEN"
+
+    def test_breaker_half_opens_after_recovery_timeout(self):
+        """An open method should get a test request after the timeout"""
+        router = MethodRouter(METHODS, failure_threshold=1, recovery_timeout=0.05)
+        router.record("api", False, 0.1)
+        assert not router.is_available("api")
+
+        time.sleep(0.1)
+        assert router.is_available("api")
+
+        router.record("api", True, 0.1)
+        assert router.get_stats()['methods']['api']['state'] == "CLOSED"
+
+    def test_half_open_method_gets_a_single_test_request(self):
+        """Only one request at a time should test a recovering method"""
+        router = MethodRouter(METHODS, failure_threshold=1, recovery_timeout=0.05)
+        router.record("api", False, 0.1)
+        time.sleep(0.1)
+
+        assert router.plan(METHODS)[0] == "api"
+        assert "api" not in router.plan(METHODS)
+
+        router.record("api", False, 0.1)
+        assert "api" not in router.plan(METHODS)
+        time.sleep(0.1)
+        assert router.plan(METHODS)[0] == "api"
+        router.record("api", True, 0.1)
+        assert "api" in router.plan(METHODS)
+        assert "api" in router.plan(METHODS)
+
+    def test_success_resets_failure_streak(self):
+        router = MethodRouter(METHODS)
+        router.record("api", False, 0.1)
+        router.record("api", False, 0.1)
+        assert router.consecutive_failures()["api"] == 2
+
+        router.record("api", True, 0.1)
+        assert router.consecutive_failures()["api"] == 0
+
+    def test_idle_method_is_probed(self):
+        """A healthy method idle for probe_interval should be tried first once"""
+        router = MethodRouter(METHODS, probe_interval=0.05)
+        router.record("api_render", True, 0.2)
+        router.record("primary_web", True, 5.0)
+
+        time.sleep(0.1)
+        router.record("api_render", True, 0.2)
+
+        assert router.plan(METHODS)[0] == "primary_web"
+        # The probe is reserved: the next request uses the fastest method again
+        assert router.plan(METHODS)[0] == "api_render"
+        assert router.get_stats()['probes'] == 1
+
+    def test_reset_breakers_keeps_latency_history(self):
+        router = MethodRouter(METHODS)
+        router.record("api_render", True, 0.2)
+        for _ in range(3):
+            router.record("api", False, 0.1)
+
+        router.reset_breakers()
+
+        assert router.is_available("api")
+        assert router.get_stats()['methods']['api_render']['avg_latency'] == 0.2
+
+    @settings(max_examples=50, deadline=None)
+    @given(st.lists(st.tuples(st.sampled_from(METHODS), st.booleans(), st.floats(0, 30)), max_size=40))
+    def test_plan_is_subset_without_duplicates(self, outcomes):
+        """
+        **Feature: method-router, Property 1: Plans are duplicate-free subsets of the candidates**
+
+        For any outcome history, plan() returns each available candidate
+        exactly once and never a method whose breaker is open.
+        """
+        router = MethodRouter(METHODS)
+        for method, success, latency in outcomes:
+            router.record(method, success, latency)
+
+        plan = router.plan(METHODS)
+
+        assert len(plan) == len(set(plan))
+        assert set(plan) == {m for m in METHODS if router.is_available(m)}
+
+
+class TestRetrieverRouting:
+    """BarcodeRetriever AUTO mode should follow the router"""
+
+    def setup_method(self):
+        config = BarcodeServiceConfig(
+            api_url='http://test-api.example.com/QRCode.asmx',
+            primary_web_url='http://primary.example.com',
+            backup_web_url='http://backup.example.com',
+            timeout=30,
+            max_retries=3,
+            retry_delay=5
+        )
+        self.retriever = BarcodeRetriever(config, Mock())
+        # API render fails unless a test says otherwise (no network)
+        self.retriever._try_api_method = Mock(return_value=None)
+        self.declaration = Declaration(
+            declaration_number='308010891440',
+            tax_code='2300782217',
+            declaration_date=datetime(2023, 1, 5),
+            customs_office_code='18A3',
+        )
+
+    def test_api_render_tried_first(self):
+        self.retriever._try_api_method.return_value = b"%PDF render"
+        with patch.object(self.retriever, '_try_api') as legacy:
+            assert self.retriever.retrieve_barcode(self.declaration) == b"%PDF render"
+
+        assert not legacy.called
+
+    def test_faster_web_method_preferred_after_success(self):
+        """Once primary web is known to be fastest it should be tried first"""
+        calls = []
+
+        def legacy_api(decl):
+            calls.append("api")
+            time.sleep(0.05)
+            return b"%PDF api"
+
+        def web(url, decl):
+            calls.append(url)
+            return b"%PDF web"
+
+        with patch.object(self.retriever, '_try_api', side_effect=legacy_api), \
+                patch.object(self.retriever, '_try_web_scraping', side_effect=web):
+            assert self.retriever.retrieve_barcode(self.declaration) == b"%PDF api"
+            self.retriever._record_method_success("primary_web", 0.001)
+            calls.clear()
+
+            assert self.retriever.retrieve_barcode(self.declaration) == b"%PDF web"
+
+        assert calls == ["http://primary.example.com"]
+
+    def test_open_breaker_skips_method(self):
+        with patch.object(self.retriever, '_try_api', return_value=None) as legacy, \
+                patch.object(self.retriever, '_try_web_scraping', return_value=b"%PDF web"):
+            for _ in range(3):
+                self.retriever._record_method_failure("api")
+            self.retriever.retrieve_barcode(self.declaration)
+
+        assert not legacy.called
+
+    def test_method_stats_exposed(self):
+        self.retriever._record_method_success("primary_web", 4.0)
+        stats = self.retriever.get_method_stats()['methods']
+        assert stats['primary_web']['avg_latency'] == 4.0
+        assert stats['primary_web']['success_rate'] == 1.0
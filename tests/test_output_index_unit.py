@@ -0,0 +1,169 @@
+"""
+Unit tests for the output directory index
+
+These tests verify that the output directory is listed once and lookups
+are answered from memory, that our own writes keep the index current,
+that periodic rescans pick up other programs' changes, and that
+FileManager finds PDFs saved under any naming format without a stat.
+"""
+
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from file_utils.file_manager import FileManager
+from file_utils.file_writer import FileWriter
+from file_utils.output_index import OutputIndex
+from file_utils.pdf_naming_service import PdfNamingService
+from models.declaration_models import Declaration
+
+
+def touch(path) -> str:
+    with open(path, "wb") as f:
+        f.write(b"pdf")
+    return str(path)
+
+
+def make_declaration(number: str = "308010891440") -> Declaration:
+    return Declaration(number, "2300782217", datetime(2024, 12, 1),
+                       bill_of_lading="HPH123", invoice_number="INV/7")
+
+
+class TestOutputIndex:
+    """Existence answered from one directory listing"""
+
+    def test_scans_once(self, tmp_path):
+        touch(tmp_path / "MV_a.pdf")
+        index = OutputIndex(str(tmp_path))
+
+        with patch("file_utils.output_index.os.scandir", wraps=os.scandir) as scandir:
+            assert index.contains("MV_a.pdf")
+            assert not index.contains("MV_b.pdf")
+            assert index.find(["MV_b.pdf", "MV_a.pdf"]) == os.path.join(str(tmp_path), "MV_a.pdf")
+
+        assert scandir.call_count == 1
+        assert index.get_stats()["lookups"] == 3
+
+    def test_own_writes_update_index(self, tmp_path):
+        index = OutputIndex(str(tmp_path))
+        assert len(index) == 0
+
+        index.add(str(tmp_path / "MV_a.pdf"))
+        index.add(str(tmp_path / "other" / "MV_b.pdf"))  # Another directory
+
+        assert index.contains("MV_a.pdf")
+        assert not index.contains("MV_b.pdf")
+        index.discard(str(tmp_path / "MV_a.pdf"))
+        assert not index.contains("MV_a.pdf")
+
+    def test_missing_directory_is_empty(self, tmp_path):
+        index = OutputIndex(str(tmp_path / "missing"))
+
+        assert not index.contains("MV_a.pdf")
+        index.add(str(tmp_path / "missing" / "MV_a.pdf"))
+        assert index.contains("MV_a.pdf")
+
+    def test_periodic_rescan(self, tmp_path):
+        index = OutputIndex(str(tmp_path), rescan_interval=60)
+        clock = [1000.0]
+
+        with patch("file_utils.output_index.time.monotonic", side_effect=lambda: clock[0]):
+            assert not index.contains("MV_a.pdf")
+            touch(tmp_path / "MV_a.pdf")
+            assert not index.contains("MV_a.pdf")
+            clock[0] += 61
+            assert index.contains("MV_a.pdf")
+
+        assert index.get_stats()["scans"] == 2
+
+    def test_writes_during_scan_are_kept(self, tmp_path):
+        index = OutputIndex(str(tmp_path))
+        real_scandir = os.scandir
+
+        def scandir_while_writing(path):
+            index.add(str(tmp_path / "MV_new.pdf"))  # Saved while listing
+            return real_scandir(path)
+
+        with patch("file_utils.output_index.os.scandir", side_effect=scandir_while_writing):
+            index.refresh()
+
+        assert index.contains("MV_new.pdf")
+
+    def test_failed_scan_keeps_entries(self, tmp_path):
+        touch(tmp_path / "MV_a.pdf")
+        index = OutputIndex(str(tmp_path))
+        index.refresh()
+
+        with patch("file_utils.output_index.os.scandir", side_effect=PermissionError("offline")):
+            index.refresh()
+
+        assert index.contains("MV_a.pdf")
+
+
+class TestCandidateFilenames:
+    """Naming variants"""
+
+    def test_configured_format_first(self):
+        names = PdfNamingService("invoice").candidate_filenames(make_declaration())
+
+        assert names[0] == "MV_INV_7_308010891440.pdf"
+        assert set(names) == {
+            "MV_INV_7_308010891440.pdf", "MV_2300782217_308010891440.pdf", "MV_HPH123_308010891440.pdf"
+        }
+
+    def test_fallbacks_deduplicated(self):
+        declaration = Declaration("308010891440", "2300782217", datetime(2024, 12, 1))
+
+        assert PdfNamingService("bill_of_lading").candidate_filenames(declaration) == [
+            "MV_2300782217_308010891440.pdf"
+        ]
+
+    def test_generate_filename_is_first_candidate(self):
+        for naming_format in PdfNamingService.VALID_FORMATS:
+            service = PdfNamingService(naming_format)
+            assert service.candidate_filenames(make_declaration())[0] == service.generate_filename(make_declaration())
+
+
+class TestFileManagerIndex:
+    """FileManager existence checks"""
+
+    @pytest.fixture
+    def manager(self, tmp_path):
+        writer = FileWriter(workers=1)
+        yield FileManager(str(tmp_path), PdfNamingService("tax_code"), file_writer=writer)
+        writer.shutdown()
+
+    def test_finds_file_saved_under_other_format(self, tmp_path, manager):
+        path = touch(tmp_path / "MV_HPH123_308010891440.pdf")
+
+        with patch("os.path.exists", side_effect=AssertionError("stat")):
+            assert manager.find_existing(make_declaration()) == path
+            assert not manager.file_exists(make_declaration())
+            assert manager.find_existing(make_declaration("308010891441")) is None
+
+    def test_saves_update_index(self, manager):
+        first, second = make_declaration("1"), make_declaration("2")
+
+        path = manager.save_barcode(first, b"pdf")
+        manager.save_barcode_async(second, b"pdf").result()
+
+        assert manager.file_exists(first)
+        assert manager.find_existing(second) == manager.get_file_path(second)
+        assert manager.save_barcode(first, b"again") is None
+        assert open(path, "rb").read() == b"pdf"
+
+    def test_verify_detects_deleted_file(self, manager):
+        path = manager.save_barcode(make_declaration(), b"pdf")
+        os.remove(path)
+
+        assert manager.file_exists(make_declaration())
+        assert not manager.file_exists(make_declaration(), verify=True)
+        assert not manager.file_exists(make_declaration())
+
+    def test_new_output_directory_gets_new_index(self, tmp_path, manager):
+        manager.save_barcode(make_declaration(), b"pdf")
+        manager.output_directory = str(tmp_path / "elsewhere")
+
+        assert not manager.file_exists(make_declaration())
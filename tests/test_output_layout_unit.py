@@ -0,0 +1,196 @@
+"""
+Unit tests for the sharded output layout and its migration
+
+These tests verify the layout subdirectories, that FileManager saves into
+them and still finds files in the flat directory until they are migrated,
+and that the migrator moves files, keeps the newer of two copies, updates
+the tracking database in bulk and can be run again.
+"""
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from database.tracking_database import TrackingDatabase
+from file_utils.file_manager import FileManager
+from file_utils.file_writer import FileWriter
+from file_utils.output_layout import UNKNOWN_SHARD, shard_directory
+from file_utils.output_migrator import OutputMigrator
+from models.declaration_models import Declaration
+
+
+def make_declaration(number: str = "308010891440", tax_code: str = "2300782217",
+                     declaration_date=datetime(2024, 12, 1)) -> Declaration:
+    return Declaration(number, tax_code, declaration_date)
+
+
+@pytest.fixture
+def writer():
+    writer = FileWriter(workers=0)
+    yield writer
+    writer.shutdown()
+
+
+class TestShardDirectory:
+    """Layout subdirectories"""
+
+    @pytest.mark.parametrize("layout, expected", [
+        ("flat", ""),
+        ("year_month", os.path.join("2024", "12")),
+        ("tax_code", "2300782217"),
+        ("tax_code_year_month", os.path.join("2300782217", "2024", "12")),
+    ])
+    def test_layouts(self, layout, expected):
+        assert shard_directory(make_declaration(), layout) == expected
+
+    def test_date_strings(self):
+        assert shard_directory(make_declaration(declaration_date="2024-03-05"), "year_month") == os.path.join("2024", "03")
+        assert shard_directory(make_declaration(declaration_date="20240305"), "year_month") == os.path.join("2024", "03")
+        assert shard_directory(make_declaration(declaration_date="n/a"), "year_month") == UNKNOWN_SHARD
+
+    def test_unsafe_tax_code(self):
+        assert shard_directory(make_declaration(tax_code="../a"), "tax_code") == "_a"
+        assert shard_directory(make_declaration(tax_code=".."), "tax_code") == UNKNOWN_SHARD
+        assert shard_directory(make_declaration(tax_code=" "), "tax_code") == UNKNOWN_SHARD
+
+    def test_invalid_layout(self):
+        with pytest.raises(ValueError):
+            shard_directory(make_declaration(), "by_week")
+
+
+class TestFileManagerLayout:
+    """Saving and finding files in a sharded layout"""
+
+    def test_saves_into_layout_directory(self, tmp_path, writer):
+        manager = FileManager(str(tmp_path), file_writer=writer)
+        manager.output_layout = "tax_code_year_month"
+
+        path = manager.save_barcode(make_declaration(), b"pdf")
+
+        assert path == os.path.join(str(tmp_path), "2300782217", "2024", "12", "MV_2300782217_308010891440.pdf")
+        assert open(path, "rb").read() == b"pdf"
+        assert manager.file_exists(make_declaration())
+
+    def test_finds_files_not_migrated_yet(self, tmp_path, writer):
+        flat = FileManager(str(tmp_path), file_writer=writer)
+        old_path = flat.save_barcode(make_declaration(), b"pdf")
+
+        manager = FileManager(str(tmp_path), file_writer=writer)
+        manager.output_layout = "year_month"
+
+        assert manager.locate(make_declaration()) == old_path
+        assert manager.find_existing(make_declaration()) == old_path
+        assert manager.file_exists(make_declaration(), verify=True)
+        assert manager.save_barcode(make_declaration(), b"new") is None  # overwrite=False
+        assert manager.locate(make_declaration("308010891441")) is None
+
+    def test_invalid_layout_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            FileManager(str(tmp_path)).output_layout = "by_week"
+
+
+class TestOutputMigrator:
+    """Moving saved files into the layout"""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        return TrackingDatabase(str(tmp_path / "tracking.db"))
+
+    def save_flat(self, root, db, writer, count):
+        manager = FileManager(str(root), file_writer=writer)
+        declarations = []
+        for i in range(count):
+            declaration = make_declaration(f"3080108914{i:02d}", tax_code=f"23007822{i % 3}",
+                                           declaration_date=datetime(2024, 1 + i % 4, 1))
+            db.add_processed(declaration, manager.save_barcode(declaration, b"pdf %d" % i))
+            declarations.append(declaration)
+        return declarations
+
+    def layout_manager(self, root, writer, layout="tax_code_year_month"):
+        manager = FileManager(str(root), file_writer=writer)
+        manager.output_layout = layout
+        return manager
+
+    def test_moves_files_and_updates_rows(self, tmp_path, db, writer):
+        root = tmp_path / "out"
+        declarations = self.save_flat(root, db, writer, 12)
+        manager = self.layout_manager(root, writer)
+        migrator = OutputMigrator(manager, db, workers=4)
+
+        assert migrator.migrate(dry_run=True).planned == 12
+        result = migrator.migrate()
+
+        assert (result.moved, result.rows_updated, result.failed) == (12, 12, 0)
+        paths = {row.declaration_number: row.file_path for row in db.get_all_processed_details()}
+        for i, declaration in enumerate(declarations):
+            assert paths[declaration.declaration_number] == manager.get_file_path(declaration)
+            assert open(manager.get_file_path(declaration), "rb").read() == b"pdf %d" % i
+            assert manager.locate(declaration) == manager.get_file_path(declaration)
+        assert [name for name in os.listdir(root) if name.endswith(".pdf")] == []
+        assert migrator.plan() == []
+
+    def test_interrupted_migration_resumes(self, tmp_path, db, writer):
+        root = tmp_path / "out"
+        declarations = self.save_flat(root, db, writer, 3)
+        manager = self.layout_manager(root, writer, "year_month")
+        # First file moved, but its row was never updated
+        os.makedirs(manager.get_directory(declarations[0]))
+        os.replace(os.path.join(str(root), os.path.basename(manager.get_file_path(declarations[0]))),
+                   manager.get_file_path(declarations[0]))
+
+        result = OutputMigrator(manager, db).migrate()
+
+        assert (result.moved, result.already_moved, result.rows_updated) == (2, 1, 3)
+
+    def test_keeps_newer_duplicate(self, tmp_path, db, writer):
+        root = tmp_path / "out"
+        declaration = self.save_flat(root, db, writer, 1)[0]
+        manager = self.layout_manager(root, writer, "tax_code")
+        flat_path = db.get_all_processed_details()[0].file_path
+        old = time.time() - 60
+        os.utime(flat_path, (old, old))
+        manager.save_barcode(declaration, b"re-downloaded", overwrite=True)
+
+        result = OutputMigrator(manager, db).migrate()
+
+        assert result.duplicates == 1
+        assert not os.path.exists(flat_path)
+        assert open(manager.get_file_path(declaration), "rb").read() == b"re-downloaded"
+        assert db.get_all_processed_details()[0].file_path == manager.get_file_path(declaration)
+
+    def test_missing_files_and_other_directories_left_alone(self, tmp_path, db, writer):
+        root = tmp_path / "out"
+        self.save_flat(root, db, writer, 2)
+        os.remove(db.get_all_processed_details()[0].file_path)
+        elsewhere = make_declaration("308010891499")
+        db.add_processed(elsewhere, str(tmp_path / "old_output" / "MV_x.pdf"))
+
+        result = OutputMigrator(self.layout_manager(root, writer), db).migrate()
+
+        assert (result.planned, result.moved, result.missing, result.rows_updated) == (2, 1, 1, 1)
+
+
+class TestTrackingDatabasePaths:
+    """Bulk path updates and rebuilds of sharded directories"""
+
+    def test_update_file_paths(self, tmp_path):
+        db = TrackingDatabase(str(tmp_path / "tracking.db"))
+        db.add_processed(make_declaration("1"), "/out/a.pdf")
+        db.add_processed(make_declaration("2"), "/out/b.pdf")
+        row_id = next(row.id for row in db.get_all_processed_details() if row.file_path == "/out/a.pdf")
+
+        assert db.update_file_paths([(row_id, "/out/x/a.pdf"), (9999, "/out/x/none.pdf")]) == 1
+        assert db.update_file_paths([]) == 0
+        assert sorted(row.file_path for row in db.get_all_processed_details()) == ["/out/b.pdf", "/out/x/a.pdf"]
+
+    def test_rebuild_reads_subdirectories(self, tmp_path):
+        db = TrackingDatabase(str(tmp_path / "tracking.db"))
+        nested = tmp_path / "out" / "2024" / "12"
+        nested.mkdir(parents=True)
+        (nested / "2300782217_308010891440.pdf").write_bytes(b"pdf")
+
+        db.rebuild_from_directory(str(tmp_path / "out"))
+
+        assert db.get_all_processed_details()[0].file_path == str(nested / "2300782217_308010891440.pdf")
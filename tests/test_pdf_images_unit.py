@@ -0,0 +1,169 @@
+"""
+Unit tests for the PDF image encoding
+
+These tests verify that QR images are reduced to the smallest exact sample
+format, that transparency is flattened onto white, that downsampling is
+optional, that encoded images are cached by content hash, and that rows
+sharing a QR image share one image XObject in the generated PDF.
+"""
+
+import base64
+import io
+import random
+import re
+import zlib
+from unittest.mock import Mock
+
+import pytest
+from PIL import Image
+from reportlab.platypus import Image as ReportLabImage
+
+from web_utils.barcode_pdf_generator import BarcodePdfGenerator
+from web_utils.pdf_images import ImageCache, encode_image
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
+
+
+def png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def qr_png(seed: int, mode: str = "RGB", scale: int = 8) -> bytes:
+    """Random 21x21 module grid (QR version 1 size), `scale` pixels per module."""
+    rnd = random.Random(seed)
+    image = Image.new("1", (21, 21), 1)
+    for y in range(21):
+        for x in range(21):
+            if rnd.random() < 0.5:
+                image.putpixel((x, y), 0)
+    return png(image.resize((21 * scale, 21 * scale), Image.NEAREST).convert(mode))
+
+
+class ReportLabImages(BarcodePdfGenerator):
+    """QR images embedded by ReportLab's Image flowable, as before."""
+
+    def _decode_qr_image(self, base64_data):
+        img = ReportLabImage(io.BytesIO(base64.b64decode(base64_data)),
+                             width=self.config.qr_code_size, height=self.config.qr_code_size)
+        img.hAlign = 'CENTER'
+        return img
+
+
+def make_info(images: list) -> ContainerDeclarationInfo:
+    info = ContainerDeclarationInfo(so_to_khai="308010891440", ma_so_thue="2300782217", ma_ptvc="2")
+    for i, image in enumerate(images, 1):
+        info.containers.append(ContainerInfo(
+            stt=i, so_container=f"TEMU{i:07d}", barcode_image=base64.b64encode(image).decode("ascii")
+        ))
+    return info
+
+
+class TestEncodeImage:
+    """Sample format selection"""
+
+    @pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "1", "P"])
+    def test_black_and_white_becomes_one_bit(self, mode):
+        encoded = encode_image(qr_png(1, mode))
+
+        assert (encoded.bits, encoded.color_space) == (1, "DeviceGray")
+        assert (encoded.width, encoded.height) == (168, 168)
+        assert len(zlib.decompress(encoded.data)) == 168 * 168 // 8
+
+    def test_one_bit_samples_keep_the_modules(self):
+        source = Image.open(io.BytesIO(qr_png(2))).convert("1")
+        encoded = encode_image(qr_png(2))
+
+        assert zlib.decompress(encoded.data) == source.tobytes()
+
+    def test_grey_stays_eight_bit_grey(self):
+        encoded = encode_image(png(Image.linear_gradient("L")))
+
+        assert (encoded.bits, encoded.color_space) == (8, "DeviceGray")
+
+    def test_colour_stays_rgb(self):
+        encoded = encode_image(png(Image.new("RGB", (4, 4), (200, 30, 30))))
+
+        assert (encoded.bits, encoded.color_space) == (8, "DeviceRGB")
+
+    def test_transparency_flattened_onto_white(self):
+        image = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+        image.putpixel((0, 0), (0, 0, 0, 255))
+        encoded = encode_image(png(image))
+
+        samples = Image.frombytes("1", (8, 8), zlib.decompress(encoded.data))
+        assert samples.getpixel((0, 0)) == 0
+        assert samples.getpixel((7, 7)) == 255
+
+    def test_downsampling_is_optional(self):
+        assert encode_image(qr_png(1), max_pixels=0).width == 168
+        assert encode_image(qr_png(1), max_pixels=84).width == 84
+        assert encode_image(qr_png(1), max_pixels=500).width == 168
+
+    def test_invalid_image_raises(self):
+        with pytest.raises(OSError):
+            encode_image(b"not an image")
+
+
+class TestImageCache:
+    """Encoded images are shared by content hash"""
+
+    def test_same_bytes_encoded_once(self):
+        cache = ImageCache()
+
+        first = cache.get(qr_png(1))
+        assert cache.get(qr_png(1)) is first
+        assert cache.get(qr_png(1), max_pixels=84) is not first
+        assert cache.get_stats() == {'entries': 2, 'hits': 1, 'misses': 2}
+
+    def test_bounded(self):
+        cache = ImageCache(max_entries=2)
+        for seed in range(4):
+            cache.get(qr_png(seed))
+
+        assert cache.get_stats()['entries'] == 2
+
+
+class TestGeneratedPdf:
+    """QR images in container PDFs"""
+
+    def count_images(self, pdf: bytes) -> int:
+        return len(re.findall(rb"/Subtype /Image", pdf))
+
+    def test_shared_qr_images_embedded_once(self):
+        generator = BarcodePdfGenerator(logger=Mock())
+        images = [qr_png(1), qr_png(2), qr_png(1)]
+
+        pdf = generator.generate_pdf(make_info(images))
+
+        assert self.count_images(pdf) == 2
+        assert b"/BitsPerComponent 1" in pdf
+        assert "3 QR images, 2 embedded" in generator.logger.info.call_args[0][0]
+
+    def test_paginated_container_list_shares_images(self):
+        pdf = BarcodePdfGenerator(logger=None).generate_pdf(make_info([qr_png(i % 3) for i in range(30)]))
+
+        assert int(re.search(rb"/Count (\d+)", pdf).group(1)) > 1
+        assert self.count_images(pdf) == 3
+
+    def test_smaller_than_reportlab_embedding(self):
+        info = make_info([qr_png(i) for i in range(4)])
+        generator = BarcodePdfGenerator(logger=None)
+        compact = generator.generate_pdf(info)
+        generator.config.image_compression_level = 1
+        generator.config.page_compression = False
+
+        assert len(compact) < len(generator.generate_pdf(info))
+        assert len(compact) * 2 < len(ReportLabImages(logger=None).generate_pdf(info))
+
+    def test_renders_like_reportlab_image(self):
+        pdfium = pytest.importorskip("pypdfium2")
+        from PIL import ImageChops
+
+        info = make_info([qr_png(1), qr_png(2)])
+        pages = [
+            pdfium.PdfDocument(generator.generate_pdf(info))[0].render(scale=2).to_pil().convert("L")
+            for generator in (BarcodePdfGenerator(logger=None), ReportLabImages(logger=None))
+        ]
+
+        assert sum(ImageChops.difference(*pages).histogram()[16:]) == 0
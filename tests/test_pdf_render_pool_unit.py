@@ -0,0 +1,191 @@
+"""
+Unit tests for the PDF render process pool
+
+These tests verify in-process and worker-process rendering, rendering
+straight to a file, seal status correction in the calling process, and
+the in-process fallback when the worker pool breaks.
+"""
+
+import os
+import pickle
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import Mock, patch
+
+import pytest
+
+from web_utils.barcode_pdf_generator import BarcodeRenderConfig
+from web_utils.pdf_render_pool import PdfRenderPool
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
+
+UNCHECKED_NOTE = "Tờ khai chưa được kiểm tra điều kiện niêm phong"
+
+
+def make_info(number: str = "308010891440", containers: int = 0) -> ContainerDeclarationInfo:
+    info = ContainerDeclarationInfo(
+        so_to_khai=number,
+        ma_so_thue="2300782217",
+        ten_don_vi_xnk="CÔNG TY TNHH ABC",
+        so_luong_hang=10,
+        dvt_so_luong_hang="PK",
+        ma_ptvc="2" if containers else "1",
+    )
+    for i in range(1, containers + 1):
+        info.containers.append(ContainerInfo(stt=i, so_container=f"TEMU{i:07d}"))
+    return info
+
+
+@pytest.fixture(scope="module")
+def worker_pool():
+    """Two worker processes, shared by the tests that need real workers."""
+    pool = PdfRenderPool(workers=2, logger=Mock())
+    yield pool
+    pool.shutdown()
+
+
+class TestInProcess:
+    """workers = 0 renders in the calling thread"""
+
+    def test_render_without_workers(self):
+        pool = PdfRenderPool(workers=0)
+
+        assert pool.render(make_info()).startswith(b"%PDF")
+        assert pool.submit(make_info()).result().startswith(b"%PDF")
+        assert pool.get_stats()['running'] is False
+
+    def test_render_to_file_without_workers(self, tmp_path):
+        path = str(tmp_path / "out" / "a.pdf")
+
+        assert PdfRenderPool(workers=0).render_to_file(make_info(), path)
+        with open(path, 'rb') as f:
+            assert f.read().startswith(b"%PDF")
+
+    def test_auto_workers_uses_cpu_count(self):
+        with patch('web_utils.pdf_render_pool.os.cpu_count', return_value=6):
+            pool = PdfRenderPool(workers=PdfRenderPool.AUTO_WORKERS)
+
+        assert pool.workers == 6
+        assert pool.get_stats()['running'] is False  # Workers start on first use
+
+    def test_new_render_config_replaces_running_pool(self):
+        pool = PdfRenderPool(workers=2)
+        executor = Mock()
+        pool._executor = executor
+        config = BarcodeRenderConfig(qr_image_max_dpi=150, image_compression_level=9)
+
+        pool.configure(2, render_config=BarcodeRenderConfig(qr_image_max_dpi=150, image_compression_level=9))
+        assert pool.render_config == config
+        executor.shutdown.assert_called_once()
+
+        pool._executor = executor
+        pool.configure(2, render_config=config)
+        assert pool._executor is executor  # Unchanged settings keep the pool
+
+    def test_declaration_info_pickles(self):
+        info = make_info(containers=3)
+        assert pickle.loads(pickle.dumps(info)) == info
+
+
+class TestWorkerProcesses:
+    """Rendering in worker processes"""
+
+    def test_render_in_workers(self, worker_pool):
+        pdf = worker_pool.render(make_info())
+
+        assert pdf.startswith(b"%PDF")
+        assert worker_pool.get_stats()['running'] is True
+        assert worker_pool.get_stats()['fallbacks'] == 0
+
+    def test_concurrent_renders(self, worker_pool):
+        infos = [make_info(f"30{i:010d}", containers=i % 3) for i in range(12)]
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(worker_pool.render, infos))
+
+        assert all(pdf.startswith(b"%PDF") for pdf in results)
+
+    def test_render_to_file_in_worker(self, worker_pool, tmp_path):
+        path = str(tmp_path / "b.pdf")
+
+        assert worker_pool.render_to_file(make_info(), path)
+        assert os.listdir(tmp_path) == ["b.pdf"]
+
+    def test_workers_use_render_config(self):
+        config = BarcodeRenderConfig(page_compression=False)
+        pool = PdfRenderPool(workers=1, render_config=config)
+        try:
+            pdf = pool.render(make_info())
+        finally:
+            pool.shutdown()
+
+        # Rendering is deterministic: same settings, same bytes as in-process
+        assert pdf == PdfRenderPool(workers=0, render_config=config).render(make_info())
+        assert pdf != PdfRenderPool(workers=0).render(make_info())
+
+    def test_invalid_info_returns_none(self, worker_pool, tmp_path):
+        assert worker_pool.render(ContainerDeclarationInfo()) is None
+        assert worker_pool.render_to_file(ContainerDeclarationInfo(), str(tmp_path / "c.pdf")) is False
+        assert not os.path.exists(tmp_path / "c.pdf")
+
+
+class TestSealStatusAndFallback:
+    """Caller-side seal status correction and broken pool recovery"""
+
+    def test_seal_status_corrected_before_sending(self):
+        pool = PdfRenderPool(workers=0)
+        info = make_info()
+        info.ghi_chu = UNCHECKED_NOTE
+
+        with patch.object(pool._generator, '_auto_correct_seal_status', return_value="Tờ khai không phải niêm phong"):
+            prepared = pool._prepare(info)
+
+        assert prepared.ghi_chu == "Tờ khai không phải niêm phong"
+        assert info.ghi_chu == UNCHECKED_NOTE
+        unchanged = make_info()
+        assert pool._prepare(unchanged) is unchanged
+
+    def test_worker_skips_seal_correction(self):
+        from web_utils import pdf_render_pool
+
+        generator = Mock()
+        with patch.object(pdf_render_pool, '_worker_generator', generator):
+            pdf_render_pool._render_in_worker(make_info())
+
+        generator.generate_pdf.assert_called_once()
+        assert generator.generate_pdf.call_args.kwargs == {'correct_seal_status': False}
+
+    def test_broken_pool_falls_back_and_restarts(self):
+        pool = PdfRenderPool(workers=2, logger=Mock())
+        broken = Future()
+        broken.set_exception(BrokenProcessPool("worker died"))
+        executor = Mock()
+        executor.submit.return_value = broken
+
+        with patch.object(pool, '_get_executor', return_value=executor):
+            pool._executor = executor
+            pdf = pool.render(make_info())
+
+        assert pdf.startswith(b"%PDF")
+        stats = pool.get_stats()
+        assert stats['fallbacks'] == 1
+        assert stats['restarts'] == 1
+        assert stats['running'] is False
+        executor.shutdown.assert_called_once()
+
+
+class TestRetrieverUsesPool:
+    """BarcodeRetriever renders through the pool when workers are configured"""
+
+    def test_retriever_render_pdf(self):
+        from web_utils.barcode_retriever import BarcodeRetriever
+
+        retriever = BarcodeRetriever.__new__(BarcodeRetriever)
+        retriever._pdf_generator = Mock()
+        render_pool = Mock(workers=4)
+        render_pool.render.return_value = b"%PDF-pool"
+
+        with patch('web_utils.barcode_retriever.get_pdf_render_pool', return_value=render_pool):
+            assert retriever._render_pdf(make_info()) == b"%PDF-pool"
+            render_pool.workers = 0
+            retriever._render_pdf(make_info())
+
+        retriever._pdf_generator.generate_pdf.assert_called_once()
@@ -0,0 +1,299 @@
+"""
+Unit tests for the staged pipeline and the workflow pipeline
+
+These tests verify that items pass through all stages, that stages
+overlap so a batch takes about as long as its slowest stage, that full
+queues hold back the stage in front, that batch stages group items, that
+workers see the caller's context variables, that errors and cancellation
+finish items correctly, and that the workflow stages fetch, render, save
+and record declarations in batches, pausing their fetches at job
+checkpoints.
+"""
+
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.pipeline import Pipeline, Stage
+from database.tracking_database import TrackingDatabase
+from models.declaration_models import Declaration
+from services.job_queue import KIND_MANUAL, KIND_SCHEDULED, PAUSED, JobQueue
+from services.workflow_pipeline import PipelineSettings, WorkflowPipeline
+from web_utils.barcode_retriever import RetrievalResult
+from web_utils.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, current_priority, request_priority
+
+
+def sleeper(seconds, passed=True):
+    def handler(item):
+        time.sleep(seconds)
+        return passed
+    return handler
+
+
+class TestPipeline:
+    """Stages connected by bounded queues"""
+
+    def test_all_items_reach_the_end(self):
+        seen = []
+        pipeline = Pipeline([
+            Stage("double", lambda item: item.append(item[0] * 2) or True, workers=3),
+            Stage("check", lambda item: True, workers=2),
+        ])
+
+        reported = pipeline.run(([i] for i in range(50)), lambda item, error: seen.append((item, error)))
+
+        assert reported == 50
+        assert sorted(item[1] for item, _ in seen) == [i * 2 for i in range(50)]
+        assert all(error is None for _, error in seen)
+        assert pipeline.get_stats()["stages"]["double"]["passed"] == 50
+
+    def test_stages_overlap(self):
+        pipeline = Pipeline([
+            Stage("a", sleeper(0.02), workers=1),
+            Stage("b", sleeper(0.02), workers=1),
+            Stage("c", sleeper(0.02), workers=1),
+        ])
+
+        started = time.monotonic()
+        pipeline.run(range(20))
+        elapsed = time.monotonic() - started
+
+        # Sequential would take 20 * 3 * 0.02 = 1.2s
+        assert elapsed < 0.9
+        for stage in pipeline.get_stats()["stages"].values():
+            assert stage["processed"] == 20
+
+    def test_backpressure(self):
+        gate = threading.Event()
+        pipeline = Pipeline([
+            Stage("fast", lambda item: True, workers=1, queue_size=2),
+            Stage("slow", lambda item: gate.wait(5), workers=1, queue_size=2),
+        ])
+        runner = threading.Thread(target=pipeline.run, args=(range(20),))
+        runner.start()
+        time.sleep(0.2)
+        # 1 in slow's handler + 2 queued + 1 in fast's handler + 2 queued
+        assert pipeline._fed <= 6
+        gate.set()
+        runner.join(5)
+
+        stats = pipeline.get_stats()
+        assert stats["items"] == 20
+        assert stats["stages"]["fast"]["blocked_seconds"] > 0
+        assert stats["stages"]["slow"]["max_queue_depth"] == 2
+
+    def test_batches(self):
+        batches = []
+        pipeline = Pipeline([
+            Stage("one", lambda item: True, workers=2),
+            Stage("many", lambda items: batches.append(list(items)) or True, batch_size=10, max_delay=0.5,
+                  queue_size=50),
+        ])
+
+        assert pipeline.run(range(25)) == 25
+
+        assert sorted(i for batch in batches for i in batch) == list(range(25))
+        assert max(len(batch) for batch in batches) == 10
+        assert pipeline.get_stats()["stages"]["many"]["batches"] == len(batches)
+
+    def test_finished_early_and_errors(self):
+        def check(item):
+            if item == 3:
+                raise ValueError("bad item")
+            return item % 2 == 0
+
+        second = MagicMock(return_value=True)
+        done = {}
+        pipeline = Pipeline([Stage("check", check), Stage("second", second)])
+
+        pipeline.run(range(6), lambda item, error: done.__setitem__(item, error))
+
+        assert set(done) == set(range(6))
+        assert isinstance(done[3], ValueError)
+        assert sorted(call.args[0] for call in second.call_args_list) == [0, 2, 4]
+        assert pipeline.get_stats()["stages"]["check"]["failed"] == 1
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        done = []
+
+        def on_done(item, error):
+            done.append(item)
+            if len(done) == 3:
+                cancel.set()
+
+        pipeline = Pipeline([Stage("work", sleeper(0.01), workers=1, queue_size=2)])
+        pipeline.run(range(100), on_done, cancel)
+
+        assert 3 <= len(done) < 10
+        assert not [t for t in threading.enumerate() if t.name.startswith("pipeline-")]  # Workers stopped
+
+    def test_workers_inherit_the_callers_context(self):
+        priorities = []
+        pipeline = Pipeline([
+            Stage("first", lambda item: priorities.append(current_priority()) or True, workers=2),
+            Stage("second", lambda item: priorities.append(current_priority()) or True, workers=2),
+        ])
+
+        with request_priority(PRIORITY_BACKGROUND):
+            pipeline.run(range(10))
+
+        assert priorities == [PRIORITY_BACKGROUND] * 20
+
+    def test_on_done_error_stops_the_run(self):
+        pipeline = Pipeline([Stage("work", lambda item: True, workers=2)])
+
+        def on_done(item, error):
+            raise RuntimeError("listener failed")
+
+        with pytest.raises(RuntimeError):
+            pipeline.run(range(100), on_done)
+
+    def test_needs_a_stage(self):
+        with pytest.raises(ValueError):
+            Pipeline([])
+
+
+def make_declaration(number, tax_code="2300782217"):
+    return Declaration(number, tax_code, datetime(2024, 12, 1), customs_office_code="18A3")
+
+
+class TestWorkflowPipeline:
+    """Fetch, render, write and track stages"""
+
+    @pytest.fixture
+    def components(self, tmp_path):
+        retriever = MagicMock()
+        retriever.fetch_barcode.side_effect = lambda declaration, known_hash, render: RetrievalResult(
+            content_hash=f"hash-{declaration.declaration_number}", info=declaration.declaration_number
+        )
+        retriever.render_barcode.side_effect = lambda result: f"%PDF {result.info}".encode()
+        file_manager = MagicMock()
+        file_manager.save_barcode.side_effect = lambda declaration, pdf, overwrite: f"/out/{declaration.declaration_number}.pdf"
+        ecus = MagicMock()
+        ecus.get_company_name.side_effect = lambda tax_code: f"Company {tax_code}"
+        db = TrackingDatabase(str(tmp_path / "tracking.db"))
+        return db, retriever, file_manager, ecus
+
+    def pipeline(self, components, **settings):
+        db, retriever, file_manager, ecus = components
+        return WorkflowPipeline(db, retriever, file_manager, ecus, MagicMock(), PipelineSettings(**settings))
+
+    def test_processes_and_records_in_batches(self, components):
+        db, retriever, file_manager, ecus = components
+        declarations = [make_declaration(f"3080108914{i:02d}", tax_code=f"23007822{i % 2}") for i in range(30)]
+        finished = []
+        pipeline = self.pipeline(components, track_batch_size=10)
+
+        assert pipeline.run(declarations, on_done=finished.append) == 30
+
+        assert all(item.success for item in finished)
+        assert all(call.kwargs == {"render": False} for call in retriever.fetch_barcode.call_args_list)
+        assert retriever.render_barcode.call_count == 30
+        assert {row.declaration_number: row.file_path for row in db.get_all_processed_details()} == {
+            d.declaration_number: f"/out/{d.declaration_number}.pdf" for d in declarations
+        }
+        assert db.get_content_hash(declarations[5]) == "hash-308010891405"
+        assert ecus.get_company_name.call_count == 2  # Once per tax code
+        assert {row[0] for row in db.get_all_companies()} == {"230078220", "230078221"}
+        stats = pipeline.get_stats()["stages"]
+        assert stats["track"]["batches"] < 30
+        assert stats["write"]["processed"] == 30
+
+    def test_failures_end_early(self, components):
+        db, retriever, file_manager, ecus = components
+        retriever.fetch_barcode.side_effect = lambda declaration, known_hash, render: (
+            RetrievalResult() if declaration.declaration_number == "1" else
+            RetrievalResult(pdf_content=b"%PDF downloaded", content_hash="h")
+        )
+        file_manager.save_barcode.side_effect = lambda declaration, pdf, overwrite: (
+            None if declaration.declaration_number == "2" else "/out/3.pdf"
+        )
+        finished = {}
+
+        self.pipeline(components).run(
+            [make_declaration("1"), make_declaration("2"), make_declaration("3")],
+            on_done=lambda item: finished.__setitem__(item.declaration.declaration_number, item)
+        )
+
+        assert finished["1"].error == "Failed to retrieve barcode"
+        assert finished["2"].error == "File save skipped"
+        assert finished["3"].success
+        retriever.render_barcode.assert_not_called()  # Downloaded PDF
+        assert [row.declaration_number for row in db.get_all_processed_details()] == ["3"]
+
+    def test_forced_redownload(self, components):
+        db, retriever, file_manager, ecus = components
+        unchanged, changed = make_declaration("1"), make_declaration("2")
+        db.add_processed(unchanged, "/out/1.pdf", content_hash="same")
+        db.add_processed(changed, "/out/2.pdf", content_hash="old")
+        processed_at = {row.declaration_number: row.processed_at for row in db.get_all_processed_details()}
+        file_manager.locate.side_effect = lambda declaration, verify: f"/out/{declaration.declaration_number}.pdf"
+        retriever.fetch_barcode.side_effect = lambda declaration, known_hash, render: (
+            RetrievalResult(content_hash="same", unchanged=True) if known_hash == "same" else
+            RetrievalResult(content_hash="new", info="info")
+        )
+        finished = {}
+
+        self.pipeline(components).run(
+            [unchanged, changed], force_redownload=True,
+            on_done=lambda item: finished.__setitem__(item.declaration.declaration_number, item)
+        )
+
+        assert finished["1"].unchanged and finished["1"].file_path == "/out/1.pdf"
+        assert finished["2"].success and not finished["2"].unchanged
+        file_manager.save_barcode.assert_called_once_with(changed, b"%PDF info", overwrite=True)
+        assert db.get_content_hash(changed) == "new"
+        rows = {row.declaration_number: row for row in db.get_all_processed_details()}
+        assert rows["2"].processed_at == processed_at["2"]
+
+    def test_stage_exception_reported(self, components):
+        db, retriever, file_manager, ecus = components
+        retriever.render_barcode.side_effect = RuntimeError("renderer crashed")
+        finished = []
+
+        self.pipeline(components).run([make_declaration("1")], on_done=finished.append)
+
+        assert not finished[0].success
+        assert isinstance(finished[0].exception, RuntimeError)
+        assert db.get_all_processed_details() == []
+
+    def test_fetches_pause_for_higher_priority_jobs(self, components):
+        db, retriever, file_manager, ecus = components
+        queue = JobQueue(max_running=1)
+        fetched = []
+        second_fetch = threading.Event()
+
+        def fetch(declaration, known_hash, render):
+            fetched.append(declaration.declaration_number)
+            if len(fetched) == 2:
+                second_fetch.set()
+            time.sleep(0.02)
+            return RetrievalResult(content_hash="h", info=declaration.declaration_number)
+
+        retriever.fetch_barcode.side_effect = fetch
+        pipeline = self.pipeline(components, fetch_workers=1)
+        declarations = [make_declaration(str(i)) for i in range(20)]
+        background = queue.submit(
+            lambda job: pipeline.run(declarations, checkpoint=job.checkpoint),
+            "poll", KIND_SCHEDULED, PRIORITY_BACKGROUND
+        )
+        assert second_fetch.wait(5)
+
+        gate = threading.Event()
+        interactive = queue.submit(lambda job: gate.wait(5), "manual", KIND_MANUAL, PRIORITY_INTERACTIVE)
+        deadline = time.monotonic() + 5
+        while background.state != PAUSED and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert background.state == PAUSED
+        paused_at = len(fetched)
+        time.sleep(0.2)
+        assert len(fetched) == paused_at < 20
+
+        gate.set()
+        interactive.wait(5)
+        assert background.wait(5) == 20
+        assert len(fetched) == 20
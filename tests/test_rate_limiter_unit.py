@@ -0,0 +1,229 @@
+"""
+Unit tests for TokenBucketRateLimiter
+
+These tests verify the sustained rate, priority lanes, FIFO fairness,
+anti-starvation promotion, 429 back-off and metrics.
+"""
+
+import asyncio
+import threading
+import time
+from datetime import date
+from unittest.mock import Mock, patch
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from web_utils.rate_limiter import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    TokenBucketRateLimiter,
+    current_priority,
+    get_rate_limiter,
+    request_priority,
+    run_with_priority,
+)
+
+
+def start_waiter(limiter, priority, order, label):
+    """Start a thread that records label once it gets a token."""
+    def run():
+        if limiter.acquire(priority=priority, timeout=5):
+            order.append(label)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+class TestTokenBucketRateLimiter:
+    """Unit tests for TokenBucketRateLimiter class"""
+
+    def test_burst_is_immediate(self):
+        """Up to `burst` requests should pass without waiting"""
+        limiter = TokenBucketRateLimiter(rate=1.0, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            assert limiter.acquire(timeout=0.5)
+        assert time.monotonic() - started < 0.1
+
+    def test_sustained_rate(self):
+        """After the burst, grants should follow the refill rate"""
+        limiter = TokenBucketRateLimiter(rate=20.0, burst=1)
+        started = time.monotonic()
+        for _ in range(11):
+            assert limiter.acquire(timeout=2)
+        elapsed = time.monotonic() - started
+        # 10 refills at 20/s = 0.5s
+        assert 0.4 <= elapsed < 1.0
+
+    def test_timeout_returns_false(self):
+        """acquire should give up after its timeout and count it"""
+        limiter = TokenBucketRateLimiter(rate=0.5, burst=1)
+        assert limiter.acquire(timeout=0.1)
+        assert not limiter.acquire(priority=PRIORITY_BACKGROUND, timeout=0.1)
+        assert limiter.get_stats()['lanes']['background']['timeouts'] == 1
+
+    def test_async_acquire_follows_rate(self):
+        """acquire_async should grant at the refill rate without threads"""
+        limiter = TokenBucketRateLimiter(rate=20.0, burst=1)
+
+        async def run():
+            started = time.monotonic()
+            for _ in range(6):
+                assert await limiter.acquire_async(timeout=2)
+            return time.monotonic() - started
+
+        threads = threading.active_count()
+        assert 0.2 <= asyncio.run(run()) < 0.6
+        assert threading.active_count() == threads
+
+    def test_cancelled_async_waiter_takes_no_token(self):
+        """A cancelled acquire_async leaves its lane without using a token"""
+        limiter = TokenBucketRateLimiter(rate=5.0, burst=1)
+        assert limiter.acquire(timeout=0.5)
+
+        async def run():
+            task = asyncio.create_task(limiter.acquire_async())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        stats = limiter.get_stats()
+        assert stats['lanes']['normal']['queued'] == 0
+        assert stats['lanes']['normal']['granted'] == 1
+        assert limiter.acquire(timeout=0.5)  # The next token is still there
+
+    def test_async_acquire_times_out(self):
+        """acquire_async should return False after its timeout"""
+        limiter = TokenBucketRateLimiter(rate=0.5, burst=1)
+        assert limiter.acquire(timeout=0.1)
+        assert not asyncio.run(limiter.acquire_async(priority=PRIORITY_BACKGROUND, timeout=0.1))
+        assert limiter.get_stats()['lanes']['background']['timeouts'] == 1
+
+    def test_interactive_served_before_background(self):
+        """A free token should go to the interactive lane first"""
+        limiter = TokenBucketRateLimiter(rate=10.0, burst=1)
+        assert limiter.acquire()
+        order = []
+
+        background = start_waiter(limiter, PRIORITY_BACKGROUND, order, "bg")
+        time.sleep(0.02)
+        interactive = start_waiter(limiter, PRIORITY_INTERACTIVE, order, "ui")
+        background.join(2)
+        interactive.join(2)
+
+        assert order == ["ui", "bg"]
+
+    def test_fifo_within_lane(self):
+        """Requests in the same lane should be served in arrival order"""
+        limiter = TokenBucketRateLimiter(rate=20.0, burst=1)
+        assert limiter.acquire()
+        order = []
+        threads = []
+        for i in range(4):
+            threads.append(start_waiter(limiter, PRIORITY_NORMAL, order, i))
+            time.sleep(0.01)
+        for t in threads:
+            t.join(2)
+
+        assert order == [0, 1, 2, 3]
+
+    def test_long_waiting_background_is_promoted(self):
+        """A background request queued beyond max_wait_promotion should not starve"""
+        limiter = TokenBucketRateLimiter(rate=10.0, burst=1, max_wait_promotion=0.05)
+        assert limiter.acquire()
+        order = []
+
+        background = start_waiter(limiter, PRIORITY_BACKGROUND, order, "bg")
+        time.sleep(0.09)
+        interactive = start_waiter(limiter, PRIORITY_INTERACTIVE, order, "ui")
+        background.join(2)
+        interactive.join(2)
+
+        assert order == ["bg", "ui"]
+
+    def test_disabled_limiter_never_waits(self):
+        """rate=0 should let every request through"""
+        limiter = TokenBucketRateLimiter(rate=0)
+        assert not limiter.enabled
+        for _ in range(100):
+            assert limiter.acquire(timeout=0)
+
+    def test_disabling_releases_waiters(self):
+        """Reconfiguring to unlimited should wake queued requests"""
+        limiter = TokenBucketRateLimiter(rate=0.1, burst=1)
+        assert limiter.acquire()
+        order = []
+        thread = start_waiter(limiter, PRIORITY_NORMAL, order, "w")
+        time.sleep(0.05)
+        limiter.configure(0)
+        thread.join(2)
+        assert order == ["w"]
+
+    def test_throttle_lowers_rate_then_recovers(self):
+        """HTTP 429 should reduce the effective rate; grants restore it"""
+        limiter = TokenBucketRateLimiter(rate=100.0, burst=100)
+        limiter.record_throttled()
+        assert limiter.effective_rate == 80.0
+        limiter.record_throttled()  # within the cool-down: no further cut
+        assert limiter.effective_rate == 80.0
+        assert limiter.get_stats()['throttled'] == 2
+
+        for _ in range(20):
+            limiter.acquire(timeout=1)
+        assert limiter.effective_rate == 100.0
+
+    def test_priority_from_context(self):
+        """acquire without a priority should use the context variable"""
+        limiter = TokenBucketRateLimiter(rate=0)
+        assert current_priority() == PRIORITY_NORMAL
+        with request_priority(PRIORITY_INTERACTIVE):
+            assert current_priority() == PRIORITY_INTERACTIVE
+            limiter.acquire()
+        run_with_priority(PRIORITY_BACKGROUND, limiter.acquire)
+        assert current_priority() == PRIORITY_NORMAL
+
+        lanes = limiter.get_stats()['lanes']
+        assert lanes['interactive']['granted'] == 1
+        assert lanes['background']['granted'] == 1
+        assert lanes['normal']['granted'] == 0
+
+    def test_global_limiter_is_singleton_and_unlimited_by_default(self):
+        """The shared limiter should not throttle until configured"""
+        limiter = get_rate_limiter()
+        assert limiter is get_rate_limiter()
+        assert not limiter.enabled
+
+    def test_client_reports_429(self):
+        """query_bang_ke should feed HTTP 429 back to the limiter"""
+        from web_utils.qrcode_api_client import QRCodeApiError, QRCodeContainerApiClient
+
+        limiter = TokenBucketRateLimiter(rate=100.0, burst=10)
+        client = QRCodeContainerApiClient(logger=Mock(), session=Mock())
+        client.session.post.return_value = Mock(status_code=429, text="", reason="Too Many Requests")
+
+        with patch('web_utils.qrcode_api_client.get_rate_limiter', return_value=limiter):
+            with pytest.raises(QRCodeApiError):
+                client.query_bang_ke("2300782217", "429", "18A3", date(2024, 12, 1), use_cache=False)
+
+        assert limiter.get_stats()['throttled'] == 1
+        assert limiter.effective_rate < 100.0
+
+    @settings(max_examples=30, deadline=None)
+    @given(st.lists(st.sampled_from([PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND]), max_size=20))
+    def test_grants_never_exceed_budget(self, priorities):
+        """
+        **Feature: rate-limiter, Property 1: Grants never exceed burst + rate * elapsed**
+
+        For any sequence of non-blocking requests, the number granted is
+        bounded by the bucket size plus the tokens refilled meanwhile.
+        """
+        limiter = TokenBucketRateLimiter(rate=50.0, burst=3)
+        started = time.monotonic()
+        granted = sum(1 for p in priorities if limiter.acquire(priority=p, timeout=0))
+        elapsed = time.monotonic() - started
+        assert granted <= 3 + int(50.0 * elapsed) + 1
@@ -19,7 +19,7 @@ from config.configuration_manager import ConfigurationManager
 from database.ecus_connector import EcusDataConnector
 from database.tracking_database import TrackingDatabase
 from processors.declaration_processor import DeclarationProcessor
-from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.barcode_retriever import BarcodeRetriever, RetrievalResult
 from file_utils.file_manager import FileManager
 from logging_system.logger import Logger
 from models.config_models import LoggingConfig
@@ -277,16 +277,18 @@ def test_property_redownload_overwrite_behavior(tax_code, declaration_number):
         
         # Set up mocks
         pdf_content = b"PDF content"
-        barcode_retriever.retrieve_barcode.return_value = pdf_content
+        barcode_retriever.fetch_barcode.return_value = RetrievalResult(pdf_content=pdf_content, content_hash="new")
         file_manager.save_barcode.return_value = f"/path/to/{tax_code}_{declaration_number}.pdf"
+        file_manager.file_exists.return_value = True
         tracking_db.is_processed.return_value = True  # Declaration is already processed
+        tracking_db.get_content_hash.return_value = "old"
         
         # Call redownload_declarations
         result = scheduler.redownload_declarations([declaration])
         
         # Verify barcode was retrieved
-        assert barcode_retriever.retrieve_barcode.call_count == 1
-        barcode_retriever.retrieve_barcode.assert_called_with(declaration)
+        assert barcode_retriever.fetch_barcode.call_count == 1
+        barcode_retriever.fetch_barcode.assert_called_with(declaration, "old")
         
         # Verify file was saved with overwrite=True
         assert file_manager.save_barcode.call_count == 1
@@ -297,7 +299,7 @@ def test_property_redownload_overwrite_behavior(tax_code, declaration_number):
         
         # Verify timestamp was updated
         assert tracking_db.update_processed_timestamp.call_count == 1
-        tracking_db.update_processed_timestamp.assert_called_with(declaration)
+        tracking_db.update_processed_timestamp.assert_called_with(declaration, content_hash="new")
         
         # Verify result statistics
         assert result.success_count == 1
@@ -18,7 +18,7 @@ from config.configuration_manager import ConfigurationManager
 from database.ecus_connector import EcusDataConnector
 from database.tracking_database import TrackingDatabase
 from processors.declaration_processor import DeclarationProcessor
-from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.barcode_retriever import BarcodeRetriever, RetrievalResult
 from file_utils.file_manager import FileManager
 from logging_system.logger import Logger
 
@@ -178,7 +178,7 @@ def test_workflow_execution():
         tracking_db.get_all_processed.return_value = set()
         ecus_connector.get_new_declarations.return_value = [declaration1, declaration2]
         processor.filter_declarations.return_value = [declaration1, declaration2]
-        barcode_retriever.retrieve_barcode.return_value = b"PDF content"
+        barcode_retriever.fetch_barcode.return_value = RetrievalResult(pdf_content=b"PDF content", content_hash="h")
         file_manager.save_barcode.return_value = "/path/to/file.pdf"
         
         scheduler = Scheduler(config_manager, *components)
@@ -196,9 +196,12 @@ def test_workflow_execution():
         tracking_db.get_all_processed.assert_called_once()
         ecus_connector.get_new_declarations.assert_called_once()
         processor.filter_declarations.assert_called_once()
-        assert barcode_retriever.retrieve_barcode.call_count == 2
+        assert barcode_retriever.fetch_barcode.call_count == 2
         assert file_manager.save_barcode.call_count == 2
-        assert tracking_db.add_processed.call_count == 2
+        recorded = [record for batch in tracking_db.record_processed_many.call_args_list for record in batch[0][0]]
+        assert sorted(recorded, key=lambda record: record[0].declaration_number) == [
+            (declaration1, "/path/to/file.pdf", "h"), (declaration2, "/path/to/file.pdf", "h")
+        ]
 
 
 def test_workflow_execution_with_errors():
@@ -225,7 +228,7 @@ def test_workflow_execution_with_errors():
         tracking_db.get_all_processed.return_value = set()
         ecus_connector.get_new_declarations.return_value = [declaration]
         processor.filter_declarations.return_value = [declaration]
-        barcode_retriever.retrieve_barcode.return_value = None  # Failure
+        barcode_retriever.fetch_barcode.return_value = RetrievalResult()  # Failure
         
         scheduler = Scheduler(config_manager, *components)
         
@@ -240,7 +243,7 @@ def test_workflow_execution_with_errors():
         
         # File should not be saved
         file_manager.save_barcode.assert_not_called()
-        tracking_db.add_processed.assert_not_called()
+        tracking_db.record_processed_many.assert_not_called()
 
 
 def test_redownload_logic():
@@ -264,7 +267,7 @@ def test_redownload_logic():
         )
         
         # Set up mocks
-        barcode_retriever.retrieve_barcode.return_value = b"PDF content"
+        barcode_retriever.fetch_barcode.return_value = RetrievalResult(pdf_content=b"PDF content", content_hash="h")
         file_manager.save_barcode.return_value = "/path/to/file.pdf"
         
         scheduler = Scheduler(config_manager, *components)
@@ -281,7 +284,7 @@ def test_redownload_logic():
         assert call_args[1]['overwrite'] == True
         
         # Verify timestamp was updated
-        tracking_db.update_processed_timestamp.assert_called_once_with(declaration)
+        tracking_db.update_processed_timestamp.assert_called_once_with(declaration, content_hash="h")
 
 
 def test_automatic_mode_executes_periodically():
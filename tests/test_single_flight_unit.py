@@ -0,0 +1,311 @@
+"""
+Unit tests for SingleFlight
+
+These tests verify request coalescing (for threads and coroutines) and
+its use in front of query_bang_ke, the asyncio batch engine,
+BarcodeRetriever.retrieve_barcode and FileManager.save_barcode.
+"""
+
+import asyncio
+import threading
+import time
+from datetime import date, datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from core.single_flight import SingleFlight
+from file_utils.file_manager import FileManager
+from models.config_models import BarcodeServiceConfig
+from models.declaration_models import Declaration
+from tests.test_async_qrcode_client_unit import stub  # noqa: F401 - fixture
+from web_utils.async_qrcode_client import AsyncQRCodeClient
+from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.qrcode_api_client import QRCodeContainerApiClient
+from web_utils.rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, run_with_priority
+
+
+def run_concurrently(fn, count):
+    """Start count threads calling fn at the same time and collect results."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+    errors = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return results, errors
+
+
+class TestSingleFlight:
+    """Unit tests for SingleFlight class"""
+
+    def test_concurrent_callers_share_one_execution(self):
+        """Overlapping calls for one key should run the function once"""
+        flight = SingleFlight("test")
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return "result"
+
+        results, errors = run_concurrently(lambda: flight.do("k", slow), 8)
+
+        assert calls == [1]
+        assert results == ["result"] * 8
+        assert errors == [None] * 8
+        stats = flight.get_stats()
+        assert stats['executions'] == 1
+        assert stats['shared'] == 7
+        assert stats['in_flight'] == 0
+
+    def test_different_keys_run_independently(self):
+        """Calls for different keys should not be coalesced"""
+        flight = SingleFlight()
+        counter = iter(range(100))
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                n = next(counter)
+            time.sleep(0.05)
+            return n
+
+        keys = iter(range(4))
+        key_lock = threading.Lock()
+
+        def call():
+            with key_lock:
+                key = next(keys)
+            return flight.do(key, work)
+
+        results, _ = run_concurrently(call, 4)
+
+        assert sorted(results) == [0, 1, 2, 3]
+        assert flight.get_stats()['executions'] == 4
+
+    def test_exception_propagates_to_followers(self):
+        """Every waiting caller should see the leader's exception"""
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.2)
+            raise ValueError("boom")
+
+        _, errors = run_concurrently(lambda: flight.do("k", failing), 4)
+
+        assert all(isinstance(e, ValueError) for e in errors)
+        assert flight.in_flight() == 0
+
+    def test_sequential_calls_execute_again(self):
+        """Once a call completes, the next call should run afresh"""
+        flight = SingleFlight()
+        fn = Mock(side_effect=[1, 2])
+
+        assert flight.do("k", fn) == 1
+        assert flight.do("k", fn) == 2
+        assert fn.call_count == 2
+        assert flight.get_stats()['shared'] == 0
+
+    def test_coroutines_join_a_threads_call(self):
+        """do_async callers should share a call led by a thread, and vice versa"""
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def slow():
+            calls.append("thread")
+            started.set()
+            time.sleep(0.2)
+            return "result"
+
+        async def never():
+            calls.append("coroutine")
+            return "other"
+
+        async def followers():
+            return await asyncio.gather(*(flight.do_async("k", never) for _ in range(3)))
+
+        leader = threading.Thread(target=flight.do, args=("k", slow))
+        leader.start()
+        assert started.wait(5)
+        assert asyncio.run(followers()) == ["result"] * 3
+        leader.join(5)
+
+        assert calls == ["thread"]
+        assert flight.in_flight() == 0
+
+    def test_cancelled_coroutine_leader_lets_followers_retry(self):
+        """A follower of a cancelled async leader should run the call itself"""
+        flight = SingleFlight()
+        calls = []
+
+        async def slow(name):
+            calls.append(name)
+            await asyncio.sleep(0.2)
+            return name
+
+        async def scenario():
+            leader = asyncio.ensure_future(flight.do_async("k", slow, "leader"))
+            await asyncio.sleep(0.05)
+            follower = asyncio.ensure_future(flight.do_async("k", slow, "follower"))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(scenario()) == "follower"
+        assert calls == ["leader", "follower"]
+
+
+SOAP_RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <QueryBangKeDanhSachContainerResponse xmlns="http://tempuri.org/">
+      <QueryBangKeDanhSachContainerResult>
+        <MaSoThue>2300782217</MaSoThue>
+        <SoToKhai>308010891440</SoToKhai>
+        <TrangThaiToKhai>Thông quan</TrangThaiToKhai>
+      </QueryBangKeDanhSachContainerResult>
+    </QueryBangKeDanhSachContainerResponse>
+  </soap:Body>
+</soap:Envelope>"""
+
+
+def make_declaration():
+    return Declaration(
+        declaration_number='308010891440',
+        tax_code='2300782217',
+        declaration_date=datetime(2023, 1, 5),
+        customs_office_code='18A3',
+    )
+
+
+class TestCoalescedCallers:
+    """Integration of SingleFlight with the API client, retriever and file manager"""
+
+    def test_query_bang_ke_sends_one_request(self):
+        """Concurrent identical queries should produce one SOAP request"""
+        session = Mock()
+
+        def slow_post(*args, **kwargs):
+            time.sleep(0.2)
+            return Mock(status_code=200, text=SOAP_RESPONSE)
+
+        session.post.side_effect = slow_post
+        clients = [QRCodeContainerApiClient(logger=Mock(), session=session) for _ in range(2)]
+        index = iter(range(6))
+        lock = threading.Lock()
+
+        def query():
+            with lock:
+                client = clients[next(index) % 2]
+            return client.query_bang_ke("2300782217", "308010891440", "18A3", date(2024, 12, 1))
+
+        results, errors = run_concurrently(query, 6)
+
+        assert errors == [None] * 6
+        assert session.post.call_count == 1
+        assert all(r.so_to_khai == "308010891440" for r in results)
+
+    def test_query_bang_ke_does_not_coalesce_across_priorities(self):
+        """An interactive query should not wait behind a background caller's request"""
+        session = Mock()
+        background_started = threading.Event()
+        release_background = threading.Event()
+
+        def post(*args, **kwargs):
+            if not background_started.is_set():
+                background_started.set()
+                release_background.wait(5)
+            return Mock(status_code=200, text=SOAP_RESPONSE)
+
+        session.post.side_effect = post
+        client = QRCodeContainerApiClient(logger=Mock(), session=session)
+        key = ("2300782217", "308010891440", "18A3", date(2024, 12, 1))
+        background = threading.Thread(
+            target=run_with_priority, args=(PRIORITY_BACKGROUND, client.query_bang_ke) + key
+        )
+        background.start()
+        assert background_started.wait(5)
+
+        try:
+            result = run_with_priority(PRIORITY_INTERACTIVE, client.query_bang_ke, *key)
+        finally:
+            release_background.set()
+            background.join(5)
+
+        assert result.so_to_khai == "308010891440"
+        assert session.post.call_count == 2
+
+    def test_batch_engine_joins_a_sync_query(self, stub):
+        """A batch query for a declaration already being looked up should not send a second request"""
+        stub.delay = 0.3
+        client = QRCodeContainerApiClient(service_url=stub.url, logger=Mock(), timeout=5)
+        key = ("0101234567", "308010891441", "18A3", datetime(2024, 12, 1))
+        single = threading.Thread(target=client.query_bang_ke, args=key, kwargs={'use_cache': False})
+        single.start()
+        while not stub.requests:
+            time.sleep(0.01)
+
+        results = AsyncQRCodeClient(service_url=stub.url, logger=Mock(), timeout=5).run_many(
+            [(key[0], key[1], key[2], date(2024, 12, 1))], use_cache=False
+        )
+        single.join(5)
+
+        assert results[0].ok and results[0].info.so_to_khai == "308010891441"
+        assert stub.requests == 1
+
+    def test_retrieve_barcode_runs_once(self):
+        """Concurrent retrievals of one declaration should share the PDF"""
+        config = BarcodeServiceConfig(
+            api_url='http://test-api.example.com/QRCode.asmx',
+            primary_web_url='http://primary.example.com',
+            backup_web_url='http://backup.example.com',
+            timeout=30,
+            max_retries=3,
+            retry_delay=5,
+        )
+        retriever = BarcodeRetriever(config, Mock(), retrieval_method='api')
+
+        def slow_api(declaration):
+            time.sleep(0.2)
+            return b"%PDF-1.4"
+
+        with patch.object(retriever, '_try_api_method', side_effect=slow_api) as mock_api:
+            results, _ = run_concurrently(lambda: retriever.retrieve_barcode(make_declaration()), 5)
+
+        assert mock_api.call_count == 1
+        assert results == [b"%PDF-1.4"] * 5
+
+    def test_save_barcode_writes_once(self, tmp_path):
+        """Concurrent saves of the same file should perform a single write"""
+        manager = FileManager(str(tmp_path))
+        real_open = open
+        writes = []
+
+        def counting_open(path, mode='r', *args, **kwargs):
+            if 'w' in mode:
+                writes.append(path)
+                time.sleep(0.2)
+            return real_open(path, mode, *args, **kwargs)
+
+        with patch('builtins.open', side_effect=counting_open):
+            results, errors = run_concurrently(
+                lambda: manager.save_barcode(make_declaration(), b"%PDF-1.4", overwrite=True), 4
+            )
+
+        assert errors == [None] * 4
+        assert len(writes) == 1
+        assert len(set(results)) == 1
+        with open(results[0], 'rb') as f:
+            assert f.read() == b"%PDF-1.4"
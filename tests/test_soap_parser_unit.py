@@ -0,0 +1,151 @@
+"""
+Unit tests for the QueryBangKeDanhSachContainer SOAP parser
+
+These tests verify header decoding, BangKe container rows, namespace
+handling and error cases for parse_bang_ke_response, with both the lxml
+and the ElementTree backend.
+"""
+
+import xml.etree.ElementTree as ET
+from unittest.mock import Mock, patch
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from benchmarks.bench_soap_parser import build_payload, legacy_parse
+from web_utils import qrcode_api_client
+from web_utils.qrcode_api_client import (
+    ContainerInfo,
+    QRCodeContainerApiClient,
+    parse_bang_ke_response,
+)
+
+
+def envelope(result_body: str, result_ns: str = ' xmlns="http://tempuri.org/"') -> str:
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+        f'<QueryBangKeDanhSachContainerResponse{result_ns}>'
+        f'<QueryBangKeDanhSachContainerResult>{result_body}</QueryBangKeDanhSachContainerResult>'
+        '</QueryBangKeDanhSachContainerResponse></soap:Body></soap:Envelope>'
+    )
+
+
+def diffgram(rows: str) -> str:
+    return (
+        '<BangKe><xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">'
+        '<xs:element name="Table_BangKe"/></xs:schema>'
+        '<diffgr:diffgram xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1">'
+        f'<DocumentElement xmlns="">{rows}</DocumentElement></diffgr:diffgram></BangKe>'
+    )
+
+
+@pytest.fixture(params=[True, False], ids=["lxml", "elementtree"])
+def backend(request):
+    """Run each test with lxml (when installed) and with ElementTree."""
+    if request.param and not qrcode_api_client.LXML_AVAILABLE:
+        pytest.skip("lxml not installed")
+    with patch.object(qrcode_api_client, 'LXML_AVAILABLE', request.param):
+        yield request.param
+
+
+class TestParseBangKeResponse:
+    """Unit tests for parse_bang_ke_response"""
+
+    def test_header_fields_and_conversions(self, backend):
+        info = parse_bang_ke_response(envelope(
+            '<MaSoThue>2300782217</MaSoThue><SoToKhai>308010891440</SoToKhai>'
+            '<TrangThaiToKhai>Thông quan</TrangThaiToKhai><So_Luong_Hang>12.5</So_Luong_Hang>'
+            '<Tong_Trong_Luong_Hang>abc</Tong_Trong_Luong_Hang><IsContainer>1</IsContainer>'
+            '<MaPTVC>2</MaPTVC><ThongBaoLoi></ThongBaoLoi><Unknown>x</Unknown>'
+        ))
+
+        assert info.ma_so_thue == "2300782217"
+        assert info.so_to_khai == "308010891440"
+        assert info.trang_thai_to_khai == "Thông quan"
+        assert info.so_luong_hang == 12.5
+        assert info.tong_trong_luong_hang == 0.0
+        assert info.is_container == 1
+        assert info.is_container_declaration
+        assert info.thong_bao_loi == ""
+        assert info.containers == []
+
+    def test_container_rows(self, backend):
+        rows = (
+            '<Table_BangKe><Stt>1</Stt><SoContainer> TEMU1234567 </SoContainer><SoSeal> S1 </SoSeal>'
+            '<SoSealHQ>#####</SoSealHQ><BarcodeImage>iVBOR</BarcodeImage><GhiChu>note</GhiChu></Table_BangKe>'
+            '<Table_BangKe><Stt>2</Stt><So_Container>OLDU7654321</So_Container><So_Seal>S2</So_Seal>'
+            '<SoSealHQ>HQ2</SoSealHQ><Trong_Luong>2.5</Trong_Luong></Table_BangKe>'
+            '<Table_BangKe><Stt>3</Stt></Table_BangKe>'
+        )
+        info = parse_bang_ke_response(envelope('<SoToKhai>1</SoToKhai>' + diffgram(rows)))
+
+        assert info.containers == [
+            ContainerInfo(stt=1, so_container="TEMU1234567", so_seal="S1", barcode_image="iVBOR", ghi_chu="note"),
+            ContainerInfo(stt=2, so_container="OLDU7654321", so_seal="S2", so_seal_hq="HQ2", trong_luong=2.5),
+        ]
+
+    @pytest.mark.parametrize("result_ns", [
+        ' xmlns="http://tempuri.org/"',
+        ' xmlns="http://example.org/other"',
+        '',
+    ])
+    def test_namespace_agnostic(self, backend, result_ns):
+        info = parse_bang_ke_response(envelope('<SoToKhai>42</SoToKhai>', result_ns))
+        assert info.so_to_khai == "42"
+
+    def test_prefixed_namespace(self, backend):
+        text = (
+            '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" xmlns:t="http://tempuri.org/">'
+            '<s:Body><t:QueryBangKeDanhSachContainerResponse><t:QueryBangKeDanhSachContainerResult>'
+            '<t:SoToKhai>7</t:SoToKhai></t:QueryBangKeDanhSachContainerResult>'
+            '</t:QueryBangKeDanhSachContainerResponse></s:Body></s:Envelope>'
+        )
+        assert parse_bang_ke_response(text).so_to_khai == "7"
+
+    def test_missing_result_returns_none(self, backend):
+        text = '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body/></soap:Envelope>'
+        assert parse_bang_ke_response(text) is None
+
+    def test_malformed_xml_raises_parse_error(self, backend):
+        with pytest.raises(ET.ParseError):
+            parse_bang_ke_response('<soap:Envelope><unclosed>')
+
+    def test_client_returns_none_on_malformed_xml(self, backend):
+        client = QRCodeContainerApiClient(logger=Mock(), session=Mock())
+        assert client._parse_soap_response('<broken') is None
+        client.logger.error.assert_called_once()
+
+    def test_large_payload_matches_legacy_parser(self, backend):
+        """Hundreds of containers should decode exactly like the old DOM parser"""
+        payload = build_payload(300, image_bytes=200)
+        info = parse_bang_ke_response(payload)
+
+        assert len(info.containers) == 300
+        assert info == legacy_parse(payload)
+
+    @settings(max_examples=40, deadline=None)
+    @given(st.lists(
+        st.tuples(
+            st.integers(0, 9999),
+            st.text(alphabet="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", min_size=1, max_size=11),
+            st.text(alphabet="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", max_size=8),
+        ),
+        max_size=30,
+    ))
+    def test_rows_round_trip(self, rows):
+        """
+        **Feature: soap-parser, Property 1: Container rows round-trip**
+
+        For any list of rows, every row is decoded in document order with
+        its sequence number, container number and seal.
+        """
+        xml_rows = "".join(
+            f'<Table_BangKe><Stt>{stt}</Stt><SoContainer>{cont}</SoContainer>'
+            + (f'<SoSeal>{seal}</SoSeal>' if seal else '')
+            + '</Table_BangKe>'
+            for stt, cont, seal in rows
+        )
+        info = parse_bang_ke_response(envelope(diffgram(xml_rows)))
+
+        assert [(c.stt, c.so_container, c.so_seal) for c in info.containers] == list(rows)
@@ -6,6 +6,7 @@ These tests verify specific functionality of the tracking database.
 
 import pytest
 import os
+import sqlite3
 import tempfile
 import shutil
 from datetime import datetime
@@ -303,6 +304,56 @@ class TestTrackingDatabase:
         # File path should be updated to the latest
         assert details[0].file_path == file_path2
     
+    def test_content_hash_recorded(self, tracking_db, sample_declaration):
+        """The payload hash is stored with the processed record"""
+        assert tracking_db.get_content_hash(sample_declaration) is None
+        
+        tracking_db.add_processed(sample_declaration, "/test/a.pdf", content_hash="h1")
+        assert tracking_db.get_content_hash(sample_declaration) == "h1"
+        
+        tracking_db.update_processed_timestamp(sample_declaration, content_hash="h2")
+        assert tracking_db.get_content_hash(sample_declaration) == "h2"
+    
+    def test_rewrite_without_hash_forgets_it(self, tracking_db, sample_declaration):
+        """A file rewritten without a known hash must not be skipped later"""
+        tracking_db.add_processed(sample_declaration, "/test/a.pdf", content_hash="h1")
+        tracking_db.update_processed_timestamp(sample_declaration)
+        assert tracking_db.get_content_hash(sample_declaration) is None
+        
+        tracking_db.update_processed_timestamp(sample_declaration, content_hash="h1")
+        tracking_db.add_processed(sample_declaration, "/test/a.pdf")
+        assert tracking_db.get_content_hash(sample_declaration) is None
+    
+    def test_content_hash_column_added_to_old_database(self, temp_dir, sample_declaration):
+        """Databases created before content hashes get the column on open"""
+        db_path = os.path.join(temp_dir, 'old.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE processed_declarations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                declaration_number TEXT NOT NULL,
+                tax_code TEXT NOT NULL,
+                declaration_date TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(declaration_number, tax_code, declaration_date)
+            )
+        """)
+        conn.execute(
+            "INSERT INTO processed_declarations (declaration_number, tax_code, declaration_date, file_path) "
+            "VALUES ('308010891440', '2300782217', '2023-01-05', '/old.pdf')"
+        )
+        conn.commit()
+        conn.close()
+        
+        db = TrackingDatabase(db_path)
+        
+        assert db.is_processed(sample_declaration)
+        assert db.get_content_hash(sample_declaration) is None
+        db.update_processed_timestamp(sample_declaration, content_hash="h1")
+        assert db.get_content_hash(sample_declaration) == "h1"
+    
     def test_empty_database(self, tracking_db):
         """Test operations on empty database"""
         # Get all processed should return empty set
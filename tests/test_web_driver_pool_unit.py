@@ -0,0 +1,293 @@
+"""
+Unit tests for the warm WebDriver pool and event-driven web waits
+
+These tests verify driver reuse and recycling in WebDriverPool, and that
+the Oracle ADF flow in BarcodeRetriever finishes as soon as a (fake)
+page is ready instead of sleeping for fixed intervals.
+"""
+
+import base64
+import threading
+import time
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from models.config_models import BarcodeServiceConfig
+from models.declaration_models import Declaration
+from web_utils.barcode_retriever import BarcodeRetriever
+from web_utils.web_driver_manager import WebDriverPool
+
+
+ADF_URL = "https://pus.customs.gov.vn/faces/ContainerBarcode"
+
+
+class FakeElement:
+    def __init__(self, text: str = ""):
+        self.text = text
+
+    def get_attribute(self, name):
+        return ""
+
+
+class FakeDriver:
+    """
+    Fake Chrome driver serving the ADF barcode page.
+
+    After the submit button is clicked, ADF reports a pending request for
+    `result_delay` seconds, then shows the result and the save link.
+    """
+
+    FORM_FIELDS = ("pt1:it1::content", "pt1:it2::content", "pt1:it3::content", "pt1:it4::content")
+
+    def __init__(self, result_delay: float = 0.3, form_delay: float = 0.0):
+        self.result_delay = result_delay
+        self.form_ready_at = time.monotonic() + form_delay
+        self.clicked_at = None
+        self.urls = []
+        self.quit_count = 0
+        self.filled = {}
+
+    def _result_ready(self) -> bool:
+        return self.clicked_at is not None and time.monotonic() - self.clicked_at >= self.result_delay
+
+    def get(self, url):
+        self.urls.append(url)
+        self.clicked_at = None
+
+    def quit(self):
+        self.quit_count += 1
+
+    def find_element(self, by, value):
+        if by == By.ID:
+            if value in self.FORM_FIELDS and time.monotonic() >= self.form_ready_at:
+                return FakeElement(value)
+            if value == "content":
+                return FakeElement("Bảng kê container" if self._result_ready() else "Nhập thông tin tờ khai")
+            if value == "lbl_BanLuu" and self._result_ready():
+                return FakeElement("Lưu bảng kê")
+        elif by == By.TAG_NAME and value == "body":
+            return FakeElement()
+        elif by == By.XPATH and "Lấy thông tin" in value:
+            return FakeElement("Lấy thông tin")
+        raise NoSuchElementException(value)
+
+    def find_elements(self, by, value):
+        return []
+
+    def execute_script(self, script, *args):
+        if "arguments[0].click()" in script:
+            self.clicked_at = time.monotonic()
+        elif "isSynchronizedWithServer" in script:
+            return self.clicked_at is None or self._result_ready()
+        elif args and isinstance(args[0], FakeElement):
+            self.filled[args[0].text] = args[1]
+        return None
+
+    def set_script_timeout(self, timeout):
+        pass
+
+    def execute_async_script(self, script, *args):
+        return True
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {'data': base64.b64encode(b"%PDF-1.4 fake").decode()}
+
+
+class TestWebDriverPool:
+    """Unit tests for WebDriverPool"""
+
+    def test_driver_is_reused_between_sessions(self):
+        factory = Mock(side_effect=FakeDriver)
+        pool = WebDriverPool(factory=factory, size=2)
+
+        with pool.session() as first:
+            pass
+        with pool.session() as second:
+            pass
+
+        assert first is second
+        assert factory.call_count == 1
+        assert first.urls == [WebDriverPool.RESET_URL] * 2
+        assert pool.get_stats()['reused'] == 1
+
+    def test_recycled_after_max_uses(self):
+        factory = Mock(side_effect=FakeDriver)
+        pool = WebDriverPool(factory=factory, size=1, max_uses=2)
+
+        drivers = []
+        for _ in range(3):
+            with pool.session() as driver:
+                drivers.append(driver)
+
+        assert drivers[0] is drivers[1]
+        assert drivers[2] is not drivers[0]
+        assert drivers[0].quit_count == 1
+        assert pool.get_stats()['recycled_uses'] == 1
+
+    def test_recycled_above_memory_threshold(self):
+        probe = Mock(side_effect=[100.0, 900.0, 100.0])
+        pool = WebDriverPool(factory=FakeDriver, size=1, max_memory_mb=500, memory_probe=probe)
+
+        with pool.session() as first:
+            pass
+        with pool.session() as second:
+            pass
+        with pool.session() as third:
+            pass
+
+        assert first is second
+        assert third is not first
+        assert first.quit_count == 1
+        assert pool.get_stats()['recycled_memory'] == 1
+
+    def test_unmeasurable_memory_keeps_driver(self):
+        pool = WebDriverPool(factory=FakeDriver, size=1, max_memory_mb=500, memory_probe=lambda d: None)
+
+        with pool.session() as first:
+            pass
+        with pool.session() as second:
+            pass
+
+        assert first is second
+
+    def test_failed_session_recycles_driver(self):
+        pool = WebDriverPool(factory=FakeDriver, size=1)
+
+        with pytest.raises(WebDriverException):
+            with pool.session() as driver:
+                raise WebDriverException("tab crashed")
+
+        assert driver.quit_count == 1
+        stats = pool.get_stats()
+        assert stats['recycled_error'] == 1
+        assert stats['in_use'] == 0
+
+    def test_size_caps_concurrent_sessions(self):
+        pool = WebDriverPool(factory=FakeDriver, size=1)
+        held = pool.acquire()
+
+        assert pool.acquire(timeout=0.05) is None
+
+        threading.Timer(0.1, pool.release, args=(held,)).start()
+        started = time.monotonic()
+        again = pool.acquire(timeout=2)
+        assert again is held
+        assert time.monotonic() - started < 1.0
+
+    def test_factory_failure_frees_slot(self):
+        factory = Mock(side_effect=[WebDriverException("no chrome"), FakeDriver()])
+        pool = WebDriverPool(factory=factory, size=1)
+
+        with pytest.raises(WebDriverException):
+            pool.acquire(timeout=0)
+        assert pool.acquire(timeout=0) is not None
+
+    def test_warm_up_starts_idle_drivers(self):
+        factory = Mock(side_effect=FakeDriver)
+        pool = WebDriverPool(factory=factory, size=3)
+
+        assert pool.warm_up(2) == 2
+        assert pool.warm_up(2) == 0
+        stats = pool.get_stats()
+        assert stats['idle'] == 2
+        assert stats['created'] == 2
+
+        pooled = pool.acquire()
+        assert pooled.uses == 0
+        assert factory.call_count == 2
+
+    def test_idle_drivers_are_reaped(self):
+        pool = WebDriverPool(factory=FakeDriver, size=1, idle_timeout=0.05)
+        with pool.session() as driver:
+            pass
+
+        deadline = time.monotonic() + 2
+        while driver.quit_count == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        assert driver.quit_count == 1
+        assert pool.get_stats()['recycled_idle'] == 1
+
+    def test_close_quits_idle_and_released_drivers(self):
+        pool = WebDriverPool(factory=FakeDriver, size=2)
+        idle = pool.acquire()
+        busy = pool.acquire()
+        pool.release(idle)
+
+        pool.close()
+        assert idle.driver.quit_count == 1
+        assert busy.driver.quit_count == 0
+
+        pool.release(busy)
+        assert busy.driver.quit_count == 1
+        assert pool.acquire(timeout=0) is None
+
+
+class TestRetrieverWebPool:
+    """Web fallback in BarcodeRetriever with the driver pool and fake drivers"""
+
+    def setup_method(self):
+        self.config = BarcodeServiceConfig(
+            api_url='http://test-api.example.com/QRCode.asmx',
+            primary_web_url=ADF_URL,
+            backup_web_url='',
+            timeout=30,
+            max_retries=1,
+            retry_delay=0,
+            web_timeout=5
+        )
+        self.declaration = Declaration(
+            declaration_number='308010891440',
+            tax_code='2300782217',
+            declaration_date=datetime(2024, 12, 1),
+            customs_office_code='18A3',
+            status='T'
+        )
+
+    @pytest.fixture(autouse=True)
+    def no_rate_limit(self):
+        with patch('web_utils.barcode_retriever.get_rate_limiter') as limiter:
+            limiter.return_value.acquire.return_value = True
+            yield
+
+    def test_adf_flow_waits_for_result_not_fixed_sleeps(self):
+        retriever = BarcodeRetriever(self.config, Mock(), retrieval_method="web")
+        driver = FakeDriver(result_delay=0.3, form_delay=0.2)
+
+        with patch.object(retriever, '_setup_webdriver', return_value=driver):
+            started = time.monotonic()
+            pdf = retriever._try_web_scraping(ADF_URL, self.declaration)
+            elapsed = time.monotonic() - started
+
+        assert pdf == b"%PDF-1.4 fake"
+        assert 0.5 <= elapsed < 3.0
+        assert driver.filled["pt1:it2::content"] == '308010891440'
+        assert driver.filled["pt1:it4::content"] == '01/12/2024'
+
+    def test_driver_reused_across_declarations(self):
+        retriever = BarcodeRetriever(self.config, Mock(), retrieval_method="web")
+        driver = FakeDriver(result_delay=0.05)
+
+        with patch.object(retriever, '_setup_webdriver', return_value=driver) as setup:
+            assert retriever._try_web_scraping(ADF_URL, self.declaration)
+            assert retriever._try_web_scraping(ADF_URL, self.declaration)
+
+        assert setup.call_count == 1
+        assert driver.quit_count == 0
+        assert retriever.get_driver_pool_stats()['reused'] == 1
+
+        retriever.cleanup()
+        assert driver.quit_count == 1
+
+    def test_result_wait_ignores_unchanged_content(self):
+        retriever = BarcodeRetriever(self.config, Mock())
+        driver = FakeDriver()
+        before = retriever._get_adf_content_text(driver)
+
+        assert not retriever._adf_result_ready(driver, before)
+        driver.clicked_at = time.monotonic() - 1
+        assert retriever._adf_result_ready(driver, before)
@@ -11,6 +11,7 @@ from datetime import datetime
 from services.workflow_service import WorkflowService
 from services.workflow_events import WorkflowEvent, WorkflowEventType
 from models.declaration_models import Declaration, WorkflowResult
+from web_utils.barcode_retriever import RetrievalResult
 
 
 class TestWorkflowService:
@@ -60,7 +61,7 @@ class TestWorkflowService:
         mock_dependencies['tracking_db'].get_all_processed.return_value = set()
         mock_dependencies['ecus_connector'].get_new_declarations.return_value = [sample_declaration]
         mock_dependencies['processor'].filter_declarations.return_value = [sample_declaration]
-        mock_dependencies['barcode_retriever'].retrieve_barcode.return_value = b'%PDF-1.4'
+        mock_dependencies['barcode_retriever'].fetch_barcode.return_value = RetrievalResult(pdf_content=b'%PDF-1.4')
         mock_dependencies['file_manager'].save_barcode.return_value = '/path/to/file.pdf'
         
         result = workflow_service.execute(days_back=7)
@@ -74,7 +75,7 @@ class TestWorkflowService:
         mock_dependencies['tracking_db'].get_all_processed.return_value = set()
         mock_dependencies['ecus_connector'].get_new_declarations.return_value = [sample_declaration]
         mock_dependencies['processor'].filter_declarations.return_value = [sample_declaration]
-        mock_dependencies['barcode_retriever'].retrieve_barcode.return_value = None
+        mock_dependencies['barcode_retriever'].fetch_barcode.return_value = RetrievalResult()
         
         result = workflow_service.execute(days_back=7)
         
@@ -87,7 +88,7 @@ class TestWorkflowService:
         mock_dependencies['tracking_db'].get_all_processed.return_value = set()
         mock_dependencies['ecus_connector'].get_new_declarations.return_value = [sample_declaration]
         mock_dependencies['processor'].filter_declarations.return_value = [sample_declaration]
-        mock_dependencies['barcode_retriever'].retrieve_barcode.return_value = b'%PDF-1.4'
+        mock_dependencies['barcode_retriever'].fetch_barcode.return_value = RetrievalResult(pdf_content=b'%PDF-1.4')
         mock_dependencies['file_manager'].save_barcode.return_value = '/path/to/file.pdf'
         
         events_received = []
@@ -119,7 +120,7 @@ class TestWorkflowService:
         """Test force redownload skips processed check."""
         mock_dependencies['ecus_connector'].get_new_declarations.return_value = [sample_declaration]
         mock_dependencies['processor'].filter_declarations.return_value = [sample_declaration]
-        mock_dependencies['barcode_retriever'].retrieve_barcode.return_value = b'%PDF-1.4'
+        mock_dependencies['barcode_retriever'].fetch_barcode.return_value = RetrievalResult(pdf_content=b'%PDF-1.4')
         mock_dependencies['file_manager'].save_barcode.return_value = '/path/to/file.pdf'
         
         workflow_service.execute(force_redownload=True)
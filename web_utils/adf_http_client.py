@@ -0,0 +1,514 @@
+"""
+ADF HTTP Client Module
+
+Browserless client for the Oracle ADF barcode page on pus.customs.gov.vn.
+
+The Selenium path only exists because the ADF form keeps session state.
+This client replays the same flow with plain HTTP requests, at API-like
+concurrency and without a browser:
+
+1. GET the page (following ADF's "_afrLoop" window loopback page)
+2. Read the form: hidden fields (javax.faces.ViewState, window/page ids),
+   input names and the "Lấy thông tin" button id
+3. POST a partial-page submit for the button, as ADF's JavaScript would
+4. Read the <partial-response> fragments and the new view state
+5. If the result has the "Lưu bảng kê" save link, fire it and use the
+   returned file when it is a PDF
+6. Otherwise parse the result fragments (header labels and container
+   table) into ContainerDeclarationInfo for local rendering
+
+Each flow uses its own requests.Session (cookies carry the ADF session),
+mounted on the adapter of the process-wide HTTP session pool so keep-alive
+connections are shared.
+"""
+
+import base64
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urljoin
+
+import requests
+
+from logging_system.logger import Logger
+from web_utils.http_session_pool import HttpSessionPool, get_http_session_pool
+from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
+from web_utils.rate_limiter import get_rate_limiter
+
+
+# Form component ids, in the order used by the Selenium path:
+# tax code, declaration number, customs office, declaration date (dd/mm/yyyy)
+ADF_FIELD_IDS = ('pt1:it1', 'pt1:it2', 'pt1:it3', 'pt1:it4')
+SUBMIT_TEXT = 'Lấy thông tin'
+SAVE_LINK_ID = 'lbl_BanLuu'
+VIEW_STATE = 'javax.faces.ViewState'
+
+# Event payload ADF's client sends for a command component
+ADF_ACTION_EVENT = '<m xmlns="http://oracle.com/richClient/comm"><k v="type"><s>action</s></k></m>'
+
+_LOOP_RE = re.compile(r'_afrLoop=([\w-]+)')
+
+
+class AdfHttpError(Exception):
+    """Exception raised when the ADF flow can't be completed"""
+    pass
+
+
+def _normalize(text: str) -> str:
+    """Lower-case, NFC-normalize and collapse a label ('Số tờ khai:' -> 'số tờ khai')."""
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split()).strip(' :').lower()
+
+
+def _to_float(text: str) -> float:
+    try:
+        return float(text.replace(',', ''))
+    except ValueError:
+        return 0.0
+
+
+# Result label -> (ContainerDeclarationInfo attribute, converter)
+_LABEL_FIELDS = {
+    'mã số thuế': ('ma_so_thue', None),
+    'mã doanh nghiệp': ('ma_so_thue', None),
+    'số tờ khai': ('so_to_khai', None),
+    'ngày tờ khai': ('ngay_to_khai', None),
+    'ngày đăng ký': ('ngay_to_khai', None),
+    'tên đơn vị xnk': ('ten_don_vi_xnk', None),
+    'đơn vị xuất nhập khẩu': ('ten_don_vi_xnk', None),
+    'tên doanh nghiệp': ('ten_don_vi_xnk', None),
+    'chi cục hải quan giám sát': ('ten_chi_cuc_hai_quan_gs', None),
+    'cục hải quan': ('ten_cuc_hai_quan', None),
+    'chi cục hải quan': ('ten_chi_cuc_hai_quan', None),
+    'loại hình': ('ten_loai_hinh', None),
+    'trạng thái tờ khai': ('trang_thai_to_khai', None),
+    'luồng': ('luong_to_khai', None),
+    'số lượng hàng': ('so_luong_hang', _to_float),
+    'tổng trọng lượng hàng': ('tong_trong_luong_hang', _to_float),
+    'số định danh': ('so_dinh_danh', None),
+    'mã địa điểm giám sát': ('ma_ddgs', None),
+    'địa điểm giám sát': ('ten_ddgs', None),
+    'phương thức vận chuyển': ('ma_ptvc', None),
+    'ghi chú': ('ghi_chu', None),
+    'thời gian lấy dữ liệu': ('thoi_gian_lay_du_lieu', None),
+}
+
+# Container table header -> ContainerInfo attribute
+_COLUMN_FIELDS = {
+    'stt': 'stt',
+    'số container': 'so_container',
+    'số hiệu container': 'so_container',
+    'số seal': 'so_seal',
+    'số seal hãng tàu': 'so_seal',
+    'số seal hải quan': 'so_seal_hq',
+    'seal hải quan': 'so_seal_hq',
+    'trọng lượng': 'trong_luong',
+    'ghi chú': 'ghi_chu',
+    'mã vạch': 'barcode_image',
+    'mã qr': 'barcode_image',
+}
+
+
+@dataclass
+class AdfForm:
+    """The ADF form read from the page."""
+    action: str
+    hidden: Dict[str, str] = field(default_factory=dict)  # Hidden field name -> value
+    input_names: Dict[str, str] = field(default_factory=dict)  # Input id -> name
+    submit_id: Optional[str] = None
+
+
+@dataclass
+class AdfResult:
+    """Outcome of one ADF flow: a PDF from the save link, or parsed data."""
+    pdf_content: Optional[bytes] = None
+    info: Optional[ContainerDeclarationInfo] = None
+    message: str = ""  # Page text when nothing could be parsed (e.g. "not found")
+
+
+class _PageParser(HTMLParser):
+    """
+    Single pass over an ADF page or fragment.
+
+    Collects form inputs, link ids and texts, the save link, text runs in
+    document order (for label/value pairs, tagged with their table row) and
+    table rows (cell texts and image sources). ADF nests layout tables, so
+    rows and cells are tracked as stacks.
+
+    ADF puts a command component's id on a wrapper element rather than on
+    the <a> itself, so a link's id is the nearest id among its ancestors.
+    """
+
+    _SKIP_TAGS = {'script', 'style'}
+    _VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.form_action: Optional[str] = None
+        self.hidden: Dict[str, str] = {}
+        self.input_names: Dict[str, str] = {}
+        self.links: List[Tuple[str, str]] = []  # (id, text)
+        self.save_link_id: Optional[str] = None
+        self.texts: List[Tuple[str, Optional[int]]] = []  # (text, row number)
+        self.rows: List[Tuple[int, List[Tuple[str, List[str]]]]] = []  # (row number, cells: (text, image srcs))
+        self._open: List[Tuple[str, Optional[str]]] = []  # Open elements: (tag, id)
+        self._links: List[List] = []  # Open <a>: [component id, text parts]
+        self._rows: List[Tuple[int, List]] = []  # Open <tr>: (row number, cells)
+        self._cells: List[List] = []  # Open <td>/<th>: [text parts, image srcs]
+        self._row_count = 0
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        element_id = a.get('id')
+        if tag in self._SKIP_TAGS:
+            self._skip += 1
+        elif tag == 'form' and self.form_action is None:
+            self.form_action = a.get('action') or ''
+        elif tag == 'input':
+            name = a.get('name')
+            if name and (a.get('type') or 'text').lower() == 'hidden':
+                self.hidden[name] = a.get('value') or ''
+            elif name and element_id:
+                self.input_names[element_id] = name
+        elif tag == 'a':
+            self._links.append([element_id or self._nearest_id(), []])
+        elif tag == 'tr':
+            self._rows.append((self._row_count, []))
+            self._row_count += 1
+        elif tag in ('td', 'th') and self._rows:
+            self._cells.append([[], []])
+        elif tag == 'img' and self._cells and a.get('src'):
+            self._cells[-1][1].append(a['src'])
+
+        if element_id == SAVE_LINK_ID and self.save_link_id is None:
+            # The label may sit inside the command link; fire the link itself
+            outer = self._links[-1][0] if self._links and tag != 'a' else None
+            self.save_link_id = outer or element_id
+
+        if tag not in self._VOID_TAGS:
+            self._open.append((tag, element_id))
+
+    def _nearest_id(self) -> Optional[str]:
+        return next((element_id for _, element_id in reversed(self._open) if element_id), None)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i][0] == tag:
+                del self._open[i:]
+                break
+        if tag in self._SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == 'a' and self._links:
+            link_id, parts = self._links.pop()
+            if link_id:
+                self.links.append((link_id, ' '.join(' '.join(parts).split())))
+        elif tag in ('td', 'th') and self._cells and self._rows:
+            parts, images = self._cells.pop()
+            self._rows[-1][1].append((' '.join(' '.join(parts).split()), images))
+        elif tag == 'tr' and self._rows:
+            row_number, cells = self._rows.pop()
+            if cells:
+                self.rows.append((row_number, cells))
+
+    def handle_data(self, data):
+        if self._skip or not data.strip():
+            return
+        self.texts.append((data.strip(), self._rows[-1][0] if self._rows else None))
+        for link in self._links:
+            link[1].append(data)
+        for cell in self._cells:
+            cell[0].append(data)
+
+
+def parse_page(html: str) -> _PageParser:
+    """Parse an ADF page or fragment."""
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def parse_form(html: str, page_url: str) -> Optional[AdfForm]:
+    """
+    Read the ADF form from a full page.
+
+    Args:
+        html: Page HTML
+        page_url: URL the page was served from (for relative actions)
+
+    Returns:
+        AdfForm, or None if the page has no form with a view state
+    """
+    page = parse_page(html)
+    if page.form_action is None or VIEW_STATE not in page.hidden:
+        return None
+    submit_id = next((link_id for link_id, text in page.links if SUBMIT_TEXT.lower() in text.lower()), None)
+    return AdfForm(
+        action=urljoin(page_url, page.form_action or page_url),
+        hidden=page.hidden,
+        input_names=page.input_names,
+        submit_id=submit_id,
+    )
+
+
+def parse_partial_response(text: str) -> Tuple[List[str], Optional[str], Optional[str]]:
+    """
+    Read an ADF/JSF <partial-response>.
+
+    Args:
+        text: Response body
+
+    Returns:
+        (HTML fragments, new view state or None, error message or None)
+
+    Raises:
+        AdfHttpError: If the body isn't a partial response
+    """
+    try:
+        root = ET.fromstring(text.encode('utf-8') if isinstance(text, str) else text)
+    except ET.ParseError as e:
+        raise AdfHttpError(f"Not a partial response: {e}")
+    if root.tag.rsplit('}', 1)[-1] != 'partial-response':
+        raise AdfHttpError(f"Unexpected response element: {root.tag}")
+
+    fragments: List[str] = []
+    view_state = None
+    error = None
+    for element in root.iter():
+        name = element.tag.rsplit('}', 1)[-1]
+        if name == 'update':
+            if element.get('id', '').startswith(VIEW_STATE):
+                view_state = (element.text or '').strip()
+            else:
+                fragments.append(element.text or '')
+        elif name == 'error':
+            error = ' '.join(t.strip() for t in element.itertext() if t.strip()) or 'ADF error'
+        elif name == 'redirect':
+            error = f"Redirected to {element.get('url', '')}"
+    return fragments, view_state, error
+
+
+def parse_result(page: _PageParser, so_to_khai: Optional[str] = None) -> Optional[ContainerDeclarationInfo]:
+    """
+    Build declaration info from the result fragments.
+
+    Header values are read as label/value text pairs, containers from the
+    table whose header row names a container column. A page only counts
+    as a result when it names the declaration or lists containers: a page
+    that just echoes search fields (e.g. "Mã số thuế") is not one.
+
+    Args:
+        page: Parsed result fragments
+        so_to_khai: Declaration number that was queried; a page naming a
+            different declaration is not a result
+
+    Returns:
+        ContainerDeclarationInfo, or None if the page has neither the
+        declaration number nor containers, or names another declaration
+    """
+    info = ContainerDeclarationInfo()
+
+    # Container table: the header row naming a container column and the rows after it
+    table_rows = set()
+    columns: Optional[List[Optional[str]]] = None
+    for row_number, row in page.rows:
+        headers = [_COLUMN_FIELDS.get(_normalize(text)) for text, _ in row]
+        if 'so_container' in headers:
+            columns = headers
+            table_rows.add(row_number)
+            continue
+        if columns is None or len(row) < len(columns):
+            continue
+        table_rows.add(row_number)
+        container = ContainerInfo()
+        for attribute, (text, images) in zip(columns, row):
+            if attribute == 'barcode_image':
+                container.barcode_image = images[0] if images else ''
+            elif attribute == 'stt':
+                container.stt = int(text) if text.isdigit() else 0
+            elif attribute == 'trong_luong':
+                container.trong_luong = _to_float(text) if text else 0.0
+            elif attribute:
+                setattr(container, attribute, '' if text == '#####' and attribute == 'so_seal_hq' else text)
+        if container.so_container:
+            info.containers.append(container)
+
+    texts = [text for text, row_number in page.texts if row_number not in table_rows]
+    for label, value in zip(texts, texts[1:]):
+        spec = _LABEL_FIELDS.get(_normalize(label))
+        if spec is None or _normalize(value) in _LABEL_FIELDS:
+            continue
+        attribute, converter = spec
+        if getattr(info, attribute) in ("", 0.0):
+            setattr(info, attribute, converter(value) if converter else value)
+
+    if info.so_to_khai and so_to_khai and info.so_to_khai.strip() != so_to_khai.strip():
+        return None
+    if info.containers:
+        info.is_container = 1
+        info.ma_ptvc = info.ma_ptvc or "2"
+        return info
+    return info if info.so_to_khai else None
+
+
+class AdfHttpClient:
+    """
+    Replays the ADF barcode form over plain HTTP.
+
+    Thread-safe: every fetch() runs its own ADF session.
+
+    Usage:
+        client = AdfHttpClient("https://pus.customs.gov.vn/faces/ContainerBarcode")
+        result = client.fetch("0101234567", "308010891440", "18A3", date(2024, 12, 1))
+    """
+
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) CustomsBarcodeAutomation"
+    MAX_LOOPBACKS = 2
+
+    def __init__(
+        self,
+        page_url: str,
+        logger: Optional[Logger] = None,
+        timeout: int = 30,
+        session_pool: Optional[HttpSessionPool] = None
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            page_url: URL of the ADF barcode page
+            logger: Optional logger instance
+            timeout: Request timeout in seconds
+            session_pool: Pool whose connections are shared (default: process-wide pool)
+        """
+        self.page_url = page_url
+        self.logger = logger
+        self.timeout = timeout
+        self._pool = session_pool or get_http_session_pool(logger)
+
+    def _new_session(self) -> requests.Session:
+        """Fresh cookie jar for one ADF session, sharing the pooled connections."""
+        session = requests.Session()
+        for prefix, adapter in self._pool.session.adapters.items():
+            session.mount(prefix, adapter)
+        session.headers['User-Agent'] = self.USER_AGENT
+        return session
+
+    def _request(self, session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        """One request to customs (counts against the shared rate limit)."""
+        if not get_rate_limiter().acquire(timeout=self.timeout):
+            raise AdfHttpError(f"{method} {url}: rate limit wait exceeded {self.timeout}s")
+        try:
+            response = session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise AdfHttpError(f"{method} {url} failed: {e}")
+        if response.status_code != 200:
+            raise AdfHttpError(f"{method} {url} returned HTTP {response.status_code}")
+        return response
+
+    def _load_form(self, session: requests.Session) -> AdfForm:
+        """GET the page, following the ADF window loopback, and read the form."""
+        response = self._request(session, 'GET', self.page_url)
+        for _ in range(self.MAX_LOOPBACKS + 1):
+            form = parse_form(response.text, response.url or self.page_url)
+            if form is not None:
+                return form
+            loop = _LOOP_RE.search(response.text)
+            if not loop:
+                break
+            response = self._request(session, 'GET', self.page_url, params={
+                '_afrLoop': loop.group(1), '_afrWindowMode': '0', 'Adf-Window-Id': 'w0'
+            })
+        raise AdfHttpError("ADF form not found on page")
+
+    @staticmethod
+    def _event_data(form: AdfForm, component_id: str) -> Dict[str, str]:
+        data = dict(form.hidden)
+        data['event'] = component_id
+        data[f'event.{component_id}'] = ADF_ACTION_EVENT
+        return data
+
+    def _fetch_images(self, session: requests.Session, base_url: str, info: ContainerDeclarationInfo) -> None:
+        """Turn image URLs in the container rows into base64 PNG data."""
+        for container in info.containers:
+            src = container.barcode_image
+            if not src:
+                continue
+            if src.startswith('data:'):
+                container.barcode_image = src.split(',', 1)[-1]
+                continue
+            try:
+                response = self._request(session, 'GET', urljoin(base_url, src))
+                container.barcode_image = base64.b64encode(response.content).decode('ascii')
+            except AdfHttpError as e:
+                if self.logger:
+                    self.logger.debug(f"QR image not loaded: {e}")
+                container.barcode_image = ''
+
+    def fetch(
+        self,
+        tax_code: str,
+        declaration_number: str,
+        customs_office: str,
+        declaration_date: Union[date, datetime]
+    ) -> AdfResult:
+        """
+        Run the ADF form for one declaration.
+
+        Args:
+            tax_code: Company tax code
+            declaration_number: Declaration number
+            customs_office: Customs office code
+            declaration_date: Declaration date
+
+        Returns:
+            AdfResult with the saved PDF, or parsed info, or only a message
+
+        Raises:
+            AdfHttpError: If the form can't be loaded or submitted
+        """
+        session = self._new_session()
+        form = self._load_form(session)
+        if not form.submit_id:
+            raise AdfHttpError(f"'{SUBMIT_TEXT}' button not found on page")
+
+        values = (tax_code, declaration_number, customs_office, declaration_date.strftime('%d/%m/%Y'))
+        data = self._event_data(form, form.submit_id)
+        for field_id, value in zip(ADF_FIELD_IDS, values):
+            name = form.input_names.get(f'{field_id}::content') or form.input_names.get(field_id) or field_id
+            data[name] = value
+        data['oracle.adf.view.rich.PROCESS'] = form.submit_id
+
+        response = self._request(session, 'POST', form.action, data=data, headers={'Adf-Rich-Message': 'true'})
+        fragments, view_state, error = parse_partial_response(response.text)
+        if error:
+            raise AdfHttpError(error)
+        if view_state:
+            form.hidden[VIEW_STATE] = view_state
+
+        page = parse_page(''.join(fragments))
+        result = AdfResult()
+
+        if page.save_link_id:
+            try:
+                saved = self._request(session, 'POST', form.action, data=self._event_data(form, page.save_link_id))
+                if saved.content.startswith(b'%PDF'):
+                    result.pdf_content = saved.content
+                    return result
+            except AdfHttpError as e:
+                if self.logger:
+                    self.logger.debug(f"ADF save link failed: {e}")
+
+        result.info = parse_result(page, declaration_number)
+        if result.info is not None:
+            result.info.ma_so_thue = result.info.ma_so_thue or tax_code
+            result.info.so_to_khai = result.info.so_to_khai or declaration_number
+            self._fetch_images(session, form.action, result.info)
+        else:
+            result.message = ' '.join(text for text, _ in page.texts)[:300]
+        return result
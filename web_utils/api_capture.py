@@ -0,0 +1,275 @@
+"""
+API Capture Module
+
+Records QueryBangKeDanhSachContainer request/response pairs to disk so
+they can be replayed by the local stub server (benchmarks/stub_soap_server.py)
+for load tests without touching the customs service.
+
+Captures are JSON lines, one file per day, in the configured directory.
+Sensitive values are scrubbed before anything is written:
+- tax codes, declaration numbers and identification numbers are replaced
+  by pseudonyms of the same length and character classes
+- company names and free-text notes are replaced by placeholders
+- container and seal numbers are pseudonymised (the "#####" marker is kept)
+- QR images are replaced by a placeholder PNG of the same size
+
+Pseudonyms are derived from a per-capture random salt, so a value maps to
+the same pseudonym in the request and in its response (replay can match
+them) but can't be reversed. Capture is disabled until init_api_capture()
+is called at application start-up.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from logging_system.logger import Logger
+
+
+SOAP_ACTION_BANG_KE = "QueryBangKeDanhSachContainer"
+
+# Tag -> scrubbing style (request and response tags)
+PSEUDONYM_TAGS = (
+    'Ma_Doanh_Nghiep', 'TK_ID',
+    'MaSoThue', 'SoToKhai', 'SoDinhDanh',
+    'SoContainer', 'So_Container', 'SoSeal', 'So_Seal', 'SoSealHQ',
+)
+PLACEHOLDER_TAGS = {
+    'TenDonViXNK': 'DOANH NGHIỆP THỬ NGHIỆM',
+    'GhiChu': 'GHI CHÚ',
+    'Ghi_Chu': 'GHI CHÚ',
+}
+IMAGE_TAGS = ('BarcodeImage',)
+
+_KEEP_VALUES = {'', '#####'}
+
+_DIGITS = '0123456789'
+_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def _tag_pattern(tags: Iterable[str]) -> 're.Pattern':
+    names = '|'.join(re.escape(t) for t in tags)
+    return re.compile(rf'(<(?:[\w.-]+:)?({names})(?:\s[^>]*)?>)([^<]*)(</(?:[\w.-]+:)?\2>)')
+
+
+_PSEUDONYM_RE = _tag_pattern(PSEUDONYM_TAGS)
+_PLACEHOLDER_RE = _tag_pattern(PLACEHOLDER_TAGS)
+_IMAGE_RE = _tag_pattern(IMAGE_TAGS)
+
+
+def placeholder_png(size: int = 0) -> bytes:
+    """
+    Build a valid 1x1 grey PNG padded to roughly `size` bytes.
+
+    The padding is an ancillary tEXt chunk, which decoders ignore, so
+    replayed payloads keep the size of the real QR images.
+
+    Args:
+        size: Target size in bytes
+
+    Returns:
+        PNG bytes
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0))
+    body = chunk(b'IDAT', zlib.compress(b'\x00\x80')) + chunk(b'IEND', b'')
+    padding = size - len(header) - len(body) - 12 - len(b'Comment\x00')
+    if padding > 0:
+        header += chunk(b'tEXt', b'Comment\x00' + b'x' * padding)
+    return header + body
+
+
+class Scrubber:
+    """Replaces sensitive values in SOAP XML with stable pseudonyms."""
+
+    def __init__(self, salt: Optional[bytes] = None):
+        self.salt = salt if salt is not None else os.urandom(16)
+
+    def pseudonym(self, value: str) -> str:
+        """
+        Map a value to a pseudonym with the same length and character classes.
+
+        Args:
+            value: Original value
+
+        Returns:
+            Digits stay digits, letters stay (upper-case) letters, other
+            characters are kept
+        """
+        value = value.strip()
+        digest = hashlib.sha256(self.salt + value.encode('utf-8')).digest()
+        out = []
+        for i, ch in enumerate(value):
+            byte = digest[i % len(digest)] ^ (i // len(digest))
+            if ch.isdigit():
+                out.append(_DIGITS[byte % 10])
+            elif ch.isalpha():
+                out.append(_LETTERS[byte % 26])
+            else:
+                out.append(ch)
+        return ''.join(out)
+
+    def _replace_pseudonym(self, match: 're.Match') -> str:
+        value = match.group(3)
+        if value.strip() in _KEEP_VALUES:
+            return match.group(0)
+        return match.group(1) + self.pseudonym(value) + match.group(4)
+
+    @staticmethod
+    def _replace_placeholder(match: 're.Match') -> str:
+        if not match.group(3).strip():
+            return match.group(0)
+        return match.group(1) + PLACEHOLDER_TAGS[match.group(2)] + match.group(4)
+
+    @staticmethod
+    def _replace_image(match: 're.Match') -> str:
+        data = match.group(3).strip()
+        if not data:
+            return match.group(0)
+        size = len(data) * 3 // 4
+        return match.group(1) + base64.b64encode(placeholder_png(size)).decode('ascii') + match.group(4)
+
+    def scrub(self, xml_text: str) -> str:
+        """
+        Scrub a SOAP request or response.
+
+        Args:
+            xml_text: SOAP XML text
+
+        Returns:
+            XML text with sensitive values replaced
+        """
+        if not xml_text:
+            return xml_text
+        text = _PSEUDONYM_RE.sub(self._replace_pseudonym, xml_text)
+        text = _PLACEHOLDER_RE.sub(self._replace_placeholder, text)
+        return _IMAGE_RE.sub(self._replace_image, text)
+
+
+class ApiCapture:
+    """
+    Thread-safe recorder of QRCode API request/response pairs.
+
+    Usage:
+        capture = init_api_capture("captures")
+        capture.record(envelope, 200, response_text, latency)
+    """
+
+    def __init__(self, directory: str, scrub: bool = True, logger: Optional[Logger] = None):
+        """
+        Initialize the recorder.
+
+        Args:
+            directory: Directory for capture files (created if missing)
+            scrub: Scrub sensitive values (disable only for local debugging)
+            logger: Optional logger instance
+        """
+        self.directory = directory
+        self.scrubber = Scrubber() if scrub else None
+        self.logger = logger
+        self._lock = threading.Lock()
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, now: datetime) -> str:
+        return os.path.join(self.directory, f"qrcode-capture-{now:%Y%m%d}.jsonl")
+
+    def record(
+        self,
+        request_body: str,
+        status: int,
+        response_text: str,
+        latency: float,
+        action: str = SOAP_ACTION_BANG_KE
+    ) -> None:
+        """
+        Append one request/response pair.
+
+        Args:
+            request_body: SOAP request envelope
+            status: HTTP status code
+            response_text: Response body
+            latency: Request latency in seconds
+            action: SOAP action name
+        """
+        if self.scrubber is not None:
+            request_body = self.scrubber.scrub(request_body)
+            response_text = self.scrubber.scrub(response_text)
+        now = datetime.now()
+        line = json.dumps({
+            'captured_at': now.isoformat(timespec='seconds'),
+            'action': action,
+            'status': status,
+            'latency': round(latency, 4),
+            'request': request_body,
+            'response': response_text,
+        }, ensure_ascii=False)
+        try:
+            with self._lock:
+                with open(self._path(now), 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+                self.records += 1
+        except OSError as e:
+            if self.logger:
+                self.logger.warning(f"Failed to write API capture: {e}")
+
+
+def load_captures(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Load capture records from files and/or directories.
+
+    Args:
+        paths: Capture files, or directories containing *.jsonl files
+
+    Returns:
+        List of capture records in file order
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.endswith('.jsonl')
+            )
+        else:
+            files.append(path)
+
+    records = []
+    for file_path in files:
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return records
+
+
+# Global instance
+_api_capture: Optional[ApiCapture] = None
+
+
+def init_api_capture(directory: str, scrub: bool = True, logger: Optional[Logger] = None) -> ApiCapture:
+    """Start capturing API traffic to directory."""
+    global _api_capture
+    _api_capture = ApiCapture(directory, scrub, logger)
+    return _api_capture
+
+
+def get_api_capture() -> Optional[ApiCapture]:
+    """Get the process-wide API capture recorder, or None if capture is off."""
+    return _api_capture
+
+
+def set_api_capture(capture: Optional[ApiCapture]) -> None:
+    """Replace (or disable with None) the process-wide API capture recorder."""
+    global _api_capture
+    _api_capture = capture
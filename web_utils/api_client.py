@@ -64,6 +64,12 @@ class CircuitBreaker:
                 return True
             return False
     
+    @property
+    def state(self) -> str:
+        """Current state: CLOSED, OPEN or HALF_OPEN."""
+        self.is_open  # moves OPEN -> HALF_OPEN once the recovery timeout has passed
+        return self._state
+    
     def record_success(self) -> None:
         with self._lock:
             self._failures = 0
@@ -0,0 +1,376 @@
+"""
+API Response Cache Module
+
+Persistent SQLite cache for QueryBangKeDanhSachContainer results, keyed
+on (MST, số TK, mã HQ, ngày đăng ký).
+
+Entries expire according to the declaration state in the response:
+- cleared: effectively immutable, kept for CLEARED_TTL
+- transfer (chuyển địa điểm kiểm tra): may still become cleared, short TTL
+- pending / API error message: expire within minutes
+
+The cache is bounded by entry count (least recently used entries are
+evicted) and records hit/miss metrics. It is disabled until
+init_api_response_cache() is called at application start-up.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, fields
+from typing import Any, Dict, Optional
+
+from logging_system.logger import Logger
+from web_utils.qrcode_api_client import BangKeQuery, ContainerDeclarationInfo, ContainerInfo
+
+
+# Declaration states used to pick a TTL
+STATE_CLEARED = "cleared"
+STATE_TRANSFER = "transfer"
+STATE_PENDING = "pending"
+STATE_ERROR = "error"
+
+CLEARED_KEYWORDS = ("thông quan", "thong quan", "chấp nhận thông quan")
+TRANSFER_KEYWORDS = ("chuyển địa điểm", "chuyen dia diem")
+# Words that negate a status ("Chưa thông quan" = not yet cleared)
+NEGATION_WORDS = ("chưa", "chua", "không", "khong")
+
+
+def classify_declaration_state(info: ContainerDeclarationInfo) -> str:
+    """
+    Classify an API result into a cache state.
+
+    A negated status ("Chưa thông quan") is pending: it must not be cached
+    for the cleared TTL just because it contains the cleared keyword.
+
+    Args:
+        info: Parsed API result
+
+    Returns:
+        One of STATE_CLEARED, STATE_TRANSFER, STATE_PENDING, STATE_ERROR
+    """
+    if info.has_error:
+        return STATE_ERROR
+    trang_thai = (info.trang_thai_to_khai or "").lower()
+    if any(word in NEGATION_WORDS for word in trang_thai.split()):
+        return STATE_PENDING
+    if any(kw in trang_thai for kw in TRANSFER_KEYWORDS):
+        return STATE_TRANSFER
+    if any(kw in trang_thai for kw in CLEARED_KEYWORDS):
+        return STATE_CLEARED
+    if any(c.barcode_image for c in info.containers):
+        return STATE_CLEARED
+    return STATE_PENDING
+
+
+class ApiResponseCache:
+    """
+    Status-aware, size-bounded persistent cache for QRCode API results.
+
+    Thread-safe; each operation uses its own SQLite connection like
+    TrackingDatabase. Lookups are read-only: the last-access times of hits
+    are kept in memory and written in batches (with the next put, or every
+    ACCESS_FLUSH_SIZE hits) so a hit does not cost a commit.
+    """
+
+    DEFAULT_DB_PATH = os.path.join("data", "api_cache.db")
+    DEFAULT_MAX_ENTRIES = 5000
+    ACCESS_FLUSH_SIZE = 100
+
+    # TTL per declaration state, in seconds
+    DEFAULT_TTLS = {
+        STATE_CLEARED: 30 * 24 * 3600,
+        STATE_TRANSFER: 30 * 60,
+        STATE_PENDING: 2 * 60,
+        STATE_ERROR: 2 * 60,
+    }
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttls: Optional[Dict[str, float]] = None,
+        logger: Optional[Logger] = None
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: Path to the SQLite cache file
+            max_entries: Maximum number of cached responses
+            ttls: Optional TTL overrides per state (seconds)
+            logger: Optional logger instance
+        """
+        self.db_path = db_path
+        self.max_entries = max(1, int(max_entries))
+        self.ttls = dict(self.DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.logger = logger
+        self._lock = threading.Lock()
+        # cache_key -> last access time not yet written to the database
+        self._pending_access: Dict[str, float] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._stores = 0
+        self._evictions = 0
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        self._initialize_database()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA busy_timeout = 10000")
+        return conn
+
+    def _initialize_database(self) -> None:
+        conn = self._get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS api_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_api_cache_last_access
+                ON api_response_cache(last_access)
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(query: BangKeQuery) -> str:
+        """Build the cache key for a query."""
+        ngay = query.ngay_dang_ky
+        ngay_str = ngay.strftime('%Y-%m-%d') if hasattr(ngay, 'strftime') else str(ngay)
+        return "|".join([
+            (query.ma_so_thue or "").strip(),
+            (query.so_to_khai or "").strip(),
+            (query.ma_hai_quan or "").strip().upper(),
+            ngay_str,
+        ])
+
+    def get(self, query: BangKeQuery) -> Optional[ContainerDeclarationInfo]:
+        """
+        Look up a cached result.
+
+        Args:
+            query: Declaration key
+
+        Returns:
+            Cached ContainerDeclarationInfo, or None on miss/expiry
+        """
+        key = self.make_key(query)
+        now = time.time()
+        conn = self._get_connection()
+        try:
+            row = conn.execute(
+                "SELECT payload, expires_at FROM api_response_cache WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            if self.logger:
+                self.logger.warning(f"API cache read failed: {e}")
+            row = None
+        finally:
+            conn.close()
+
+        if row is None:
+            with self._lock:
+                self._misses += 1
+            return None
+
+        # Expired rows are left for the next put() to delete
+        payload, expires_at = row
+        if expires_at <= now:
+            with self._lock:
+                self._misses += 1
+                self._expired += 1
+            return None
+
+        info = self._deserialize(payload)
+        with self._lock:
+            if info is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._pending_access[key] = now
+            flush = len(self._pending_access) >= self.ACCESS_FLUSH_SIZE
+        if flush:
+            self.flush_access()
+        return info
+
+    def flush_access(self) -> None:
+        """Write the buffered last-access times of cache hits."""
+        conn = self._get_connection()
+        try:
+            self._write_access(conn)
+            conn.commit()
+        except sqlite3.Error as e:
+            if self.logger:
+                self.logger.warning(f"API cache write failed: {e}")
+        finally:
+            conn.close()
+
+    def _write_access(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            pending, self._pending_access = self._pending_access, {}
+        if pending:
+            conn.executemany(
+                "UPDATE api_response_cache SET last_access = ? WHERE cache_key = ?",
+                [(accessed, key) for key, accessed in pending.items()]
+            )
+
+    def put(self, query: BangKeQuery, info: ContainerDeclarationInfo) -> None:
+        """
+        Store a result with a TTL chosen from its declaration state.
+
+        Args:
+            query: Declaration key
+            info: Parsed API result
+        """
+        if info is None:
+            return
+        state = classify_declaration_state(info)
+        ttl = self.ttls.get(state, self.ttls[STATE_PENDING])
+        if ttl <= 0:
+            return
+
+        now = time.time()
+        conn = self._get_connection()
+        try:
+            self._write_access(conn)
+            conn.execute(
+                """INSERT OR REPLACE INTO api_response_cache
+                   (cache_key, state, payload, created_at, expires_at, last_access)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (self.make_key(query), state, json.dumps(asdict(info), ensure_ascii=False),
+                 now, now + ttl, now)
+            )
+            evicted = self._evict(conn, now)
+            conn.commit()
+            with self._lock:
+                self._stores += 1
+                self._evictions += evicted
+        except sqlite3.Error as e:
+            if self.logger:
+                self.logger.warning(f"API cache write failed: {e}")
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        """Drop expired entries, then least recently used ones over the bound."""
+        conn.execute("DELETE FROM api_response_cache WHERE expires_at <= ?", (now,))
+        count = conn.execute("SELECT COUNT(*) FROM api_response_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return 0
+        conn.execute(
+            """DELETE FROM api_response_cache WHERE cache_key IN (
+                   SELECT cache_key FROM api_response_cache
+                   ORDER BY last_access ASC LIMIT ?)""",
+            (overflow,)
+        )
+        return overflow
+
+    def invalidate(self, query: BangKeQuery) -> None:
+        """Remove one cached result."""
+        conn = self._get_connection()
+        try:
+            conn.execute("DELETE FROM api_response_cache WHERE cache_key = ?", (self.make_key(query),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self) -> None:
+        """Remove all cached results."""
+        with self._lock:
+            self._pending_access.clear()
+        conn = self._get_connection()
+        try:
+            conn.execute("DELETE FROM api_response_cache")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def __len__(self) -> int:
+        conn = self._get_connection()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM api_response_cache").fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache metrics.
+
+        Returns:
+            Dictionary with hits, misses, hit rate, expirations, stores,
+            evictions and current size
+        """
+        size = len(self)
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits / lookups) if lookups else 0.0,
+                'expired': self._expired,
+                'stores': self._stores,
+                'evictions': self._evictions,
+                'size': size,
+                'max_entries': self.max_entries,
+            }
+
+    def _deserialize(self, payload: str) -> Optional[ContainerDeclarationInfo]:
+        try:
+            data = json.loads(payload)
+            containers = [ContainerInfo(**c) for c in data.pop('containers', [])]
+            known = {f.name for f in fields(ContainerDeclarationInfo)}
+            info = ContainerDeclarationInfo(**{k: v for k, v in data.items() if k in known})
+            info.containers = containers
+            return info
+        except (ValueError, TypeError) as e:
+            if self.logger:
+                self.logger.warning(f"Discarding unreadable API cache entry: {e}")
+            return None
+
+
+# Global instance (None until initialized at start-up)
+_api_response_cache: Optional[ApiResponseCache] = None
+
+
+def init_api_response_cache(
+    db_path: str = ApiResponseCache.DEFAULT_DB_PATH,
+    max_entries: int = ApiResponseCache.DEFAULT_MAX_ENTRIES,
+    ttls: Optional[Dict[str, float]] = None,
+    logger: Optional[Logger] = None
+) -> ApiResponseCache:
+    """Create the process-wide API response cache."""
+    global _api_response_cache
+    _api_response_cache = ApiResponseCache(db_path, max_entries, ttls, logger)
+    return _api_response_cache
+
+
+def get_api_response_cache() -> Optional[ApiResponseCache]:
+    """Get the process-wide API response cache, or None if caching is disabled."""
+    return _api_response_cache
+
+
+def set_api_response_cache(cache: Optional[ApiResponseCache]) -> None:
+    """Replace (or disable with None) the process-wide API response cache."""
+    global _api_response_cache
+    _api_response_cache = cache
@@ -0,0 +1,580 @@
+"""
+Async QRCode API Client Module
+
+asyncio-based batch engine for the QueryBangKeDanhSachContainer SOAP
+method. A single event loop keeps dozens of requests in flight over a
+small pool of keep-alive connections, with per-request timeouts and
+cooperative cancellation.
+
+The engine uses a minimal HTTP/1.1 transport on top of asyncio streams
+so it has no dependencies beyond the standard library. That transport
+connects straight to the service, so when a proxy applies to the service
+URL (HTTP(S)_PROXY or the system proxy settings, as requests reads them)
+the batch goes through the pooled requests session on a bounded thread
+pool instead, like the sync client; a redirect answered to the direct
+transport is followed the same way. Request building and response
+parsing are shared with QRCodeContainerApiClient.
+
+Every request takes a token from the process-wide rate limiter and a
+slot from the adaptive concurrency controller, so batches share the API
+budget with synchronous callers. Slow requests can be hedged with a
+second identical request (see web_utils.hedging).
+
+Synchronous callers (GUI worker threads, ClearanceChecker) should use
+QRCodeContainerApiClient.query_many(), which runs the engine on a
+private event loop.
+"""
+
+import asyncio
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from logging_system.logger import Logger
+from web_utils.api_capture import get_api_capture
+from web_utils.api_response_cache import get_api_response_cache
+from web_utils.concurrency_controller import (
+    AdaptiveConcurrencyController,
+    get_concurrency_controller,
+    is_overload_status,
+)
+from web_utils.qrcode_api_client import (
+    BangKeQuery,
+    BangKeResult,
+    ContainerDeclarationInfo,
+    QRCodeApiError,
+    QRCodeContainerApiClient,
+    _bang_ke_flight,
+    bang_ke_flight_key,
+)
+from web_utils.rate_limiter import TokenBucketRateLimiter, get_rate_limiter
+from web_utils.hedging import HedgePolicy, get_hedge_policy
+
+
+SOAP_ACTION = 'http://tempuri.org/QueryBangKeDanhSachContainer'
+
+# How often the cancel watcher polls the threading.Event
+CANCEL_POLL_INTERVAL = 0.1
+
+# Statuses answered with a Location the direct transport doesn't follow
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class AsyncHttpTransport:
+    """
+    Minimal keep-alive HTTP/1.1 client on asyncio streams.
+
+    Supports Content-Length and chunked responses. Idle connections are
+    kept per (host, port, scheme) and reused by later requests on the
+    same event loop.
+    """
+
+    def __init__(self):
+        self._idle: Dict[Tuple[str, int, str], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    async def _open(self, host: str, port: int, scheme: str):
+        ssl_context = ssl.create_default_context() if scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        self.connections_opened += 1
+        return reader, writer
+
+    def _take_idle(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        return None
+
+    def _release(self, key, reader, writer, keep_alive: bool):
+        if keep_alive and not writer.is_closing():
+            self._idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+
+    async def post(self, url: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, str, Dict[str, str], bytes]:
+        """
+        Send a POST request and read the full response.
+
+        Args:
+            url: Target URL (http or https)
+            body: Request body bytes
+            headers: Extra request headers
+
+        Returns:
+            Tuple of (status, reason, response headers, body bytes)
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        host = parts.hostname or ''
+        port = parts.port or (443 if scheme == 'https' else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        key = (host, port, scheme)
+
+        host_header = host if parts.port is None else f"{host}:{port}"
+        lines = [f"POST {path} HTTP/1.1", f"Host: {host_header}",
+                 f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body
+
+        conn = self._take_idle(key)
+        reused = conn is not None
+        if conn is None:
+            conn = await self._open(host, port, scheme)
+
+        while True:
+            reader, writer = conn
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, reason, resp_headers, resp_body, keep_alive = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused:
+                    # Server closed an idle keep-alive socket; retry once on a fresh one
+                    reused = False
+                    conn = await self._open(host, port, scheme)
+                    continue
+                raise ConnectionError(f"Connection to {host}:{port} failed: {e}") from e
+            except BaseException:
+                # Timeout/cancellation mid-request leaves the stream in an unknown state
+                writer.close()
+                raise
+
+            self.requests_sent += 1
+            self._release(key, reader, writer, keep_alive)
+            return status, reason, resp_headers, resp_body
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        version, _, rest = status_line.decode('latin-1').strip().partition(' ')
+        code, _, reason = rest.partition(' ')
+        status = int(code)
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = bytearray()
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip optional trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks += await reader.readexactly(size)
+                await reader.readexactly(2)
+            body = bytes(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        return status, reason, headers, body, keep_alive
+
+    def close(self):
+        """Close all idle connections."""
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+
+class RequestsTransport:
+    """
+    AsyncHttpTransport's post() over a requests session on worker threads.
+
+    Used when the direct transport can't reach the service: requests
+    applies the proxy settings (environment and system) and follows
+    redirects, exactly as for the sync client.
+    """
+
+    def __init__(self, session: requests.Session, timeout: float, max_workers: int):
+        """
+        Initialize the transport.
+
+        Args:
+            session: Session to send with (the shared keep-alive pool)
+            timeout: Request timeout in seconds
+            max_workers: Requests in flight at once
+        """
+        self.session = session
+        self.timeout = timeout
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.connections_opened = 0  # Pooled by the session
+        self.requests_sent = 0
+
+    async def post(self, url: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, str, Dict[str, str], bytes]:
+        """
+        Send a POST request and read the full response.
+
+        Raises:
+            requests.RequestException: On transport errors (an OSError)
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="qrcode-http")
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self._executor, partial(self.session.post, url, data=body, headers=headers, timeout=self.timeout)
+        )
+        self.requests_sent += 1
+        resp_headers = {name.lower(): value for name, value in response.headers.items()}
+        return response.status_code, response.reason or '', resp_headers, response.content
+
+    def close(self):
+        """Stop the worker threads once running requests finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def uses_proxy(url: str) -> bool:
+    """True if requests would send to url through a proxy (environment or system settings)."""
+    return bool(requests.utils.get_environ_proxies(url))
+
+
+class AsyncQRCodeClient:
+    """
+    asyncio client for QueryBangKeDanhSachContainer.
+
+    Shares SOAP envelope building and response parsing with the
+    synchronous QRCodeContainerApiClient.
+    """
+
+    def __init__(
+        self,
+        service_url: str = None,
+        logger: Logger = None,
+        timeout: float = 30,
+        controller: Optional[AdaptiveConcurrencyController] = None,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        hedge_policy: Optional[HedgePolicy] = None
+    ):
+        """
+        Initialize the async client.
+
+        Args:
+            service_url: SOAP service URL. Defaults to the sync client's default.
+            logger: Logger instance for logging
+            timeout: Default per-request timeout in seconds
+            controller: Concurrency controller (default: the shared instance)
+            rate_limiter: Request rate limiter (default: the shared instance)
+            hedge_policy: Hedging policy for slow requests (default: the shared instance)
+        """
+        self.controller = controller or get_concurrency_controller()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.hedge_policy = hedge_policy or get_hedge_policy()
+        self._codec = QRCodeContainerApiClient(service_url=service_url, logger=logger, timeout=timeout)
+        self.service_url = self._codec.service_url
+        self.logger = self._codec.logger
+        self.timeout = timeout
+        self._transport = None
+        self._fallback: Optional[RequestsTransport] = None
+
+    async def query_bang_ke(self, query: BangKeQuery, timeout: Optional[float] = None) -> Optional[ContainerDeclarationInfo]:
+        """
+        Query one declaration, hedging slow requests.
+
+        When the hedge policy is enabled and the request hasn't answered
+        within the configured latency percentile of being sent (waits for
+        a rate-limiter token and concurrency slot don't count), an
+        identical request is sent unless requests are queued at the rate
+        limiter; the first answer wins and the other request is cancelled.
+
+        Args:
+            query: Declaration key
+            timeout: Request timeout in seconds (default: client timeout)
+
+        Returns:
+            ContainerDeclarationInfo, or None if the response had no result
+
+        Raises:
+            QRCodeApiError: On HTTP errors, transport errors, timeouts or
+                            invalid XML (when hedged: only if both requests fail)
+        """
+        policy = self.hedge_policy
+        delay = policy.hedge_delay()
+        if delay is None:
+            return await self._query_once(query, timeout)
+
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._query_once(query, timeout, sent))
+        hedge = None
+        try:
+            # Time spent queued for a token or slot isn't latency
+            sending = asyncio.ensure_future(sent.wait())
+            try:
+                await asyncio.wait({primary, sending}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                sending.cancel()
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not policy.try_start_hedge(self.rate_limiter):
+                return await primary
+
+            self.logger.debug(f"Hedging slow request for {query.so_to_khai} after {delay:.2f}s")
+            hedge = asyncio.ensure_future(self._query_once(query, timeout))
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        policy.record_outcome(task is hedge)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel whichever request lost (closes its connection)
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _query_once(self, query: BangKeQuery, timeout: Optional[float] = None,
+                          sent: Optional[asyncio.Event] = None) -> Optional[ContainerDeclarationInfo]:
+        """
+        Send one QueryBangKeDanhSachContainer request.
+
+        Waits for a rate-limiter token and a slot from the shared adaptive
+        concurrency controller before sending; the timeout covers the
+        request itself, not the wait.
+
+        Args:
+            query: Declaration key
+            timeout: Request timeout in seconds (default: client timeout)
+            sent: Set once the token and slot are held and the request is sent
+
+        Returns:
+            ContainerDeclarationInfo, or None if the response had no result
+
+        Raises:
+            QRCodeApiError: On HTTP errors, transport errors, timeouts or invalid XML
+        """
+        if self._transport is None:
+            self._transport = self._make_transport(self.controller.max_limit)
+        request_timeout = timeout if timeout is not None else self.timeout
+
+        envelope = self._codec._build_soap_request(
+            query.ma_so_thue, query.so_to_khai, query.ma_hai_quan, query.ngay_dang_ky
+        )
+
+        # Both waits sleep on the event loop (no worker threads); a
+        # cancelled task leaves the queues without taking a token or slot
+        if not await self.rate_limiter.acquire_async(timeout=request_timeout):
+            raise QRCodeApiError(f"Rate limit wait exceeded {request_timeout}s")
+
+        controller = self.controller
+        if not await controller.acquire_async(timeout=request_timeout):
+            raise QRCodeApiError(
+                f"No API concurrency slot free within {request_timeout}s (limit {controller.limit})"
+            )
+
+        if sent is not None:
+            sent.set()
+        started = time.monotonic()
+        success = False
+        overload = False
+        try:
+            request = (
+                self.service_url,
+                envelope.encode('utf-8'),
+                {'Content-Type': 'text/xml; charset=utf-8', 'SOAPAction': SOAP_ACTION}
+            )
+            status, reason, headers, body = await asyncio.wait_for(self._transport.post(*request), request_timeout)
+            if status in REDIRECT_STATUSES and isinstance(self._transport, AsyncHttpTransport):
+                # The direct transport doesn't follow redirects; requests does
+                self.logger.debug(f"Service answered HTTP {status}, following it with requests")
+                status, reason, headers, body = await asyncio.wait_for(
+                    self._requests_transport().post(*request), request_timeout
+                )
+            success = status == 200
+            overload = is_overload_status(status)
+            if success:
+                self.hedge_policy.record_latency(time.monotonic() - started)
+        except asyncio.TimeoutError as e:
+            overload = True
+            raise QRCodeApiError(f"Request timed out after {request_timeout}s") from e
+        except (OSError, ValueError) as e:
+            overload = True
+            raise QRCodeApiError(f"Request failed: {e}") from e
+        finally:
+            controller.release(time.monotonic() - started, success, overload)
+
+        charset = 'utf-8'
+        content_type = headers.get('content-type', '')
+        if 'charset=' in content_type:
+            charset = content_type.split('charset=', 1)[1].split(';')[0].strip() or charset
+        text = body.decode(charset, errors='replace')
+
+        capture = get_api_capture()
+        if capture is not None:
+            capture.record(envelope, status, text, time.monotonic() - started)
+
+        if status == 429:
+            self.rate_limiter.record_throttled()
+        if status != 200:
+            raise QRCodeApiError(f"HTTP {status}: {reason}")
+        return self._codec._parse_soap_response(text)
+
+    async def query_many(
+        self,
+        keys,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None,
+        on_result: Optional[Callable[[BangKeResult], None]] = None,
+        use_cache: bool = True,
+        checkpoint: Optional[Callable[[], bool]] = None
+    ) -> List[BangKeResult]:
+        """
+        Run many queries with bounded concurrency.
+
+        Args:
+            keys: Iterable of BangKeQuery or (mst, so_tk, ma_hq, ngay) tuples
+            concurrency: Upper bound on requests in flight (default: the
+                         adaptive controller's max_limit; the controller's
+                         current limit applies on top of this)
+            timeout: Per-request timeout in seconds (default: client timeout)
+            cancel_event: Optional threading.Event; when set, pending and
+                          in-flight requests are cancelled
+            on_result: Optional callback invoked as each request finishes
+            use_cache: Serve results from the API response cache when
+                       available (fresh results are always written back)
+            checkpoint: Optional callable run in a worker thread before each
+                        query (e.g. Job.checkpoint); it may block, which holds
+                        the query back, and returning False cancels the query
+
+        Returns:
+            List of BangKeResult in the same order as keys
+        """
+        queries = [BangKeQuery.coerce(k) for k in keys]
+        results: List[Optional[BangKeResult]] = [None] * len(queries)
+        if not queries:
+            return []
+
+        if concurrency is None:
+            concurrency = self.controller.max_limit
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._transport = self._make_transport(concurrency)
+        cache = get_api_response_cache()
+        loop = asyncio.get_running_loop()
+
+        async def run_one(index: int, query: BangKeQuery):
+            async with semaphore:
+                # Blocks while the job is paused; nothing is sent meanwhile
+                if checkpoint is not None and not await loop.run_in_executor(None, checkpoint):
+                    return
+                started = time.monotonic()
+                # Cache lookups hit SQLite: keep them off the event loop
+                cached = None
+                if cache is not None and use_cache:
+                    cached = await loop.run_in_executor(None, cache.get, query)
+                try:
+                    if cached is not None:
+                        info = cached
+                    else:
+                        # Shares requests with sync callers of the same declaration
+                        info = await _bang_ke_flight.do_async(
+                            bang_ke_flight_key(self.service_url, query), self.query_bang_ke, query, timeout
+                        )
+                        if info is not None and cache is not None:
+                            await loop.run_in_executor(None, cache.put, query, info)
+                    result = BangKeResult(query, info=info)
+                except QRCodeApiError as e:
+                    result = BangKeResult(query, error=e)
+                except Exception as e:
+                    # Report bugs per request; an escaped exception would
+                    # look like a cancellation and skip on_result
+                    self.logger.error(f"Unexpected error querying {query.so_to_khai}: {e}", exc_info=True)
+                    error = QRCodeApiError(f"Unexpected error: {e}")
+                    error.__cause__ = e
+                    result = BangKeResult(query, error=error)
+                result.elapsed = time.monotonic() - started
+                results[index] = result
+                if on_result:
+                    try:
+                        on_result(result)
+                    except Exception as e:
+                        self.logger.error(f"query_many result callback failed: {e}")
+
+        tasks = [asyncio.ensure_future(run_one(i, q)) for i, q in enumerate(queries)]
+        watcher = None
+        if cancel_event is not None:
+            watcher = asyncio.ensure_future(self._watch_cancel(cancel_event, tasks))
+
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if watcher:
+                watcher.cancel()
+            self._transport.close()
+            if self._fallback is not None:
+                self._fallback.close()
+                self._fallback = None
+
+        for index, query in enumerate(queries):
+            if results[index] is None:
+                results[index] = BangKeResult(query, error=QRCodeApiError("Cancelled"), cancelled=True)
+
+        failed = sum(1 for r in results if not r.ok)
+        self.logger.debug(
+            f"query_many finished: {len(queries)} requests, {failed} failed, "
+            f"{self._transport.connections_opened} connections"
+        )
+        return results
+
+    def _make_transport(self, concurrency: int):
+        """Direct asyncio transport, or requests on threads when a proxy applies."""
+        if uses_proxy(self.service_url):
+            self.logger.debug(f"Proxy configured for {self.service_url}, sending the batch with requests")
+            return RequestsTransport(self._codec.session, self.timeout, concurrency)
+        return AsyncHttpTransport()
+
+    def _requests_transport(self) -> RequestsTransport:
+        if self._fallback is None:
+            self._fallback = RequestsTransport(self._codec.session, self.timeout, self.controller.max_limit)
+        return self._fallback
+
+    @staticmethod
+    async def _watch_cancel(cancel_event: threading.Event, tasks: List[asyncio.Future]):
+        while not cancel_event.is_set():
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+        for task in tasks:
+            task.cancel()
+
+    def run_many(self, keys, **kwargs) -> List[BangKeResult]:
+        """
+        Blocking wrapper around query_many for threads without an event loop.
+
+        Args:
+            keys: Iterable of query keys
+            **kwargs: Passed to query_many
+
+        Returns:
+            List of BangKeResult in the same order as keys
+        """
+        return asyncio.run(self.query_many(keys, **kwargs))
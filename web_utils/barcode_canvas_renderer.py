@@ -0,0 +1,429 @@
+"""
+Barcode Canvas Renderer Module
+
+Fast path for the barcode PDFs: draws the fixed single-page layouts of
+BarcodePdfGenerator straight onto a reportlab canvas, skipping the
+document template, frame, and generic table layout passes of Platypus.
+
+Positions follow Platypus rules exactly: frame padding, table cell padding,
+the fixed leading of string cells, and centring of tables wider than the
+frame. The result is the same page. Text that fits on one line without
+markup is drawn as a text object. Anything that might wrap is laid out by
+a Paragraph, so line breaks stay the same.
+
+Pages that don't fit (long container lists, very long field values) raise
+CanvasLayoutError, and the generator falls back to Platypus, which
+paginates.
+"""
+
+import io
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.fonts import ps2tt, tt2ps
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph, Spacer
+from reportlab.platypus.flowables import Flowable
+
+
+# Platypus defaults the layouts rely on
+FRAME_PADDING = 6          # Frame padding on each side
+CELL_PADDING = (6, 6, 3, 3)  # Table cell padding: left, right, top, bottom
+CELL_LEADING = 12          # Leading of string cells (FONTSIZE doesn't change it)
+GRID_WIDTH = 0.5
+HEADER_BACKGROUND = colors.Color(0.9, 0.9, 0.9)
+HEADER_TEXT_WIDTH = 160    # Width of the customs office block in the header
+_FUZZ = 1e-6               # Frame overflow tolerance
+
+# One line of plain text, optionally led by a <font name='...'> label
+_MARKUP = re.compile(r"[<>&]")
+_FONT_LABEL = re.compile(r"<font name='([^'<>&]+)'>([^<>&]*)</font>([^<>&]*)\Z")
+_ITALIC = re.compile(r"<i>([^<>&]*)</i>\Z")
+
+
+class CanvasLayoutError(Exception):
+    """The declaration doesn't fit the single-page canvas layout."""
+    pass
+
+
+@dataclass
+class PageTexts:
+    """Text of a declaration page (markup as passed to Paragraph)."""
+    office: str
+    sub_office: str
+    date: str
+    titles: Tuple[str, str]
+    seal_note: str
+    items: List[str]  # Items 1-9
+    export_line: str
+    notes: Sequence[str]
+
+
+class TextBlock(Flowable):
+    """
+    Paragraph stand-in that draws one line of plain text directly.
+
+    Falls back to a real Paragraph when the text has other markup, has
+    whitespace that Paragraph would collapse, or is too wide for one line.
+    """
+
+    def __init__(self, markup: str, style):
+        super().__init__()
+        self.markup = markup
+        self.style = style
+        self.segments = _plain_segments(markup, style)
+        self._paragraph: Optional[Paragraph] = None
+        self._text_width = 0.0
+
+    def wrap(self, availWidth, availHeight):
+        style = self.style
+        self.width = availWidth
+        if self.segments is not None and self._paragraph is None:
+            text_width = sum(_text_width(text, font, style.fontSize) for font, text in self.segments)
+            if text_width <= availWidth:
+                self._text_width = text_width
+                self.height = style.leading
+                return availWidth, self.height
+        if self._paragraph is None:
+            self._paragraph = Paragraph(self.markup, style)
+        self.width, self.height = self._paragraph.wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def getSpaceAfter(self):
+        return self.style.spaceAfter
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        if self._paragraph is not None:
+            self._paragraph.drawOn(canvas, x, y)
+            return
+        style = self.style
+        if style.alignment == TA_CENTER:
+            x += (self.width - self._text_width) / 2
+        elif style.alignment == TA_RIGHT:
+            x += self.width - self._text_width
+        text = canvas.beginText(x, y + self.height - style.fontSize)
+        text.setFillColor(style.textColor)
+        for font, segment in self.segments:
+            text.setFont(font, style.fontSize, style.leading)
+            text.textOut(segment)
+        canvas.drawText(text)
+
+
+def _plain_segments(markup: str, style) -> Optional[List[Tuple[str, str]]]:
+    """Split one-line markup into (font, text) runs, or None if Paragraph is needed."""
+    if not _MARKUP.search(markup):
+        segments = [(style.fontName, markup)]
+    else:
+        match = _FONT_LABEL.match(markup)
+        if match:
+            segments = [(match.group(1), match.group(2)), (style.fontName, match.group(3))]
+        else:
+            match = _ITALIC.match(markup)
+            if not match:
+                return None
+            try:
+                family, bold, _ = ps2tt(style.fontName)
+                segments = [(tt2ps(family, bold, 1), match.group(1))]
+            except ValueError:
+                return None
+    if len(segments) == 1:
+        # Paragraph drops leading/trailing whitespace and collapses runs
+        font, text = segments[0]
+        text = ' '.join(text.split())
+        return [(font, text)] if text else None
+    text = ''.join(segment for _, segment in segments)
+    if not text or text != ' '.join(text.split()):
+        return None
+    return [(font, segment) for font, segment in segments if segment]
+
+
+@lru_cache(maxsize=1024)
+def _text_width(text: str, font: str, size: float) -> float:
+    """stringWidth, cached: titles, labels and notes repeat on every page."""
+    return stringWidth(text, font, size)
+
+
+class FastTable(Flowable):
+    """
+    Subset of platypus.Table for the fixed layouts.
+
+    It supports fixed column widths, string cells (split on newlines) and
+    cells holding a list of flowables. Padding and vertical alignment are
+    uniform, alignment is set per column, and the first row can have its
+    own font and a background. A grid is optional. Drawing order and
+    positions match Table.
+    """
+
+    def __init__(self, rows: List[list], col_widths: Sequence[float],
+                 aligns: Sequence[str], valign: str = 'MIDDLE',
+                 padding: Tuple[float, float, float, float] = CELL_PADDING,
+                 fonts: Optional[Tuple[Tuple[str, float], Tuple[str, float]]] = None,
+                 header_background=None, grid: bool = False):
+        super().__init__()
+        self.rows = rows
+        self.col_widths = list(col_widths)
+        self.aligns = aligns
+        self.valign = valign
+        self.padding = padding
+        self.fonts = fonts  # (header font, size), (body font, size)
+        self.header_background = header_background
+        self.grid = grid
+        self.hAlign = 'CENTER'
+        self._row_heights: List[float] = []
+        self._sizes: dict = {}
+
+    def wrap(self, availWidth, availHeight):
+        left, right, top, bottom = self.padding
+        self._row_heights = []
+        for r, row in enumerate(self.rows):
+            height = 0.0
+            for c, cell in enumerate(row):
+                if isinstance(cell, str):
+                    cell_height = CELL_LEADING * len(cell.split('\n'))
+                else:
+                    sizes = [f.wrap(self.col_widths[c] - left - right, 0xfffffff) for f in cell]
+                    self._sizes[r, c] = sizes
+                    cell_height = sum(h for _, h in sizes)
+                    cell_height += sum(f.getSpaceAfter() for f in cell[:-1])
+                height = max(height, cell_height)
+            self._row_heights.append(height + top + bottom)
+        self.width = sum(self.col_widths)
+        self.height = sum(self._row_heights)
+        return self.width, self.height
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        left, right, top, bottom = self.padding
+        col_positions = [x]
+        for width in self.col_widths:
+            col_positions.append(col_positions[-1] + width)
+        row_positions = [y + self.height]
+        for height in self._row_heights:
+            row_positions.append(row_positions[-1] - height)
+
+        canvas.saveState()
+        if self.header_background is not None:
+            canvas.setFillColor(self.header_background)
+            canvas.rect(x, row_positions[0], self.width, row_positions[1] - row_positions[0], stroke=0, fill=1)
+        canvas.setFillColor(colors.black)
+
+        size = 0
+        for r, row in enumerate(self.rows):
+            row_height = self._row_heights[r]
+            row_bottom = row_positions[r + 1]
+            if self.fonts:
+                font, size = self.fonts[0] if r == 0 else self.fonts[1]
+                canvas.setFont(font, size, CELL_LEADING)
+            for c, cell in enumerate(row):
+                col_x, col_width = col_positions[c], self.col_widths[c]
+                if isinstance(cell, str):
+                    lines = cell.split('\n')
+                    if self.valign == 'TOP':
+                        line_y = row_bottom + row_height - top - size
+                    else:
+                        line_y = row_bottom + (bottom + row_height - top + len(lines) * CELL_LEADING) / 2 - size
+                    line_x = col_x + (col_width + left - right) / 2
+                    for line in lines:
+                        canvas.drawCentredString(line_x, line_y, line)
+                        line_y -= CELL_LEADING
+                    continue
+
+                sizes = self._sizes[r, c]
+                cell_height = sum(h for _, h in sizes) + sum(f.getSpaceAfter() for f in cell[:-1])
+                if self.valign == 'TOP':
+                    cell_y = row_bottom + row_height - top
+                else:
+                    cell_y = row_bottom + (row_height + bottom - top + cell_height) / 2
+                for flowable, (w, h) in zip(cell, sizes):
+                    align = self.aligns[c]
+                    if align == 'LEFT':
+                        cell_x = col_x + left
+                    elif align == 'RIGHT':
+                        cell_x = col_x + col_width - right - w
+                    else:
+                        cell_x = col_x + (col_width + left - right - w) / 2
+                    cell_y -= h
+                    if not isinstance(flowable, Spacer):
+                        flowable.drawOn(canvas, cell_x, cell_y)
+                    cell_y -= flowable.getSpaceAfter()
+
+        if self.grid:
+            canvas.setStrokeColor(colors.black)
+            canvas.setLineWidth(GRID_WIDTH)
+            canvas.setLineCap(1)
+            canvas.setLineJoin(1)
+            # One stroke per line, box first, as Table draws GRID
+            x0, x1 = col_positions[0], col_positions[-1]
+            y0, y1 = row_positions[0], row_positions[-1]
+            for y_line in (y0, y1):
+                canvas.line(x0, y_line, x1, y_line)
+            for x_line in (x0, x1):
+                canvas.line(x_line, y1, x_line, y0)
+            for y_line in row_positions[1:-1]:
+                canvas.line(x0, y_line, x1, y_line)
+            for x_line in col_positions[1:-1]:
+                canvas.line(x_line, y1, x_line, y0)
+        canvas.restoreState()
+
+
+class CanvasPageRenderer:
+    """
+    Draws the cargo and container declaration pages on a single canvas.
+
+    Usage:
+        renderer = CanvasPageRenderer(config, styles, fonts)
+        pdf_bytes = renderer.render_cargo(texts, barcode, header, col_widths, quantity, weight)
+    """
+
+    def __init__(self, config, styles: dict, fonts: Tuple[str, str, str]):
+        """
+        Args:
+            config: BarcodeRenderConfig (page size and margins)
+            styles: Paragraph styles of the generator
+            fonts: Tuple of (regular, bold, italic) font names
+        """
+        self.config = config
+        self.styles = styles
+        self.font_name, self.font_bold, self.font_italic = fonts
+        # Tables use the page width minus margins, which is wider than the
+        # frame (padding), so Platypus centres them over the frame
+        self.table_width = config.page_width - config.margin_left - config.margin_right
+
+    def render_cargo(self, texts: PageTexts, barcode: Optional[Flowable], table_header: Sequence[str],
+                     col_widths: Sequence[float], quantity: str, weight: str) -> bytes:
+        """
+        Render the cargo (non-container) page, laid out as BarcodePdfGenerator._build_content.
+
+        Raises:
+            CanvasLayoutError: If the page overflows
+        """
+        right = [barcode] if barcode else []
+        right += [Spacer(1, 2 * mm), TextBlock(texts.date, self.styles['date_right_italic'])]
+
+        cell_style = self.styles['cell_wrap']
+        data_row = [
+            '1',
+            [TextBlock(quantity, cell_style)] if quantity else '',
+            [TextBlock(weight, cell_style)] if weight else '',
+            '',
+            '',
+        ]
+        table = FastTable(
+            [list(table_header), data_row], col_widths, aligns=['CENTER'] * len(col_widths),
+            fonts=((self.font_bold, 8), (self.font_name, 10)),
+            header_background=HEADER_BACKGROUND, grid=True
+        )
+        return self._render(texts, right, table, gaps=(10 * mm, 8 * mm, 8 * mm))
+
+    def render_container(self, texts: PageTexts, table_header: Sequence[str],
+                         col_widths: Sequence[float], rows: List[list]) -> bytes:
+        """
+        Render the container page, laid out as BarcodePdfGenerator._build_container_content.
+
+        Args:
+            rows: Container rows (strings, and a QR Image flowable or '' last)
+
+        Raises:
+            CanvasLayoutError: If the container table doesn't fit on the page
+        """
+        right = [TextBlock(texts.date, self.styles['date_right_italic'])]
+        table_rows = [list(table_header)]
+        table_rows += [[cell if isinstance(cell, str) else [cell] for cell in row] for row in rows]
+        table = FastTable(
+            table_rows, col_widths, aligns=['CENTER'] * len(col_widths),
+            fonts=((self.font_bold, 10), (self.font_name, 11)),
+            header_background=HEADER_BACKGROUND, grid=True
+        )
+        return self._render(texts, right, table, gaps=(8 * mm, 6 * mm, 6 * mm))
+
+    def _render(self, texts: PageTexts, header_right: list, table: FastTable,
+                gaps: Tuple[float, float, float]) -> bytes:
+        """Lay out the page around the declaration table (gaps after subtitle, item 9, export line)."""
+        styles = self.styles
+        config = self.config
+        half = self.table_width * 0.5
+        story = []
+
+        # Header: customs office block | barcode and date
+        office = FastTable(
+            [[[TextBlock(texts.office, styles['header_left_bold'])]],
+             [[TextBlock(texts.sub_office, styles['header_bold_center'])]]],
+            [HEADER_TEXT_WIDTH], aligns=['LEFT'], valign='TOP', padding=(0, 0, 0, 2)
+        )
+        story.append(FastTable([[[office], header_right]], [half, half], aligns=['LEFT', 'RIGHT'], valign='TOP'))
+        story.append(Spacer(1, 15 * mm))
+
+        for title in texts.titles:
+            story.append(TextBlock(title, styles['title']))
+        story.append(TextBlock(texts.seal_note, styles['subtitle_black']))
+        story.append(Spacer(1, gaps[0]))
+
+        # Items 1-2 full width, 3-5 | 6-8 in two columns, 9 full width
+        info = styles['info']
+        items = texts.items
+        story.append(TextBlock(items[0], info))
+        story.append(TextBlock(items[1], info))
+        story.append(FastTable(
+            [[[TextBlock(items[i], info)], [TextBlock(items[i + 3], info)]] for i in range(2, 5)],
+            [half, half], aligns=['LEFT', 'LEFT'], valign='TOP', padding=(6, 6, 1, 1)
+        ))
+        story.append(TextBlock(items[8], info))
+        story.append(Spacer(1, gaps[1]))
+
+        story.append(table)
+        story.append(Spacer(1, 5 * mm))
+        story.append(TextBlock(texts.export_line, styles['small_italic']))
+        story.append(Spacer(1, gaps[2]))
+        for note in texts.notes:
+            story.append(TextBlock(note, styles['note']))
+
+        # Lay out everything before drawing, so an overflow costs no drawing
+        placements = _layout(story, config)
+
+        buffer = io.BytesIO()
+        canvas = Canvas(
+            buffer, pagesize=(config.page_width, config.page_height),
+            pageCompression=int(config.page_compression),
+            invariant=int(config.invariant)
+        )
+        for flowable, x, y in placements:
+            flowable.drawOn(canvas, x, y)
+        canvas.showPage()
+        canvas.save()
+        return buffer.getvalue()
+
+
+def _layout(story: List[Flowable], config) -> List[Tuple[Flowable, float, float]]:
+    """
+    Place flowables top-down in the page frame, as platypus.Frame does.
+
+    Returns:
+        (flowable, x, y) positions, Spacers omitted
+
+    Raises:
+        CanvasLayoutError: If the story doesn't fit on one page
+    """
+    frame_x = config.margin_left + FRAME_PADDING
+    frame_width = config.page_width - config.margin_left - config.margin_right - 2 * FRAME_PADDING
+    bottom = config.margin_bottom + FRAME_PADDING
+    y = config.page_height - config.margin_top - FRAME_PADDING
+    placements = []
+    for flowable in story:
+        width, height = flowable.wrap(frame_width, y - bottom)
+        y -= height
+        if y < bottom - _FUZZ:
+            raise CanvasLayoutError(f"{flowable.__class__.__name__} overflows the page")
+        if not isinstance(flowable, Spacer):
+            x = frame_x
+            if flowable.hAlign in ('CENTER', 'CENTRE', TA_CENTER):
+                x += (frame_width - width) / 2
+            elif flowable.hAlign in ('RIGHT', TA_RIGHT):
+                x += frame_width - width
+            placements.append((flowable, x, y))
+        y -= flowable.getSpaceAfter()
+    return placements
@@ -6,10 +6,13 @@ matching the layout from pus.customs.gov.vn website.
 """
 
 import io
+import json
 import base64
+import hashlib
+import threading
 from datetime import datetime
-from typing import Optional, List
-from dataclasses import dataclass
+from typing import Dict, Optional, List, Tuple
+from dataclasses import asdict, dataclass
 
 # PDF generation
 from reportlab.lib import colors
@@ -17,29 +20,420 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm, cm
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.platypus import Frame, PageTemplate, BaseDocTemplate
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
-# Barcode generation - explicit imports for PyInstaller compatibility
-# Use Code39 (Free 3 of 9) to match ECUS barcode style
-try:
-    from barcode import Code39
-    from barcode.writer import ImageWriter
-except ImportError:
-    # Fallback: try importing from barcode.codex module directly
-    try:
-        from barcode.codex import Code39
-        from barcode.writer import ImageWriter
-    except ImportError:
-        Code39 = None
-        ImageWriter = None
+# Barcodes are drawn as vectors with ReportLab's Code39 (Free 3 of 9) widget
+# to match ECUS barcode style
+from reportlab.graphics.barcode.code39 import Standard39
+from reportlab.platypus.flowables import Flowable
 
+from web_utils.barcode_canvas_renderer import (
+    HEADER_TEXT_WIDTH,
+    CanvasLayoutError,
+    CanvasPageRenderer,
+    PageTexts,
+)
+from web_utils.pdf_images import PdfImage, get_image_cache
 from web_utils.qrcode_api_client import ContainerDeclarationInfo, ContainerInfo
 from logging_system.logger import Logger
 
 
+# Code39 bar geometry (scaled to BarcodeRenderConfig.barcode_width afterwards)
+BARCODE_BAR_WIDTH = 0.3 * mm  # Narrow bar
+BARCODE_QUIET_ZONE = 2 * mm   # Each side
+
+# Static page content of the cargo and container layouts
+CARGO_TITLES = ("DANH SÁCH HÀNG HÓA", "ĐỦ ĐIỀU KIỆN QUA KHU VỰC GIÁM SÁT HẢI QUAN")
+CONTAINER_TITLES = ("DANH SÁCH CONTAINER", "ĐỦ ĐIỀU KIỆN QUA KHU VỰC GIÁM SÁT HẢI QUAN")
+
+CARGO_TABLE_HEADER = [
+    'STT',
+    'SỐ LƯỢNG HÀNG\n(1)',
+    'TỔNG TRỌNG LƯỢNG HÀNG\n(2)',
+    'LƯỢNG HÀNG HÓA\nTHỰC TẾ QUA KHU VỰC\nGIÁM SÁT HẢI QUAN\n(3)',
+    'XÁC NHẬN CỦA\nCÔNG CHỨC HẢI QUAN\n(4)'
+]
+CARGO_COL_WIDTHS = [1.2*cm, 3.5*cm, 4*cm, 4*cm, 4*cm]  # Slightly wider column for SỐ LƯỢNG HÀNG
+
+CONTAINER_TABLE_HEADER = [
+    'STT',
+    'SỐ HIỆU\nCONTAINER\n(1)',
+    'SỐ SEAL\nCONTAINER\n(Nếu có)\n(2)',
+    'SỐ SEAL\nHẢI QUAN\n(Nếu có)\n(3)',
+    'XÁC NHẬN\nCỦA\nCÔNG CHỨC\nHẢI QUAN\n(4)',
+    'MÃ VẠCH\n(5)'
+]
+# Column widths (total ~17cm for A4 with margins - increased to match original)
+CONTAINER_COL_WIDTHS = [1.2*cm, 3*cm, 2.8*cm, 2.8*cm, 3.2*cm, 3*cm]
+
+CARGO_NOTES = [
+    "<i>Ghi chú:</i>",
+    "- Cột số (1) lấy từ tiêu chí \"Số lượng\" trên phần \"General\" của tờ khai hải quan.",
+    "- Cột số (2) lấy từ tiêu chí \"Tổng trọng lượng hàng\" trên phần \"General\" của tờ khai hải quan.",
+    "- Trường hợp hàng hóa được đưa qua KVGS nhiều lần thì đối với từng lần đưa hàng qua KVGS, công chức hải quan thực hiện:",
+    "    + Cột số (3): ghi rõ lượng hàng từng lần qua KVGS.",
+    "    + Cột số (4): ghi ngày, tháng, năm; ký, đóng dấu công chức.",
+    "- Trường hợp ghi rõ tại cột (1):",
+    "    + Khác 1 thì theo dõi lượng hàng tại cột (3) tương ứng theo cột (1).",
+]
+
+CONTAINER_NOTES = [
+    "<i>Ghi chú:</i>",
+    "- Cột số (1):",
+    "    + Đối với hàng nhập khẩu: lấy từ Danh sách container do người khai hải quan gửi đến hệ thống.",
+    "    + Đối với hàng xuất khẩu: lấy từ tiêu chí \"Số container\" trên tờ khai xuất.",
+    "    Trường hợp có sự thay đổi số container đã khai báo, căn cứ chứng từ do người khai hải quan nộp; xuất trình, công chức hải quan cập nhật số container vào hệ thống để in lại danh sách container.",
+    "- Cột số (2): Đối với hàng nhập khẩu: lấy từ Danh sách container do người khai hải quan gửi đến hệ thống.",
+]
+
+# Bump when the page layout changes, so payload hashes recorded for PDFs
+# rendered with the old layout no longer match
+PDF_LAYOUT_VERSION = 1
+
+# ContainerDeclarationInfo fields that are not printed (the retrieval time
+# changes on every query)
+UNRENDERED_FIELDS = ("thoi_gian_lay_du_lieu", "thong_bao_loi")
+
+
+def _seal_correction_settings() -> Optional[Dict[str, bool]]:
+    """Seal note auto-correction preferences (None if they can't be read)."""
+    try:
+        from config.preferences_service import get_preferences_service
+        prefs = get_preferences_service()
+        return {
+            "green_yellow": bool(prefs.auto_correct_seal_green_yellow),
+            "red": bool(prefs.auto_correct_seal_red),
+        }
+    except Exception:
+        return None
+
+
+def payload_hash(info: ContainerDeclarationInfo, config: Optional["BarcodeRenderConfig"] = None) -> str:
+    """
+    Hash of the declaration data a PDF is rendered from.
+    
+    Two payloads with the same hash render the same page content, so a
+    caller holding the hash of the PDF it already saved can skip rendering
+    and writing it again. Besides the printed data, the hash covers
+    everything else that changes the output: the layout version, the
+    render settings and the seal note auto-correction preferences.
+    
+    Args:
+        info: ContainerDeclarationInfo from the API or web form
+        config: Render settings the PDF is made with (default: BarcodeRenderConfig())
+        
+    Returns:
+        SHA-256 hex digest
+    """
+    data = asdict(info)
+    for name in UNRENDERED_FIELDS:
+        data.pop(name, None)
+    data["_layout"] = PDF_LAYOUT_VERSION
+    data["_render"] = asdict(config or BarcodeRenderConfig())
+    data["_seal_correction"] = _seal_correction_settings()
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+# Font triple (regular, bold, italic) -> cached styles. Fonts are registered
+# once per process; styles and table styles are immutable once built and
+# shared by every generator instance.
+FontSet = Tuple[str, str, str]
+
+_fonts: Optional[FontSet] = None
+_paragraph_styles: Dict[FontSet, dict] = {}
+_table_styles: Dict[FontSet, dict] = {}
+_render_lock = threading.Lock()
+
+
+def get_render_fonts(logger: Logger = None) -> FontSet:
+    """
+    Register Vietnamese-compatible fonts once per process.
+
+    Args:
+        logger: Logger instance for logging.
+
+    Returns:
+        Tuple of (regular, bold, italic) font names.
+    """
+    global _fonts
+    with _render_lock:
+        if _fonts is None:
+            try:
+                # Try to use Arial which supports Vietnamese
+                pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
+                pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
+                pdfmetrics.registerFont(TTFont('Arial-Italic', 'ariali.ttf'))
+                _fonts = ('Arial', 'Arial-Bold', 'Arial-Italic')
+            except Exception:
+                # Fallback to Helvetica (built-in)
+                _fonts = ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique')
+                if logger:
+                    logger.debug("Using Helvetica font (Vietnamese may not display correctly)")
+        return _fonts
+
+
+def get_paragraph_styles(fonts: FontSet) -> dict:
+    """
+    Get the paragraph styles for a font set, building them on first use.
+
+    Args:
+        fonts: Tuple of (regular, bold, italic) font names.
+
+    Returns:
+        Dictionary of style name -> ParagraphStyle.
+    """
+    with _render_lock:
+        styles = _paragraph_styles.get(fonts)
+        if styles is None:
+            styles = _build_paragraph_styles(*fonts)
+            _paragraph_styles[fonts] = styles
+        return styles
+
+
+def get_table_styles(fonts: FontSet) -> dict:
+    """
+    Get the static table styles for a font set, building them on first use.
+
+    Args:
+        fonts: Tuple of (regular, bold, italic) font names.
+
+    Returns:
+        Dictionary of table name -> TableStyle.
+    """
+    with _render_lock:
+        styles = _table_styles.get(fonts)
+        if styles is None:
+            styles = _build_table_styles(*fonts)
+            _table_styles[fonts] = styles
+        return styles
+
+
+def _build_paragraph_styles(font_name: str, font_bold: str, font_italic: str) -> dict:
+    """Build paragraph styles for PDF"""
+    styles = getSampleStyleSheet()
+    
+    result = {
+        'header_left': ParagraphStyle(
+            'header_left',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=11,  # Increased from 10
+            alignment=TA_LEFT,
+        ),
+        'header_bold': ParagraphStyle(
+            'header_bold',
+            parent=styles['Normal'],
+            fontName=font_bold,
+            fontSize=12,  # Increased from 11
+            alignment=TA_LEFT,
+        ),
+        'header_bold_center': ParagraphStyle(
+            'header_bold_center',
+            parent=styles['Normal'],
+            fontName=font_bold,
+            fontSize=12,  # Increased from 11
+            alignment=TA_CENTER,  # Center aligned under the first line
+        ),
+        'header_left_bold': ParagraphStyle(
+            'header_left_bold',
+            parent=styles['Normal'],
+            fontName=font_bold,
+            fontSize=12,  # Increased from 11
+            alignment=TA_LEFT,
+        ),
+        'header_center_bold': ParagraphStyle(
+            'header_center_bold',
+            parent=styles['Normal'],
+            fontName=font_bold,
+            fontSize=12,  # Increased from 11
+            alignment=TA_CENTER,
+        ),
+        'date_right_italic': ParagraphStyle(
+            'date_right_italic',
+            parent=styles['Normal'],
+            fontName=font_italic,
+            fontSize=11,  # Increased from 10
+            alignment=TA_RIGHT,
+        ),
+        'title': ParagraphStyle(
+            'title',
+            parent=styles['Normal'],
+            fontName=font_bold,
+            fontSize=13,  # Increased from 12
+            alignment=TA_CENTER,
+            spaceAfter=2 * mm,
+        ),
+        'subtitle_black': ParagraphStyle(
+            'subtitle_black',
+            parent=styles['Normal'],
+            fontName=font_bold,
+            fontSize=12,  # Increased from 11
+            alignment=TA_CENTER,
+            textColor=colors.black,  # Black, not red
+        ),
+        'info': ParagraphStyle(
+            'info',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=10,  # Increased from 9
+            alignment=TA_LEFT,
+            spaceAfter=1 * mm,
+            wordWrap='CJK',  # Allow word wrap for long text
+        ),
+        'small_italic': ParagraphStyle(
+            'small_italic',
+            parent=styles['Normal'],
+            fontName=font_italic,
+            fontSize=9,  # Increased from 8
+            alignment=TA_LEFT,
+        ),
+        'link_right': ParagraphStyle(
+            'link_right',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=10,  # Increased from 9
+            alignment=TA_RIGHT,
+            textColor=colors.blue,
+        ),
+        'note': ParagraphStyle(
+            'note',
+            parent=styles['Normal'],
+            fontName=font_name,
+            fontSize=9,  # Increased from 8
+            alignment=TA_LEFT,
+            textColor=colors.black,  # Changed from gray to black
+            spaceAfter=0.5 * mm,
+        ),
+    }
+    
+    # Cell style for wrapping text in cargo table data cells
+    result['cell_wrap'] = ParagraphStyle(
+        'cell_wrap',
+        parent=result['info'],
+        fontSize=9,
+        alignment=TA_CENTER,
+        wordWrap='CJK',  # Enable word wrap
+        leading=11,  # Line spacing
+    )
+    return result
+
+
+def _build_table_styles(font_name: str, font_bold: str, font_italic: str) -> dict:
+    """Build the static table styles shared by the cargo and container layouts"""
+    return {
+        # Line 1 is LEFT aligned, Line 2 is CENTER aligned within the same width
+        'header_inner': TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),      # Line 1: LEFT aligned
+            ('ALIGN', (0, 1), (0, 1), 'CENTER'),    # Line 2: CENTER aligned
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ]),
+        'header': TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+        ]),
+        'info': TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ]),
+        'cargo': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.9, 0.9)),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), font_bold),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),  # Reverted to 8 to fit column width
+            ('FONTNAME', (0, 1), (-1, -1), font_name),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),  # Increased from 9
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('ROWHEIGHT', (0, 0), (-1, 0), 45),
+            # Remove fixed row height for data rows to allow auto-expand for wrapped text
+        ]),
+        'container': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.9, 0.9)),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), font_bold),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),  # Increased from 9
+            ('FONTNAME', (0, 1), (-1, -1), font_name),
+            ('FONTSIZE', (0, 1), (-1, -1), 11),  # Increased from 10
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('ROWHEIGHT', (0, 0), (-1, 0), 60),  # Increased header row height
+            ('ROWHEIGHT', (0, 1), (-1, -1), 65),  # Increased data row height for QR codes
+        ]),
+    }
+
+
+class Code39Barcode(Flowable):
+    """
+    Vector Code39 barcode scaled to a fixed box.
+
+    Bars are drawn straight onto the page canvas (no raster image and no
+    intermediate Drawing), without check digit or text below (ECUS style).
+    The encoding is computed once and the bar operators are formatted
+    once; Standard39 recomputes the encoding on every size query and
+    formats each bar through canvas.rect.
+    """
+
+    def __init__(self, value: str, width: float, height: float):
+        super().__init__()
+        self.barcode = Standard39(
+            value,
+            checksum=0,
+            humanReadable=False,
+            barWidth=BARCODE_BAR_WIDTH,
+            barHeight=height,
+            lquiet=BARCODE_QUIET_ZONE,
+            rquiet=BARCODE_QUIET_ZONE,
+        )
+        self.barcode._calculate()
+        self.width = width
+        self.height = height
+        self.hAlign = 'RIGHT'
+        self._bars = self._bar_path()
+
+    def _bar_path(self) -> str:
+        """PDF path operators for the bars (as Standard39.draw lays them out)."""
+        barcode = self.barcode
+        bar_width = barcode.barWidth
+        wide = bar_width * barcode.ratio
+        height = barcode._height
+        left = barcode.lquiet
+        ops = []
+        for c in barcode.decomposed:
+            if c == 'i':
+                left += barcode.gap
+            elif c == 's':
+                left += bar_width
+            elif c == 'S':
+                left += wide
+            elif c in 'bB':
+                w = bar_width if c == 'b' else wide
+                # One filled path per bar, as canvas.rect (rasterizers snap each bar)
+                ops.append(f"n {left:.4f} 0 {w:.4f} {height:.4f} re f")
+                left += w
+        return '\n'.join(ops)
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.scale(self.width / self.barcode._width, self.height / self.barcode._height)
+        if self._bars:
+            self.canv.addLiteral(self._bars)
+
+
 @dataclass
 class BarcodeRenderConfig:
     """Configuration for barcode PDF rendering"""
@@ -52,6 +446,10 @@ class BarcodeRenderConfig:
     barcode_height: float = 15 * mm  # Reduced to match ECUS barcode (no text below)
     barcode_width: float = 50 * mm   # Reduced width to match ECUS proportions
     qr_code_size: float = 2 * cm     # QR code size for container PDF (~2cm x 2cm)
+    qr_image_max_dpi: int = 0        # Downsample QR images above this resolution (0 = keep)
+    image_compression_level: int = 6  # zlib level for image streams (1-9)
+    page_compression: bool = True    # Flate-compress page content streams
+    invariant: bool = True           # Fixed creation date and document ID (same input, same bytes)
 
 
 class BarcodePdfGenerator:
@@ -61,34 +459,22 @@ class BarcodePdfGenerator:
     Creates PDF output matching the layout from pus.customs.gov.vn website.
     """
     
-    def __init__(self, logger: Logger = None):
+    def __init__(self, logger: Logger = None, config: Optional[BarcodeRenderConfig] = None):
         """
         Initialize the PDF generator.
         
         Args:
             logger: Logger instance for logging.
+            config: Render settings (default: BarcodeRenderConfig())
         """
         self.logger = logger
-        self.config = BarcodeRenderConfig()
+        self.config = config or BarcodeRenderConfig()
+        self.fast_render = True  # Draw single-page PDFs directly on the canvas
         self._register_fonts()
     
     def _register_fonts(self):
-        """Register Vietnamese-compatible fonts"""
-        try:
-            # Try to use Arial which supports Vietnamese
-            pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
-            pdfmetrics.registerFont(TTFont('Arial-Bold', 'arialbd.ttf'))
-            pdfmetrics.registerFont(TTFont('Arial-Italic', 'ariali.ttf'))
-            self.font_name = 'Arial'
-            self.font_bold = 'Arial-Bold'
-            self.font_italic = 'Arial-Italic'
-        except Exception:
-            # Fallback to Helvetica (built-in)
-            self.font_name = 'Helvetica'
-            self.font_bold = 'Helvetica-Bold'
-            self.font_italic = 'Helvetica-Oblique'
-            if self.logger:
-                self.logger.debug("Using Helvetica font (Vietnamese may not display correctly)")
+        """Use the Vietnamese-compatible fonts registered for this process"""
+        self.font_name, self.font_bold, self.font_italic = get_render_fonts(self.logger)
     
     def _auto_correct_seal_status(self, ghi_chu: str, info: ContainerDeclarationInfo) -> str:
         """
@@ -143,13 +529,19 @@ class BarcodePdfGenerator:
         
         return ghi_chu
     
-    def generate_pdf(self, info: ContainerDeclarationInfo) -> Optional[bytes]:
+    def generate_pdf(self, info: ContainerDeclarationInfo, correct_seal_status: bool = True) -> Optional[bytes]:
         """
         Generate PDF document from declaration info.
         Routes to container layout if MaPTVC = 2, otherwise regular cargo layout.
         
+        Single-page declarations are drawn directly on the canvas
+        (CanvasPageRenderer); pages that don't fit, such as long container
+        lists, are built with Platypus.
+        
         Args:
             info: ContainerDeclarationInfo object with declaration data.
+            correct_seal_status: Apply _auto_correct_seal_status to the note
+                (False when the caller already did, e.g. render worker processes).
             
         Returns:
             PDF content as bytes, or None if generation fails.
@@ -160,35 +552,20 @@ class BarcodePdfGenerator:
             return None
         
         try:
-            # Create PDF in memory
-            buffer = io.BytesIO()
-            
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=A4,
-                topMargin=self.config.margin_top,
-                bottomMargin=self.config.margin_bottom,
-                leftMargin=self.config.margin_left,
-                rightMargin=self.config.margin_right
-            )
-            
-            # Build document content - route based on declaration type
-            if info.is_container_declaration:
-                elements = self._build_container_content(info)
-                pdf_type = "container"
-            else:
-                elements = self._build_content(info)
-                pdf_type = "cargo"
-            
-            # Generate PDF
-            doc.build(elements)
+            is_container = info.is_container_declaration
+            pdf_type = "container" if is_container else "cargo"
+            texts = self._page_texts(info, correct_seal_status, is_container)
+            rows = self._container_rows(info.containers) if is_container else None
             
-            # Get PDF bytes
-            pdf_bytes = buffer.getvalue()
-            buffer.close()
+            pdf_bytes = self._render_canvas(info, texts, rows) if self.fast_render else None
+            if pdf_bytes is None:
+                pdf_bytes = self._render_platypus(info, texts, rows)
             
             if self.logger:
-                self.logger.info(f"Generated {pdf_type} PDF ({len(pdf_bytes)} bytes) for declaration {info.so_to_khai}")
+                images = f", {self._image_report(rows)}" if rows else ""
+                self.logger.info(
+                    f"Generated {pdf_type} PDF ({len(pdf_bytes)} bytes{images}) for declaration {info.so_to_khai}"
+                )
             
             return pdf_bytes
             
@@ -199,90 +576,82 @@ class BarcodePdfGenerator:
                 self.logger.debug(traceback.format_exc())
             return None
     
-    def _build_content(self, info: ContainerDeclarationInfo) -> list:
+    def _render_canvas(self, info: ContainerDeclarationInfo, texts: PageTexts,
+                       rows: Optional[list]) -> Optional[bytes]:
         """
-        Build PDF content elements matching web layout.
+        Draw the page directly on the canvas.
         
-        Args:
-            info: ContainerDeclarationInfo object.
-            
         Returns:
-            List of flowable elements for PDF.
+            PDF content as bytes, or None if the page needs Platypus.
         """
-        elements = []
-        styles = self._get_styles()
-        
-        # Calculate available width
-        available_width = A4[0] - self.config.margin_left - self.config.margin_right
+        renderer = CanvasPageRenderer(
+            self.config, self._get_styles(), (self.font_name, self.font_bold, self.font_italic)
+        )
+        try:
+            if rows is not None:
+                return renderer.render_container(texts, CONTAINER_TABLE_HEADER, CONTAINER_COL_WIDTHS, rows)
+            quantity, weight = self._cargo_quantities(info)
+            return renderer.render_cargo(
+                texts, self._generate_barcode_image(info.so_to_khai),
+                CARGO_TABLE_HEADER, CARGO_COL_WIDTHS, quantity, weight
+            )
+        except CanvasLayoutError as e:
+            if self.logger:
+                self.logger.debug(f"Declaration {info.so_to_khai} needs more than one page ({e}), using Platypus")
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Canvas rendering failed for {info.so_to_khai} ({e}), using Platypus")
+        return None
+    
+    def _render_platypus(self, info: ContainerDeclarationInfo, texts: PageTexts,
+                         rows: Optional[list]) -> bytes:
+        """Build the document with Platypus (paginates long content)."""
+        buffer = io.BytesIO()
+        
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=A4,
+            topMargin=self.config.margin_top,
+            bottomMargin=self.config.margin_bottom,
+            leftMargin=self.config.margin_left,
+            rightMargin=self.config.margin_right,
+            pageCompression=int(self.config.page_compression),
+            invariant=int(self.config.invariant)
+        )
         
-        # ===== HEADER SECTION =====
-        # Create header table with 2 columns: Left (customs office) | Right (barcode + date)
+        # Build document content - route based on declaration type
+        if rows is not None:
+            elements = self._build_container_content(texts, rows)
+        else:
+            elements = self._build_content(info, texts)
         
-        # Generate barcode image from SoToKhai (not SoDinhDanh)
-        barcode_img = self._generate_barcode_image(info.so_to_khai)
+        doc.build(elements)
+        return buffer.getvalue()
+    
+    def _page_texts(self, info: ContainerDeclarationInfo, correct_seal_status: bool = True,
+                    is_container: bool = False) -> PageTexts:
+        """
+        Build the text shared by the Platypus and canvas layouts.
         
-        # Format date
-        today = datetime.now()
-        date_str = f"Ngày {today.day:02d} tháng {today.month:02d} năm {today.year}"
+        Args:
+            info: ContainerDeclarationInfo object.
+            correct_seal_status: Apply _auto_correct_seal_status to the note.
+            is_container: Container layout (titles and notes differ).
+            
+        Returns:
+            PageTexts with Paragraph markup.
+        """
+        now = datetime.now()
         
-        # Left column: Customs office info
         # Use TenCucHaiQuan (e.g., "Chi cục Hải quan khu vực V") and TenChiCucHaiQuan (e.g., "Hải quan Bắc Ninh")
         ten_cuc_hq = info.ten_cuc_hai_quan or "Chi cục Hải quan khu vực V"
         ten_chi_cuc_hq = info.ten_chi_cuc_hai_quan or "Hải quan Bắc Ninh"
         
-        # Line 1: "Chi cục Hải quan khu vực V" - bold, LEFT aligned
-        # Line 2: "Hải quan Bắc Ninh" - bold, CENTER aligned under line 1
-        header_line1 = Paragraph(ten_cuc_hq, styles['header_left_bold'])
-        header_line2 = Paragraph(ten_chi_cuc_hq, styles['header_bold_center'])
-        
-        # Create a table with fixed width matching "Chi cục Hải quan khu vực V" text
-        # Line 1 is LEFT aligned, Line 2 is CENTER aligned within the same width
-        header_text_width = 160  # Width in points to match "Chi cục Hải quan khu vực V"
-        header_inner_table = Table(
-            [[header_line1], [header_line2]],
-            colWidths=[header_text_width]
-        )
-        header_inner_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),      # Line 1: LEFT aligned
-            ('ALIGN', (0, 1), (0, 1), 'CENTER'),    # Line 2: CENTER aligned
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('TOPPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-            ('LEFTPADDING', (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ]))
-        
-        left_content = [header_inner_table]
-        
-        # Right column: Barcode and date
-        right_content = []
-        if barcode_img:
-            right_content.append(barcode_img)
-        right_content.append(Spacer(1, 2*mm))
-        right_content.append(Paragraph(date_str, styles['date_right_italic']))
-        
-        # Create header table
-        header_data = [[left_content, right_content]]
-        header_table = Table(header_data, colWidths=[available_width * 0.5, available_width * 0.5])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ]))
-        elements.append(header_table)
-        elements.append(Spacer(1, 15*mm))
-        
-        # ===== TITLE SECTION =====
-        elements.append(Paragraph("DANH SÁCH HÀNG HÓA", styles['title']))
-        elements.append(Paragraph("ĐỦ ĐIỀU KIỆN QUA KHU VỰC GIÁM SÁT HẢI QUAN", styles['title']))
-        
         # Sub-title (black text, not red)
         ghi_chu = info.ghi_chu or "Tờ khai không phải niêm phong"
-        ghi_chu = self._auto_correct_seal_status(ghi_chu, info)
-        elements.append(Paragraph(ghi_chu, styles['subtitle_black']))
-        elements.append(Spacer(1, 10*mm))
+        if correct_seal_status:
+            ghi_chu = self._auto_correct_seal_status(ghi_chu, info)
         
-        # ===== DECLARATION INFO SECTION =====
         # Build full customs supervision location (Chi cục HQ GS + Địa điểm GS)
         chi_cuc_gs = info.ten_chi_cuc_hai_quan_gs or 'CC HQ CK Sân bay QT Nội Bài'
         # Add địa điểm giám sát (MaDDGS: TenDDGS - MaPTVC) if available
@@ -297,236 +666,184 @@ class BarcodePdfGenerator:
         else:
             chi_cuc_gs_full = chi_cuc_gs
         
-        # Item 1 - full width (allow line wrap for long content)
-        elements.append(Paragraph(
-            f"<font name='{self.font_bold}'>1. Chi cục hải quan giám sát:</font> {chi_cuc_gs_full}",
-            styles['info']
-        ))
-        
-        # Item 2 - full width
-        elements.append(Paragraph(
-            f"<font name='{self.font_bold}'>2. Đơn vị XNK:</font> {info.ten_don_vi_xnk}",
-            styles['info']
-        ))
-        
-        # Items 3-5 (left) and 6-8 (right) in two columns
-        left_items = [
-            f"<font name='{self.font_bold}'>3. Mã số thuế:</font> {info.ma_so_thue}",
-            f"<font name='{self.font_bold}'>4. Số tờ khai:</font> {info.so_to_khai}",
-            f"<font name='{self.font_bold}'>5. Trạng thái tờ khai:</font> {info.trang_thai_to_khai}",
+        bold = self.font_bold
+        items = [
+            f"<font name='{bold}'>1. Chi cục hải quan giám sát:</font> {chi_cuc_gs_full}",
+            f"<font name='{bold}'>2. Đơn vị XNK:</font> {info.ten_don_vi_xnk}",
+            f"<font name='{bold}'>3. Mã số thuế:</font> {info.ma_so_thue}",
+            f"<font name='{bold}'>4. Số tờ khai:</font> {info.so_to_khai}",
+            f"<font name='{bold}'>5. Trạng thái tờ khai:</font> {info.trang_thai_to_khai}",
+            f"<font name='{bold}'>6. Ngày tờ khai:</font> {info.ngay_to_khai}",
+            f"<font name='{bold}'>7. Loại hình:</font> {info.ten_loai_hinh}",
+            f"<font name='{bold}'>8. Luồng:</font> {info.luong_to_khai}",
+            f"<font name='{bold}'>9. Số quản lý hàng hóa:</font> {info.so_dinh_danh}",
         ]
         
-        right_items = [
-            f"<font name='{self.font_bold}'>6. Ngày tờ khai:</font> {info.ngay_to_khai}",
-            f"<font name='{self.font_bold}'>7. Loại hình:</font> {info.ten_loai_hinh}",
-            f"<font name='{self.font_bold}'>8. Luồng:</font> {info.luong_to_khai}",
-        ]
+        return PageTexts(
+            office=ten_cuc_hq,
+            sub_office=ten_chi_cuc_hq,
+            date=f"Ngày {now.day:02d} tháng {now.month:02d} năm {now.year}",
+            titles=CONTAINER_TITLES if is_container else CARGO_TITLES,
+            seal_note=ghi_chu,
+            items=items,
+            export_line=f"Kết xuất dữ liệu lúc: {now.strftime('%d/%m/%Y %I:%M %p')}",
+            notes=CONTAINER_NOTES if is_container else CARGO_NOTES,
+        )
+    
+    @staticmethod
+    def _cargo_quantities(info: ContainerDeclarationInfo) -> Tuple[str, str]:
+        """Format the quantity and weight cells of the cargo table."""
+        so_luong = f"{int(info.so_luong_hang)} {info.dvt_so_luong_hang}" if info.so_luong_hang else ""
+        trong_luong = f"{info.tong_trong_luong_hang} {info.dvt_tong_trong_luong_hang}" if info.tong_trong_luong_hang else ""
+        return so_luong, trong_luong
+    
+    def _build_header(self, texts: PageTexts, right_content: list) -> Table:
+        """
+        Build the header table: customs office (left) | barcode and date (right).
+        
+        Args:
+            texts: Page texts.
+            right_content: Flowables of the right column.
+            
+        Returns:
+            ReportLab Table object.
+        """
+        styles = self._get_styles()
+        table_styles = self._get_table_styles()
+        available_width = A4[0] - self.config.margin_left - self.config.margin_right
+        
+        # Line 1: "Chi cục Hải quan khu vực V" - bold, LEFT aligned
+        # Line 2: "Hải quan Bắc Ninh" - bold, CENTER aligned under line 1
+        header_line1 = Paragraph(texts.office, styles['header_left_bold'])
+        header_line2 = Paragraph(texts.sub_office, styles['header_bold_center'])
+        
+        # Create a table with fixed width matching "Chi cục Hải quan khu vực V" text
+        # Line 1 is LEFT aligned, Line 2 is CENTER aligned within the same width
+        header_inner_table = Table(
+            [[header_line1], [header_line2]],
+            colWidths=[HEADER_TEXT_WIDTH]
+        )
+        header_inner_table.setStyle(table_styles['header_inner'])
+        
+        header_table = Table(
+            [[[header_inner_table], right_content]],
+            colWidths=[available_width * 0.5, available_width * 0.5]
+        )
+        header_table.setStyle(table_styles['header'])
+        return header_table
+    
+    def _build_info_section(self, texts: PageTexts, elements: list) -> None:
+        """
+        Append declaration info items 1-9 (items 3-5 | 6-8 in two columns).
+        
+        Args:
+            texts: Page texts.
+            elements: Flowable list to append to.
+        """
+        styles = self._get_styles()
+        table_styles = self._get_table_styles()
+        available_width = A4[0] - self.config.margin_left - self.config.margin_right
+        
+        # Items 1-2 - full width (allow line wrap for long content)
+        elements.append(Paragraph(texts.items[0], styles['info']))
+        elements.append(Paragraph(texts.items[1], styles['info']))
         
         # Build info table for items 3-8
         info_rows = []
-        for i in range(len(left_items)):
-            left_para = Paragraph(left_items[i], styles['info'])
-            right_para = Paragraph(right_items[i], styles['info'])
+        for i in range(2, 5):
+            left_para = Paragraph(texts.items[i], styles['info'])
+            right_para = Paragraph(texts.items[i + 3], styles['info'])
             info_rows.append([left_para, right_para])
         
         info_table = Table(info_rows, colWidths=[available_width * 0.5, available_width * 0.5])
-        info_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('TOPPADDING', (0, 0), (-1, -1), 1),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
-        ]))
+        info_table.setStyle(table_styles['info'])
         elements.append(info_table)
         
         # Item 9 - full width
-        elements.append(Paragraph(
-            f"<font name='{self.font_bold}'>9. Số quản lý hàng hóa:</font> {info.so_dinh_danh}",
-            styles['info']
-        ))
-        elements.append(Spacer(1, 8*mm))
+        elements.append(Paragraph(texts.items[8], styles['info']))
+    
+    def _build_content(self, info: ContainerDeclarationInfo, texts: PageTexts) -> list:
+        """
+        Build PDF content elements matching web layout.
         
-        # ===== CARGO TABLE =====
-        table_header = [
-            'STT',
-            'SỐ LƯỢNG HÀNG\n(1)',
-            'TỔNG TRỌNG LƯỢNG HÀNG\n(2)',
-            'LƯỢNG HÀNG HÓA\nTHỰC TẾ QUA KHU VỰC\nGIÁM SÁT HẢI QUAN\n(3)',
-            'XÁC NHẬN CỦA\nCÔNG CHỨC HẢI QUAN\n(4)'
-        ]
+        Args:
+            info: ContainerDeclarationInfo object.
+            texts: Page texts from _page_texts.
+            
+        Returns:
+            List of flowable elements for PDF.
+        """
+        elements = []
+        styles = self._get_styles()
+        table_styles = self._get_table_styles()
         
-        # Format cargo data - use Paragraph for automatic text wrapping
-        so_luong_raw = f"{int(info.so_luong_hang)} {info.dvt_so_luong_hang}" if info.so_luong_hang else ""
-        trong_luong_raw = f"{info.tong_trong_luong_hang} {info.dvt_tong_trong_luong_hang}" if info.tong_trong_luong_hang else ""
+        # ===== HEADER SECTION =====
+        # Right column: barcode from SoToKhai (not SoDinhDanh) and date
+        right_content = []
+        barcode_img = self._generate_barcode_image(info.so_to_khai)
+        if barcode_img:
+            right_content.append(barcode_img)
+        right_content.append(Spacer(1, 2*mm))
+        right_content.append(Paragraph(texts.date, styles['date_right_italic']))
         
-        # Create cell style for wrapping text in data cells
-        cell_style = ParagraphStyle(
-            'cell_wrap',
-            parent=styles['info'],
-            fontSize=9,
-            alignment=TA_CENTER,
-            wordWrap='CJK',  # Enable word wrap
-            leading=11,  # Line spacing
-        )
+        elements.append(self._build_header(texts, right_content))
+        elements.append(Spacer(1, 15*mm))
+        
+        # ===== TITLE SECTION =====
+        for title in texts.titles:
+            elements.append(Paragraph(title, styles['title']))
+        elements.append(Paragraph(texts.seal_note, styles['subtitle_black']))
+        elements.append(Spacer(1, 10*mm))
+        
+        # ===== DECLARATION INFO SECTION =====
+        self._build_info_section(texts, elements)
+        elements.append(Spacer(1, 8*mm))
+        
+        # ===== CARGO TABLE =====
+        so_luong_raw, trong_luong_raw = self._cargo_quantities(info)
+        cell_style = styles['cell_wrap']
         
         # Wrap long text in Paragraph for automatic line breaking
         so_luong = Paragraph(so_luong_raw, cell_style) if so_luong_raw else ''
         trong_luong = Paragraph(trong_luong_raw, cell_style) if trong_luong_raw else ''
         
         table_data = [
-            table_header,
+            CARGO_TABLE_HEADER,
             ['1', so_luong, trong_luong, '', '']
         ]
         
-        col_widths = [1.2*cm, 3.5*cm, 4*cm, 4*cm, 4*cm]  # Slightly wider column for SỐ LƯỢNG HÀNG
-        cargo_table = Table(table_data, colWidths=col_widths)
-        cargo_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.9, 0.9)),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), self.font_bold),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),  # Reverted to 8 to fit column width
-            ('FONTNAME', (0, 1), (-1, -1), self.font_name),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),  # Increased from 9
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('ROWHEIGHT', (0, 0), (-1, 0), 45),
-            # Remove fixed row height for data rows to allow auto-expand for wrapped text
-        ]))
+        cargo_table = Table(table_data, colWidths=CARGO_COL_WIDTHS)
+        cargo_table.setStyle(table_styles['cargo'])
         elements.append(cargo_table)
         elements.append(Spacer(1, 5*mm))
         
         # ===== EXPORT INFO =====
-        export_time = datetime.now().strftime("%d/%m/%Y %I:%M %p")
-        elements.append(Paragraph(
-            f"Kết xuất dữ liệu lúc: {export_time}",
-            styles['small_italic']
-        ))
+        elements.append(Paragraph(texts.export_line, styles['small_italic']))
         elements.append(Spacer(1, 8*mm))
         
         # ===== NOTES SECTION =====
-        notes = [
-            "<i>Ghi chú:</i>",
-            "- Cột số (1) lấy từ tiêu chí \"Số lượng\" trên phần \"General\" của tờ khai hải quan.",
-            "- Cột số (2) lấy từ tiêu chí \"Tổng trọng lượng hàng\" trên phần \"General\" của tờ khai hải quan.",
-            "- Trường hợp hàng hóa được đưa qua KVGS nhiều lần thì đối với từng lần đưa hàng qua KVGS, công chức hải quan thực hiện:",
-            "    + Cột số (3): ghi rõ lượng hàng từng lần qua KVGS.",
-            "    + Cột số (4): ghi ngày, tháng, năm; ký, đóng dấu công chức.",
-            "- Trường hợp ghi rõ tại cột (1):",
-            "    + Khác 1 thì theo dõi lượng hàng tại cột (3) tương ứng theo cột (1).",
-        ]
-        
-        for note in notes:
+        for note in texts.notes:
             elements.append(Paragraph(note, styles['note']))
         
         return elements
     
     def _get_styles(self) -> dict:
-        """Get paragraph styles for PDF"""
-        styles = getSampleStyleSheet()
-        
-        return {
-            'header_left': ParagraphStyle(
-                'header_left',
-                parent=styles['Normal'],
-                fontName=self.font_name,
-                fontSize=11,  # Increased from 10
-                alignment=TA_LEFT,
-            ),
-            'header_bold': ParagraphStyle(
-                'header_bold',
-                parent=styles['Normal'],
-                fontName=self.font_bold,
-                fontSize=12,  # Increased from 11
-                alignment=TA_LEFT,
-            ),
-            'header_bold_center': ParagraphStyle(
-                'header_bold_center',
-                parent=styles['Normal'],
-                fontName=self.font_bold,
-                fontSize=12,  # Increased from 11
-                alignment=TA_CENTER,  # Center aligned under the first line
-            ),
-            'header_left_bold': ParagraphStyle(
-                'header_left_bold',
-                parent=styles['Normal'],
-                fontName=self.font_bold,
-                fontSize=12,  # Increased from 11
-                alignment=TA_LEFT,
-            ),
-            'header_center_bold': ParagraphStyle(
-                'header_center_bold',
-                parent=styles['Normal'],
-                fontName=self.font_bold,
-                fontSize=12,  # Increased from 11
-                alignment=TA_CENTER,
-            ),
-            'date_right_italic': ParagraphStyle(
-                'date_right_italic',
-                parent=styles['Normal'],
-                fontName=self.font_italic,
-                fontSize=11,  # Increased from 10
-                alignment=TA_RIGHT,
-            ),
-            'title': ParagraphStyle(
-                'title',
-                parent=styles['Normal'],
-                fontName=self.font_bold,
-                fontSize=13,  # Increased from 12
-                alignment=TA_CENTER,
-                spaceAfter=2 * mm,
-            ),
-            'subtitle_black': ParagraphStyle(
-                'subtitle_black',
-                parent=styles['Normal'],
-                fontName=self.font_bold,
-                fontSize=12,  # Increased from 11
-                alignment=TA_CENTER,
-                textColor=colors.black,  # Black, not red
-            ),
-            'info': ParagraphStyle(
-                'info',
-                parent=styles['Normal'],
-                fontName=self.font_name,
-                fontSize=10,  # Increased from 9
-                alignment=TA_LEFT,
-                spaceAfter=1 * mm,
-                wordWrap='CJK',  # Allow word wrap for long text
-            ),
-            'small_italic': ParagraphStyle(
-                'small_italic',
-                parent=styles['Normal'],
-                fontName=self.font_italic,
-                fontSize=9,  # Increased from 8
-                alignment=TA_LEFT,
-            ),
-            'link_right': ParagraphStyle(
-                'link_right',
-                parent=styles['Normal'],
-                fontName=self.font_name,
-                fontSize=10,  # Increased from 9
-                alignment=TA_RIGHT,
-                textColor=colors.blue,
-            ),
-            'note': ParagraphStyle(
-                'note',
-                parent=styles['Normal'],
-                fontName=self.font_name,
-                fontSize=9,  # Increased from 8
-                alignment=TA_LEFT,
-                textColor=colors.black,  # Changed from gray to black
-                spaceAfter=0.5 * mm,
-            ),
-        }
+        """Get paragraph styles for PDF (shared, do not modify)"""
+        return get_paragraph_styles((self.font_name, self.font_bold, self.font_italic))
+    
+    def _get_table_styles(self) -> dict:
+        """Get static table styles for PDF (shared, do not modify)"""
+        return get_table_styles((self.font_name, self.font_bold, self.font_italic))
     
-    def _generate_barcode_image(self, code: str) -> Optional[Image]:
+    def _generate_barcode_image(self, code: str) -> Optional[Code39Barcode]:
         """
-        Generate barcode image for PDF.
+        Generate vector barcode for PDF.
         
         Args:
             code: Barcode value (SoToKhai - declaration number).
             
         Returns:
-            ReportLab Image object, or None if generation fails.
+            Code39Barcode flowable, or None if generation fails.
         """
         if not code:
             return None
@@ -535,52 +852,19 @@ class BarcodePdfGenerator:
         if self.logger:
             self.logger.info(f"Generating barcode for value: {code}")
         
-        # Check if barcode library is available
-        if Code39 is None or ImageWriter is None:
-            if self.logger:
-                self.logger.error("Barcode library not available - Code39 or ImageWriter is None")
-            return None
-        
         try:
-            # Generate barcode to bytes
-            barcode_buffer = io.BytesIO()
-            
-            # Create Code39 barcode matching ECUS style (Free 3 of 9 font)
-            # Code39 is the standard used by ECUS for customs barcodes
-            barcode = Code39(code, writer=ImageWriter(), add_checksum=False)
-            barcode.write(barcode_buffer, options={
-                'module_width': 0.3,      # Standard bar width
-                'module_height': 12,      # Reduced height to match ECUS
-                'font_size': 0,           # No text below barcode (ECUS style)
-                'text_distance': 1,       # Minimal text distance
-                'quiet_zone': 2,          # Standard quiet zone
-                'write_text': False,      # No text below barcode (ECUS style)
-                'dpi': 300,               # Higher DPI for better quality
-            })
-            
-            barcode_buffer.seek(0)
+            barcode = Code39Barcode(code, self.config.barcode_width, self.config.barcode_height)
             
-            # Verify barcode was generated
-            barcode_data = barcode_buffer.getvalue()
-            if not barcode_data or len(barcode_data) < 100:
+            # Validated on construction, so a bad value drops the barcode instead of failing the PDF
+            if not barcode.barcode.valid:
                 if self.logger:
-                    self.logger.error(f"Barcode generation produced empty or too small data: {len(barcode_data)} bytes")
+                    self.logger.error(f"Value cannot be encoded as Code39: {code}")
                 return None
             
-            # Reset buffer position for reading
-            barcode_buffer.seek(0)
-            
-            # Create ReportLab Image with proper dimensions
-            # Use larger dimensions to prevent compression/cropping
-            img = Image(barcode_buffer, 
-                       width=self.config.barcode_width, 
-                       height=self.config.barcode_height)
-            img.hAlign = 'RIGHT'
-            
             if self.logger:
-                self.logger.debug(f"Generated barcode image: {len(barcode_data)} bytes, {self.config.barcode_width}x{self.config.barcode_height}")
+                self.logger.debug(f"Generated barcode: {self.config.barcode_width}x{self.config.barcode_height}")
             
-            return img
+            return barcode
             
         except Exception as e:
             if self.logger:
@@ -589,15 +873,18 @@ class BarcodePdfGenerator:
                 self.logger.debug(traceback.format_exc())
             return None
 
-    def _decode_qr_image(self, base64_data: str) -> Optional[Image]:
+    def _decode_qr_image(self, base64_data: str) -> Optional[PdfImage]:
         """
-        Decode base64 encoded PNG to ReportLab Image.
+        Decode base64 encoded PNG to an image flowable.
+        
+        Images are encoded once per content hash (see pdf_images), so rows
+        with the same QR image share one image XObject in the PDF.
         
         Args:
             base64_data: Base64 encoded PNG image data.
             
         Returns:
-            ReportLab Image object, or None if decoding fails.
+            PdfImage flowable, or None if decoding fails.
         """
         if not base64_data:
             return None
@@ -606,17 +893,19 @@ class BarcodePdfGenerator:
             # Decode base64 to bytes
             image_bytes = base64.b64decode(base64_data)
             
-            # Create BytesIO buffer
-            image_buffer = io.BytesIO(image_bytes)
+            max_pixels = 0
+            if self.config.qr_image_max_dpi > 0:
+                max_pixels = round(self.config.qr_code_size / 72 * self.config.qr_image_max_dpi)
+            encoded = get_image_cache().get(image_bytes, max_pixels, self.config.image_compression_level)
             
-            # Create ReportLab Image with QR code size (~2cm x 2cm)
-            img = Image(image_buffer, 
-                       width=self.config.qr_code_size, 
-                       height=self.config.qr_code_size)
-            img.hAlign = 'CENTER'
+            # QR code size (~2cm x 2cm)
+            img = PdfImage(encoded, width=self.config.qr_code_size, height=self.config.qr_code_size)
             
             if self.logger:
-                self.logger.debug(f"Decoded QR image: {len(image_bytes)} bytes")
+                self.logger.debug(
+                    f"Decoded QR image: {len(image_bytes)} bytes -> {encoded.width}x{encoded.height} "
+                    f"{encoded.bits}-bit, {len(encoded.data)} bytes embedded"
+                )
             
             return img
             
@@ -625,71 +914,74 @@ class BarcodePdfGenerator:
                 self.logger.error(f"Failed to decode QR image: {e}")
             return None
     
-    def _build_container_table(self, containers: List[ContainerInfo]) -> Table:
+    def _container_rows(self, containers: List[ContainerInfo]) -> list:
         """
-        Build 6-column table for container declarations.
+        Build the data rows of the container table.
         
         Args:
             containers: List of ContainerInfo objects.
             
         Returns:
-            ReportLab Table object.
+            Rows of cell values (strings, QR Image flowable last).
         """
-        styles = self._get_styles()
-        
-        # Table header
-        table_header = [
-            'STT',
-            'SỐ HIỆU\nCONTAINER\n(1)',
-            'SỐ SEAL\nCONTAINER\n(Nếu có)\n(2)',
-            'SỐ SEAL\nHẢI QUAN\n(Nếu có)\n(3)',
-            'XÁC NHẬN\nCỦA\nCÔNG CHỨC\nHẢI QUAN\n(4)',
-            'MÃ VẠCH\n(5)'
-        ]
-        
-        table_data = [table_header]
-        
-        # Add container rows
+        rows = []
         for cont in containers:
             # Decode QR image
             qr_img = self._decode_qr_image(cont.barcode_image)
             
-            row = [
+            rows.append([
                 str(cont.stt),
                 cont.so_container,
                 cont.so_seal if cont.so_seal else "",  # Show "NA" if that's the value
                 cont.so_seal_hq,  # Already handled "#####" in parsing
                 '',  # Empty for customs officer signature
                 qr_img if qr_img else ''
-            ]
-            table_data.append(row)
+            ])
+        return rows
+    
+    @staticmethod
+    def _image_report(rows: list) -> str:
+        """
+        Summarise the QR images of the container rows for the log.
         
-        # Column widths (total ~17cm for A4 with margins - increased to match original)
-        col_widths = [1.2*cm, 3*cm, 2.8*cm, 2.8*cm, 3.2*cm, 3*cm]
+        Bytes saved are the image streams not embedded again because rows
+        share a QR image.
+        """
+        images = [row[-1] for row in rows if isinstance(row[-1], PdfImage)]
+        if not images:
+            return "no QR images"
+        unique = {image.encoded.key: image.encoded for image in images}
+        embedded = sum(len(encoded.data) for encoded in unique.values())
+        shared = sum(len(image.encoded.data) for image in images) - embedded
+        return (
+            f"{len(images)} QR images, {len(unique)} embedded in {embedded} bytes, "
+            f"{shared} bytes saved by sharing"
+        )
+    
+    def _build_container_table(self, rows: list) -> Table:
+        """
+        Build 6-column table for container declarations.
         
-        container_table = Table(table_data, colWidths=col_widths)
-        container_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.9, 0.9)),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), self.font_bold),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),  # Increased from 9
-            ('FONTNAME', (0, 1), (-1, -1), self.font_name),
-            ('FONTSIZE', (0, 1), (-1, -1), 11),  # Increased from 10
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('ROWHEIGHT', (0, 0), (-1, 0), 60),  # Increased header row height
-            ('ROWHEIGHT', (0, 1), (-1, -1), 65),  # Increased data row height for QR codes
-        ]))
+        Args:
+            rows: Container rows from _container_rows.
+            
+        Returns:
+            ReportLab Table object.
+        """
+        table_styles = self._get_table_styles()
+        
+        container_table = Table([CONTAINER_TABLE_HEADER] + rows, colWidths=CONTAINER_COL_WIDTHS)
+        container_table.setStyle(table_styles['container'])
         
         return container_table
     
-    def _build_container_content(self, info: ContainerDeclarationInfo) -> list:
+    def _build_container_content(self, texts: PageTexts, rows: list) -> list:
         """
         Build PDF content elements for container declarations.
         
         Args:
-            info: ContainerDeclarationInfo object.
+            texts: Page texts from _page_texts.
+            rows: Container rows from _container_rows.
             
         Returns:
             List of flowable elements for PDF.
@@ -697,145 +989,32 @@ class BarcodePdfGenerator:
         elements = []
         styles = self._get_styles()
         
-        # Calculate available width
-        available_width = A4[0] - self.config.margin_left - self.config.margin_right
-        
         # ===== HEADER SECTION (no barcode, no "- 2" indicator) =====
-        # Format date
-        today = datetime.now()
-        date_str = f"Ngày {today.day:02d} tháng {today.month:02d} năm {today.year}"
-        
-        # Left column: Customs office info (same as regular PDF, no "- 2" indicator)
-        ten_cuc_hq = info.ten_cuc_hai_quan or "Chi cục Hải quan khu vực V"
-        ten_chi_cuc_hq = info.ten_chi_cuc_hai_quan or "Hải quan Bắc Ninh"
-        
-        header_line1 = Paragraph(ten_cuc_hq, styles['header_left_bold'])
-        header_line2 = Paragraph(ten_chi_cuc_hq, styles['header_bold_center'])
-        
-        header_text_width = 160
-        header_inner_table = Table(
-            [[header_line1], [header_line2]],
-            colWidths=[header_text_width]
-        )
-        header_inner_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (0, 1), (0, 1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('TOPPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-            ('LEFTPADDING', (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ]))
-        
-        # No "- 2" indicator - removed as per user feedback
-        left_content = [header_inner_table]
-        
         # Right column: Date only (no barcode for container PDF)
-        right_content = [Paragraph(date_str, styles['date_right_italic'])]
-        
-        # Create header table
-        header_data = [[left_content, right_content]]
-        header_table = Table(header_data, colWidths=[available_width * 0.5, available_width * 0.5])
-        header_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ]))
-        elements.append(header_table)
+        right_content = [Paragraph(texts.date, styles['date_right_italic'])]
+        elements.append(self._build_header(texts, right_content))
         elements.append(Spacer(1, 15*mm))
         
         # ===== TITLE SECTION =====
-        elements.append(Paragraph("DANH SÁCH CONTAINER", styles['title']))
-        elements.append(Paragraph("ĐỦ ĐIỀU KIỆN QUA KHU VỰC GIÁM SÁT HẢI QUAN", styles['title']))
-        
-        # Sub-title
-        ghi_chu = info.ghi_chu or "Tờ khai không phải niêm phong"
-        ghi_chu = self._auto_correct_seal_status(ghi_chu, info)
-        elements.append(Paragraph(ghi_chu, styles['subtitle_black']))
+        for title in texts.titles:
+            elements.append(Paragraph(title, styles['title']))
+        elements.append(Paragraph(texts.seal_note, styles['subtitle_black']))
         elements.append(Spacer(1, 8*mm))
         
         # ===== DECLARATION INFO SECTION (same as regular PDF) =====
-        chi_cuc_gs = info.ten_chi_cuc_hai_quan_gs or 'CC HQ CK Sân bay QT Nội Bài'
-        if info.ma_ddgs and info.ten_ddgs:
-            ma_ptvc_str = f" - {info.ma_ptvc}" if info.ma_ptvc else ""
-            chi_cuc_gs_full = f"{chi_cuc_gs} - {info.ma_ddgs}: {info.ten_ddgs}{ma_ptvc_str}"
-        elif info.ten_ddgs:
-            ma_ptvc_str = f" - {info.ma_ptvc}" if info.ma_ptvc else ""
-            chi_cuc_gs_full = f"{chi_cuc_gs} - {info.ten_ddgs}{ma_ptvc_str}"
-        else:
-            chi_cuc_gs_full = chi_cuc_gs
-        
-        # Item 1 - full width
-        elements.append(Paragraph(
-            f"<font name='{self.font_bold}'>1. Chi cục hải quan giám sát:</font> {chi_cuc_gs_full}",
-            styles['info']
-        ))
-        
-        # Item 2 - full width
-        elements.append(Paragraph(
-            f"<font name='{self.font_bold}'>2. Đơn vị XNK:</font> {info.ten_don_vi_xnk}",
-            styles['info']
-        ))
-        
-        # Items 3-5 (left) and 6-8 (right)
-        left_items = [
-            f"<font name='{self.font_bold}'>3. Mã số thuế:</font> {info.ma_so_thue}",
-            f"<font name='{self.font_bold}'>4. Số tờ khai:</font> {info.so_to_khai}",
-            f"<font name='{self.font_bold}'>5. Trạng thái tờ khai:</font> {info.trang_thai_to_khai}",
-        ]
-        
-        right_items = [
-            f"<font name='{self.font_bold}'>6. Ngày tờ khai:</font> {info.ngay_to_khai}",
-            f"<font name='{self.font_bold}'>7. Loại hình:</font> {info.ten_loai_hinh}",
-            f"<font name='{self.font_bold}'>8. Luồng:</font> {info.luong_to_khai}",
-        ]
-        
-        info_rows = []
-        for i in range(len(left_items)):
-            left_para = Paragraph(left_items[i], styles['info'])
-            right_para = Paragraph(right_items[i], styles['info'])
-            info_rows.append([left_para, right_para])
-        
-        info_table = Table(info_rows, colWidths=[available_width * 0.5, available_width * 0.5])
-        info_table.setStyle(TableStyle([
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('TOPPADDING', (0, 0), (-1, -1), 1),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
-        ]))
-        elements.append(info_table)
-        
-        # Item 9 - full width
-        elements.append(Paragraph(
-            f"<font name='{self.font_bold}'>9. Số quản lý hàng hóa:</font> {info.so_dinh_danh}",
-            styles['info']
-        ))
+        self._build_info_section(texts, elements)
         elements.append(Spacer(1, 6*mm))
         
         # ===== CONTAINER TABLE =====
-        container_table = self._build_container_table(info.containers)
-        elements.append(container_table)
+        elements.append(self._build_container_table(rows))
         elements.append(Spacer(1, 5*mm))
         
         # ===== EXPORT INFO =====
-        export_time = datetime.now().strftime("%d/%m/%Y %I:%M %p")
-        elements.append(Paragraph(
-            f"Kết xuất dữ liệu lúc: {export_time}",
-            styles['small_italic']
-        ))
+        elements.append(Paragraph(texts.export_line, styles['small_italic']))
         elements.append(Spacer(1, 6*mm))
         
         # ===== NOTES SECTION =====
-        notes = [
-            "<i>Ghi chú:</i>",
-            "- Cột số (1):",
-            "    + Đối với hàng nhập khẩu: lấy từ Danh sách container do người khai hải quan gửi đến hệ thống.",
-            "    + Đối với hàng xuất khẩu: lấy từ tiêu chí \"Số container\" trên tờ khai xuất.",
-            "    Trường hợp có sự thay đổi số container đã khai báo, căn cứ chứng từ do người khai hải quan nộp; xuất trình, công chức hải quan cập nhật số container vào hệ thống để in lại danh sách container.",
-            "- Cột số (2): Đối với hàng nhập khẩu: lấy từ Danh sách container do người khai hải quan gửi đến hệ thống.",
-        ]
-        
-        for note in notes:
+        for note in texts.notes:
             elements.append(Paragraph(note, styles['note']))
         
         return elements
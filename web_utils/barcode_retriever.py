@@ -12,9 +12,13 @@ V2.0 Updates (December 2024):
 
 from __future__ import annotations  # PEP 563: Postpone type annotation evaluation
 
+import contextvars
+import hashlib
 import time
+import threading
 import requests
-from typing import Optional
+from dataclasses import dataclass
+from typing import Any, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -40,7 +44,23 @@ from models.config_models import BarcodeServiceConfig, SelectorCache
 from models.declaration_models import Declaration
 from logging_system.logger import Logger
 from web_utils.qrcode_api_client import QRCodeContainerApiClient, QRCodeApiError
-from web_utils.barcode_pdf_generator import BarcodePdfGenerator
+from web_utils.barcode_pdf_generator import BarcodePdfGenerator, BarcodeRenderConfig, payload_hash
+from web_utils.pdf_render_pool import get_pdf_render_pool
+from web_utils.concurrency_controller import SlotTimeoutError, get_concurrency_controller, is_overload_status
+from web_utils.rate_limiter import current_priority, get_rate_limiter
+from web_utils.http_session_pool import get_http_session_pool
+from web_utils.web_driver_manager import WebDriverPool
+from web_utils.adf_http_client import AdfHttpClient, AdfHttpError
+from web_utils.method_router import (
+    METHOD_API,
+    METHOD_API_RENDER,
+    METHOD_BACKUP_WEB,
+    METHOD_PRIMARY_WEB,
+    METHOD_WEB,
+    METHOD_WEB_HTTP,
+    MethodRouter,
+)
+from core.single_flight import SingleFlight
 
 
 class BarcodeRetrievalError(Exception):
@@ -52,9 +72,56 @@ class RetrievalMethod(Enum):
     """Barcode retrieval method options"""
     API = "api"      # Use API to get data and render PDF
     WEB = "web"      # Use web scraping from pus.customs.gov.vn
+    HTTP = "http"    # Replay the pus.customs.gov.vn form over HTTP (no browser)
     AUTO = "auto"    # Auto-select best method with fallback
 
 
+@dataclass
+class RetrievalResult:
+    """
+    Outcome of BarcodeRetriever.fetch_barcode.
+    
+    Attributes:
+        pdf_content: Retrieved PDF (None if unchanged or failed)
+        content_hash: Hash of the payload the PDF was made from: the API or
+            web form data for locally rendered PDFs, the PDF bytes for
+            downloaded ones
+        unchanged: The payload hash equals the caller's known hash, so
+            nothing was rendered
+        info: Declaration info still to be rendered (fetch_barcode with
+            render=False; see render_barcode)
+    """
+    pdf_content: Optional[bytes] = None
+    content_hash: Optional[str] = None
+    unchanged: bool = False
+    info: Any = None
+    
+    @property
+    def needs_render(self) -> bool:
+        """The PDF is still to be rendered from info"""
+        return self.pdf_content is None and self.info is not None
+    
+    @property
+    def status(self) -> str:
+        """'unchanged', 'success' or 'failed'"""
+        if self.unchanged:
+            return "unchanged"
+        return "success" if self.pdf_content or self.info is not None else "failed"
+
+
+# Coalesces concurrent retrievals of the same declaration across retrievers
+_retrieve_flight = SingleFlight("retrieve_barcode")
+
+# (result, known hash, render) of the fetch_barcode call running in this context
+_current_fetch: contextvars.ContextVar = contextvars.ContextVar("current_fetch", default=None)
+
+# Returned down the method chain instead of a PDF when the payload is unchanged
+_UNCHANGED = object()
+
+# Returned down the method chain instead of a PDF when rendering is deferred
+_DEFERRED = object()
+
+
 class BarcodeRetriever:
     """
     Retrieves barcode PDFs from customs services.
@@ -62,9 +129,26 @@ class BarcodeRetriever:
     V2.0 supports multiple retrieval methods:
     - API: Query data from SOAP API and render PDF locally (faster, more reliable)
     - Web: Scrape from pus.customs.gov.vn website (fallback)
+    - HTTP: Submit the pus.customs.gov.vn form over plain HTTP (no browser)
     - Auto: Try API first, fallback to Web if failed
     """
     
+    # Maximum concurrent browser sessions for web scraping (= driver pool size)
+    WEB_MAX_CONCURRENT = 3
+    
+    # Poll interval for condition-based page waits (seconds)
+    WEB_POLL_INTERVAL = 0.25
+    
+    # ADF's client-side sync check (True when no partial-page request is pending)
+    ADF_SYNCHRONIZED_SCRIPT = """
+        try {
+            if (window.AdfPage && AdfPage.PAGE && AdfPage.PAGE.isSynchronizedWithServer) {
+                return AdfPage.PAGE.isSynchronizedWithServer();
+            }
+        } catch (e) {}
+        return document.readyState === 'complete';
+    """
+    
     # Adaptive selectors with multiple variations for each field
     # Updated December 2024 based on actual website analysis
     FIELD_SELECTORS = {
@@ -120,7 +204,7 @@ class BarcodeRetriever:
         Args:
             config: BarcodeServiceConfig object
             logger: Logger instance
-            retrieval_method: Method to use - 'api', 'web', or 'auto' (default)
+            retrieval_method: Method to use - 'api', 'web', 'http', or 'auto' (default)
         """
         self.config = config
         self.logger = logger
@@ -147,8 +231,9 @@ class BarcodeRetriever:
             timeout=getattr(self.config, 'api_timeout', 30)
         )
         
-        # Initialize PDF generator for API method
-        self._pdf_generator = BarcodePdfGenerator(logger=logger)
+        # Initialize PDF generator for API method (used when the render
+        # pool is not configured with worker processes)
+        self._pdf_generator = BarcodePdfGenerator(logger=logger, config=get_pdf_render_pool().render_config)
         
         # Initialize HTTP session with connection pooling for performance
         self.session = requests.Session()
@@ -169,15 +254,28 @@ class BarcodeRetriever:
             self.session.mount('https://', adapter)
             self.logger.debug(f"HTTP session initialized with max_retries={getattr(self.config, 'max_retries', 1)}, no retry delays")
         
-        # Track failed methods for skipping (reset per batch)
-        # Note: backup_web removed in V2.0 due to CAPTCHA
-        self._failed_methods = {
-            'api': 0,
-            'web': 0,
-            'primary_web': 0,
-            'backup_web': 0
-        }
-        self._skip_threshold = 3  # Skip after 3 consecutive failures
+        # Rolling latency/success stats and a circuit breaker per method
+        self._skip_threshold = 3  # Open a method's breaker after 3 consecutive failures
+        self._router = MethodRouter(
+            methods=(METHOD_API_RENDER, METHOD_API, METHOD_WEB, METHOD_WEB_HTTP, METHOD_PRIMARY_WEB, METHOD_BACKUP_WEB),
+            failure_threshold=self._skip_threshold,
+            recovery_timeout=getattr(self.config, 'method_recovery_timeout', MethodRouter.DEFAULT_RECOVERY_TIMEOUT),
+            probe_interval=getattr(self.config, 'method_probe_interval', MethodRouter.DEFAULT_PROBE_INTERVAL),
+            logger=logger
+        )
+        
+        # Warm browsers reused across declarations; the pool size also caps
+        # concurrent Selenium sessions (worker pools are sized for the API)
+        self._driver_pool = WebDriverPool(
+            factory=lambda: self._setup_webdriver(),
+            size=self.WEB_MAX_CONCURRENT,
+            max_uses=getattr(self.config, 'web_driver_max_uses', WebDriverPool.DEFAULT_MAX_USES),
+            max_memory_mb=getattr(self.config, 'web_driver_max_memory_mb', 0),
+            logger=logger
+        )
+        
+        # Browserless client for the ADF form (created on first use)
+        self._adf_client: Optional[AdfHttpClient] = None
     
     def set_retrieval_method(self, method: str) -> None:
         """
@@ -194,11 +292,8 @@ class BarcodeRetriever:
             old_method = self.retrieval_method
             self.retrieval_method = new_method
             
-            # Reset failed method counters when method changes
-            self._failed_methods = {
-                'api': 0,
-                'web': 0
-            }
+            # Give every method a fresh chance when the mode changes
+            self._router.reset_breakers()
             
             self.logger.info(f"Retrieval method changed from '{old_method.value}' to '{new_method.value}'")
         except ValueError:
@@ -211,7 +306,10 @@ class BarcodeRetriever:
         V2.0: Supports API, Web, and Auto methods.
         - API: Query SOAP API and render PDF locally (faster)
         - Web: Scrape from pus.customs.gov.vn
-        - Auto: Try API, then primary web, then backup web
+        - Auto: Try API render, legacy API, the HTTP web form (ADF page
+          only), primary web and backup web in the order chosen by
+          the latency-aware router (that order until statistics say
+          otherwise), skipping methods whose breaker is open
         
         Args:
             declaration: Declaration object
@@ -219,45 +317,166 @@ class BarcodeRetriever:
         Returns:
             PDF content as bytes, or None if all methods fail
         """
+        # Overlapping runs (scheduler + manual panel) for the same declaration
+        # share one retrieval instead of scraping/rendering it twice, when
+        # they run at the same request priority (see query_bang_ke)
+        key = (declaration.id, declaration.customs_office_code, self.retrieval_method.value, current_priority())
+        return _retrieve_flight.do(key, self._retrieve_barcode_uncoalesced, declaration)
+    
+    def fetch_barcode(self, declaration: Declaration, known_hash: Optional[str] = None,
+                      render: bool = True) -> RetrievalResult:
+        """
+        Retrieve barcode PDF unless its payload is unchanged.
+        
+        Like retrieve_barcode, but when the API or web form data hashes to
+        known_hash (the hash recorded for the PDF already on disk) the PDF
+        is neither rendered nor returned, and the result says 'unchanged'.
+        
+        Args:
+            declaration: Declaration object
+            known_hash: Content hash of the saved PDF, or None to always retrieve
+            render: If False, a PDF that would be rendered locally is not
+                rendered; the result carries the declaration info instead
+                (see render_barcode). Downloaded PDFs are returned as usual.
+            
+        Returns:
+            RetrievalResult with the PDF (or the info to render) and its
+            content hash
+        """
+        key = (declaration.id, declaration.customs_office_code, self.retrieval_method.value, known_hash, render,
+               current_priority())
+        return _retrieve_flight.do(key, self._fetch_uncoalesced, declaration, known_hash, render)
+    
+    def render_barcode(self, result: RetrievalResult) -> Optional[bytes]:
+        """
+        Render the PDF of a fetch_barcode(render=False) result.
+        
+        Args:
+            result: RetrievalResult from fetch_barcode
+            
+        Returns:
+            PDF content as bytes (the fetched PDF if nothing was deferred),
+            or None if generation fails
+        """
+        if not result.needs_render:
+            return result.pdf_content
+        return self._render_pdf(result.info)
+    
+    def _fetch_uncoalesced(self, declaration: Declaration, known_hash: Optional[str],
+                           render: bool = True) -> RetrievalResult:
+        """Run the retrieval chain with payload hashing enabled."""
+        result = RetrievalResult()
+        token = _current_fetch.set((result, known_hash, render))
+        try:
+            pdf_content = self._retrieve_barcode_uncoalesced(declaration)
+        finally:
+            _current_fetch.reset(token)
+        
+        if pdf_content is _UNCHANGED:
+            result.unchanged = True
+        elif pdf_content is _DEFERRED:
+            pass  # result.info is set; rendered by render_barcode
+        elif pdf_content:
+            if result.content_hash is None:
+                # Downloaded PDF: its bytes are the payload
+                result.content_hash = hashlib.sha256(pdf_content).hexdigest()
+            if known_hash is not None and result.content_hash == known_hash:
+                self.logger.info(f"Barcode PDF for {declaration.id} is unchanged")
+                result.unchanged = True
+            else:
+                result.pdf_content = pdf_content
+        return result
+    
+    def _render_config(self) -> BarcodeRenderConfig:
+        """Render settings of whichever renderer _render_pdf will use."""
+        render_pool = get_pdf_render_pool()
+        if render_pool.workers:
+            return render_pool.render_config
+        return self._pdf_generator.config
+    
+    def _payload_unchanged(self, declaration: Declaration, info) -> bool:
+        """
+        Record the payload hash for the running fetch_barcode call.
+        
+        Returns:
+            True if it equals the caller's known hash (skip rendering)
+        """
+        fetch = _current_fetch.get()
+        if fetch is None:
+            return False
+        result, known_hash, _ = fetch
+        result.content_hash = payload_hash(info, self._render_config())
+        if known_hash is not None and result.content_hash == known_hash:
+            self.logger.info(f"Payload unchanged for {declaration.id}, skipping PDF rendering")
+            return True
+        return False
+    
+    def _retrieve_barcode_uncoalesced(self, declaration: Declaration) -> Optional[bytes]:
+        """Run the configured retrieval chain for one declaration."""
         self.logger.info(f"Attempting to retrieve barcode for {declaration.id} using method: {self.retrieval_method.value}")
         self.logger.debug(f"Declaration details: tax_code={declaration.tax_code}, declaration_number={declaration.declaration_number}, customs_office={declaration.customs_office_code}, date={declaration.declaration_date}")
         
         # Determine which methods to try based on retrieval_method setting
         if self.retrieval_method == RetrievalMethod.API:
             # API only
-            return self._try_api_method(declaration)
+            return self._attempt_method(METHOD_API_RENDER, declaration)
         
         elif self.retrieval_method == RetrievalMethod.WEB:
             # Web only
-            return self._try_web_method(declaration)
+            return self._attempt_method(METHOD_WEB, declaration)
+        
+        elif self.retrieval_method == RetrievalMethod.HTTP:
+            # Web form without a browser
+            return self._attempt_method(METHOD_WEB_HTTP, declaration)
         
         else:  # AUTO mode
-            # Try API first, then primary web, then backup web
-            if self._should_try_method('api'):
-                pdf_content = self._try_api(declaration)
+            candidates = [METHOD_API_RENDER, METHOD_API]
+            if self._is_adf_url(self.config.primary_web_url):
+                candidates.append(METHOD_WEB_HTTP)
+            candidates.append(METHOD_PRIMARY_WEB)
+            if getattr(self.config, 'backup_web_url', None):
+                candidates.append(METHOD_BACKUP_WEB)
+            
+            for method in self._router.plan(candidates):
+                pdf_content = self._attempt_method(method, declaration)
                 if pdf_content:
-                    self._record_method_success('api')
                     return pdf_content
-                self._record_method_failure('api')
-
-            if self._should_try_method('primary_web'):
-                pdf_content = self._try_web_scraping(self.config.primary_web_url, declaration)
-                if pdf_content:
-                    self._record_method_success('primary_web')
-                    return pdf_content
-                self._record_method_failure('primary_web')
-
-            backup_url = getattr(self.config, 'backup_web_url', None)
-            if backup_url and self._should_try_method('backup_web'):
-                pdf_content = self._try_web_scraping(backup_url, declaration)
-                if pdf_content:
-                    self._record_method_success('backup_web')
-                    return pdf_content
-                self._record_method_failure('backup_web')
-
+            
             self.logger.error(f"All retrieval methods failed for {declaration.id}")
             return None
     
+    def _attempt_method(self, method: str, declaration: Declaration) -> Optional[bytes]:
+        """
+        Run one retrieval method and feed its outcome and latency to the router.
+        
+        Args:
+            method: Router method name
+            declaration: Declaration object
+            
+        Returns:
+            PDF content as bytes, or None if the method failed
+        """
+        started = time.monotonic()
+        if method == METHOD_API_RENDER:
+            pdf_content = self._try_api_method(declaration)
+        elif method == METHOD_API:
+            pdf_content = self._try_api(declaration)
+        elif method == METHOD_WEB_HTTP:
+            pdf_content = self._try_web_http(declaration)
+        elif method == METHOD_PRIMARY_WEB:
+            pdf_content = self._try_web_scraping(self.config.primary_web_url, declaration)
+        elif method == METHOD_BACKUP_WEB:
+            pdf_content = self._try_web_scraping(self.config.backup_web_url, declaration)
+        else:
+            pdf_content = self._try_web_method(declaration)
+        
+        latency = time.monotonic() - started
+        if pdf_content:
+            self._record_method_success(method, latency)
+        else:
+            self._record_method_failure(method, latency)
+        return pdf_content
+    
     def _try_api_method(self, declaration: Declaration) -> Optional[bytes]:
         """
         Try to retrieve barcode via API and render PDF.
@@ -281,35 +500,56 @@ class BarcodeRetriever:
             
             if not info:
                 self.logger.warning(f"API returned no data for {declaration.id}")
-                self._record_method_failure('api')
                 return None
             
             if info.has_error:
                 self.logger.warning(f"API error for {declaration.id}: {info.thong_bao_loi}")
-                self._record_method_failure('api')
                 return None
             
+            if self._payload_unchanged(declaration, info):
+                return _UNCHANGED
+            
             # Generate PDF from API data
-            pdf_content = self._pdf_generator.generate_pdf(info)
+            pdf_content = self._render_pdf(info)
             
             if pdf_content:
                 self.logger.info(f"Successfully generated PDF via API for {declaration.id}")
-                self._record_method_success('api')
                 return pdf_content
             
             self.logger.warning(f"Failed to generate PDF for {declaration.id}")
-            self._record_method_failure('api')
             return None
             
         except QRCodeApiError as e:
             self.logger.error(f"API error for {declaration.id}: {e}")
-            self._record_method_failure('api')
             return None
         except Exception as e:
             self.logger.error(f"API method failed for {declaration.id}: {e}")
-            self._record_method_failure('api')
             return None
     
+    def _render_pdf(self, info) -> Optional[bytes]:
+        """
+        Render a PDF from declaration info.
+        
+        Uses the PDF render worker processes when configured, so the
+        ReportLab work doesn't hold the GIL in this I/O thread. Inside a
+        fetch_barcode(render=False) call nothing is rendered: the info is
+        kept on the result for render_barcode.
+        
+        Args:
+            info: ContainerDeclarationInfo from the API or web form
+            
+        Returns:
+            PDF content as bytes, or None if generation fails
+        """
+        fetch = _current_fetch.get()
+        if fetch is not None and not fetch[2]:
+            fetch[0].info = info
+            return _DEFERRED
+        render_pool = get_pdf_render_pool()
+        if render_pool.workers:
+            return render_pool.render(info)
+        return self._pdf_generator.generate_pdf(info)
+    
     def _try_web_method(self, declaration: Declaration) -> Optional[bytes]:
         """
         Try to retrieve barcode via web scraping.
@@ -326,16 +566,72 @@ class BarcodeRetriever:
             
             if pdf_content:
                 self.logger.info(f"Successfully retrieved barcode via web for {declaration.id}")
-                self._record_method_success('web')
                 return pdf_content
             
             self.logger.warning(f"Web method returned no content for {declaration.id}")
-            self._record_method_failure('web')
             return None
             
         except Exception as e:
             self.logger.error(f"Web method failed for {declaration.id}: {e}")
-            self._record_method_failure('web')
+            return None
+    
+    @staticmethod
+    def _is_adf_url(url: Optional[str]) -> bool:
+        """Check whether url is the Oracle ADF page on pus.customs.gov.vn"""
+        return bool(url) and 'pus.customs.gov.vn' in url and 'faces' in url
+    
+    def _try_web_http(self, declaration: Declaration) -> Optional[bytes]:
+        """
+        Try to retrieve barcode by replaying the ADF web form over HTTP.
+        
+        Uses the PDF from the page's save link when it returns one,
+        otherwise renders the parsed result locally like the API method.
+        
+        Args:
+            declaration: Declaration object
+            
+        Returns:
+            PDF content as bytes, or None if failed
+        """
+        try:
+            self.logger.debug(f"Trying browserless web form for {declaration.id}")
+            if self._adf_client is None:
+                self._adf_client = AdfHttpClient(
+                    self.config.primary_web_url,
+                    logger=self.logger,
+                    timeout=getattr(self.config, 'web_timeout', self.config.timeout)
+                )
+            result = self._adf_client.fetch(
+                declaration.tax_code,
+                declaration.declaration_number,
+                declaration.customs_office_code,
+                declaration.declaration_date
+            )
+            
+            if result.pdf_content:
+                self.logger.info(f"Successfully retrieved barcode via web form for {declaration.id}")
+                return result.pdf_content
+            
+            if result.info is None:
+                self.logger.warning(f"Web form returned no result for {declaration.id}: {result.message}")
+                return None
+            
+            if self._payload_unchanged(declaration, result.info):
+                return _UNCHANGED
+            
+            pdf_content = self._render_pdf(result.info)
+            if pdf_content:
+                self.logger.info(f"Successfully generated PDF via web form for {declaration.id}")
+                return pdf_content
+            
+            self.logger.warning(f"Failed to generate PDF from web form for {declaration.id}")
+            return None
+            
+        except AdfHttpError as e:
+            self.logger.error(f"Web form error for {declaration.id}: {e}")
+            return None
+        except Exception as e:
+            self.logger.error(f"Web form method failed for {declaration.id}: {e}")
             return None
     
     def _try_api(self, declaration: Declaration) -> Optional[bytes]:
@@ -375,12 +671,24 @@ class BarcodeRetriever:
             # Use api_timeout if available, otherwise fall back to legacy timeout
             timeout = getattr(self.config, 'api_timeout', self.config.timeout)
             
-            response = self.session.post(
-                self.config.api_url,
-                data=soap_request,
-                headers=headers,
-                timeout=timeout
-            )
+            limiter = get_rate_limiter()
+            if not limiter.acquire(timeout=timeout):
+                self.logger.warning(f"Rate limit wait exceeded {timeout}s for {declaration.id}")
+                return None
+            
+            with get_concurrency_controller().slot(timeout) as slot:
+                response = self.session.post(
+                    self.config.api_url,
+                    data=soap_request,
+                    headers=headers,
+                    timeout=timeout
+                )
+                slot.record(
+                    success=response.status_code == 200,
+                    overload=is_overload_status(response.status_code)
+                )
+            if response.status_code == 429:
+                limiter.record_throttled()
             
             if response.status_code == 200:
                 # Parse SOAP response to extract PDF content
@@ -390,6 +698,9 @@ class BarcodeRetriever:
                 self.logger.warning(f"API returned status code {response.status_code}")
                 return None
                 
+        except SlotTimeoutError as e:
+            self.logger.warning(f"{e} for {declaration.id}")
+            return None
         except requests.Timeout:
             timeout = getattr(self.config, 'api_timeout', self.config.timeout)
             self.logger.error(f"API request timed out after {timeout}s")
@@ -450,32 +761,43 @@ class BarcodeRetriever:
         Returns:
             PDF content as bytes, or None if failed
         """
-        driver = None
+        # Browsers are heavy: borrow a warm one (waits while all are busy)
+        pooled = None
+        healthy = False
         try:
-            # Set up WebDriver
-            self.logger.debug(f"Setting up WebDriver for {url}")
-            driver = self._setup_webdriver()
+            self.logger.debug(f"Acquiring WebDriver for {url}")
+            pooled = self._driver_pool.acquire()
+            if pooled is None:
+                self.logger.error("WebDriver pool is closed")
+                return None
+            driver = pooled.driver
             
-            # Navigate to URL
+            # Navigate to URL (page loads count against the shared request rate)
+            timeout = getattr(self.config, 'web_timeout', self.config.timeout)
             self.logger.debug(f"Navigating to {url}")
+            if not get_rate_limiter().acquire(timeout=timeout):
+                self.logger.warning(f"Rate limit wait exceeded {timeout}s for {declaration.id}")
+                healthy = True
+                return None
             driver.get(url)
             self.logger.debug(f"Navigation complete, waiting for page to load")
             
             # Wait for page to load (use web_timeout if available)
-            timeout = getattr(self.config, 'web_timeout', self.config.timeout)
             WebDriverWait(driver, timeout).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             self.logger.debug(f"Page body loaded")
             
             # Detect website type and use appropriate method
-            if 'pus.customs.gov.vn' in url and 'faces' in url:
+            if self._is_adf_url(url):
                 # Oracle ADF website - use special handling
                 self.logger.debug("Detected Oracle ADF website, using AJAX handling")
-                return self._handle_oracle_adf_website(driver, declaration)
+                result = self._handle_oracle_adf_website(driver, declaration)
             else:
                 # Standard website - use normal form submission
-                return self._handle_standard_website(driver, declaration)
+                result = self._handle_standard_website(driver, declaration)
+            healthy = True
+            return result
                 
         except TimeoutException:
             self.logger.error(f"Web scraping timed out for {url}")
@@ -487,8 +809,9 @@ class BarcodeRetriever:
             self.logger.error(f"Web scraping failed for {url}: {e}")
             return None
         finally:
-            if driver:
-                driver.quit()
+            # A driver whose session failed is quit instead of reused
+            if pooled is not None:
+                self._driver_pool.release(pooled, healthy)
     
     def _handle_oracle_adf_website(self, driver: webdriver.Chrome, declaration: Declaration) -> Optional[bytes]:
         """
@@ -515,21 +838,14 @@ class BarcodeRetriever:
             
             self.logger.debug(f"Filling Oracle ADF form for {declaration.id}")
             
-            # Wait for ADF to fully load - Oracle ADF needs time to initialize JavaScript
-            # Try multiple times with increasing wait
-            form_loaded = False
-            for wait_time in [3, 5, 10]:
-                time.sleep(wait_time)
-                try:
-                    driver.find_element(By.ID, "pt1:it1::content")
-                    self.logger.debug(f"ADF form fields loaded after {wait_time}s wait")
-                    form_loaded = True
-                    break
-                except:
-                    self.logger.debug(f"Form fields not found after {wait_time}s, retrying...")
-            
-            if not form_loaded:
-                self.logger.error("ADF form fields not found after multiple attempts")
+            # Wait for ADF to initialize its JavaScript and render the form
+            try:
+                WebDriverWait(driver, timeout, poll_frequency=self.WEB_POLL_INTERVAL).until(
+                    EC.presence_of_element_located((By.ID, "pt1:it1::content"))
+                )
+                self.logger.debug("ADF form fields loaded")
+            except TimeoutException:
+                self.logger.error(f"ADF form fields not found after {timeout}s")
                 return None
             
             # Fill form fields using JavaScript (more reliable for ADF)
@@ -546,8 +862,12 @@ class BarcodeRetriever:
             # Field 4: Ngày tờ khai (Declaration Date) - dd/mm/yyyy format
             self._fill_adf_field(driver, 'pt1:it4::content', date_str)
             
-            # Wait a bit for ADF to process field changes
-            time.sleep(1)
+            # Wait for ADF to process the field changes (change events may
+            # trigger partial-page requests)
+            self._wait_for_adf_idle(driver, timeout=5)
+            
+            # Snapshot the result region so the wait below can tell when it changes
+            content_before = self._get_adf_content_text(driver)
             
             # Find and click the "Lấy thông tin" button
             # In Oracle ADF, buttons are often <a> tags with role="button"
@@ -557,14 +877,11 @@ class BarcodeRetriever:
                 self.logger.error("Failed to click ADF submit button")
                 return None
             
-            # Wait for AJAX response - need longer wait for server to process
+            # Wait for the AJAX response to render the result (server can be slow)
             self.logger.debug("Waiting for ADF AJAX response...")
-            time.sleep(10)  # Wait 10 seconds for AJAX response (server can be slow)
-            
-            # Wait for result content to appear
             try:
-                WebDriverWait(driver, timeout).until(
-                    lambda d: self._check_adf_result_loaded(d)
+                WebDriverWait(driver, timeout, poll_frequency=self.WEB_POLL_INTERVAL).until(
+                    lambda d: self._adf_result_ready(d, content_before)
                 )
                 self.logger.debug("ADF result loaded")
             except TimeoutException:
@@ -705,6 +1022,79 @@ class BarcodeRetriever:
         self.logger.error("Could not find or click ADF submit button")
         return False
     
+    def _is_adf_synchronized(self, driver: webdriver.Chrome) -> bool:
+        """
+        Check whether ADF has no partial-page request in flight
+        
+        Args:
+            driver: WebDriver instance
+            
+        Returns:
+            True if the page is synchronized with the server (or the check
+            isn't available)
+        """
+        try:
+            return bool(driver.execute_script(self.ADF_SYNCHRONIZED_SCRIPT))
+        except Exception:
+            return True
+    
+    def _wait_for_adf_idle(self, driver: webdriver.Chrome, timeout: float) -> bool:
+        """
+        Wait until ADF has finished its pending partial-page requests
+        
+        Args:
+            driver: WebDriver instance
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            True if ADF became idle, False on timeout
+        """
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(self._is_adf_synchronized)
+            return True
+        except TimeoutException:
+            self.logger.debug(f"ADF still busy after {timeout}s")
+            return False
+    
+    def _get_adf_content_text(self, driver: webdriver.Chrome) -> str:
+        """Text of the ADF result region ('' if missing)"""
+        try:
+            return driver.find_element(By.ID, "content").text.strip()
+        except Exception:
+            return ""
+    
+    def _adf_result_ready(self, driver: webdriver.Chrome, content_before: str) -> bool:
+        """
+        Wait condition for the ADF result after submit
+        
+        The result is ready when the save link or a barcode table is shown,
+        or (for "not found" and error messages) when the result region text
+        has changed and ADF has no request in flight.
+        
+        Args:
+            driver: WebDriver instance
+            content_before: Result region text captured before the submit
+            
+        Returns:
+            True if the result has loaded, False otherwise
+        """
+        if not self._is_adf_synchronized(driver):
+            return False
+        try:
+            driver.find_element(By.ID, "lbl_BanLuu")
+            return True
+        except Exception:
+            pass
+        try:
+            for table in driver.find_elements(By.TAG_NAME, "table"):
+                text = table.text.lower()
+                if "container" in text or "mã vạch" in text:
+                    return True
+        except Exception:
+            pass
+        content = self._get_adf_content_text(driver)
+        return bool(content) and content != content_before
+    
     def _check_adf_result_loaded(self, driver: webdriver.Chrome) -> bool:
         """
         Check if ADF result content has loaded
@@ -954,7 +1344,7 @@ class BarcodeRetriever:
             """)
             
             self.logger.debug("Prepared print-friendly view")
-            time.sleep(0.5)
+            self._wait_for_layout(driver)
             
             # Step 2: Use Chrome DevTools Protocol to print page to PDF
             try:
@@ -1051,6 +1441,42 @@ class BarcodeRetriever:
             self.logger.debug(f"HTML to PDF fallback failed: {e}")
             return None
     
+    def _wait_for_layout(self, driver: webdriver.Chrome) -> None:
+        """
+        Wait until style changes have been laid out (two animation frames)
+        
+        Args:
+            driver: WebDriver instance
+        """
+        try:
+            driver.set_script_timeout(5)
+            driver.execute_async_script(
+                "var done = arguments[arguments.length - 1];"
+                "requestAnimationFrame(function() { requestAnimationFrame(function() { done(true); }); });"
+            )
+        except Exception:
+            # Headless pages without rendering may never fire animation frames
+            time.sleep(0.5)
+    
+    def _pdf_available(self, driver: webdriver.Chrome) -> bool:
+        """
+        Wait condition for the standard website after submit
+        
+        Args:
+            driver: WebDriver instance
+            
+        Returns:
+            True if a PDF link, a PDF iframe or a PDF page is present
+        """
+        try:
+            if driver.current_url.endswith('.pdf'):
+                return True
+            if driver.find_elements(By.XPATH, "//a[contains(@href, '.pdf')]"):
+                return True
+            return bool(driver.find_elements(By.XPATH, "//iframe[contains(@src, '.pdf')]"))
+        except Exception:
+            return False
+    
     def _handle_standard_website(self, driver: webdriver.Chrome, declaration: Declaration) -> Optional[bytes]:
         """
         Handle standard website with normal form submission
@@ -1082,7 +1508,11 @@ class BarcodeRetriever:
             submit_button.click()
             
             # Wait for PDF generation
-            time.sleep(3)
+            timeout = getattr(self.config, 'web_timeout', self.config.timeout)
+            try:
+                WebDriverWait(driver, timeout, poll_frequency=self.WEB_POLL_INTERVAL).until(self._pdf_available)
+            except TimeoutException:
+                self.logger.debug("No PDF link appeared after submit")
             
             # Try to download PDF
             pdf_content = self._download_pdf(driver)
@@ -1448,52 +1878,83 @@ class BarcodeRetriever:
     
     def _should_try_method(self, method_name: str) -> bool:
         """
-        Check if a method should be tried based on failure count
+        Check if a method should be tried (its circuit breaker is not open)
         
         Args:
-            method_name: Name of the method ('api', 'primary_web', 'backup_web')
+            method_name: Name of the method ('api_render', 'api', 'primary_web', 'backup_web', 'web')
             
         Returns:
             True if method should be tried, False if it should be skipped
         """
-        return self._failed_methods.get(method_name, 0) < self._skip_threshold
+        return self._router.is_available(method_name)
     
-    def _record_method_failure(self, method_name: str) -> None:
+    def _record_method_failure(self, method_name: str, latency: float = 0.0) -> None:
         """
         Record a method failure
         
         Args:
             method_name: Name of the method that failed
+            latency: Attempt duration in seconds
         """
-        self._failed_methods[method_name] = self._failed_methods.get(method_name, 0) + 1
-        if self._failed_methods[method_name] >= self._skip_threshold:
-            self.logger.warning(
-                f"Method '{method_name}' has failed {self._failed_methods[method_name]} times, "
-                f"will be skipped for remaining declarations in this batch"
-            )
+        self._router.record(method_name, False, latency)
     
-    def _record_method_success(self, method_name: str) -> None:
+    def _record_method_success(self, method_name: str, latency: float = 0.0) -> None:
         """
         Record a method success (resets failure count)
         
         Args:
             method_name: Name of the method that succeeded
+            latency: Attempt duration in seconds
         """
-        self._failed_methods[method_name] = 0
+        self._router.record(method_name, True, latency)
     
-    def reset_method_skip_list(self) -> None:
+    @property
+    def _failed_methods(self) -> dict:
+        """Consecutive failure count per method."""
+        return self._router.consecutive_failures()
+    
+    def get_method_stats(self) -> dict:
+        """Get per-method routing statistics (see MethodRouter.get_stats)."""
+        return self._router.get_stats()
+    
+    def warm_up_connections(self, workers: int) -> int:
         """
-        Reset the method skip list for a new batch
+        Pre-open keep-alive connections to the QRCode API before a batch.
+        
+        The API client shares the process-wide session pool, so the warmed
+        connections are reused by every worker thread. In web mode the
+        browser pool is started in the background instead.
         
-        This should be called at the start of processing a new batch of declarations
+        Args:
+            workers: Number of concurrent workers in the coming batch
+            
+        Returns:
+            Number of connections warmed (0 when the API method is not used)
         """
-        self._failed_methods = {
-            'api': 0,
-            'web': 0,
-            'primary_web': 0,
-            'backup_web': 0
-        }
-        self.logger.debug("Method skip list reset for new batch")
+        if workers <= 0:
+            return 0
+        if self.retrieval_method == RetrievalMethod.WEB:
+            # Browsers take seconds to start: warm them while the batch begins
+            threading.Thread(
+                target=self._driver_pool.warm_up, args=(workers,),
+                name="webdriver-warmup", daemon=True
+            ).start()
+            return 0
+        if self.retrieval_method == RetrievalMethod.HTTP:
+            try:
+                pool = get_http_session_pool(self.logger)
+                pool.ensure_capacity(workers)
+                return pool.warm_up(self.config.primary_web_url, workers)
+            except Exception as e:
+                self.logger.debug(f"Connection warm-up failed: {e}")
+                return 0
+        if self.retrieval_method != RetrievalMethod.API:
+            return 0
+        try:
+            return self._api_client.warm_up(workers)
+        except Exception as e:
+            self.logger.debug(f"Connection warm-up failed: {e}")
+            return 0
     
     def set_retrieval_method(self, method: str) -> None:
         """
@@ -1508,8 +1969,13 @@ class BarcodeRetriever:
         except ValueError:
             self.logger.warning(f"Invalid retrieval method '{method}', keeping current: {self.retrieval_method.value}")
     
+    def get_driver_pool_stats(self) -> dict:
+        """Get WebDriver pool statistics (see WebDriverPool.get_stats)."""
+        return self._driver_pool.get_stats()
+    
     def cleanup(self) -> None:
         """Clean up resources"""
+        self._driver_pool.close()
         if self._webdriver:
             try:
                 self._webdriver.quit()
@@ -0,0 +1,332 @@
+"""
+Adaptive Concurrency Controller Module
+
+AIMD (additive-increase / multiplicative-decrease) limit on the number of
+concurrent requests to the customs QRCode API, shared by every caller
+(BarcodeRetriever, ClearanceChecker, manual download panel, asyncio batch
+engine).
+
+- Each healthy response (fast and successful) grows the limit by 1/limit,
+  i.e. about +1 per round trip of the whole window.
+- A timeout, connection error or HTTP 5xx/429 halves the limit, at most
+  once per `decrease_cooldown` seconds so a burst of failures from the
+  same window does not collapse it to the minimum.
+- Slow but successful responses hold the limit steady.
+
+Worker pools are sized to max_limit; the controller decides how many of
+those workers may talk to the API at the same time.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from logging_system.logger import Logger
+
+
+class SlotTimeoutError(TimeoutError):
+    """Raised by AdaptiveConcurrencyController.slot() when no slot frees up in time"""
+    pass
+
+
+class AdaptiveConcurrencyController:
+    """
+    Thread-safe AIMD concurrency limiter.
+
+    Usage:
+        with controller.slot(timeout) as slot:
+            response = session.post(...)
+            slot.record(success=response.ok, overload=response.status_code >= 500)
+    """
+
+    DEFAULT_MIN_LIMIT = 1
+    DEFAULT_MAX_LIMIT = 12
+    DEFAULT_INITIAL_LIMIT = 3
+    DEFAULT_LATENCY_TARGET = 2.0  # seconds
+    DEFAULT_DECREASE_COOLDOWN = 2.0  # seconds
+    DECREASE_FACTOR = 0.5
+
+    def __init__(
+        self,
+        min_limit: int = DEFAULT_MIN_LIMIT,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        latency_target: float = DEFAULT_LATENCY_TARGET,
+        decrease_cooldown: float = DEFAULT_DECREASE_COOLDOWN,
+        logger: Optional[Logger] = None
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            min_limit: Lowest concurrency the controller will back off to
+            max_limit: Highest concurrency the controller will grow to
+            initial_limit: Starting concurrency
+            latency_target: Latency (seconds) below which a response counts as healthy
+            decrease_cooldown: Minimum seconds between two limit decreases
+            logger: Optional logger instance
+        """
+        self.logger = logger
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        # Coroutines waiting in acquire_async, woken when a slot may be free
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+        # Metrics
+        self._successes = 0
+        self._overloads = 0
+        self._increases = 0
+        self._decreases = 0
+
+        self.configure(min_limit, max_limit, latency_target, initial_limit, decrease_cooldown)
+
+    def configure(
+        self,
+        min_limit: int,
+        max_limit: int,
+        latency_target: Optional[float] = None,
+        initial_limit: Optional[int] = None,
+        decrease_cooldown: Optional[float] = None
+    ) -> None:
+        """
+        Update limits at runtime (e.g. from BarcodeServiceConfig).
+
+        Args:
+            min_limit: Lowest concurrency
+            max_limit: Highest concurrency
+            latency_target: Healthy latency threshold in seconds
+            initial_limit: Optional new current limit
+            decrease_cooldown: Minimum seconds between two limit decreases
+        """
+        with self._condition:
+            self.min_limit = max(1, int(min_limit))
+            self.max_limit = max(self.min_limit, int(max_limit))
+            if latency_target is not None:
+                self.latency_target = float(latency_target)
+            if decrease_cooldown is not None:
+                self.decrease_cooldown = max(0.0, float(decrease_cooldown))
+            current = initial_limit if initial_limit is not None else getattr(self, '_limit', self.min_limit)
+            self._limit = float(min(self.max_limit, max(self.min_limit, current)))
+            self._condition.notify_all()
+            self._wake_async_waiters()
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently holding a slot."""
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until a slot is free.
+
+        Args:
+            timeout: Maximum seconds to wait (None = wait forever)
+
+        Returns:
+            True if a slot was acquired, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._in_flight >= self.limit:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._in_flight += 1
+            return True
+
+    async def acquire_async(self, timeout: Optional[float] = None) -> bool:
+        """
+        acquire() for coroutines: waits on the event loop until release()
+        frees a slot. A cancelled waiter holds no slot.
+
+        Args:
+            timeout: Maximum seconds to wait (None = wait forever)
+
+        Returns:
+            True if a slot was acquired, False on timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._condition:
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return True
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    return False
+                await asyncio.wait_for(waiter[1], remaining)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                with self._condition:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def _wake_async_waiters(self) -> None:
+        """Let every acquire_async waiter check for a slot again (lock held)."""
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # Event loop already closed
+
+    def try_acquire(self) -> bool:
+        """Acquire a slot without blocking. Returns False if none is free."""
+        with self._condition:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: float, success: bool, overload: bool = False) -> None:
+        """
+        Release a slot and feed the outcome back into the limit.
+
+        Args:
+            latency: Request duration in seconds
+            success: True if the request produced a usable response
+            overload: True for timeouts, connection errors and HTTP 5xx/429
+        """
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+
+            if overload:
+                self._overloads += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    old = self.limit
+                    self._limit = max(float(self.min_limit), self._limit * self.DECREASE_FACTOR)
+                    self._last_decrease = now
+                    self._decreases += 1
+                    if self.logger and self.limit != old:
+                        self.logger.info(f"API concurrency reduced {old} -> {self.limit} (overload)")
+            elif success:
+                self._successes += 1
+                if latency <= self.latency_target and self._limit < self.max_limit:
+                    old = self.limit
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / max(1.0, self._limit))
+                    if self.limit != old:
+                        self._increases += 1
+                        if self.logger:
+                            self.logger.debug(f"API concurrency raised {old} -> {self.limit}")
+
+            self._condition.notify_all()
+            self._wake_async_waiters()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """
+        Hold a slot for the duration of a request.
+
+        Yields a _Slot; call slot.record(success, overload) to report the
+        outcome. Exceptions escaping the block count as overload when they
+        are timeouts or connection errors, otherwise as neutral failures.
+
+        Args:
+            timeout: Maximum seconds to wait for the slot (None = wait forever)
+
+        Raises:
+            SlotTimeoutError: If no slot was free within timeout
+        """
+        if not self.acquire(timeout):
+            raise SlotTimeoutError(f"No API concurrency slot free within {timeout}s (limit {self.limit})")
+        slot = _Slot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except Exception as e:
+            if slot.success is None:
+                slot.record(success=False, overload=is_overload_error(e))
+            raise
+        finally:
+            if slot.success is None:
+                slot.record(success=False)
+            self.release(time.monotonic() - started, slot.success, slot.overload)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get controller metrics.
+
+        Returns:
+            Dictionary with current limit, bounds, in-flight count and
+            counters for successes, overloads, increases and decreases
+        """
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'in_flight': self._in_flight,
+                'successes': self._successes,
+                'overloads': self._overloads,
+                'increases': self._increases,
+                'decreases': self._decreases,
+            }
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Slot:
+    """Outcome holder for AdaptiveConcurrencyController.slot()."""
+
+    def __init__(self):
+        self.success: Optional[bool] = None
+        self.overload = False
+
+    def record(self, success: bool, overload: bool = False) -> None:
+        self.success = success
+        self.overload = overload
+
+
+def is_overload_status(status_code: int) -> bool:
+    """True for HTTP statuses that signal the server is struggling."""
+    if not isinstance(status_code, int):
+        return False
+    return status_code == 429 or status_code >= 500
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """True for exceptions that signal the server is struggling."""
+    import asyncio
+    import requests
+
+    return isinstance(error, (
+        requests.Timeout,
+        requests.ConnectionError,
+        asyncio.TimeoutError,
+        TimeoutError,
+        ConnectionError,
+    ))
+
+
+# Global instance
+_concurrency_controller: Optional[AdaptiveConcurrencyController] = None
+_concurrency_controller_lock = threading.Lock()
+
+
+def get_concurrency_controller(logger: Optional[Logger] = None) -> AdaptiveConcurrencyController:
+    """Get or create the process-wide API concurrency controller."""
+    global _concurrency_controller
+    with _concurrency_controller_lock:
+        if _concurrency_controller is None:
+            _concurrency_controller = AdaptiveConcurrencyController(logger=logger)
+        elif logger and _concurrency_controller.logger is None:
+            _concurrency_controller.logger = logger
+        return _concurrency_controller
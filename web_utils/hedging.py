@@ -0,0 +1,303 @@
+"""
+Request Hedging Module
+
+Cuts tail latency of QRCode API calls. Most QueryBangKeDanhSachContainer
+requests answer in under a second, but a few stall for the full timeout.
+When hedging is enabled, a request that hasn't answered within a
+percentile of recent latencies gets a second identical request, and
+whichever answers first wins; the loser is cancelled (async client) or
+abandoned and its response discarded (sync client).
+
+Safeguards:
+- No hedging until enough latency samples exist to estimate the percentile.
+- The hedge delay never drops below `min_delay`.
+- Hedges are limited to `max_ratio` of requests, so a slow service
+  doesn't get twice the traffic; hedges also take rate-limiter tokens
+  and concurrency slots like any other request.
+- The hedge delay starts when the request is sent, not while it waits
+  for its rate-limiter token and concurrency slot (the recorded latencies
+  don't include those waits either). Request functions report that
+  moment with mark_request_sent().
+- No hedges while requests are queued at the rate limiter: the hedge
+  would only take a token from a saturated budget.
+"""
+
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional
+
+from logging_system.logger import Logger
+from web_utils.rate_limiter import TokenBucketRateLimiter, get_rate_limiter
+
+
+# Set by HedgePolicy.call for its primary request; see mark_request_sent()
+_sent_event: contextvars.ContextVar = contextvars.ContextVar("hedge_sent_event", default=None)
+
+
+def mark_request_sent() -> None:
+    """
+    Report that the request of the current call now holds its token and
+    slot and is being sent; the hedge delay of HedgePolicy.call starts here.
+    """
+    event = _sent_event.get()
+    if event is not None:
+        event.set()
+
+
+class LatencyTracker:
+    """Rolling window of request latencies with percentile lookup."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=max(1, int(window)))
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(float(latency))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Nearest-rank percentile of the window.
+
+        Args:
+            p: Percentile in 0..100
+
+        Returns:
+            Latency in seconds, or None if there are no samples
+        """
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        rank = int(round(p / 100.0 * (len(ordered) - 1)))
+        return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+class HedgePolicy:
+    """
+    Decides when to send a hedge request and runs hedged calls.
+
+    Usage (sync):
+        result = policy.call(send_request)
+
+    The async client uses hedge_delay()/try_start_hedge()/record_outcome()
+    directly with asyncio tasks.
+    """
+
+    DEFAULT_PERCENTILE = 95.0
+    DEFAULT_MIN_DELAY = 1.0  # seconds
+    DEFAULT_MAX_RATIO = 0.1
+    DEFAULT_MIN_SAMPLES = 20
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = DEFAULT_PERCENTILE,
+        min_delay: float = DEFAULT_MIN_DELAY,
+        max_ratio: float = DEFAULT_MAX_RATIO,
+        min_samples: int = DEFAULT_MIN_SAMPLES,
+        window: int = 200,
+        logger: Optional[Logger] = None
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            enabled: Send hedge requests at all
+            percentile: Latency percentile after which a request is hedged
+            min_delay: Lower bound on the hedge delay in seconds
+            max_ratio: Maximum hedges as a fraction of requests
+            min_samples: Latency samples needed before hedging starts
+            window: Number of recent latencies kept
+            logger: Optional logger instance
+        """
+        self.logger = logger
+        self.tracker = LatencyTracker(window)
+        self.min_samples = max(1, int(min_samples))
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._budget_denied = 0
+        self._queue_denied = 0
+        self.configure(enabled, percentile, min_delay, max_ratio)
+
+    def configure(
+        self,
+        enabled: bool,
+        percentile: float = DEFAULT_PERCENTILE,
+        min_delay: float = DEFAULT_MIN_DELAY,
+        max_ratio: float = DEFAULT_MAX_RATIO
+    ) -> None:
+        """
+        Update the policy settings (latency history is kept).
+
+        Args:
+            enabled: Send hedge requests at all
+            percentile: Latency percentile after which a request is hedged
+            min_delay: Lower bound on the hedge delay in seconds
+            max_ratio: Maximum hedges as a fraction of requests
+        """
+        with self._lock:
+            self.enabled = bool(enabled)
+            self.percentile = min(max(float(percentile), 1.0), 99.9)
+            self.min_delay = max(0.0, float(min_delay))
+            self.max_ratio = max(0.0, float(max_ratio))
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Seconds to wait before hedging a request that starts now.
+
+        Returns:
+            Delay in seconds, or None if this request should not be hedged
+            (disabled or not enough latency samples yet)
+        """
+        with self._lock:
+            self._requests += 1
+            if not self.enabled or self.max_ratio <= 0:
+                return None
+            percentile, min_delay = self.percentile, self.min_delay
+        if len(self.tracker) < self.min_samples:
+            return None
+        return max(self.tracker.percentile(percentile), min_delay)
+
+    def try_start_hedge(self, limiter: Optional[TokenBucketRateLimiter] = None) -> bool:
+        """
+        Take a hedge from the budget.
+
+        Args:
+            limiter: Rate limiter the hedge would take its token from; no
+                hedge while requests are queued there
+
+        Returns:
+            True if a hedge request may be sent, False if the budget is
+            spent or the limiter has queued requests
+        """
+        queued = limiter.queued() if limiter is not None else 0
+        with self._lock:
+            if queued:
+                self._queue_denied += 1
+                return False
+            if self._hedged + 1 > self.max_ratio * self._requests + 1:
+                self._budget_denied += 1
+                return False
+            self._hedged += 1
+            return True
+
+    def record_latency(self, latency: float) -> None:
+        """Record the latency of a request that got an answer."""
+        self.tracker.record(latency)
+
+    def record_outcome(self, hedge_won: bool) -> None:
+        """Record which request of a hedged pair answered first."""
+        if hedge_won:
+            with self._lock:
+                self._hedge_wins += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+            return self._executor
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call fn, sending an identical second call if the first is slow.
+
+        fn must be idempotent. Without a hedge delay it runs directly in the
+        calling thread. Otherwise both calls run on worker threads; the first
+        to return wins, and an exception only propagates if both calls fail.
+        The losing call can't be interrupted and runs to completion, but its
+        result is discarded.
+
+        The hedge delay is counted from fn's mark_request_sent() call (or
+        from its return, if it never calls it).
+
+        Args:
+            fn: Request function
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Result of whichever call returned first
+        """
+        delay = self.hedge_delay()
+        if delay is None:
+            return fn(*args, **kwargs)
+
+        executor = self._get_executor()
+        # Each call gets its own copy of the context (request priority etc.)
+        sent = threading.Event()
+        context = contextvars.copy_context()
+        context.run(_sent_event.set, sent)
+        primary = executor.submit(context.run, fn, *args, **kwargs)
+        primary.add_done_callback(lambda _: sent.set())
+        # Time spent queued for a token or slot isn't latency
+        sent.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.try_start_hedge(get_rate_limiter()):
+            return primary.result()
+
+        if self.logger:
+            self.logger.debug(f"Request exceeded p{self.percentile:g} latency ({delay:.2f}s), sending hedge request")
+        hedge = executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.record_outcome(future is hedge)
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get hedging metrics.
+
+        Returns:
+            Dictionary with enabled flag, request and hedge counts, hedge
+            wins, budget denials, hedges skipped because requests were
+            queued at the rate limiter, and the current hedge delay
+        """
+        with self._lock:
+            stats = {
+                'enabled': self.enabled,
+                'percentile': self.percentile,
+                'requests': self._requests,
+                'hedged': self._hedged,
+                'hedge_wins': self._hedge_wins,
+                'budget_denied': self._budget_denied,
+                'queue_denied': self._queue_denied,
+                'samples': len(self.tracker),
+            }
+            percentile, min_delay = self.percentile, self.min_delay
+        current = self.tracker.percentile(percentile)
+        stats['current_delay'] = max(current, min_delay) if current is not None else None
+        return stats
+
+
+# Global instance
+_hedge_policy: Optional[HedgePolicy] = None
+_hedge_policy_lock = threading.Lock()
+
+
+def get_hedge_policy(logger: Optional[Logger] = None) -> HedgePolicy:
+    """Get or create the process-wide hedge policy (disabled until configured)."""
+    global _hedge_policy
+    with _hedge_policy_lock:
+        if _hedge_policy is None:
+            _hedge_policy = HedgePolicy(enabled=False, logger=logger)
+        elif logger and _hedge_policy.logger is None:
+            _hedge_policy.logger = logger
+        return _hedge_policy
@@ -0,0 +1,190 @@
+"""
+HTTP Session Pool Module
+
+Process-wide pooled HTTP session shared by every caller of the customs
+SOAP services (ClearanceChecker, BarcodeRetriever, manual download panel).
+
+Keeping one keep-alive connection pool per process avoids paying a fresh
+TCP handshake for every declaration and every retry. The pool is sized to
+the number of concurrent workers and can be pre-warmed before a batch.
+
+Metrics for connection reuse are read from the underlying urllib3 pools.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from logging_system.logger import Logger
+
+
+class HttpSessionPool:
+    """
+    Shared keep-alive HTTP session with connection reuse metrics.
+
+    The session itself is thread-safe for the simple request/response
+    calls made by the SOAP clients, so a single instance is shared across
+    all worker threads.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    WARM_UP_TIMEOUT = 5
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, logger: Optional[Logger] = None):
+        """
+        Initialize the session pool.
+
+        Args:
+            pool_size: Maximum number of keep-alive connections per host
+            logger: Optional logger instance
+        """
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._pool_size = max(1, int(pool_size))
+
+        # Counters carried over from adapters replaced by ensure_capacity()
+        self._retired_requests = 0
+        self._retired_connections = 0
+        self._warm_ups = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'text/xml; charset=utf-8',
+            'Accept': 'text/xml'
+        })
+        self._adapter = self._mount_adapter(self._pool_size)
+
+    @property
+    def pool_size(self) -> int:
+        """Current maximum number of keep-alive connections per host."""
+        return self._pool_size
+
+    def _mount_adapter(self, pool_size: int) -> HTTPAdapter:
+        """Mount a new pooled adapter for http and https."""
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        return adapter
+
+    def ensure_capacity(self, workers: int) -> None:
+        """
+        Grow the pool so it can keep one connection alive per worker.
+
+        Connections beyond pool_maxsize would otherwise be opened and
+        discarded after each request, defeating keep-alive.
+
+        Args:
+            workers: Number of threads that will use the session concurrently
+        """
+        with self._lock:
+            if workers <= self._pool_size:
+                return
+
+            # The old adapter is not closed so in-flight requests can finish;
+            # its idle connections are released when it is garbage collected.
+            requests_done, connections = self._adapter_counters(self._adapter)
+            self._retired_requests += requests_done
+            self._retired_connections += connections
+
+            self._pool_size = workers
+            self._adapter = self._mount_adapter(workers)
+
+        if self.logger:
+            self.logger.debug(f"HTTP session pool resized to {workers} connections")
+
+    def warm_up(self, url: str, connections: Optional[int] = None) -> int:
+        """
+        Open keep-alive connections to a host before a batch starts.
+
+        Issues concurrent lightweight GET requests so that the pool holds
+        up to `connections` idle sockets when the first real request is sent.
+
+        Args:
+            url: Service URL to warm (any URL on the target host)
+            connections: Number of connections to open (default: pool size)
+
+        Returns:
+            Number of warm-up requests that succeeded
+        """
+        count = min(connections or self._pool_size, self._pool_size)
+        if count <= 0 or not url:
+            return 0
+
+        def _touch() -> bool:
+            try:
+                response = self.session.get(url, timeout=self.WARM_UP_TIMEOUT)
+                # Read the body so the connection is returned to the pool
+                response.content
+                return True
+            except requests.RequestException:
+                return False
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            results = list(executor.map(lambda _: _touch(), range(count)))
+
+        succeeded = sum(1 for ok in results if ok)
+        with self._lock:
+            self._warm_ups += 1
+
+        if self.logger:
+            self.logger.debug(f"Warmed {succeeded}/{count} connections to {url}")
+        return succeeded
+
+    @staticmethod
+    def _adapter_counters(adapter: HTTPAdapter) -> tuple:
+        """Sum request and connection counters across an adapter's host pools."""
+        total_requests = 0
+        total_connections = 0
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            total_requests += getattr(pool, 'num_requests', 0)
+            total_connections += getattr(pool, 'num_connections', 0)
+        return total_requests, total_connections
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get connection reuse metrics.
+
+        Returns:
+            Dictionary with request count, connections opened, reused
+            requests, reuse ratio, pool size and number of warm-ups
+        """
+        with self._lock:
+            requests_done, connections = self._adapter_counters(self._adapter)
+            requests_done += self._retired_requests
+            connections += self._retired_connections
+            reused = max(0, requests_done - connections)
+            return {
+                'requests': requests_done,
+                'connections_opened': connections,
+                'connections_reused': reused,
+                'reuse_ratio': (reused / requests_done) if requests_done else 0.0,
+                'pool_size': self._pool_size,
+                'warm_ups': self._warm_ups,
+            }
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+
+
+# Global instance
+_http_session_pool: Optional[HttpSessionPool] = None
+_http_session_pool_lock = threading.Lock()
+
+
+def get_http_session_pool(logger: Optional[Logger] = None) -> HttpSessionPool:
+    """Get or create the process-wide HTTP session pool."""
+    global _http_session_pool
+    with _http_session_pool_lock:
+        if _http_session_pool is None:
+            _http_session_pool = HttpSessionPool(logger=logger)
+        elif logger and _http_session_pool.logger is None:
+            _http_session_pool.logger = logger
+        return _http_session_pool
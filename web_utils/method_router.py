@@ -0,0 +1,255 @@
+"""
+Retrieval Method Router Module
+
+Chooses the order in which BarcodeRetriever tries its retrieval methods
+(API + local render, legacy GetBarcode, browserless web form, primary
+web, backup web) from
+rolling per-method statistics instead of a fixed chain.
+
+- Each method keeps a rolling window of recent outcomes (success, latency).
+- Healthy methods that have succeeded recently are tried fastest-first
+  (average success latency divided by success rate); methods without data
+  keep their configured order; methods that have only failed go last.
+- Every method has a circuit breaker: after `failure_threshold`
+  consecutive failures it is skipped until `recovery_timeout` passes, then
+  half-opened: the next request tries it first, and it stays out of other
+  requests' plans until that test attempt is recorded.
+- A healthy method that hasn't been attempted for `probe_interval` seconds
+  is moved to the front for one request, so its statistics stay current.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from logging_system.logger import Logger
+from web_utils.api_client import CircuitBreaker
+
+
+# Method names (shared with BarcodeRetriever)
+METHOD_API_RENDER = "api_render"   # QueryBangKeDanhSachContainer + local PDF render
+METHOD_API = "api"                 # Legacy GetBarcode SOAP call
+METHOD_PRIMARY_WEB = "primary_web"
+METHOD_BACKUP_WEB = "backup_web"
+METHOD_WEB = "web"                 # Web-only mode
+METHOD_WEB_HTTP = "web_http"       # ADF web form replayed over HTTP (no browser)
+
+
+class MethodStats:
+    """Rolling outcome window and circuit breaker for one method."""
+
+    def __init__(self, name: str, window: int, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.samples: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+        self.consecutive_failures = 0
+        self.last_attempt: Optional[float] = None
+        self.attempts = 0
+        # When the half-open test request was handed out (None = not reserved)
+        self.half_open_probe: Optional[float] = None
+
+    @property
+    def success_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if ok) / len(self.samples)
+
+    @property
+    def avg_latency(self) -> Optional[float]:
+        """Mean latency of successful attempts in the window."""
+        latencies = [latency for ok, latency in self.samples if ok]
+        if not latencies:
+            return None
+        return sum(latencies) / len(latencies)
+
+    def score(self) -> Optional[float]:
+        """Expected cost of trying this method (lower is better), None if unknown."""
+        latency = self.avg_latency
+        if latency is None:
+            return None
+        return latency / max(self.success_rate, 0.05)
+
+
+class MethodRouter:
+    """
+    Thread-safe latency-aware router with a circuit breaker per method.
+
+    Usage:
+        for method in router.plan(["api", "primary_web"]):
+            started = time.monotonic()
+            result = run(method)
+            router.record(method, bool(result), time.monotonic() - started)
+            if result:
+                break
+    """
+
+    DEFAULT_WINDOW = 50
+    DEFAULT_FAILURE_THRESHOLD = 3
+    DEFAULT_RECOVERY_TIMEOUT = 120.0  # seconds
+    DEFAULT_PROBE_INTERVAL = 300.0  # seconds
+
+    def __init__(
+        self,
+        methods: Iterable[str] = (),
+        window: int = DEFAULT_WINDOW,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        recovery_timeout: float = DEFAULT_RECOVERY_TIMEOUT,
+        probe_interval: float = DEFAULT_PROBE_INTERVAL,
+        logger: Optional[Logger] = None
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            methods: Known method names
+            window: Number of recent outcomes kept per method
+            failure_threshold: Consecutive failures that open a method's breaker
+            recovery_timeout: Seconds before an open breaker lets a test request through
+            probe_interval: Seconds after which an idle healthy method is probed
+            logger: Optional logger instance
+        """
+        self.window = max(1, int(window))
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = recovery_timeout
+        self.probe_interval = probe_interval
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._stats: Dict[str, MethodStats] = {}
+        self._probes = 0
+        for method in methods:
+            self._get(method)
+
+    def _get(self, method: str) -> MethodStats:
+        stats = self._stats.get(method)
+        if stats is None:
+            stats = MethodStats(method, self.window, self.failure_threshold, self.recovery_timeout)
+            self._stats[method] = stats
+        return stats
+
+    def is_available(self, method: str) -> bool:
+        """True unless the method's circuit breaker is open."""
+        with self._lock:
+            return not self._get(method).breaker.is_open
+
+    def plan(self, candidates: List[str]) -> List[str]:
+        """
+        Order the candidate methods for one request.
+
+        Args:
+            candidates: Methods in their configured (fallback) order
+
+        Returns:
+            Available methods, best first; methods with open breakers and
+            half-open methods already being tested are left out
+        """
+        now = time.monotonic()
+        with self._lock:
+            available, recovering = [], []
+            for method in candidates:
+                stats = self._get(method)
+                if stats.breaker.is_open:
+                    continue
+                if stats.breaker.state == "HALF_OPEN":
+                    # One test request at a time; the reservation lapses
+                    # after recovery_timeout if that request never tries it
+                    reserved = stats.half_open_probe
+                    if reserved is not None and now - reserved < self.recovery_timeout:
+                        continue
+                    stats.half_open_probe = now
+                    recovering.append(method)
+                    continue
+                available.append(method)
+
+            proven, unknown, failing = [], [], []
+            for method in available:
+                stats = self._stats[method]
+                score = stats.score()
+                if score is not None:
+                    proven.append((score, method))
+                elif stats.samples:
+                    failing.append(method)
+                else:
+                    unknown.append(method)
+            proven.sort(key=lambda item: item[0])
+            order = recovering + [m for _, m in proven] + unknown + failing
+
+            # Probe one idle method so its statistics don't go stale (unless
+            # this request already tests a half-open method)
+            for method in ([] if recovering else order[1:]):
+                last = self._stats[method].last_attempt
+                if last is not None and now - last >= self.probe_interval:
+                    order.remove(method)
+                    order.insert(0, method)
+                    # Reserve the probe so concurrent requests don't all take it
+                    self._stats[method].last_attempt = now
+                    self._probes += 1
+                    if self.logger:
+                        self.logger.debug(f"Probing retrieval method '{method}'")
+                    break
+
+            return order
+
+    def record(self, method: str, success: bool, latency: float) -> None:
+        """
+        Record the outcome of one attempt.
+
+        Args:
+            method: Method name
+            success: True if the method produced a PDF
+            latency: Attempt duration in seconds
+        """
+        with self._lock:
+            stats = self._get(method)
+            stats.samples.append((bool(success), float(latency)))
+            stats.last_attempt = time.monotonic()
+            stats.attempts += 1
+            stats.half_open_probe = None
+            if success:
+                stats.consecutive_failures = 0
+                stats.breaker.record_success()
+                return
+
+            stats.consecutive_failures += 1
+            was_open = stats.breaker.state == "OPEN"
+            stats.breaker.record_failure()
+            if not was_open and stats.breaker.state == "OPEN" and self.logger:
+                self.logger.warning(
+                    f"Method '{method}' has failed {stats.consecutive_failures} times in a row, "
+                    f"skipping it for {self.recovery_timeout:.0f}s"
+                )
+
+    def consecutive_failures(self) -> Dict[str, int]:
+        """Consecutive failure count per method."""
+        with self._lock:
+            return {name: stats.consecutive_failures for name, stats in self._stats.items()}
+
+    def reset_breakers(self) -> None:
+        """Close all breakers and clear failure streaks; latency history is kept."""
+        with self._lock:
+            for stats in self._stats.values():
+                stats.breaker.reset()
+                stats.consecutive_failures = 0
+                stats.half_open_probe = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get routing metrics.
+
+        Returns:
+            Dictionary with the probe count and, per method, breaker state,
+            attempts, window size, success rate, average success latency
+            and consecutive failures
+        """
+        with self._lock:
+            methods = {}
+            for name, stats in self._stats.items():
+                methods[name] = {
+                    'state': stats.breaker.state,
+                    'attempts': stats.attempts,
+                    'samples': len(stats.samples),
+                    'success_rate': stats.success_rate,
+                    'avg_latency': stats.avg_latency,
+                    'consecutive_failures': stats.consecutive_failures,
+                }
+            return {'probes': self._probes, 'methods': methods}
@@ -6,11 +6,14 @@ This module provides parallel download functionality.
 Requirements: 9.1
 """
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from typing import List, Dict, Callable, Optional, Any
 from threading import Event, Lock
 from dataclasses import dataclass
 
+from web_utils.concurrency_controller import get_concurrency_controller
+from web_utils.rate_limiter import PRIORITY_INTERACTIVE, run_with_priority
+
 
 @dataclass
 class DownloadResult:
@@ -19,26 +22,34 @@ class DownloadResult:
     success: bool
     file_path: Optional[str] = None
     error: Optional[str] = None
+    write: Optional[Future] = None  # Queued file write (download_batch waits for it)
 
 
 class ParallelDownloader:
     """
     Parallel downloader using ThreadPoolExecutor.
     
+    The pool is sized to the adaptive concurrency controller's upper bound;
+    the controller decides how many workers may call the API at once.
+    Requests are issued in the rate limiter's interactive lane by default.
+    
     Requirements: 9.1
     """
     
-    MAX_CONCURRENT = 3
-    
     def __init__(
         self, 
         barcode_retriever, 
         file_manager, 
-        max_concurrent: int = 3
+        max_concurrent: Optional[int] = None,
+        priority: int = PRIORITY_INTERACTIVE
     ):
         self.barcode_retriever = barcode_retriever
         self.file_manager = file_manager
-        self.max_concurrent = min(max_concurrent, self.MAX_CONCURRENT)
+        max_limit = get_concurrency_controller().max_limit
+        self.max_concurrent = min(max_concurrent or max_limit, max_limit)
+        self.priority = priority
+        
+        self.last_batch_path: Optional[str] = None
         
         self._stop_event = Event()
         self._active_count = 0
@@ -52,6 +63,9 @@ class ParallelDownloader:
         """
         Download barcodes for multiple declarations in parallel.
         
+        When the file manager has batch output enabled, the PDFs are also
+        combined into one batch file (its path is left in last_batch_path).
+        
         Args:
             declarations: List of Declaration objects
             progress_callback: Callback(completed, total) for progress updates
@@ -60,41 +74,47 @@ class ParallelDownloader:
             Dictionary mapping declaration_id to success status
         """
         self._stop_event.clear()
-        if self.barcode_retriever and hasattr(self.barcode_retriever, 'reset_method_skip_list'):
-            self.barcode_retriever.reset_method_skip_list()
+        if self.barcode_retriever and hasattr(self.barcode_retriever, 'warm_up_connections'):
+            self.barcode_retriever.warm_up_connections(min(self.max_concurrent, len(declarations)))
         results = {}
         total = len(declarations)
         completed = 0
         
-        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
-            futures = {}
+        batch = self.file_manager.open_batch()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+                futures = {}
             
-            for decl in declarations:
-                if self._stop_event.is_set():
-                    break
+                for position, decl in enumerate(declarations):
+                    if self._stop_event.is_set():
+                        break
                 
-                future = executor.submit(self._download_single, decl)
-                futures[future] = decl.id
+                    future = executor.submit(run_with_priority, self.priority, self._download_single, decl, batch, position)
+                    futures[future] = decl.id
             
-            for future in as_completed(futures):
-                if self._stop_event.is_set():
-                    break
+                for future in as_completed(futures):
+                    if self._stop_event.is_set():
+                        break
                 
-                decl_id = futures[future]
-                try:
-                    result = future.result()
-                    results[decl_id] = result.success
-                except Exception:
-                    results[decl_id] = False
+                    decl_id = futures[future]
+                    try:
+                        result = self._finish_write(future.result())
+                        results[decl_id] = result.success
+                    except Exception:
+                        results[decl_id] = False
                 
-                completed += 1
-                if progress_callback:
-                    progress_callback(completed, total)
+                    completed += 1
+                    if progress_callback:
+                        progress_callback(completed, total)
+        finally:
+            if batch is not None:
+                self.file_manager.file_writer.flush()  # Queued writes still add to the batch
+            self.last_batch_path = batch.close() if batch is not None else None
         
         return results
     
-    def _download_single(self, declaration) -> DownloadResult:
-        """Download a single declaration"""
+    def _download_single(self, declaration, batch=None, position: Optional[int] = None) -> DownloadResult:
+        """Download a single declaration (and add it to the batch file, if any)"""
         with self._lock:
             self._active_count += 1
         
@@ -105,11 +125,13 @@ class ParallelDownloader:
             pdf_content = self.barcode_retriever.retrieve_barcode(declaration)
             
             if pdf_content:
-                file_path = self.file_manager.save_barcode(
-                    declaration, pdf_content, overwrite=True
-                )
-                if file_path:
-                    return DownloadResult(declaration.id, True, file_path=file_path)
+                then = None
+                if batch is not None:
+                    def then(file_path):
+                        batch.add(declaration, pdf_content, source_path=file_path, position=position)
+                # Written on the file writer's I/O threads; this thread goes back to the network
+                write = self.file_manager.save_barcode_async(declaration, pdf_content, overwrite=True, then=then)
+                return DownloadResult(declaration.id, True, write=write)
             
             return DownloadResult(declaration.id, False, error="Failed to retrieve")
             
@@ -119,6 +141,19 @@ class ParallelDownloader:
             with self._lock:
                 self._active_count -= 1
     
+    @staticmethod
+    def _finish_write(result: DownloadResult) -> DownloadResult:
+        """Wait for the queued file write of a download."""
+        if result.write is None:
+            return result
+        try:
+            file_path = result.write.result()
+        except Exception as e:
+            return DownloadResult(result.declaration_id, False, error=str(e))
+        if not file_path:
+            return DownloadResult(result.declaration_id, False, error="File could not be saved")
+        return DownloadResult(result.declaration_id, True, file_path=file_path)
+    
     def stop(self) -> None:
         """Stop all downloads"""
         self._stop_event.set()
@@ -0,0 +1,226 @@
+"""
+PDF Images Module
+
+Embeds the container QR images of barcode PDFs compactly.
+
+ReportLab embeds every image as 8-bit RGB samples, compressed and then
+ASCII85-encoded, and decodes the PNG again for every table row. QR codes
+are black and white, so here each image is decoded once, reduced to the
+smallest sample format that holds it exactly (1-bit for black and white,
+8-bit gray, RGB otherwise), optionally downsampled, and Flate-compressed
+without ASCII85. Encoded images are cached process-wide by the SHA-1 of
+the decoded bytes, and PdfImage registers one image XObject per document
+and content hash, so rows sharing a QR image share one XObject.
+"""
+
+import hashlib
+import io
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image as PILImage
+from reportlab.pdfbase.pdfdoc import PDFImageXObject
+from reportlab.platypus.flowables import Flowable
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """
+    Image samples ready to embed as a PDF image XObject.
+
+    Attributes:
+        key: SHA-1 of the decoded image bytes and the encode settings
+        width: Width in pixels
+        height: Height in pixels
+        bits: Bits per component (1 or 8)
+        color_space: PDF color space (DeviceGray or DeviceRGB)
+        data: Flate-compressed samples
+    """
+    key: str
+    width: int
+    height: int
+    bits: int
+    color_space: str
+    data: bytes
+
+
+def encode_image(image_bytes: bytes, max_pixels: int = 0, compression_level: int = 6) -> EncodedImage:
+    """
+    Decode an image and encode it for embedding.
+
+    Args:
+        image_bytes: Image file content (PNG, JPEG, ...)
+        max_pixels: Downsample images wider or taller than this (0 = keep)
+        compression_level: zlib compression level (1-9)
+
+    Returns:
+        EncodedImage
+
+    Raises:
+        OSError: If the image can't be decoded
+    """
+    image = PILImage.open(io.BytesIO(image_bytes))
+
+    if image.mode in ("RGBA", "LA", "P", "PA") or "transparency" in image.info:
+        # Flatten transparency onto white paper
+        rgba = image.convert("RGBA")
+        image = PILImage.new("RGB", rgba.size, "white")
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode not in ("1", "L", "RGB"):
+        image = image.convert("RGB")
+
+    if image.mode == "RGB":
+        red, green, blue = (band.tobytes() for band in image.split())
+        if red == green == blue:
+            image = image.convert("L")
+
+    bilevel = _is_bilevel(image)
+
+    if max_pixels and max(image.size) > max_pixels:
+        scale = max_pixels / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        # Nearest keeps black and white modules sharp
+        resample = PILImage.NEAREST if bilevel else PILImage.LANCZOS
+        image = image.resize(size, resample)
+
+    if bilevel:
+        if image.mode != "1":
+            image = image.convert("1", dither=PILImage.Dither.NONE)
+        bits, color_space = 1, "DeviceGray"
+    elif image.mode == "L":
+        bits, color_space = 8, "DeviceGray"
+    else:
+        bits, color_space = 8, "DeviceRGB"
+
+    return EncodedImage(
+        key=image_key(image_bytes, max_pixels, compression_level),
+        width=image.width,
+        height=image.height,
+        bits=bits,
+        color_space=color_space,
+        data=zlib.compress(image.tobytes(), compression_level),
+    )
+
+
+def image_key(image_bytes: bytes, max_pixels: int = 0, compression_level: int = 6) -> str:
+    """Content hash of an image and its encode settings."""
+    return hashlib.sha1(image_bytes + b"|%d|%d" % (max_pixels, compression_level)).hexdigest()
+
+
+def _is_bilevel(image: PILImage.Image) -> bool:
+    """True for images with only pure black and pure white pixels."""
+    if image.mode == "1":
+        return True
+    if image.mode != "L":
+        return False
+    colors = image.getcolors(2)  # None if there are more than two
+    return colors is not None and all(value in (0, 255) for _, value in colors)
+
+
+class ImageCache:
+    """Bounded process-wide cache of encoded images by content hash."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, EncodedImage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, image_bytes: bytes, max_pixels: int = 0, compression_level: int = 6) -> EncodedImage:
+        """
+        Get the encoded image for image_bytes, encoding it on first use.
+
+        Raises:
+            OSError: If the image can't be decoded
+        """
+        key = image_key(image_bytes, max_pixels, compression_level)
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return encoded
+            self._misses += 1
+
+        encoded = encode_image(image_bytes, max_pixels, compression_level)
+        with self._lock:
+            self._entries[key] = encoded
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return encoded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Get cache statistics."""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self._hits, 'misses': self._misses}
+
+
+class PdfImage(Flowable):
+    """
+    Image flowable drawing an EncodedImage.
+
+    The image XObject is registered once per document under its content
+    hash; later rows with the same image only reference it.
+    """
+
+    def __init__(self, encoded: EncodedImage, width: float, height: float, hAlign: str = 'CENTER'):
+        super().__init__()
+        self.encoded = encoded
+        self.width = width
+        self.height = height
+        self.hAlign = hAlign
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        name = register_image(self.canv, self.encoded)
+        self.canv.scale(self.width, self.height)
+        self.canv.addLiteral(f"/{name} Do")
+
+
+def register_image(canvas, encoded: EncodedImage) -> str:
+    """
+    Register an encoded image with the canvas's document (once) and mark
+    it as used on the current page, as Canvas.drawImage does.
+
+    Returns:
+        XObject resource name to draw with "Do"
+    """
+    document = canvas._doc
+    name = document.getXObjectName(encoded.key)
+    if document.idToObject.get(name) is None:
+        xobject = PDFImageXObject(encoded.key)
+        xobject.width = encoded.width
+        xobject.height = encoded.height
+        xobject.bitsPerComponent = encoded.bits
+        xobject.colorSpace = encoded.color_space
+        xobject.streamContent = encoded.data
+        xobject._filters = ('FlateDecode',)
+        xobject.mask = None
+        document.Reference(xobject, name)
+        document.addForm(encoded.key, xobject)
+    canvas._formsinuse.append(encoded.key)
+    return name
+
+
+# Global instance
+_image_cache: Optional[ImageCache] = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Get or create the process-wide encoded image cache."""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
@@ -0,0 +1,305 @@
+"""
+PDF Render Pool Module
+
+Moves barcode PDF rendering (CPU-bound ReportLab work) out of the I/O
+threads. Rendering in the download threads holds the GIL and stalls the
+SOAP calls of every other thread; with a process pool, the calling thread
+just waits on a future (GIL released) while a worker process renders, so
+large batches use all cores and the network stage keeps its own
+concurrency (rate limiter and adaptive concurrency controller).
+
+ContainerDeclarationInfo is a plain dataclass, so it pickles to the
+workers as is. A worker either returns the PDF bytes or writes the file
+itself (render_to_file), which saves sending the bytes back.
+
+Workers have no logger and no access to the runtime preferences, so the
+seal status note is auto-corrected in the calling process before the
+declaration is sent. The render settings (BarcodeRenderConfig) are passed
+to each worker by the pool initializer. With workers = 0 the pool renders in the calling
+thread, as before.
+"""
+
+import dataclasses
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from file_utils.file_writer import DirectoryCache, atomic_write
+from logging_system.logger import Logger
+from web_utils.barcode_pdf_generator import BarcodePdfGenerator, BarcodeRenderConfig
+from web_utils.qrcode_api_client import ContainerDeclarationInfo
+
+
+# Generator of the current worker process (created by the pool initializer)
+_worker_generator: Optional[BarcodePdfGenerator] = None
+
+# Output directories known to exist in this process
+_directories = DirectoryCache()
+
+
+def _init_worker(render_config: Optional[BarcodeRenderConfig] = None) -> None:
+    """Process pool initializer: register fonts and build styles once."""
+    global _worker_generator
+    _worker_generator = BarcodePdfGenerator(logger=None, config=render_config)
+
+
+def _render_in_worker(info: ContainerDeclarationInfo) -> Optional[bytes]:
+    """Render a PDF in a worker process (seal status already corrected)."""
+    return _worker_generator.generate_pdf(info, correct_seal_status=False)
+
+
+def _render_to_file_in_worker(info: ContainerDeclarationInfo, path: str) -> int:
+    """
+    Render a PDF in a worker process and write it to path.
+
+    Returns:
+        Bytes written, or 0 if rendering failed
+    """
+    pdf_content = _render_in_worker(info)
+    if not pdf_content:
+        return 0
+    return _write_file(path, pdf_content)
+
+
+def _write_file(path: str, content: bytes) -> int:
+    """Write content to path via a temporary file, so readers never see half a PDF."""
+    _directories.ensure(os.path.dirname(path))
+    return atomic_write(path, content)
+
+
+class PdfRenderPool:
+    """
+    Renders barcode PDFs in worker processes.
+
+    Usage:
+        pool = get_pdf_render_pool(logger)
+        pool.configure(workers=4, render_config=BarcodeRenderConfig(qr_image_max_dpi=300))
+        pdf_content = pool.render(info)
+    """
+
+    AUTO_WORKERS = -1  # One worker per CPU core
+
+    def __init__(
+        self,
+        workers: int = 0,
+        logger: Optional[Logger] = None,
+        render_config: Optional[BarcodeRenderConfig] = None
+    ):
+        """
+        Initialize the render pool (worker processes start on first use).
+
+        Args:
+            workers: Worker processes (0 = render in the calling thread,
+                -1 = one per CPU core)
+            logger: Optional logger instance
+            render_config: Render settings (default: BarcodeRenderConfig())
+        """
+        self.logger = logger
+        self._generator = BarcodePdfGenerator(logger=logger, config=render_config)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._workers = 0
+        self._rendered = 0
+        self._fallbacks = 0
+        self._restarts = 0
+        self.configure(workers)
+
+    @property
+    def workers(self) -> int:
+        """Number of worker processes (0 = in-process rendering)."""
+        return self._workers
+
+    @property
+    def render_config(self) -> BarcodeRenderConfig:
+        """Render settings used in-process and by the workers."""
+        return self._generator.config
+
+    def configure(self, workers: int, render_config: Optional[BarcodeRenderConfig] = None) -> None:
+        """
+        Set the number of worker processes and the render settings; a
+        running pool is replaced.
+
+        Args:
+            workers: Worker processes (0 = render in the calling thread,
+                -1 = one per CPU core)
+            render_config: New render settings (None = keep the current ones)
+        """
+        workers = int(workers)
+        if workers < 0:
+            workers = os.cpu_count() or 1
+        with self._lock:
+            config_changed = render_config is not None and render_config != self._generator.config
+            if workers == self._workers and not config_changed:
+                return
+            if config_changed:
+                self._generator.config = render_config
+            old_executor, self._executor = self._executor, None
+            self._workers = workers
+        if old_executor is not None:
+            old_executor.shutdown(wait=False, cancel_futures=False)
+        if self.logger:
+            mode = f"{workers} worker processes" if workers else "in-process"
+            self.logger.info(f"PDF rendering: {mode}")
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._workers and self._executor is None:
+                # spawn: forking a process full of I/O threads can copy held locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self._generator.config,)
+                )
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next render starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prepare(self, info: ContainerDeclarationInfo) -> ContainerDeclarationInfo:
+        """Apply the seal status auto-correction here, where the preferences live."""
+        ghi_chu = self._generator._auto_correct_seal_status(info.ghi_chu, info)
+        if ghi_chu != info.ghi_chu:
+            return dataclasses.replace(info, ghi_chu=ghi_chu)
+        return info
+
+    def submit(self, info: ContainerDeclarationInfo) -> Future:
+        """
+        Start rendering a PDF.
+
+        Args:
+            info: Declaration info to render
+
+        Returns:
+            Future with the PDF bytes (None if rendering failed)
+        """
+        executor = self._get_executor()
+        if executor is None:
+            future: Future = Future()
+            future.set_result(self._generator.generate_pdf(info))
+            return future
+        return executor.submit(_render_in_worker, self._prepare(info))
+
+    def render(self, info: ContainerDeclarationInfo) -> Optional[bytes]:
+        """
+        Render a PDF, waiting for the result.
+
+        Falls back to rendering in the calling thread if the worker pool
+        is broken or the declaration can't be sent to it.
+
+        Args:
+            info: Declaration info to render
+
+        Returns:
+            PDF content as bytes, or None if generation fails
+        """
+        executor = self._get_executor()
+        if executor is None:
+            return self._generator.generate_pdf(info)
+
+        try:
+            pdf_content = executor.submit(_render_in_worker, self._prepare(info)).result()
+        except BrokenProcessPool as e:
+            self._reset_executor(executor)
+            return self._fallback(info, e)
+        except Exception as e:
+            return self._fallback(info, e)
+
+        self._count_rendered(info, pdf_content)
+        return pdf_content
+
+    def render_to_file(self, info: ContainerDeclarationInfo, path: str) -> bool:
+        """
+        Render a PDF and write it to path (in the worker process).
+
+        Args:
+            info: Declaration info to render
+            path: Output file path (replaced atomically)
+
+        Returns:
+            True if the file was written
+        """
+        executor = self._get_executor()
+        if executor is None:
+            pdf_content = self._generator.generate_pdf(info)
+            return bool(pdf_content) and _write_file(path, pdf_content) > 0
+
+        try:
+            try:
+                written = executor.submit(_render_to_file_in_worker, self._prepare(info), path).result()
+            except BrokenProcessPool as e:
+                self._reset_executor(executor)
+                pdf_content = self._fallback(info, e)
+                return bool(pdf_content) and _write_file(path, pdf_content) > 0
+            except OSError:
+                raise
+            except Exception as e:
+                pdf_content = self._fallback(info, e)
+                return bool(pdf_content) and _write_file(path, pdf_content) > 0
+        except OSError as e:
+            if self.logger:
+                self.logger.error(f"Failed to write PDF for {info.so_to_khai} to {path}: {e}")
+            return False
+
+        self._count_rendered(info, written)
+        return written > 0
+
+    def _fallback(self, info: ContainerDeclarationInfo, error: Exception) -> Optional[bytes]:
+        if self.logger:
+            self.logger.warning(f"PDF worker failed for {info.so_to_khai} ({error!r}), rendering in-process")
+        with self._lock:
+            self._fallbacks += 1
+        return self._generator.generate_pdf(info)
+
+    def _count_rendered(self, info: ContainerDeclarationInfo, result) -> None:
+        with self._lock:
+            self._rendered += 1
+        if self.logger:
+            if result:
+                size = result if isinstance(result, int) else len(result)
+                self.logger.info(f"Rendered PDF ({size} bytes) for declaration {info.so_to_khai} in worker process")
+            else:
+                self.logger.warning(f"Worker process could not render PDF for declaration {info.so_to_khai}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker processes (restarted on next use)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        """Get render statistics."""
+        with self._lock:
+            return {
+                'workers': self._workers,
+                'running': self._executor is not None,
+                'rendered': self._rendered,
+                'fallbacks': self._fallbacks,
+                'restarts': self._restarts,
+            }
+
+
+# Global instance
+_pdf_render_pool: Optional[PdfRenderPool] = None
+_pdf_render_pool_lock = threading.Lock()
+
+
+def get_pdf_render_pool(logger: Optional[Logger] = None) -> PdfRenderPool:
+    """Get or create the process-wide render pool (in-process until configured)."""
+    global _pdf_render_pool
+    with _pdf_render_pool_lock:
+        if _pdf_render_pool is None:
+            _pdf_render_pool = PdfRenderPool(workers=0, logger=logger)
+        elif logger and _pdf_render_pool.logger is None:
+            _pdf_render_pool.logger = logger
+            _pdf_render_pool._generator.logger = logger
+        return _pdf_render_pool
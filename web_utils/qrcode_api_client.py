@@ -7,12 +7,30 @@ Based on WSDL analysis from http://103.248.160.25:8086/WS_Container/QRCode.asmx?
 The API provides container/declaration information for barcode generation.
 """
 
+import time
 import requests
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass, field
 from datetime import datetime, date
 from typing import Optional, List
 from logging_system.logger import Logger
+from core.single_flight import SingleFlight
+from web_utils.http_session_pool import get_http_session_pool
+from web_utils.concurrency_controller import SlotTimeoutError, get_concurrency_controller, is_overload_status
+from web_utils.rate_limiter import current_priority, get_rate_limiter
+from web_utils.hedging import get_hedge_policy, mark_request_sent
+from web_utils.api_capture import get_api_capture
+
+# lxml parses large responses about twice as fast as ElementTree
+try:
+    from lxml import etree as lxml_etree
+    LXML_AVAILABLE = True
+    _LXML_PARSER = lxml_etree.XMLParser(
+        encoding='utf-8', resolve_entities=False, no_network=True, huge_tree=True
+    )
+except ImportError:
+    lxml_etree = None
+    LXML_AVAILABLE = False
 
 
 @dataclass
@@ -98,6 +116,219 @@ class QRCodeApiError(Exception):
     pass
 
 
+@dataclass(frozen=True)
+class BangKeQuery:
+    """Key identifying one QueryBangKeDanhSachContainer request"""
+    ma_so_thue: str
+    so_to_khai: str
+    ma_hai_quan: str
+    ngay_dang_ky: date
+    
+    @classmethod
+    def coerce(cls, key) -> 'BangKeQuery':
+        """Build a query from a BangKeQuery or a (mst, so_tk, ma_hq, ngay) tuple."""
+        if isinstance(key, cls):
+            return key
+        ma_so_thue, so_to_khai, ma_hai_quan, ngay_dang_ky = key
+        return cls(str(ma_so_thue), str(so_to_khai), str(ma_hai_quan or ""), ngay_dang_ky)
+
+
+@dataclass
+class BangKeResult:
+    """Outcome of one query in a batch (see QRCodeContainerApiClient.query_many)"""
+    query: BangKeQuery
+    info: Optional[ContainerDeclarationInfo] = None
+    error: Optional[Exception] = None
+    elapsed: float = 0.0
+    cancelled: bool = False
+    
+    @property
+    def ok(self) -> bool:
+        """True if the request completed without a transport or HTTP error"""
+        return self.error is None and not self.cancelled
+
+
+def _to_float(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0
+
+
+def _to_int(text: str) -> int:
+    try:
+        return int(text)
+    except ValueError:
+        return 0
+
+
+# Result header element -> (ContainerDeclarationInfo attribute, converter)
+_HEADER_FIELDS = {
+    'MaSoThue': ('ma_so_thue', None),
+    'SoToKhai': ('so_to_khai', None),
+    'NgayToKhai': ('ngay_to_khai', None),
+    'TenDonViXNK': ('ten_don_vi_xnk', None),
+    'MaDDGS': ('ma_ddgs', None),
+    'TenDDGS': ('ten_ddgs', None),
+    'TenChiCucHaiQuanGS': ('ten_chi_cuc_hai_quan_gs', None),
+    'TenCucHaiQuan': ('ten_cuc_hai_quan', None),
+    'TenChiCucHaiQuan': ('ten_chi_cuc_hai_quan', None),
+    'LoaiHinh': ('loai_hinh', None),
+    'TenLoaiHinh': ('ten_loai_hinh', None),
+    'MaTrangThaiToKhai': ('ma_trang_thai_to_khai', None),
+    'TrangThaiToKhai': ('trang_thai_to_khai', None),
+    'LuongToKhai': ('luong_to_khai', None),
+    'So_Luong_Hang': ('so_luong_hang', _to_float),
+    'Tong_Trong_Luong_Hang': ('tong_trong_luong_hang', _to_float),
+    'DVT_So_Luong_Hang': ('dvt_so_luong_hang', None),
+    'DVT_Tong_Trong_Luong_Hang': ('dvt_tong_trong_luong_hang', None),
+    'IsContainer': ('is_container', _to_int),
+    'SoDinhDanh': ('so_dinh_danh', None),
+    'MaPTVC': ('ma_ptvc', None),
+    'NgayTau': ('ngay_tau', None),
+    'Ghi_Chu': ('ghi_chu', None),
+    'ThoiGianLayDuLieu': ('thoi_gian_lay_du_lieu', None),
+    'ThongBaoLoi': ('thong_bao_loi', None),
+}
+
+_RESULT_TAG = 'QueryBangKeDanhSachContainerResult'
+_BANG_KE_TAG = 'BangKe'
+
+# '{namespace}Local' -> 'Local'; tags repeat for every row, so cache them
+_local_names: dict = {}
+
+
+def _local_name(tag: str) -> str:
+    name = _local_names.get(tag)
+    if name is None:
+        name = tag[tag.rfind('}') + 1:] if isinstance(tag, str) else ""
+        _local_names[tag] = name
+    return name
+
+
+def _build_container(row: dict) -> ContainerInfo:
+    """Build a ContainerInfo from one Table_BangKe row (local name -> text)."""
+    container = ContainerInfo()
+    stt = row.get('Stt')
+    if stt:
+        try:
+            container.stt = int(stt)
+        except ValueError:
+            pass
+    # Current field names first, then the old ones
+    so_container = row.get('SoContainer') or row.get('So_Container')
+    if so_container:
+        container.so_container = so_container.strip()
+    so_seal = row.get('SoSeal') or row.get('So_Seal')
+    if so_seal:
+        container.so_seal = so_seal.strip()
+    so_seal_hq = row.get('SoSealHQ')
+    if so_seal_hq:
+        # "#####" means no customs seal
+        so_seal_hq = so_seal_hq.strip()
+        if so_seal_hq != "#####":
+            container.so_seal_hq = so_seal_hq
+    container.barcode_image = row.get('BarcodeImage') or ""
+    container.ghi_chu = row.get('GhiChu') or ""
+    trong_luong = row.get('Trong_Luong')
+    if trong_luong:
+        try:
+            container.trong_luong = float(trong_luong)
+        except ValueError:
+            pass
+    return container
+
+
+def _parse_xml(response_text: str):
+    """Parse XML with lxml when available, else ElementTree."""
+    if LXML_AVAILABLE:
+        try:
+            return lxml_etree.fromstring(response_text.encode('utf-8'), _LXML_PARSER)
+        except lxml_etree.XMLSyntaxError as e:
+            raise ET.ParseError(str(e))
+    return ET.fromstring(response_text)
+
+
+def parse_bang_ke_response(response_text: str) -> Optional[ContainerDeclarationInfo]:
+    """
+    Parse a QueryBangKeDanhSachContainer SOAP response in a single walk.
+    
+    The result element's children are visited once and dispatched by
+    local name (header fields via _HEADER_FIELDS, container rows from the
+    BangKe diffgram), so namespace prefixes and default namespaces don't
+    matter and no find() lookups are needed. Row cells are read directly
+    from each row without walking the whole diffgram.
+    
+    Args:
+        response_text: SOAP XML response as string.
+        
+    Returns:
+        ContainerDeclarationInfo, or None if the response has no result element.
+        
+    Raises:
+        ET.ParseError: If the XML is malformed.
+    """
+    root = _parse_xml(response_text)
+    names = _local_names
+    
+    result_elem = None
+    for elem in root.iter():
+        if _local_name(elem.tag) == _RESULT_TAG:
+            result_elem = elem
+            break
+    if result_elem is None:
+        return None
+    
+    info = ContainerDeclarationInfo()
+    bang_ke_elem = None
+    for child in result_elem:
+        name = names.get(child.tag) or _local_name(child.tag)
+        field_spec = _HEADER_FIELDS.get(name)
+        if field_spec is not None:
+            text = child.text
+            if text:
+                attr, convert = field_spec
+                setattr(info, attr, convert(text) if convert else text)
+        elif name == _BANG_KE_TAG:
+            bang_ke_elem = child
+    
+    if bang_ke_elem is not None:
+        containers = []
+        # Breadth-first over the diffgram; rows are not descended into
+        pending = [bang_ke_elem]
+        for node in pending:
+            for child in node:
+                name = names.get(child.tag) or _local_name(child.tag)
+                if 'Table' in name:
+                    row = {names.get(cell.tag) or _local_name(cell.tag): cell.text for cell in child}
+                    container = _build_container(row)
+                    if container.so_container:
+                        containers.append(container)
+                elif len(child):
+                    pending.append(child)
+        info.containers = containers
+    
+    return info
+
+
+# Coalesces concurrent identical queries across all client instances and
+# the asyncio batch engine
+_bang_ke_flight = SingleFlight("query_bang_ke")
+
+
+def bang_ke_flight_key(service_url: str, query: BangKeQuery) -> tuple:
+    """
+    Single-flight key of a query: callers of the same priority share it,
+    so an interactive lookup never waits behind a background caller's
+    rate limiter token. Only the date part of the registration date is
+    sent, so date and datetime keys match.
+    """
+    ngay = query.ngay_dang_ky
+    if isinstance(ngay, datetime):
+        ngay = ngay.date()
+    return (service_url, query.ma_so_thue, query.so_to_khai, query.ma_hai_quan, ngay, current_priority())
+
+
 class QRCodeContainerApiClient:
     """
     Client for the Customs QRCode SOAP WebService API.
@@ -113,7 +344,13 @@ class QRCodeContainerApiClient:
     SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
     TEMPURI_NS = "http://tempuri.org/"
     
-    def __init__(self, service_url: str = None, logger: Logger = None, timeout: int = 30):
+    def __init__(
+        self,
+        service_url: str = None,
+        logger: Logger = None,
+        timeout: int = 30,
+        session: Optional[requests.Session] = None
+    ):
         """
         Initialize the QRCode API client.
         
@@ -121,33 +358,40 @@ class QRCodeContainerApiClient:
             service_url: SOAP service URL. Defaults to DEFAULT_SERVICE_URL.
             logger: Logger instance for logging. If None, creates a default logger.
             timeout: Request timeout in seconds.
+            session: Optional HTTP session. Defaults to the process-wide pooled
+                     keep-alive session shared by all API callers.
         """
         self.service_url = service_url or self.DEFAULT_SERVICE_URL
         self.logger = logger or Logger()
         self.timeout = timeout
         
-        # Initialize HTTP session with connection pooling
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'text/xml; charset=utf-8',
-            'Accept': 'text/xml'
-        })
+        # Use the shared keep-alive pool unless a session is injected
+        if session is None:
+            session = get_http_session_pool(logger).session
+        self.session = session
     
     def query_bang_ke(
         self, 
         ma_so_thue: str, 
         so_to_khai: str, 
         ma_hai_quan: str, 
-        ngay_dang_ky: date
+        ngay_dang_ky: date,
+        use_cache: bool = True
     ) -> Optional[ContainerDeclarationInfo]:
         """
         Query declaration information using QueryBangKeDanhSachContainer method.
         
+        When the API response cache is enabled, cached results are returned
+        without a network call, and fresh results are stored with a TTL
+        that depends on the declaration state.
+        
         Args:
             ma_so_thue: Tax code (Mã số thuế / Mã doanh nghiệp)
             so_to_khai: Declaration number (Số tờ khai)
             ma_hai_quan: Customs office code (Mã hải quan)
             ngay_dang_ky: Registration date (Ngày đăng ký)
+            use_cache: Read from the response cache (results are always
+                       written back). Pass False to force a fresh query.
             
         Returns:
             ContainerDeclarationInfo object if successful, None if failed.
@@ -155,6 +399,40 @@ class QRCodeContainerApiClient:
         Raises:
             QRCodeApiError: If API request fails with error.
         """
+        from web_utils.api_response_cache import get_api_response_cache
+        
+        cache = get_api_response_cache()
+        query = BangKeQuery(ma_so_thue, so_to_khai, ma_hai_quan or "", ngay_dang_ky)
+        if cache is not None and use_cache:
+            cached = cache.get(query)
+            if cached is not None:
+                self.logger.debug(f"API cache hit for {so_to_khai}")
+                return cached
+        
+        # Concurrent callers for the same declaration and priority share
+        # one request (also with the asyncio batch engine)
+        return _bang_ke_flight.do(
+            bang_ke_flight_key(self.service_url, query),
+            self._fetch_bang_ke, query, cache
+        )
+    
+    def _fetch_bang_ke(self, query: BangKeQuery, cache) -> Optional[ContainerDeclarationInfo]:
+        """
+        Send the QueryBangKeDanhSachContainer request and parse the response.
+        
+        Args:
+            query: Declaration key
+            cache: Response cache to write the result to, or None
+            
+        Returns:
+            ContainerDeclarationInfo object if successful, None if failed.
+            
+        Raises:
+            QRCodeApiError: If API request fails with error.
+        """
+        ma_so_thue, so_to_khai = query.ma_so_thue, query.so_to_khai
+        ma_hai_quan, ngay_dang_ky = query.ma_hai_quan, query.ngay_dang_ky
+        
         try:
             # Build SOAP request
             soap_request = self._build_soap_request(
@@ -164,25 +442,14 @@ class QRCodeContainerApiClient:
             self.logger.debug(f"Sending SOAP request to {self.service_url}")
             self.logger.debug(f"Request params: MST={ma_so_thue}, TK={so_to_khai}, HQ={ma_hai_quan}, Date={ngay_dang_ky}")
             
-            # Send request
-            response = self.session.post(
-                self.service_url,
-                data=soap_request.encode('utf-8'),
-                headers={
-                    'Content-Type': 'text/xml; charset=utf-8',
-                    'SOAPAction': 'http://tempuri.org/QueryBangKeDanhSachContainer'
-                },
-                timeout=self.timeout
-            )
+            # Slow requests get a second identical request when hedging is on
+            response = get_hedge_policy().call(self._post_soap_request, soap_request)
             
             # Check HTTP status
             if response.status_code != 200:
                 self.logger.error(f"API returned HTTP {response.status_code}: {response.text[:500]}")
                 raise QRCodeApiError(f"HTTP {response.status_code}: {response.reason}")
             
-            # Debug: log raw response
-            self.logger.debug(f"Raw API response: {response.text[:2000]}")
-            
             # Parse response
             result = self._parse_soap_response(response.text)
             
@@ -193,6 +460,8 @@ class QRCodeContainerApiClient:
                     self.logger.info(f"Successfully retrieved declaration info for {so_to_khai}")
                 else:
                     self.logger.warning(f"No valid data returned for {so_to_khai}")
+                if cache is not None:
+                    cache.put(query, result)
                 
             return result
             
@@ -206,6 +475,60 @@ class QRCodeContainerApiClient:
             self.logger.error(f"Failed to parse API response: {e}")
             raise QRCodeApiError(f"Invalid XML response: {e}")
     
+    def _post_soap_request(self, soap_request: str) -> requests.Response:
+        """
+        Send one QueryBangKeDanhSachContainer POST.
+        
+        Waits for the process-wide rate limiter and a concurrency slot,
+        records the request latency for hedging and, when capture is on,
+        writes the scrubbed request/response pair to disk.
+        
+        Args:
+            soap_request: SOAP envelope
+            
+        Returns:
+            HTTP response
+            
+        Raises:
+            QRCodeApiError: If the rate limit or concurrency slot wait times out.
+            requests.RequestException: On transport errors.
+        """
+        # Wait for the process-wide request rate budget
+        limiter = get_rate_limiter()
+        if not limiter.acquire(timeout=self.timeout):
+            raise QRCodeApiError(f"Rate limit wait exceeded {self.timeout}s")
+        
+        # Send request (concurrency is limited process-wide by the AIMD controller)
+        try:
+            with get_concurrency_controller().slot(self.timeout) as slot:
+                mark_request_sent()
+                started = time.monotonic()
+                response = self.session.post(
+                    self.service_url,
+                    data=soap_request.encode('utf-8'),
+                    headers={
+                        'Content-Type': 'text/xml; charset=utf-8',
+                        'SOAPAction': 'http://tempuri.org/QueryBangKeDanhSachContainer'
+                    },
+                    timeout=self.timeout
+                )
+                slot.record(
+                    success=response.status_code == 200,
+                    overload=is_overload_status(response.status_code)
+                )
+        except SlotTimeoutError as e:
+            raise QRCodeApiError(str(e)) from e
+        latency = time.monotonic() - started
+        if response.status_code == 200:
+            get_hedge_policy().record_latency(latency)
+        elif response.status_code == 429:
+            limiter.record_throttled()
+        
+        capture = get_api_capture()
+        if capture is not None:
+            capture.record(soap_request, response.status_code, response.text, latency)
+        return response
+    
     def _build_soap_request(
         self, 
         ma_so_thue: str, 
@@ -259,89 +582,9 @@ class QRCodeContainerApiClient:
             ContainerDeclarationInfo object, or None if parsing fails.
         """
         try:
-            # Parse XML
-            root = ET.fromstring(response_text)
-            
-            # Define namespaces
-            namespaces = {
-                'soap': self.SOAP_NS,
-                'ns': self.TEMPURI_NS
-            }
-            
-            # Find QueryBangKeDanhSachContainerResult element
-            result_elem = root.find('.//ns:QueryBangKeDanhSachContainerResult', namespaces)
-            
-            if result_elem is None:
-                # Try without namespace prefix
-                result_elem = root.find('.//{http://tempuri.org/}QueryBangKeDanhSachContainerResult')
-            
-            if result_elem is None:
+            info = parse_bang_ke_response(response_text)
+            if info is None:
                 self.logger.warning("No QueryBangKeDanhSachContainerResult found in response")
-                return None
-            
-            # Extract fields into dataclass
-            info = ContainerDeclarationInfo()
-            
-            # Map XML elements to dataclass fields
-            field_mapping = {
-                'MaSoThue': 'ma_so_thue',
-                'SoToKhai': 'so_to_khai',
-                'NgayToKhai': 'ngay_to_khai',
-                'TenDonViXNK': 'ten_don_vi_xnk',
-                'MaDDGS': 'ma_ddgs',
-                'TenDDGS': 'ten_ddgs',
-                'TenChiCucHaiQuanGS': 'ten_chi_cuc_hai_quan_gs',
-                'TenCucHaiQuan': 'ten_cuc_hai_quan',
-                'TenChiCucHaiQuan': 'ten_chi_cuc_hai_quan',
-                'LoaiHinh': 'loai_hinh',
-                'TenLoaiHinh': 'ten_loai_hinh',
-                'MaTrangThaiToKhai': 'ma_trang_thai_to_khai',
-                'TrangThaiToKhai': 'trang_thai_to_khai',
-                'LuongToKhai': 'luong_to_khai',
-                'So_Luong_Hang': 'so_luong_hang',
-                'Tong_Trong_Luong_Hang': 'tong_trong_luong_hang',
-                'DVT_So_Luong_Hang': 'dvt_so_luong_hang',
-                'DVT_Tong_Trong_Luong_Hang': 'dvt_tong_trong_luong_hang',
-                'IsContainer': 'is_container',
-                'SoDinhDanh': 'so_dinh_danh',
-                'MaPTVC': 'ma_ptvc',
-                'NgayTau': 'ngay_tau',
-                'Ghi_Chu': 'ghi_chu',
-                'ThoiGianLayDuLieu': 'thoi_gian_lay_du_lieu',
-                'ThongBaoLoi': 'thong_bao_loi'
-            }
-            
-            for xml_name, attr_name in field_mapping.items():
-                # Try with namespace first, then without
-                elem = result_elem.find(f'ns:{xml_name}', namespaces)
-                if elem is None:
-                    elem = result_elem.find(xml_name)
-                if elem is None:
-                    # Try with full namespace
-                    elem = result_elem.find(f'{{{self.TEMPURI_NS}}}{xml_name}')
-                
-                if elem is not None and elem.text:
-                    value = elem.text
-                    # Convert numeric fields
-                    if attr_name in ('so_luong_hang', 'tong_trong_luong_hang'):
-                        try:
-                            value = float(value)
-                        except ValueError:
-                            value = 0.0
-                    elif attr_name == 'is_container':
-                        try:
-                            value = int(value)
-                        except ValueError:
-                            value = 0
-                    setattr(info, attr_name, value)
-            
-            # Parse BangKe (container list) if present
-            bang_ke_elem = result_elem.find('BangKe')
-            if bang_ke_elem is None:
-                bang_ke_elem = result_elem.find(f'{{{self.TEMPURI_NS}}}BangKe')
-            if bang_ke_elem is not None:
-                info.containers = self._parse_bang_ke(bang_ke_elem)
-            
             return info
             
         except ET.ParseError as e:
@@ -351,86 +594,55 @@ class QRCodeContainerApiClient:
             self.logger.error(f"Error parsing response: {e}")
             return None
     
-    def _parse_bang_ke(self, bang_ke_elem: ET.Element) -> List[ContainerInfo]:
+    def query_many(
+        self,
+        keys,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cancel_event=None,
+        on_result=None,
+        use_cache: bool = True,
+        checkpoint=None
+    ) -> List[BangKeResult]:
         """
-        Parse BangKe element to extract container list.
+        Query many declarations concurrently using the asyncio batch engine.
+        
+        Blocking facade over AsyncQRCodeClient.query_many so GUI worker
+        threads can keep dozens of requests in flight without one thread
+        per request.
         
         Args:
-            bang_ke_elem: BangKe XML element.
+            keys: Iterable of BangKeQuery or (mst, so_tk, ma_hq, ngay) tuples
+            concurrency: Upper bound on requests in flight (default: the
+                         adaptive controller's max_limit)
+            timeout: Per-request timeout in seconds (default: client timeout)
+            cancel_event: Optional threading.Event that cancels pending requests
+            on_result: Optional callback(BangKeResult) invoked as each completes
+            use_cache: Serve cached results without a request (results are
+                       always written back to the cache)
+            checkpoint: Optional callable() -> bool run before each query; it
+                        may block (e.g. Job.checkpoint while the job is paused)
+                        and returning False cancels the query
             
         Returns:
-            List of ContainerInfo objects.
+            List of BangKeResult in the same order as keys
         """
-        containers = []
-        
-        try:
-            # BangKe contains a diffgram with container data
-            # Look for Table_BangKe elements inside diffgram/DocumentElement
-            for table in bang_ke_elem.iter():
-                if 'Table_BangKe' in table.tag or 'Table' in table.tag:
-                    container = ContainerInfo()
-                    
-                    # Parse Stt (sequence number)
-                    stt_elem = table.find('Stt')
-                    if stt_elem is not None and stt_elem.text:
-                        try:
-                            container.stt = int(stt_elem.text)
-                        except ValueError:
-                            pass
-                    
-                    # Parse SoContainer (trim whitespace)
-                    so_cont = table.find('SoContainer')
-                    if so_cont is not None and so_cont.text:
-                        container.so_container = so_cont.text.strip()
-                    else:
-                        # Try old field name
-                        so_cont = table.find('So_Container')
-                        if so_cont is not None and so_cont.text:
-                            container.so_container = so_cont.text.strip()
-                    
-                    # Parse SoSeal (trim whitespace)
-                    so_seal = table.find('SoSeal')
-                    if so_seal is not None and so_seal.text:
-                        container.so_seal = so_seal.text.strip()
-                    else:
-                        # Try old field name
-                        so_seal = table.find('So_Seal')
-                        if so_seal is not None and so_seal.text:
-                            container.so_seal = so_seal.text.strip()
-                    
-                    # Parse SoSealHQ (customs seal)
-                    so_seal_hq = table.find('SoSealHQ')
-                    if so_seal_hq is not None and so_seal_hq.text:
-                        # Handle "#####" as empty
-                        seal_hq_value = so_seal_hq.text.strip()
-                        if seal_hq_value != "#####":
-                            container.so_seal_hq = seal_hq_value
-                    
-                    # Parse BarcodeImage (base64 encoded PNG)
-                    barcode_img = table.find('BarcodeImage')
-                    if barcode_img is not None and barcode_img.text:
-                        container.barcode_image = barcode_img.text
-                    
-                    # Parse GhiChu (notes)
-                    ghi_chu = table.find('GhiChu')
-                    if ghi_chu is not None and ghi_chu.text:
-                        container.ghi_chu = ghi_chu.text
-                    
-                    # Parse Trong_Luong (weight) - for backward compatibility
-                    trong_luong = table.find('Trong_Luong')
-                    if trong_luong is not None and trong_luong.text:
-                        try:
-                            container.trong_luong = float(trong_luong.text)
-                        except ValueError:
-                            pass
-                    
-                    if container.so_container:
-                        containers.append(container)
-                        
-        except Exception as e:
-            self.logger.debug(f"Error parsing BangKe: {e}")
+        from web_utils.async_qrcode_client import AsyncQRCodeClient
         
-        return containers
+        client = AsyncQRCodeClient(
+            service_url=self.service_url,
+            logger=self.logger,
+            timeout=self.timeout
+        )
+        return client.run_many(
+            keys,
+            concurrency=concurrency,
+            timeout=timeout,
+            cancel_event=cancel_event,
+            on_result=on_result,
+            use_cache=use_cache,
+            checkpoint=checkpoint
+        )
     
     def test_connection(self) -> bool:
         """
@@ -450,7 +662,25 @@ class QRCodeContainerApiClient:
             self.logger.error(f"Connection test failed: {e}")
             return False
     
+    def warm_up(self, connections: Optional[int] = None) -> int:
+        """
+        Pre-open keep-alive connections to the service before a batch.
+        
+        Args:
+            connections: Number of connections to open (default: pool size)
+            
+        Returns:
+            Number of connections successfully warmed
+        """
+        pool = get_http_session_pool()
+        if self.session is not pool.session:
+            return 0
+        if connections:
+            pool.ensure_capacity(connections)
+        return pool.warm_up(self.service_url, connections)
+    
     def close(self):
-        """Close the HTTP session."""
-        if hasattr(self, 'session'):
-            self.session.close()
+        """
+        Release the client. The session is not closed: it is either the
+        shared keep-alive pool or injected (and owned) by the caller.
+        """
@@ -0,0 +1,378 @@
+"""
+Rate Limiter Module
+
+Process-wide token-bucket limit on the request rate to the customs
+endpoints, shared by the Scheduler, manual panel downloads, redownloads
+and ClearanceChecker.
+
+- Tokens refill continuously at `rate` per second up to `burst`, so the
+  sustained rate stays just below the configured ceiling instead of
+  alternating between bursts and idle periods.
+- Waiting requests are queued per priority lane. A free token always goes
+  to the oldest waiter of the highest-priority non-empty lane (interactive
+  before normal before background); within a lane requests are served in
+  arrival order.
+- Waiters that have queued longer than `max_wait_promotion` are served as
+  interactive so background polling cannot starve indefinitely.
+- When the server answers HTTP 429 the effective rate is reduced, then
+  recovers gradually towards the configured rate.
+
+The priority of a request is taken from a context variable set with
+request_priority() / run_with_priority() by the code that starts the work.
+The global limiter is unlimited until configured at application start-up.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+from logging_system.logger import Logger
+
+
+# Priority lanes (lower value = served first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_BACKGROUND: "background",
+}
+
+_request_priority: contextvars.ContextVar = contextvars.ContextVar(
+    "request_priority", default=PRIORITY_NORMAL
+)
+
+
+def current_priority() -> int:
+    """Priority of requests issued from the current context."""
+    return _request_priority.get()
+
+
+@contextmanager
+def request_priority(priority: int):
+    """
+    Issue all requests inside the block with the given priority.
+
+    Args:
+        priority: One of PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def run_with_priority(priority: int, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Call fn with the given request priority.
+
+    Useful with ThreadPoolExecutor.submit, whose workers do not inherit
+    the submitting thread's context.
+    """
+    with request_priority(priority):
+        return fn(*args, **kwargs)
+
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe token bucket with priority lanes.
+
+    Usage:
+        if limiter.acquire(timeout=30):
+            response = session.post(...)
+    """
+
+    DEFAULT_RATE = 5.0  # requests per second
+    DEFAULT_BURST = 5
+    DEFAULT_MAX_WAIT_PROMOTION = 10.0  # seconds
+    THROTTLE_FACTOR = 0.8
+    MIN_RATE_FRACTION = 0.25
+    RECOVERY_STEP = 0.02  # fraction of the configured rate regained per grant
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_wait_promotion: float = DEFAULT_MAX_WAIT_PROMOTION,
+        logger: Optional[Logger] = None
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Sustained requests per second (<= 0 disables limiting)
+            burst: Maximum number of tokens that can accumulate
+            max_wait_promotion: Seconds after which a queued request is
+                                served as interactive
+            logger: Optional logger instance
+        """
+        self.logger = logger
+        self._condition = threading.Condition()
+        self._lanes: Dict[int, Deque] = {p: deque() for p in PRIORITY_NAMES}
+        self._sequence = itertools.count()
+        self._last_throttle = 0.0
+
+        # Metrics per lane
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._wait_total = {p: 0.0 for p in PRIORITY_NAMES}
+        self._wait_max = {p: 0.0 for p in PRIORITY_NAMES}
+        self._timeouts = {p: 0 for p in PRIORITY_NAMES}
+        self._throttled = 0
+
+        self.configure(rate, burst, max_wait_promotion)
+
+    def configure(
+        self,
+        rate: float,
+        burst: Optional[int] = None,
+        max_wait_promotion: Optional[float] = None
+    ) -> None:
+        """
+        Update limits at runtime (e.g. from BarcodeServiceConfig).
+
+        Args:
+            rate: Sustained requests per second (<= 0 disables limiting)
+            burst: Maximum bucket size
+            max_wait_promotion: Anti-starvation promotion delay in seconds
+        """
+        with self._condition:
+            self.rate = max(0.0, float(rate))
+            self._effective_rate = self.rate
+            if burst is not None:
+                self.burst = max(1, int(burst))
+            if max_wait_promotion is not None:
+                self.max_wait_promotion = max(0.0, float(max_wait_promotion))
+            self._tokens = float(self.burst)
+            self._last_refill = time.monotonic()
+            self._condition.notify_all()
+
+    @property
+    def enabled(self) -> bool:
+        """False when the rate is 0 (unlimited)."""
+        return self.rate > 0
+
+    @property
+    def effective_rate(self) -> float:
+        """Current refill rate after 429 back-off."""
+        return self._effective_rate
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self._effective_rate)
+            self._last_refill = now
+
+    def _next_waiter(self, now: float):
+        """The waiter that should receive the next token."""
+        oldest = None
+        for priority in sorted(self._lanes):
+            lane = self._lanes[priority]
+            if lane and (oldest is None or lane[0][1] < oldest[1]):
+                oldest = lane[0]
+        # Anti-starvation: a waiter queued too long jumps ahead
+        if oldest is not None and now - oldest[1] >= self.max_wait_promotion:
+            return oldest
+        for priority in sorted(self._lanes):
+            if self._lanes[priority]:
+                return self._lanes[priority][0]
+        return None
+
+    def acquire(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Block until a token is available for this request.
+
+        Args:
+            priority: Lane to queue in; defaults to current_priority()
+            timeout: Maximum seconds to wait (None = wait forever)
+
+        Returns:
+            True if a token was acquired, False on timeout
+        """
+        if priority is None:
+            priority = current_priority()
+        if priority not in self._lanes:
+            priority = PRIORITY_NORMAL
+
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        waiter = (next(self._sequence), started, priority)
+
+        with self._condition:
+            if not self.enabled:
+                self._record_grant(priority, 0.0)
+                return True
+
+            self._lanes[priority].append(waiter)
+            try:
+                while True:
+                    granted, wait = self._poll(waiter, deadline)
+                    if granted is not None:
+                        return granted
+                    self._condition.wait(wait)
+            finally:
+                self._leave(waiter)
+
+    async def acquire_async(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """
+        acquire() for coroutines: queues in the same lanes as the threads
+        but sleeps on the event loop until the next token is due.
+
+        A cancelled waiter leaves its lane without taking a token.
+
+        Args:
+            priority: Lane to queue in; defaults to current_priority()
+            timeout: Maximum seconds to wait (None = wait forever)
+
+        Returns:
+            True if a token was acquired, False on timeout
+        """
+        if priority is None:
+            priority = current_priority()
+        if priority not in self._lanes:
+            priority = PRIORITY_NORMAL
+
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        waiter = (next(self._sequence), started, priority)
+
+        with self._condition:
+            if not self.enabled:
+                self._record_grant(priority, 0.0)
+                return True
+            self._lanes[priority].append(waiter)
+        try:
+            while True:
+                with self._condition:
+                    granted, wait = self._poll(waiter, deadline)
+                if granted is not None:
+                    return granted
+                await asyncio.sleep(wait)
+        finally:
+            with self._condition:
+                self._leave(waiter)
+
+    def _poll(self, waiter, deadline: Optional[float]):
+        """
+        Grant a token to a queued waiter if it is its turn (lock held).
+
+        Returns:
+            (True, None) when granted, (False, None) on timeout, otherwise
+            (None, seconds until the next token is due or the deadline)
+        """
+        started, priority = waiter[1], waiter[2]
+        now = time.monotonic()
+        self._refill(now)
+        if not self.enabled:
+            # Limiting was switched off while we were queued
+            self._record_grant(priority, now - started)
+            return True, None
+        if self._next_waiter(now) is waiter and self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self._recover()
+            self._record_grant(priority, now - started)
+            return True, None
+
+        if deadline is not None and now >= deadline:
+            self._timeouts[priority] += 1
+            return False, None
+
+        # Sleep until the next token is due
+        wait = max(0.001, (1.0 - self._tokens) / self._effective_rate)
+        if deadline is not None:
+            wait = min(wait, deadline - now)
+        return None, wait
+
+    def _leave(self, waiter) -> None:
+        """Remove a waiter from its lane and let the next one check (lock held)."""
+        try:
+            self._lanes[waiter[2]].remove(waiter)
+        except ValueError:
+            pass
+        self._condition.notify_all()
+
+    def queued(self) -> int:
+        """Number of requests waiting for a token in all lanes."""
+        with self._condition:
+            return sum(len(lane) for lane in self._lanes.values())
+
+    def record_throttled(self) -> None:
+        """
+        Report an HTTP 429 from the server.
+
+        Lowers the effective rate (at most once per second) so the sustained
+        rate settles just below what the server tolerates.
+        """
+        with self._condition:
+            self._throttled += 1
+            now = time.monotonic()
+            if not self.enabled or now - self._last_throttle < 1.0:
+                return
+            self._last_throttle = now
+            floor = self.rate * self.MIN_RATE_FRACTION
+            old = self._effective_rate
+            self._effective_rate = max(floor, self._effective_rate * self.THROTTLE_FACTOR)
+            if self.logger and self._effective_rate != old:
+                self.logger.info(f"Request rate reduced {old:.2f} -> {self._effective_rate:.2f}/s (HTTP 429)")
+
+    def _recover(self) -> None:
+        if self._effective_rate < self.rate:
+            self._effective_rate = min(self.rate, self._effective_rate + self.rate * self.RECOVERY_STEP)
+
+    def _record_grant(self, priority: int, waited: float) -> None:
+        self._granted[priority] += 1
+        self._wait_total[priority] += waited
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get limiter metrics.
+
+        Returns:
+            Dictionary with the configured and effective rate, available
+            tokens, 429 count, and per-lane granted, queued, timeouts,
+            average and maximum wait
+        """
+        with self._condition:
+            self._refill(time.monotonic())
+            lanes = {}
+            for priority, name in PRIORITY_NAMES.items():
+                granted = self._granted[priority]
+                lanes[name] = {
+                    'granted': granted,
+                    'queued': len(self._lanes[priority]),
+                    'timeouts': self._timeouts[priority],
+                    'avg_wait': (self._wait_total[priority] / granted) if granted else 0.0,
+                    'max_wait': self._wait_max[priority],
+                }
+            return {
+                'rate': self.rate,
+                'effective_rate': self._effective_rate,
+                'burst': self.burst,
+                'tokens': self._tokens,
+                'throttled': self._throttled,
+                'lanes': lanes,
+            }
+
+
+# Global instance
+_rate_limiter: Optional[TokenBucketRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(logger: Optional[Logger] = None) -> TokenBucketRateLimiter:
+    """Get or create the process-wide outbound request rate limiter."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucketRateLimiter(rate=0, logger=logger)
+        elif logger and _rate_limiter.logger is None:
+            _rate_limiter.logger = logger
+        return _rate_limiter
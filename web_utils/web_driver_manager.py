@@ -8,11 +8,13 @@ Responsibilities:
 1. Create and configure Chrome WebDriver
 2. Session management
 3. Cleanup on exit
+4. Pool of warm drivers reused across declarations (WebDriverPool)
 """
 
 import os
 import threading
-from typing import Optional
+import time
+from typing import Any, Callable, Dict, List, Optional
 from contextlib import contextmanager
 
 # Optional selenium imports (may not be installed)
@@ -34,6 +36,13 @@ except ImportError:
     WEBDRIVER_MANAGER_AVAILABLE = False
     ChromeDriverManager = None
 
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
 from logging_system.logger import Logger
 
 
@@ -177,6 +186,320 @@ class WebDriverManager:
             return None
 
 
+def driver_memory_mb(driver) -> Optional[float]:
+    """
+    Resident memory of a driver's browser processes in MB.
+    
+    Sums chromedriver and all its child processes (browser, renderers).
+    
+    Args:
+        driver: WebDriver instance
+        
+    Returns:
+        Memory in MB, or None if it can't be measured (psutil missing,
+        remote driver, process gone)
+    """
+    if not PSUTIL_AVAILABLE:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class PooledDriver:
+    """A pooled WebDriver with its usage counters."""
+    
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.idle_since = self.created_at
+
+
+class WebDriverPool:
+    """
+    Pool of warm WebDriver instances shared by worker threads.
+    
+    Starting Chrome takes seconds, so drivers are kept after use and
+    handed to the next declaration. The pool size caps concurrent browser
+    sessions (callers wait for a free driver). A driver is recycled (quit
+    and later replaced) when:
+    - it has served `max_uses` sessions
+    - its browser processes use more than `max_memory_mb` (needs psutil)
+    - the session raised an error (page state unknown)
+    - it has been idle for `idle_timeout` seconds
+    
+    Usage:
+        pool = WebDriverPool(factory=create_driver, size=3)
+        with pool.session() as driver:
+            driver.get(url)
+    """
+    
+    DEFAULT_MAX_USES = 50
+    DEFAULT_IDLE_TIMEOUT = 300.0  # seconds
+    RESET_URL = "about:blank"
+    
+    def __init__(
+        self,
+        factory: Optional[Callable[[], Any]] = None,
+        size: int = 3,
+        max_uses: int = DEFAULT_MAX_USES,
+        max_memory_mb: float = 0,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        memory_probe: Callable[[Any], Optional[float]] = driver_memory_mb,
+        logger: Optional[Logger] = None
+    ):
+        """
+        Initialize the pool (no browser is started until needed).
+        
+        Args:
+            factory: Creates a new driver. Defaults to WebDriverManager's
+                     headless Chrome setup.
+            size: Maximum number of drivers (concurrent browser sessions)
+            max_uses: Sessions served before a driver is recycled (0 = no limit)
+            max_memory_mb: Browser memory that triggers a recycle (0 = no limit)
+            idle_timeout: Seconds an idle driver is kept (0 = forever)
+            memory_probe: Returns a driver's memory in MB, or None
+            logger: Optional logger instance
+        """
+        self.logger = logger
+        if factory is None:
+            factory = WebDriverManager(logger)._create_driver
+        self._factory = factory
+        self.size = max(1, int(size))
+        self.max_uses = max(0, int(max_uses))
+        self.max_memory_mb = max(0.0, float(max_memory_mb or 0))
+        self.idle_timeout = max(0.0, float(idle_timeout or 0))
+        self._memory_probe = memory_probe
+        self._condition = threading.Condition()
+        self._idle: List[PooledDriver] = []
+        self._total = 0  # idle + in use + being created
+        self._closed = False
+        self._reaper: Optional[threading.Timer] = None
+        self._stats = {'created': 0, 'reused': 0, 'recycled_uses': 0, 'recycled_memory': 0,
+                       'recycled_error': 0, 'recycled_idle': 0}
+    
+    def _log(self, level: str, message: str) -> None:
+        if self.logger:
+            getattr(self.logger, level)(message)
+    
+    def _quit(self, pooled: PooledDriver) -> None:
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            self._log('debug', f"Error quitting pooled WebDriver: {e}")
+    
+    def acquire(self, timeout: Optional[float] = None) -> Optional[PooledDriver]:
+        """
+        Take an idle driver, or start one if the pool isn't full.
+        
+        Args:
+            timeout: Seconds to wait for a free driver (None = wait forever)
+            
+        Returns:
+            PooledDriver, or None if the wait timed out or the pool is closed
+            
+        Raises:
+            Exception: Whatever the factory raises when starting a driver
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._stats['reused'] += 1
+                    return pooled
+                if self._total < self.size:
+                    self._total += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+        
+        # Start the browser outside the lock (takes seconds)
+        try:
+            driver = self._factory()
+        except BaseException:
+            with self._condition:
+                self._total -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['created'] += 1
+        self._log('debug', "Started pooled WebDriver")
+        return PooledDriver(driver)
+    
+    def release(self, pooled: PooledDriver, healthy: bool = True) -> None:
+        """
+        Return a driver after a session.
+        
+        Args:
+            pooled: Driver from acquire()
+            healthy: False if the session failed; the driver is then recycled
+        """
+        pooled.uses += 1
+        reason = None
+        if not healthy:
+            reason = 'error'
+        elif self.max_uses and pooled.uses >= self.max_uses:
+            reason = 'uses'
+        elif self.max_memory_mb:
+            memory = self._memory_probe(pooled.driver)
+            if memory is not None and memory > self.max_memory_mb:
+                reason = 'memory'
+        
+        if reason is None:
+            try:
+                # Drop the page (and its memory) between declarations
+                pooled.driver.get(self.RESET_URL)
+            except Exception:
+                reason = 'error'
+        
+        with self._condition:
+            if reason is None and not self._closed:
+                pooled.idle_since = time.monotonic()
+                self._idle.append(pooled)
+                self._condition.notify()
+                self._schedule_reap()
+                return
+            self._total -= 1
+            if reason:
+                self._stats[f'recycled_{reason}'] += 1
+            self._condition.notify()
+        if reason:
+            self._log('debug', f"Recycling WebDriver after {pooled.uses} uses ({reason})")
+        self._quit(pooled)
+    
+    @contextmanager
+    def session(self, timeout: Optional[float] = None):
+        """
+        Borrow a driver for one session.
+        
+        The driver is returned to the pool afterwards, or recycled if the
+        block raised.
+        
+        Args:
+            timeout: Seconds to wait for a free driver (None = wait forever)
+            
+        Raises:
+            TimeoutError: If no driver became free within timeout
+        """
+        pooled = self.acquire(timeout)
+        if pooled is None:
+            raise TimeoutError("No WebDriver available")
+        healthy = False
+        try:
+            yield pooled.driver
+            healthy = True
+        finally:
+            self.release(pooled, healthy)
+    
+    def warm_up(self, count: Optional[int] = None) -> int:
+        """
+        Start drivers ahead of a batch.
+        
+        Args:
+            count: Drivers to have started (default and cap: pool size)
+            
+        Returns:
+            Number of drivers started
+        """
+        count = min(self.size, self.size if count is None else count)
+        with self._condition:
+            if self._closed:
+                return 0
+            missing = max(0, count - self._total)
+            self._total += missing
+        
+        started = 0
+        for _ in range(missing):
+            try:
+                pooled = PooledDriver(self._factory())
+            except Exception as e:
+                self._log('warning', f"WebDriver warm-up failed: {e}")
+                with self._condition:
+                    self._total -= missing - started
+                    self._condition.notify_all()
+                break
+            started += 1
+            with self._condition:
+                self._stats['created'] += 1
+                if self._closed:
+                    self._total -= 1
+                else:
+                    self._idle.append(pooled)
+                    self._condition.notify()
+                    self._schedule_reap()
+                    continue
+            self._quit(pooled)
+        return started
+    
+    def _schedule_reap(self) -> None:
+        """Arm the idle reaper (called with the lock held)."""
+        if not self.idle_timeout or self._reaper is not None or self._closed:
+            return
+        self._reaper = threading.Timer(self.idle_timeout, self._reap)
+        self._reaper.daemon = True
+        self._reaper.start()
+    
+    def _reap(self) -> None:
+        """Quit drivers idle for longer than idle_timeout."""
+        now = time.monotonic()
+        with self._condition:
+            self._reaper = None
+            expired = [p for p in self._idle if now - p.idle_since >= self.idle_timeout]
+            for pooled in expired:
+                self._idle.remove(pooled)
+                self._total -= 1
+                self._stats['recycled_idle'] += 1
+            if self._idle:
+                self._schedule_reap()
+            self._condition.notify_all()
+        for pooled in expired:
+            self._quit(pooled)
+    
+    def close(self) -> None:
+        """Quit idle drivers; drivers in use are quit when released."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            if self._reaper is not None:
+                self._reaper.cancel()
+                self._reaper = None
+            self._condition.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool metrics.
+        
+        Returns:
+            Dictionary with size, idle and in-use counts, drivers created,
+            sessions served by a reused driver, and recycle counts by reason
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self._total - len(self._idle),
+            })
+            return stats
+
+
 # Global instance
 _manager: Optional[WebDriverManager] = None
 